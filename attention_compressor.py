@@ -4,24 +4,81 @@
 Attention-based Text Compressor (opensource).
 
 Main flow: last-row probe (SDPA) + torch detector + sentence selection.
-Public API: compress(), compress_batch().
+Public API: compress(), compress_batch(), compress_stream(), rank();
+serving.AsyncCompressor adds compress_async() on top.
 """
 
-import re
+import hashlib
+import heapq
+import itertools
 import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
-from queue import Queue
-from typing import List, Tuple, Union, Dict, Optional, Literal
+from typing import Callable, Iterable, Iterator, List, Tuple, Union, Dict, Optional, Literal
 import numpy as np
 import torch
 import torch.nn as nn
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoModelForCausalLM, AutoTokenizer, DynamicCache
 import joblib
-import nltk
 import gc
 
-from probe import ProbeState, patch_qwen2_attention_for_probe
+from prep import (
+    CacheRegistry,
+    align_char_spans,
+    align_char_spans_batch,
+    align_char_spans_dense,
+    cumulative_char_spans,
+    SentenceAlignedTokenizer,
+    SingleFlight,
+    content_hash,
+    pad_aligned_rows,
+    tokenizer_fingerprint,
+)
+from prep.aligned_prompt import locate_sentence_spans
+from prep.corpus import PASSAGE_SEPARATOR, CorpusIndex
+from prep.dedup import duplicate_groups
+from prep.entry import build_context_entry, entry_sentences
+from prep.fast_tokenizer import tokenizer_json
+from prep.markers import joined_sentences, sentence_marker_masks
+from prep.pipeline import PipelineStats, run_pipeline
+from prep.result_store import ResultStore
+from prep.token_ids import SentenceIdAssembler
+from prep.prompt import (
+    PROMPT_HEAD,
+    PROMPT_TOKEN_MARGIN,
+    build_filtering_prompt,
+    filtering_prompt_tail,
+)
+from prep.splitters import (
+    ENGLISH_SPLITTERS,
+    ChineseRuleSplitter,
+    SentenceSplitter,
+    SpacySplitter,
+    count_words,
+    split_code_blocks,
+    split_contexts,
+    sync_sentence_spans,
+)
+from prep.worker import PrepProcessPool
+from probe import (
+    MemoryBudgetError,
+    MemoryModel,
+    MemoryPlanConfig,
+    ProbeState,
+    is_allocation_error,
+    patch_qwen2_attention_for_probe,
+)
+from probe.memory import available_bytes, measure_peak_bytes
+from selection import (
+    ColumnarResults,
+    ColumnarResultsBuilder,
+    SentenceRanking,
+    pad_index_lists,
+    pad_scores,
+    pad_tokens,
+    select_by_budget_batch,
+    select_by_threshold_batch,
+)
 
 
 class AttentionCompressor:
@@ -52,6 +109,24 @@ class AttentionCompressor:
         batch_prep_workers: int = 0,
         use_prep_pipeline: bool = True,
         disable_chunking: bool = False,
+        use_sentence_aligned_prep: bool = False,
+        context_cache_bytes: int = 256 * 1024 * 1024,
+        english_sentence_splitter: Literal["nltk", "regex"] = "nltk",
+        prep_processes: int = 0,
+        cache_policy: Literal["lru", "cost"] = "lru",
+        cache_bytes: Optional[Dict[str, int]] = None,
+        dedup_sentences: Literal["off", "exact", "near"] = "off",
+        dedup_threshold: float = 0.8,
+        result_cache: bool = False,
+        result_cache_dir: Optional[str] = None,
+        return_token_ids: bool = False,
+        validate_token_ids: bool = False,
+        prompt_template: Optional[str] = None,
+        pipeline_prep_workers: int = 1,
+        pipeline_finalize_workers: int = 0,
+        pipeline_queue_depth: int = 2,
+        batch_size: int = 4,
+        memory_planning: Union[bool, MemoryPlanConfig] = False,
         **kwargs,  # Accept extra params for demo/profile compatibility
     ):
         self.attention_model_path = attention_model_path
@@ -71,15 +146,52 @@ class AttentionCompressor:
         self.use_torch_compile = use_torch_compile
         self.use_triton_probe = use_triton_probe
         self._probe_state = None
-        self._filtering_cache: Dict[Tuple, dict] = {}
-        self._filtering_cache_max = 32
-        self._doc_prep_cache: Dict[Tuple[str, str], Tuple[List[str], Optional[List[int]]]] = {}
-        self._ctx_budget_cache: Dict[Tuple[int, str], int] = {}
         self.sentence_budget_tokenizer = sentence_budget_tokenizer
         self.sentence_tokenize_workers = max(0, int(sentence_tokenize_workers))
         self.batch_prep_workers = max(0, int(batch_prep_workers))
         self.use_prep_pipeline = bool(use_prep_pipeline)
+        self.pipeline_prep_workers = max(1, int(pipeline_prep_workers))
+        self.pipeline_finalize_workers = max(0, int(pipeline_finalize_workers))
+        self.pipeline_queue_depth = max(1, int(pipeline_queue_depth))
+        self._pipeline_stats: Optional[Dict] = None
+        self.batch_size = max(1, int(batch_size))
+        self._autotune_profile: Optional[Dict] = None
+        if memory_planning is True:
+            memory_planning = MemoryPlanConfig()
+        self._memory_config: Optional[MemoryPlanConfig] = memory_planning or None
+        self.memory_budget_bytes = memory_planning.budget_bytes if memory_planning else None
+        self._memory_model: Optional[MemoryModel] = None
+        self._memory_stats = {"planned_splits": 0, "rejected": 0, "oom_retries": 0}
         self.disable_chunking = bool(disable_chunking)
+        if english_sentence_splitter not in ENGLISH_SPLITTERS:
+            raise ValueError(
+                f"english_sentence_splitter must be one of {sorted(ENGLISH_SPLITTERS)}, "
+                f"got {english_sentence_splitter!r}"
+            )
+        self.english_sentence_splitter = english_sentence_splitter
+        if dedup_sentences not in ("off", "exact", "near"):
+            raise ValueError(
+                f"dedup_sentences must be 'off', 'exact' or 'near', got {dedup_sentences!r}"
+            )
+        self.dedup_sentences = dedup_sentences
+        self.dedup_threshold = float(dedup_threshold)
+        if prompt_template is not None and "{context}" not in prompt_template:
+            raise ValueError("prompt_template must contain a '{context}' placeholder")
+        self.prompt_template = prompt_template
+        self.validate_token_ids = bool(validate_token_ids)
+        self.return_token_ids = bool(
+            return_token_ids or validate_token_ids or prompt_template is not None
+        )
+        self.eval_tokenizer_path = eval_tokenizer_path
+        self.prep_processes = max(0, int(prep_processes))
+        self._prep_pool: Optional[PrepProcessPool] = None
+        self._prep_threads: Optional[ThreadPoolExecutor] = None
+        self._prep_threads_size = 0
+        self.use_sentence_aligned_prep = bool(use_sentence_aligned_prep)
+        self._aligned_tokenizer: Optional[SentenceAlignedTokenizer] = None
+        self._passage_aligned_tokenizer: Optional[SentenceAlignedTokenizer] = None
+        self._corpus_index: Optional[CorpusIndex] = None
+        self._setup_caches(context_cache_bytes, cache_policy, cache_bytes)
         self._prep_cache_lock = threading.Lock()
 
         self.device = torch.device(device if torch.cuda.is_available() else "cpu")
@@ -88,6 +200,11 @@ class AttentionCompressor:
         self._load_eval_tokenizer(eval_tokenizer_path)
         self._load_detector()
         self._setup_text_processing()
+        self._setup_aligned_prep()
+        self._setup_result_cache(result_cache, result_cache_dir)
+        self._setup_token_ids()
+        if self._memory_config is not None:
+            self._setup_memory_model()
 
         print(f"AttentionCompressor initialized:")
         print(f"  - Model: {attention_model_path}")
@@ -106,14 +223,56 @@ class AttentionCompressor:
             print(f"  - Triton fused probe: enabled")
         if self.sentence_budget_tokenizer != "7b":
             print(f"  - Sentence budget tokenizer: {self.sentence_budget_tokenizer}")
+        elif self._shared_sentence_tokenizer:
+            print(f"  - Sentence budget tokenizer: 7b (same vocab as 0.5B, single encode)")
+        if self.english_sentence_splitter != "nltk":
+            print(f"  - English sentence splitter: {self.english_sentence_splitter}")
         if self.sentence_tokenize_workers > 0:
             print(f"  - Parallel sentence tokenize workers: {self.sentence_tokenize_workers}")
         if self.batch_prep_workers > 0:
             print(f"  - Batch prep workers: {self.batch_prep_workers}")
         if self.use_prep_pipeline:
             print(f"  - Prep/forward pipeline: enabled (overlap CPU prep with GPU)")
+        if self.pipeline_prep_workers > 1 or self.pipeline_finalize_workers > 0:
+            print(
+                f"  - Pipeline stages: {self.pipeline_prep_workers} prep / 1 forward / "
+                f"{self.pipeline_finalize_workers or 'inline'} finalize "
+                f"(queue depth {self.pipeline_queue_depth})"
+            )
+        if self.prep_processes > 0:
+            print(f"  - Prep worker processes: {self.prep_processes} (shared-memory handoff)")
         if self.disable_chunking:
             print(f"  - Chunking: disabled (single forward, no split/gate)")
+        if self._aligned_tokenizer is not None:
+            print(f"  - Sentence-aligned prep: enabled (no offset mapping)")
+        if self.dedup_sentences != "off":
+            print(
+                f"  - Sentence dedup: {self.dedup_sentences}"
+                + (f" (MinHash Jaccard >= {self.dedup_threshold})" if self.dedup_sentences == "near" else "")
+                + ", copies share the canonical sentence's score"
+            )
+        if self._result_config is not None:
+            print(
+                f"  - Result cache: sentence scores by content hash"
+                + (f" (persisted to {self._result_store.root})" if self._result_store else "")
+            )
+        if self._token_ids is not None:
+            print(
+                f"  - 7B token ids: assembled from cached sentence ids"
+                + (" (prompt template)" if self.prompt_template is not None else "")
+                + (", validated against a full encode" if self.validate_token_ids else "")
+            )
+        if self._caches.policy != "lru":
+            print(f"  - Cache eviction: {self._caches.policy} (GreedyDual-Size by rebuild time)")
+        if self.batch_size != 4:
+            print(f"  - Default batch size: {self.batch_size}")
+        if self._memory_model is not None:
+            budget = self.memory_budget_bytes
+            print(
+                f"  - Memory planning: batches split to fit "
+                + (f"{budget / 2**20:.0f} MiB" if budget else "free memory")
+                + f" (~{self._memory_model.coeffs[1] / 1024:.0f} KiB/token calibrated)"
+            )
 
     def _apply_torch_compile(self):
         try:
@@ -127,6 +286,124 @@ class AttentionCompressor:
             print(f"⚠️  torch.compile failed: {e}")
             self.use_torch_compile = False
 
+    def _tuned_settings(self) -> Dict:
+        return {
+            "use_triton_probe": self.use_triton_probe,
+            "use_prep_pipeline": self.use_prep_pipeline,
+            "batch_size": self.batch_size,
+            "sentence_tokenize_workers": self.sentence_tokenize_workers,
+            "use_torch_compile": self.use_torch_compile,
+        }
+
+    def _apply_tuned_settings(self, settings: Dict) -> None:
+        """Apply autotune knobs (unknown keys ignored, so older profiles still load)."""
+        if "use_triton_probe" in settings:
+            self.use_triton_probe = bool(settings["use_triton_probe"])
+            self._probe_state.use_triton = self.use_triton_probe
+        if "use_prep_pipeline" in settings:
+            self.use_prep_pipeline = bool(settings["use_prep_pipeline"])
+        if "batch_size" in settings:
+            self.batch_size = max(1, int(settings["batch_size"]))
+        if "sentence_tokenize_workers" in settings:
+            self.sentence_tokenize_workers = max(0, int(settings["sentence_tokenize_workers"]))
+        compiled = hasattr(self.attention_model, "_orig_mod")
+        want_compiled = bool(settings.get("use_torch_compile", compiled))
+        if want_compiled and not compiled:
+            self.use_torch_compile = True
+            self._apply_torch_compile()
+        elif compiled and not want_compiled:
+            self.attention_model = self.attention_model._orig_mod
+            self.use_torch_compile = False
+
+    def apply_tuned_profile(self, profile: Dict) -> None:
+        """Apply a serving.autotune profile's settings; get_model_info()["autotune"] reports it."""
+        self._apply_tuned_settings(profile["settings"])
+        self._autotune_profile = profile
+
+    _CACHE_BYTES = {
+        "tokenized_context": 256 * 1024 * 1024,
+        "filtering": 64 * 1024 * 1024,
+        "ctx_budget": 1024 * 1024,
+        "sentence_markers": 16 * 1024 * 1024,
+        "sentence_dedup": 16 * 1024 * 1024,
+        "results": 64 * 1024 * 1024,
+        "sentence_ids": 32 * 1024 * 1024,
+    }
+
+    def _setup_caches(
+        self,
+        context_cache_bytes: int,
+        cache_policy: str,
+        cache_bytes: Optional[Dict[str, int]],
+    ):
+        """Bounded content-hash caches (one registry, stats in get_model_info)."""
+        budgets = dict(self._CACHE_BYTES, tokenized_context=context_cache_bytes)
+        unknown = set(cache_bytes or ()) - set(budgets)
+        if unknown:
+            raise ValueError(
+                f"cache_bytes keys must be in {sorted(budgets)}, got {sorted(unknown)}"
+            )
+        budgets.update(cache_bytes or {})
+        self._caches = CacheRegistry(policy=cache_policy)
+        # Tokenized docs (split + counts + aligned ids) per (context_type, context).
+        self._context_cache = self._caches.create("tokenized_context", budgets["tokenized_context"])
+        # Per (context, question) prep: positions, kept sentences, host-side inputs.
+        self._filtering_cache = self._caches.create("filtering", budgets["filtering"])
+        # Per (max_seq_len, question) context token budget for the chunk gate.
+        self._ctx_budget_cache = self._caches.create("ctx_budget", budgets["ctx_budget"])
+        # Per sentence list marker masks (score rules, mandatory picks, separator).
+        self._marker_cache = self._caches.create("sentence_markers", budgets["sentence_markers"])
+        # Per (dedup mode, context_type, context) prompt with duplicate sentences cut out.
+        self._dedup_cache = self._caches.create("sentence_dedup", budgets["sentence_dedup"])
+        # Per (config, request) sentence scores; any budget is selected from them.
+        self._results_cache = self._caches.create("results", budgets["results"])
+        # Per sentence 7B ids (split at first / last pre-token) + junction glue ids.
+        self._sentence_ids_cache = self._caches.create("sentence_ids", budgets["sentence_ids"])
+
+    def _setup_result_cache(self, result_cache: bool, result_cache_dir: Optional[str]):
+        """Score cache keyed on request content + everything that changes the scores."""
+        self._result_store = ResultStore(result_cache_dir) if result_cache_dir else None
+        self._result_flight = SingleFlight()
+        self._result_config: Optional[str] = None
+        if not (result_cache or result_cache_dir):
+            return
+        detector = hashlib.blake2b(digest_size=16)
+        for module in (self.torch_detector,):
+            if module is not None:
+                for tensor in module.state_dict().values():
+                    detector.update(tensor.detach().cpu().numpy().tobytes())
+        for tensor in (getattr(self, "detector_scaler", None) or {}).values():
+            detector.update(tensor.detach().cpu().numpy().tobytes())
+        self._result_config = content_hash(
+            "results-v1",
+            self.attention_model_path,
+            str(self.attention_model.dtype),
+            tokenizer_fingerprint(self.tokenizer),
+            tokenizer_fingerprint(self._budget_tokenizer()),
+            detector.hexdigest(),
+            self._PROMPT_HEAD,
+            repr(
+                (
+                    self.max_seq_len,
+                    self.disable_chunking,
+                    self.min_word_length,
+                    self.english_sentence_splitter,
+                    self.use_fast_chinese_split,
+                    self.sentence_budget_tokenizer,
+                    self.dedup_sentences,
+                    self.dedup_threshold,
+                    self.use_pure_gpu,
+                )
+            ),
+        ).hex()
+
+    def _setup_token_ids(self):
+        """7B ids of compressed_text from per-sentence ids (return_token_ids)."""
+        self._token_ids: Optional[SentenceIdAssembler] = None
+        self._token_id_mismatches = 0
+        if self.return_token_ids:
+            self._token_ids = SentenceIdAssembler(self.eval_tokenizer, self._sentence_ids_cache)
+
     def _load_attention_model(self):
         """Load the attention model and tokenizer"""
         print(f"Loading attention model from: {self.attention_model_path}")
@@ -171,10 +448,26 @@ class AttentionCompressor:
         self._setup_attention_capture()
 
     def _load_eval_tokenizer(self, eval_tokenizer_path: str):
-        """Load evaluation tokenizer for token counting."""
+        """Load evaluation tokenizer for token counting.
+
+        When the budget tokenizer is content-identical to the 0.5B one (same
+        normalizer, pre-tokenizer, vocab and merges), one per-sentence encode
+        serves budget counts, the chunk gate and aligned input construction.
+        """
         self.eval_tokenizer = AutoTokenizer.from_pretrained(
             eval_tokenizer_path, use_fast=True
         )
+        if self.sentence_budget_tokenizer == "0.5b":
+            self._shared_sentence_tokenizer = True
+        else:
+            attn_fp = tokenizer_fingerprint(self.tokenizer)
+            self._shared_sentence_tokenizer = attn_fp is not None and (
+                attn_fp == tokenizer_fingerprint(self.eval_tokenizer)
+            )
+        budget_tokenizer = self._budget_tokenizer()
+        self._join_sep_token_costs = {
+            sep: self._encode_length(budget_tokenizer, sep) for sep in (" ", "\n\n")
+        }
 
     def _load_detector(self):
         """Load trained detector for classification-based filtering"""
@@ -229,6 +522,30 @@ class AttentionCompressor:
     def _setup_text_processing(self):
         """Setup text processing. Spacy lazy-loaded when use_fast_chinese_split=False."""
         self.zh_sent_tokenize = None  # Lazy load when needed
+        self._english_splitter: SentenceSplitter = ENGLISH_SPLITTERS[
+            self.english_sentence_splitter
+        ]()
+        self._chinese_rule_splitter = ChineseRuleSplitter()
+        self._spacy_splitter: Optional[SpacySplitter] = None
+
+    def _setup_aligned_prep(self):
+        """Sentence-aligned prompt tokenizer (needs a fast tokenizer with pre_tokenizer).
+
+        Passage lists and the corpus index always assemble rows from aligned
+        pieces when available; use_sentence_aligned_prep extends that to plain
+        string contexts.
+        """
+        aligned = SentenceAlignedTokenizer(
+            self.tokenizer, self._PROMPT_HEAD, self.max_seq_len
+        )
+        self._passage_aligned_tokenizer = aligned if aligned.available else None
+        if not self.use_sentence_aligned_prep:
+            return
+        if not aligned.available:
+            print("⚠️  Sentence-aligned prep needs a fast tokenizer, using offset mapping")
+            self.use_sentence_aligned_prep = False
+            return
+        self._aligned_tokenizer = aligned
 
     def _ensure_spacy_loaded(self):
         """Lazy-load spacy only when use_fast_chinese_split=False and context_type=chinese."""
@@ -243,6 +560,7 @@ class AttentionCompressor:
                 disable=['tok2vec', 'tagger', 'parser', 'attribute_ruler', 'lemmatizer', 'ner']
             )
             self.zh_sent_tokenize.add_pipe('sentencizer')
+            self._spacy_splitter = SpacySplitter(self.zh_sent_tokenize)
         except OSError:
             print("⚠️  zh_core_web_sm not found, Chinese will use simple split")
 
@@ -270,21 +588,30 @@ class AttentionCompressor:
                 _ = self.attention_model(**dummy_inputs, output_attentions=False, return_dict=True)
 
     def _compress_with_chunking(
-        self, context: str, question: str, context_type: str
+        self,
+        context: str,
+        question: str,
+        context_type: str,
+        entry: Optional[dict] = None,
     ) -> Tuple[List, List[str], List[int]]:
-        """Question-aware chunk gate + optional multi-forward."""
+        """Question-aware chunk gate + optional multi-forward.
+
+        entry: prepared split / counts for context (default: _tokenized_context).
+        """
         max_ctx_tokens = self._max_context_tokens_for_forward(question)
-        doc_sentences = self._split_context_sentences(context, context_type)
+        if entry is None:
+            entry = self._tokenized_context(context, context_type)
+        doc_sentences = self._entry_sentences(context, entry)
         if not doc_sentences:
             return [], [], []
-        attn_toks = self._batch_count_tokens(doc_sentences, self.tokenizer)
+        attn_toks = entry["attn_tokens"].tolist()
         if sum(attn_toks) <= max_ctx_tokens:
             return self._get_sentence_scores(
                 context,
                 question,
                 context_type,
                 preset_sentences=doc_sentences,
-                preset_sentence_tokens=self._count_sentence_tokens(doc_sentences),
+                preset_sentence_tokens=entry["budget_tokens"].tolist(),
             )
         chunk_specs = self._build_attention_chunk_specs(
             doc_sentences, attn_toks, max_ctx_tokens, context_type
@@ -292,10 +619,11 @@ class AttentionCompressor:
         all_sentence_scores: List = []
         all_sentences: List[str] = []
         all_sentence_tokens: List[int] = []
+        budget_toks = entry["budget_tokens"]
         for spec in chunk_specs:
             chunk_sents = spec.get("sentences")
             chunk_budget_toks = (
-                self._count_sentence_tokens(chunk_sents) if chunk_sents else None
+                budget_toks[spec["start"] : spec["end"]].tolist() if chunk_sents else None
             )
             chunk_scores, chunk_sentences, chunk_tokens = self._get_sentence_scores(
                 spec["text"],
@@ -311,7 +639,7 @@ class AttentionCompressor:
 
     def compress(
         self,
-        context: str,
+        context: Union[str, List[str]],
         question: str = "",
         target_token: int = -1,
         compression_rate: float = 0.5,
@@ -322,20 +650,62 @@ class AttentionCompressor:
         """
         Compress text using attention-based filtering.
 
+        context: one string, or a list of passages (e.g. RAG retrievals). Passages
+        are joined with prep.corpus.PASSAGE_SEPARATOR; split, token counts and
+        prompt ids are cached per passage, so reordered or partly new lists reuse
+        the prep of every passage seen before.
+
         Returns:
             Dict: compressed_text, original_length, compressed_length, compression_ratio,
                   sentence_scores, sentences, preserved_indices, processing_time
+                  (+ sentence_passages / preserved_passages for passage lists,
+                  + compressed_token_ids / prompt_token_ids with return_token_ids)
         """
-        start_time = time.time()
-
-        if self.disable_chunking:
-            sentence_scores, sentences, sentence_tokens = self._get_sentence_scores(
-                context, question, context_type
+        return self._public_result(
+            self._compress(
+                context,
+                question,
+                target_token,
+                compression_rate,
+                context_type,
+                use_threshold_filtering,
+                threshold,
             )
-        else:
-            sentence_scores, sentences, sentence_tokens = self._compress_with_chunking(
-                context, question, context_type
+        )
+
+    @staticmethod
+    def _public_result(result: Dict) -> Dict:
+        """Drop the per-sentence token counts kept for columnar packing."""
+        result.pop("sentence_tokens", None)
+        return result
+
+    def _compress(
+        self,
+        context: Union[str, List[str]],
+        question: str = "",
+        target_token: int = -1,
+        compression_rate: float = 0.5,
+        context_type: str = "english",
+        use_threshold_filtering: bool = False,
+        threshold: float = 0.5,
+    ) -> Dict[str, Union[str, List, Dict]]:
+        """compress(); results also carry sentence_tokens (internal callers)."""
+        if not isinstance(context, str):
+            return self._compress_passage_list(
+                list(context),
+                question,
+                context_type,
+                target_token,
+                compression_rate,
+                use_threshold_filtering,
+                threshold,
             )
+        start_time = time.time()
+
+        sentence_scores, sentences, sentence_tokens, _ = self._cached_scores(
+            self._result_key("text", context_type, question, context),
+            lambda: self._score_context(context, question, context_type) + (None,),
+        )
 
         total_tokens = sum(sentence_tokens)
 
@@ -371,44 +741,410 @@ class AttentionCompressor:
 
         processing_time = time.time() - start_time
 
-        return {
-            'compressed_text': compressed_text,
-            'original_length': total_tokens,
-            'compressed_length': compressed_tokens,
-            'compression_ratio': actual_compression_rate,
-            'sentence_scores': sentence_scores,
-            'sentences': sentences,
-            'preserved_indices': preserved_indices,
-            'processing_time': processing_time
+        return self._attach_token_ids(
+            {
+                'compressed_text': compressed_text,
+                'original_length': total_tokens,
+                'compressed_length': compressed_tokens,
+                'compression_ratio': actual_compression_rate,
+                'sentence_scores': sentence_scores,
+                'sentence_tokens': sentence_tokens,
+                'sentences': sentences,
+                'preserved_indices': preserved_indices,
+                'processing_time': processing_time
+            },
+            context_type,
+            question,
+        )
+
+    def compress_steps(
+        self,
+        sample: Dict,
+        prefill_chunk_tokens: int = 2048,
+        target_token: int = -1,
+        compression_rate: float = 0.5,
+        use_threshold_filtering: bool = False,
+        threshold: float = 0.5,
+    ) -> Iterator[Optional[Dict]]:
+        """compress() of one sample as resumable steps (for serving.SloScheduler).
+
+        Yields None after prep and after each prefill_chunk_tokens slice of the
+        forward, then the result. Samples off the single-forward path (passage
+        lists, cached scores, contexts over max_seq_len) run in one step
+        through compress_batch().
+        """
+        budget_kwargs = dict(
+            target_token=target_token,
+            compression_rate=compression_rate,
+            use_threshold_filtering=use_threshold_filtering,
+            threshold=threshold,
+        )
+        key = self._sample_result_key(sample)
+        if not isinstance(sample["context"], str) or (
+            key is not None and self._load_scores(key) is not None
+        ):
+            yield self.compress_batch([sample], batch_size=1, **budget_kwargs)[0]
+            return
+        package = self._prepare_sample_package(sample)
+        if package.get("needs_chunking"):
+            yield self._public_result(self._compress_from_prep_package(package, **budget_kwargs))
+            return
+        yield None
+        start_time = time.time()
+        for probs in self._forward_probs_steps(package["prep"], prefill_chunk_tokens):
+            if probs is None:
+                yield None
+        yield self._public_result(
+            self._finalize_prep_package(package, (start_time, probs), budget_kwargs)
+        )
+
+    def _sample_entries(self, sample: Dict) -> List[dict]:
+        context = sample.get("context", "")
+        context_type = sample.get("context_type", "english")
+        if isinstance(context, str):
+            return [self._tokenized_context(context, context_type)] if context else []
+        passages = [p for p in context if p.strip()]
+        return self._passage_entries(passages, context_type) if passages else []
+
+    def estimate_prompt_tokens(self, sample: Dict) -> int:
+        """0.5B context tokens of a sample from its cached prep entry (built on miss)."""
+        return sum(
+            int(entry["attn_tokens"].sum())
+            for entry in self._sample_entries(sample)
+            if entry["attn_tokens"] is not None
+        )
+
+    def _estimated_prompt_shape(self, sample: Dict) -> Tuple[int, int]:
+        """(prompt tokens, sentences) of a sample for the memory planner."""
+        entries = self._sample_entries(sample)
+        context_tokens = sum(
+            int((e["attn_tokens"] if e["attn_tokens"] is not None else e["budget_tokens"]).sum())
+            for e in entries
+        )
+        wrapper = self._build_filtering_prompt("", sample.get("question", ""))
+        tokens = context_tokens + len(self.tokenizer(wrapper)["input_ids"])
+        sentences = sum(len(e["budget_tokens"]) for e in entries)
+        return min(tokens, self.max_seq_len), sentences
+
+    def rank(
+        self,
+        context: Union[str, List[str]],
+        question: str = "",
+        context_type: str = "english",
+    ) -> SentenceRanking:
+        """
+        Score a request once and return a reusable ranking.
+
+        ranking.select(target_tokens=...) / select(rate=...) / select(threshold=...)
+        return compress() results at selection-only cost, e.g. a 2x / 3x / 5x ladder:
+
+            ranking = compressor.rank(context, question)
+            results = [ranking.select(rate=r) for r in (0.5, 0.67, 0.8)]
+        """
+        if isinstance(context, str):
+            sentence_scores, sentences, sentence_tokens, _ = self._cached_scores(
+                self._result_key("text", context_type, question, context),
+                lambda: self._score_context(context, question, context_type) + (None,),
+            )
+            return SentenceRanking(
+                self, context, question, context_type, sentence_scores, sentences, sentence_tokens
+            )
+        passages = list(context)
+        kept, texts = self._nonempty_passages(passages)
+        sentence_scores, sentences, sentence_tokens, sentence_passages = self._joined_scores(
+            texts, lambda: self._passage_entries(texts, context_type), question, context_type
+        )
+        return SentenceRanking(
+            self,
+            texts,
+            question,
+            context_type,
+            sentence_scores,
+            sentences,
+            sentence_tokens,
+            [kept[i] for i in sentence_passages] if sentence_passages is not None else None,
+        )
+
+    def _score_context(
+        self, context: str, question: str, context_type: str
+    ) -> Tuple[Union[List[float], torch.Tensor], List[str], List[int]]:
+        """Sentence scores, sentences and budget tokens for one document."""
+        if self.dedup_sentences != "off":
+            view = self._context_dedup_view(context, context_type)
+            if view is not None:
+                scored = self._score_dedup_view(view, question, context_type)
+                if scored is not None:
+                    return scored
+        if self.disable_chunking:
+            return self._get_sentence_scores(context, question, context_type)
+        return self._compress_with_chunking(context, question, context_type)
+
+    def _result_key(self, *parts: str) -> Optional[bytes]:
+        """Result-cache key of one scoring request (None = result cache off)."""
+        if self._result_config is None:
+            return None
+        return content_hash(self._result_config, *parts)
+
+    def _sample_result_key(self, sample: Dict) -> Optional[bytes]:
+        context = sample.get("context", "")
+        if not isinstance(context, str):
+            return None  # passage lists are keyed inside compress()
+        return self._result_key(
+            "text", sample.get("context_type", "english"), sample.get("question", ""), context
+        )
+
+    def _load_scores(self, key: bytes) -> Optional[tuple]:
+        """(scores, sentences, sentence_tokens, sentence_passages) from memory, then disk."""
+        value = self._results_cache.get(key)
+        if value is None and self._result_store is not None:
+            value = self._result_store.get(key)
+            if value is not None:
+                self._results_cache.put(key, value)
+        if value is None:
+            return None
+        scores = list(value["scores"])
+        if value["tensor"]:
+            scores = torch.tensor(
+                scores, dtype=getattr(torch, value["dtype"]), device=self.device
+            )
+        passages = value["sentence_passages"]
+        return (
+            scores,
+            list(value["sentences"]),
+            list(value["sentence_tokens"]),
+            list(passages) if passages is not None else None,
+        )
+
+    def _store_scores(self, key: Optional[bytes], scored: tuple, cost: float = 0.0) -> None:
+        if key is None:
+            return
+        scores, sentences, sentence_tokens, passages = scored
+        tensor = isinstance(scores, torch.Tensor)
+        value = {
+            "scores": scores.tolist() if tensor else [float(x) for x in scores],
+            "tensor": tensor,
+            "dtype": str(scores.dtype).replace("torch.", "") if tensor else None,
+            "sentences": list(sentences),
+            "sentence_tokens": [int(t) for t in sentence_tokens],
+            "sentence_passages": [int(p) for p in passages] if passages is not None else None,
         }
+        self._results_cache.put(key, value, cost=cost)
+        if self._result_store is not None:
+            self._result_store.put(key, value)
+
+    def _cached_scores(self, key: Optional[bytes], score_fn: Callable[[], tuple]) -> tuple:
+        """score_fn() through the result cache; concurrent identical keys run it once."""
+        if key is None:
+            return score_fn()
+
+        def _load_or_score() -> tuple:
+            scored = self._load_scores(key)
+            if scored is None:
+                t0 = time.perf_counter()
+                scored = score_fn()
+                self._store_scores(key, scored, cost=time.perf_counter() - t0)
+            return scored
+
+        return self._result_flight.do(key, _load_or_score)
 
     def compress_batch(
         self,
         samples: List[Dict[str, str]],
-        batch_size: int = 4,
+        batch_size: Optional[int] = None,
         target_token: int = -1,
         compression_rate: float = 0.5,
         use_threshold_filtering: bool = False,
         threshold: float = 0.5,
         length_bucket: bool = True,
         use_prep_pipeline: Optional[bool] = None,
-    ) -> List[Dict[str, Union[str, List, Dict]]]:
+        columnar: bool = False,
+    ) -> Union[List[Dict[str, Union[str, List, Dict]]], ColumnarResults]:
         """
         Batch compress for throughput (single-sample latency unchanged).
 
-        Each sample dict: context, question (optional), context_type (optional).
+        Each sample dict: context (string or list of passages), question (optional),
+        context_type (optional).
+
+        batch_size: samples per batched forward; None uses self.batch_size.
 
         length_bucket: sort by length before chunking (ordering only when pipeline on).
 
         use_prep_pipeline: overlap CPU tokenize/split for sample i+1 with GPU
         forward on sample i. Recommended for heterogeneous LongBench workloads.
         Set False to use batched GPU forward (best when prompts are similar length).
+        With dedup_sentences on, samples always take the pipelined path.
+        With the result cache on, cached samples skip the forward and repeated
+        samples in one batch are scored once.
+
+        columnar: return selection.ColumnarResults (numpy columns, sentences as
+        spans into each context, compressed_text joined on access) instead of a
+        list of dicts; samples run in windows whose dicts are dropped once packed.
         """
+        if batch_size is None:
+            batch_size = self.batch_size
+        if columnar:
+            return self._compress_batch_columnar(
+                samples,
+                batch_size=batch_size,
+                target_token=target_token,
+                compression_rate=compression_rate,
+                use_threshold_filtering=use_threshold_filtering,
+                threshold=threshold,
+                length_bucket=length_bucket,
+                use_prep_pipeline=use_prep_pipeline,
+            )
+        batch_kwargs = dict(
+            batch_size=batch_size,
+            target_token=target_token,
+            compression_rate=compression_rate,
+            use_threshold_filtering=use_threshold_filtering,
+            threshold=threshold,
+            length_bucket=length_bucket,
+            use_prep_pipeline=use_prep_pipeline,
+        )
+        results = self._compress_batch_dicts(samples, **batch_kwargs)
+        return [self._public_result(result) for result in results]
+
+    def _compress_batch_dicts(self, samples: List[Dict], **batch_kwargs) -> List[Dict]:
+        """compress_batch() list results, with sentence_tokens kept."""
         if not samples:
             return []
+        if self._result_config is not None:
+            return self._compress_batch_with_result_cache(samples, **batch_kwargs)
+        return self._compress_batch_uncached(samples, **batch_kwargs)
+
+    _COLUMNAR_WINDOW = 256
+
+    def _compress_batch_columnar(
+        self, samples: List[Dict], batch_size: int, **batch_kwargs
+    ) -> ColumnarResults:
+        builder = ColumnarResultsBuilder()
+        window = max(batch_size, self._COLUMNAR_WINDOW)
+        for start in range(0, len(samples), window):
+            chunk = samples[start : start + window]
+            results = self._compress_batch_dicts(chunk, batch_size=batch_size, **batch_kwargs)
+            for sample, result in zip(chunk, results):
+                context = sample.get("context", "")
+                if not isinstance(context, str):
+                    context = PASSAGE_SEPARATOR.join(context)
+                context_type = sample.get("context_type", "english")
+                builder.append(
+                    result, context, self._join_separator(context_type, result["sentences"])
+                )
+            del results
+        return builder.build()
+
+    def _compress_batch_with_result_cache(
+        self,
+        samples: List[Dict],
+        target_token: int,
+        compression_rate: float,
+        use_threshold_filtering: bool,
+        threshold: float,
+        **batch_kwargs,
+    ) -> List[Dict[str, Union[str, List, Dict]]]:
+        """compress_batch() answering cached samples from stored scores.
+
+        Uncached keys are claimed in the result SingleFlight and scored in one
+        batch; keys another compress() / compress_batch() call is already scoring
+        are waited on (after this batch's own keys are published) and reused.
+        """
+        budget = dict(
+            target_token=target_token,
+            compression_rate=compression_rate,
+            use_threshold_filtering=use_threshold_filtering,
+            threshold=threshold,
+        )
+        keys = [self._sample_result_key(s) for s in samples]
+        results: List[Optional[Dict]] = [None] * len(samples)
+        first: Dict[bytes, int] = {}
+        for i, key in enumerate(keys):
+            if key is not None:
+                first.setdefault(key, i)
+        led, waiting = self._result_flight.lead(first)
+        scored: Dict[bytes, tuple] = {}
+        to_score = [i for i, key in enumerate(keys) if key is None]
+        error: Optional[BaseException] = None
+        try:
+            for key, i in first.items():
+                if key in waiting:
+                    continue
+                stored = self._load_scores(key)
+                if stored is None:
+                    to_score.append(i)
+                else:
+                    scored[key] = stored
+            to_score.sort()
+            if to_score:
+                fresh = self._compress_batch_uncached(
+                    [samples[i] for i in to_score], **budget, **batch_kwargs
+                )
+                for i, result in zip(to_score, fresh):
+                    results[i] = result
+                    if keys[i] is not None:
+                        scores = result["sentence_scores"]
+                        scored[keys[i]] = (
+                            scores if isinstance(scores, torch.Tensor) else list(scores),
+                            list(result["sentences"]),
+                            list(result["sentence_tokens"]),
+                            None,
+                        )
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            for key in led:
+                self._result_flight.finish(key, scored.get(key), error)
+        for key, flight in waiting.items():
+            scored[key] = self._result_flight.wait(flight)
+
+        for i, key in enumerate(keys):
+            if results[i] is not None:
+                continue
+            start_time = time.time()
+            sentence_scores, sentences, sentence_tokens, _ = scored[key]
+            results[i] = self._finalize_compress_result(
+                samples[i]["context"],
+                sentences,
+                sentence_scores,
+                sentence_tokens,
+                samples[i].get("context_type", "english"),
+                processing_time=time.time() - start_time,
+                question=samples[i].get("question", ""),
+                **budget,
+            )
+        return results  # type: ignore[return-value]
+
+    def _compress_batch_uncached(
+        self,
+        samples: List[Dict],
+        batch_size: int,
+        target_token: int,
+        compression_rate: float,
+        use_threshold_filtering: bool,
+        threshold: float,
+        length_bucket: bool,
+        use_prep_pipeline: Optional[bool],
+    ) -> List[Dict[str, Union[str, List, Dict]]]:
+        passage_idx = [
+            i for i, s in enumerate(samples) if not isinstance(s.get("context", ""), str)
+        ]
+        if passage_idx:
+            return self._compress_batch_with_passages(
+                samples,
+                passage_idx,
+                batch_size=batch_size,
+                target_token=target_token,
+                compression_rate=compression_rate,
+                use_threshold_filtering=use_threshold_filtering,
+                threshold=threshold,
+                length_bucket=length_bucket,
+                use_prep_pipeline=use_prep_pipeline,
+            )
+        self._prefetch_tokenized_contexts(samples)
         pipeline = (
             self.use_prep_pipeline if use_prep_pipeline is None else use_prep_pipeline
-        )
+        ) or self.dedup_sentences != "off"
         chunk_kwargs = dict(
             target_token=target_token,
             compression_rate=compression_rate,
@@ -416,6 +1152,9 @@ class AttentionCompressor:
             threshold=threshold,
         )
         if pipeline and len(samples) > 1:
+            pipeline_stats = PipelineStats(
+                self.pipeline_prep_workers, self.pipeline_finalize_workers
+            )
             if length_bucket and batch_size > 1:
                 indexed = list(enumerate(samples))
                 indexed.sort(
@@ -427,12 +1166,14 @@ class AttentionCompressor:
                     bucket = indexed[start : start + batch_size]
                     chunk = [sample for _, sample in bucket]
                     chunk_results = self._compress_sequential_pipelined(
-                        chunk, **chunk_kwargs
+                        chunk, pipeline_stats=pipeline_stats, **chunk_kwargs
                     )
                     for (orig_idx, _), result in zip(bucket, chunk_results):
                         results[orig_idx] = result
                 return results  # type: ignore[return-value]
-            return self._compress_sequential_pipelined(samples, **chunk_kwargs)
+            return self._compress_sequential_pipelined(
+                samples, pipeline_stats=pipeline_stats, **chunk_kwargs
+            )
 
         if batch_size <= 1 or len(samples) <= 1 or not length_bucket:
             results: List[Dict] = []
@@ -469,66 +1210,585 @@ class AttentionCompressor:
                 results[orig_idx] = result
         return results  # type: ignore[return-value]
 
-    def _prepare_sample_package(self, sample: Dict[str, str]) -> dict:
-        """CPU-only prep for one sample (thread-safe)."""
-        context = sample["context"]
-        question = sample.get("question", "")
-        context_type = sample.get("context_type", "english")
-        if self._sample_needs_chunking(context, question, context_type):
-            return {"needs_chunking": True, "sample": sample}
-        with self._prep_cache_lock:
-            doc_sentences, preset_tokens = self._doc_sentences_and_tokens(
-                context, context_type
-            )
-            prep = self._prepare_filtering_inputs(
-                context,
-                question,
-                context_type,
-                preset_sentences=doc_sentences if doc_sentences else None,
-                preset_sentence_tokens=preset_tokens,
-            )
-        return {
-            "needs_chunking": False,
-            "context": context,
-            "context_type": context_type,
-            "prep": prep,
-        }
+    def compress_stream(
+        self,
+        samples: Iterable[Dict],
+        window: int = 256,
+        batch_size: Optional[int] = None,
+        ordered: bool = True,
+        target_token: int = -1,
+        compression_rate: float = 0.5,
+        use_threshold_filtering: bool = False,
+        threshold: float = 0.5,
+        use_prep_pipeline: Optional[bool] = None,
+    ) -> Iterator[Union[Dict, Tuple[int, Dict]]]:
+        """
+        compress_batch() over a lazily read iterable, holding at most ``window`` samples.
 
-    def _forward_scores_from_prep(
-        self, prep: dict, context_type: str
-    ) -> Tuple[Union[List[float], torch.Tensor], List[str], List[int]]:
-        """GPU forward + detector on ready prep (main thread only)."""
-        if self.torch_detector is None:
-            raise ValueError("Torch detector not loaded. Detector required for clean mode.")
+        Each batch is the oldest pending sample plus the batch_size - 1 pending
+        samples closest to it in length (same length key as length_bucket); the
+        window is refilled after every batch. The oldest sample always goes next,
+        so no sample waits for more than window / batch_size batches.
 
-        _tf32_restore = None
-        if self.use_pure_gpu and torch.cuda.is_available():
-            _tf32_restore = torch.backends.cuda.matmul.allow_tf32
-            torch.backends.cuda.matmul.allow_tf32 = True
-        try:
-            with torch.inference_mode():
-                self._probe_state.begin(
-                    prep["sent_positions"], prep["context_start"], prep["context_end"]
-                )
-                _ = self.attention_model(
-                    input_ids=prep["inputs"]["input_ids"],
-                    attention_mask=prep["inputs"]["attention_mask"],
-                    output_attentions=False,
-                    return_dict=True,
+        ordered=True yields results in input order (buffer bounded by ``window``);
+        ordered=False yields (index, result) as soon as each batch finishes.
+        batch_size=None uses self.batch_size.
+        """
+        if batch_size is None:
+            batch_size = self.batch_size
+        if window < 1 or batch_size < 1:
+            raise ValueError(f"window and batch_size must be >= 1, got {window}, {batch_size}")
+        window = max(window, batch_size)
+        budget = dict(
+            target_token=target_token,
+            compression_rate=compression_rate,
+            use_threshold_filtering=use_threshold_filtering,
+            threshold=threshold,
+        )
+        source = iter(enumerate(samples))
+        pending: List[Tuple[int, Dict, int]] = []
+        done: Dict[int, Dict] = {}
+        next_idx = 0
+        while True:
+            for idx, sample in itertools.islice(source, window - len(pending)):
+                pending.append((idx, sample, self._sample_length(sample)))
+            if not pending:
+                return
+            anchor_len = pending[0][2]
+            picked = {0} | {
+                j
+                for _, j in heapq.nsmallest(
+                    batch_size - 1,
+                    ((abs(length - anchor_len), j) for j, (_, _, length) in enumerate(pending) if j),
                 )
-                vectors = self._probe_state.finalize_vectors()
-            if vectors is None:
-                raise ValueError("Attention probe processing failed to produce features.")
-            return self._vectors_to_sentence_scores(
-                vectors,
-                prep["sentences"],
-                prep["sentence_tokens"],
-                context_type,
+            }
+            bucket = [pending[j] for j in sorted(picked)]
+            pending = [item for j, item in enumerate(pending) if j not in picked]
+            results = self.compress_batch(
+                [sample for _, sample, _ in bucket],
+                batch_size=len(bucket),
+                length_bucket=False,
+                use_prep_pipeline=use_prep_pipeline,
+                **budget,
             )
-        finally:
-            if _tf32_restore is not None:
+            for (idx, _, _), result in zip(bucket, results):
+                if not ordered:
+                    yield idx, result
+                else:
+                    done[idx] = result
+            while next_idx in done:
+                yield done.pop(next_idx)
+                next_idx += 1
+
+    @staticmethod
+    def _sample_length(sample: Dict) -> int:
+        context = sample.get("context", "")
+        if not isinstance(context, str):
+            context_len = sum(len(p) for p in context)
+        else:
+            context_len = len(context)
+        return context_len + len(sample.get("question", ""))
+
+    def load_corpus_index(self, path: str) -> CorpusIndex:
+        """Attach a passage index (scripts/build_corpus_index.py) for compress_passages()."""
+        index = CorpusIndex(path)
+        manifest = index.manifest
+        if manifest["attention_tokenizer"] != tokenizer_fingerprint(self.tokenizer):
+            raise ValueError(f"Corpus index {path} was built with a different 0.5B tokenizer")
+        if manifest["budget_tokenizer"] != tokenizer_fingerprint(self._budget_tokenizer()):
+            raise ValueError(f"Corpus index {path} was built with a different budget tokenizer")
+        if manifest["prompt_head"] != self._PROMPT_HEAD:
+            raise ValueError(f"Corpus index {path} was built for a different prompt template")
+        if manifest.get("min_word_length") != self.min_word_length:
+            print(
+                f"⚠️  Corpus index min_word_length={manifest.get('min_word_length')} "
+                f"!= {self.min_word_length}, indexed sentence splits are used as-is"
+            )
+        self._corpus_index = index
+        print(f"✅ Corpus index loaded: {len(index)} passages ({index.context_type}) from {path}")
+        return index
+
+    def compress_passages(
+        self,
+        passage_ids: List[str],
+        question: str = "",
+        target_token: int = -1,
+        compression_rate: float = 0.5,
+        use_threshold_filtering: bool = False,
+        threshold: float = 0.5,
+    ) -> Dict[str, Union[str, List, Dict]]:
+        """
+        compress() over indexed passages, joined with prep.corpus.PASSAGE_SEPARATOR.
+
+        Sentences are the indexed per-passage splits; prompt ids and sentence token
+        spans are sliced from the index shards, only the glue between passages and
+        the question tail are encoded. Over-long prompts (or junctions that merge
+        across the separator) fall back to chunked scoring of the same sentences.
+
+        Returns:
+            Dict: compress() fields plus passage_ids and sentence_passages
+                  (index into passage_ids for each sentence)
+        """
+        if self._corpus_index is None:
+            raise ValueError("No corpus index loaded; call load_corpus_index(path) first")
+        if not passage_ids:
+            raise ValueError("passage_ids must not be empty")
+        start_time = time.time()
+        passages = [self._corpus_index.passage(pid) for pid in passage_ids]
+        entries = [
+            {
+                "sent_spans": p["sent_spans"],
+                "sentences": None,
+                "budget_tokens": p["budget_tokens"],
+                "attn_tokens": p["attn_tokens"],
+                "aligned": p["aligned"],
+            }
+            for p in passages
+        ]
+        result = self._compress_joined_entries(
+            [p["text"] for p in passages],
+            entries,
+            question,
+            self._corpus_index.context_type,
+            target_token,
+            compression_rate,
+            use_threshold_filtering,
+            threshold,
+            start_time,
+        )
+        result["passage_ids"] = list(passage_ids)
+        return self._public_result(result)
+
+    def _compress_joined_entries(
+        self,
+        texts: List[str],
+        entries: Union[List[dict], Callable[[], List[dict]]],
+        question: str,
+        context_type: str,
+        target_token: int,
+        compression_rate: float,
+        use_threshold_filtering: bool,
+        threshold: float,
+        start_time: float,
+    ) -> Dict[str, Union[str, List, Dict]]:
+        """Score + select over passages given their per-passage prep entries.
+
+        entries: list, or a zero-arg callable (not called on a result-cache hit).
+        """
+        context = PASSAGE_SEPARATOR.join(texts)
+        sentence_scores, sentences, sentence_tokens, sentence_passages = self._joined_scores(
+            texts, entries, question, context_type
+        )
+
+        result = self._finalize_compress_result(
+            context,
+            sentences,
+            sentence_scores,
+            sentence_tokens,
+            context_type,
+            target_token,
+            compression_rate,
+            use_threshold_filtering,
+            threshold,
+            time.time() - start_time,
+            question,
+        )
+        result["sentence_passages"] = sentence_passages
+        result["preserved_passages"] = (
+            sorted({sentence_passages[i] for i in result["preserved_indices"]})
+            if sentence_passages is not None
+            else None
+        )
+        return result
+
+    def _joined_scores(
+        self,
+        texts: List[str],
+        entries: Union[List[dict], Callable[[], List[dict]]],
+        question: str,
+        context_type: str,
+    ) -> tuple:
+        """_score_joined_entries through the result cache."""
+        return self._cached_scores(
+            self._result_key("passages", context_type, question, *texts),
+            lambda: self._score_joined_entries(
+                texts, entries() if callable(entries) else entries, question, context_type
+            ),
+        )
+
+    def _score_joined_entries(
+        self, texts: List[str], entries: List[dict], question: str, context_type: str
+    ) -> Tuple[Union[List[float], torch.Tensor], List[str], List[int], Optional[List[int]]]:
+        """Scores, sentences, budget tokens and passage of each sentence."""
+        context = PASSAGE_SEPARATOR.join(texts)
+        per_passage = [self._entry_sentences(t, e) for t, e in zip(texts, entries)]
+        doc_sentences = [sent for sentences in per_passage for sent in sentences]
+        owner = np.repeat(
+            np.arange(len(texts)), [len(sentences) for sentences in per_passage]
+        )
+        budget_tokens = np.concatenate(
+            [np.asarray(e["budget_tokens"], dtype=np.int64) for e in entries]
+        )
+        attn_tokens = (
+            None
+            if any(e["attn_tokens"] is None for e in entries)
+            else np.concatenate([np.asarray(e["attn_tokens"], dtype=np.int64) for e in entries])
+        )
+
+        view = scored = None
+        if self.dedup_sentences != "off" and doc_sentences:
+            view = self._dedup_view(
+                context, context_type, doc_sentences, budget_tokens, attn_tokens
+            )
+        if view is not None:
+            scored = self._score_dedup_view(view, question, context_type)
+
+        row = None
+        fits = (
+            self.disable_chunking
+            or attn_tokens is None
+            or int(attn_tokens.sum()) <= self._max_context_tokens_for_forward(question)
+        )
+        if (
+            scored is None
+            and fits
+            and doc_sentences
+            and self._passage_aligned_tokenizer is not None
+            and all(e["aligned"] is not None for e in entries)
+        ):
+            row = self._passage_aligned_tokenizer.build_joined_row(
+                [e["aligned"] for e in entries],
+                PASSAGE_SEPARATOR,
+                self._filtering_prompt_tail(question),
+            )
+
+        if scored is not None:
+            sentence_scores, sentences, sentence_tokens = scored
+            sentence_passages = owner[budget_tokens > 0].tolist()
+        elif row is not None:
+            keep = np.flatnonzero(budget_tokens > 0)
+            package = self._package_from_worker_row(
+                {"context": context, "context_type": context_type},
+                {
+                    "needs_chunking": False,
+                    "input_ids": row["input_ids"],
+                    "context_start": row["context_start"],
+                    "context_end": row["context_end"],
+                    "sent_positions": [row["sent_positions"][i] for i in keep.tolist()],
+                    "sentences": [doc_sentences[i] for i in keep.tolist()],
+                    "sentence_tokens": budget_tokens[keep].tolist(),
+                },
+            )
+            sentence_scores, sentences, sentence_tokens = self._forward_scores_from_prep(
+                package["prep"], context_type
+            )
+            sentence_passages = owner[keep].tolist()
+        else:
+            entry = {
+                "sent_spans": None,
+                "sentences": doc_sentences,
+                "budget_tokens": budget_tokens,
+                "attn_tokens": attn_tokens if attn_tokens is not None else budget_tokens,
+            }
+            if self.disable_chunking:
+                sentence_scores, sentences, sentence_tokens = self._get_sentence_scores(
+                    context,
+                    question,
+                    context_type,
+                    preset_sentences=doc_sentences,
+                    preset_sentence_tokens=budget_tokens.tolist(),
+                )
+            else:
+                sentence_scores, sentences, sentence_tokens = self._compress_with_chunking(
+                    context, question, context_type, entry=entry
+                )
+            spans = locate_sentence_spans(context, sentences) if sentences else None
+            if spans is None:
+                sentence_passages = None
+            else:
+                starts = np.cumsum([0] + [len(t) + len(PASSAGE_SEPARATOR) for t in texts[:-1]])
+                sentence_passages = (
+                    np.searchsorted(starts, spans[:, 0], side="right") - 1
+                ).tolist()
+        return sentence_scores, sentences, sentence_tokens, sentence_passages
+
+    def _compress_passage_list(
+        self,
+        passages: List[str],
+        question: str,
+        context_type: str,
+        target_token: int,
+        compression_rate: float,
+        use_threshold_filtering: bool,
+        threshold: float,
+    ) -> Dict[str, Union[str, List, Dict]]:
+        """compress() for a list of passages (prep cached per passage, not per list)."""
+        start_time = time.time()
+        kept, texts = self._nonempty_passages(passages)
+        result = self._compress_joined_entries(
+            texts,
+            lambda: self._passage_entries(texts, context_type),
+            question,
+            context_type,
+            target_token,
+            compression_rate,
+            use_threshold_filtering,
+            threshold,
+            start_time,
+        )
+        for key in ("sentence_passages", "preserved_passages"):
+            if result[key] is not None:
+                result[key] = [kept[i] for i in result[key]]
+        return result
+
+    @staticmethod
+    def _nonempty_passages(passages: List[str]) -> Tuple[List[int], List[str]]:
+        kept = [i for i, passage in enumerate(passages) if passage.strip()]
+        if not kept:
+            raise ValueError("passages must contain at least one non-empty passage")
+        return kept, [passages[i] for i in kept]
+
+    def _passage_entries(self, passages: List[str], context_type: str) -> List[dict]:
+        """Per-passage split, counts and aligned ids, cached by passage hash.
+
+        Uncached passages are split in one splitter call. Entries carry aligned
+        pieces whenever the tokenizer allows; without use_sentence_aligned_prep
+        they live under their own keys so plain contexts keep offset-path entries.
+        """
+        aligned = self._passage_aligned_tokenizer
+        shared_keys = aligned is self._aligned_tokenizer
+        keys = [
+            content_hash(context_type, p) if shared_keys else content_hash("passage", context_type, p)
+            for p in passages
+        ]
+        found = {k: self._context_cache.get(k) for k in set(keys)}
+        missing = {}
+        for key, passage in zip(keys, passages):
+            if found[key] is None:
+                missing.setdefault(key, passage)
+        if missing:
+            texts = list(missing.values())
+            t0 = time.perf_counter()
+            split = self._split_contexts(texts, [context_type] * len(texts))
+            split_cost = (time.perf_counter() - t0) / len(texts)
+            for (key, passage), sentences in zip(missing.items(), split):
+                t0 = time.perf_counter()
+                entry = self._build_context_entry(
+                    passage, sentences, pinned=False, aligned_tokenizer=aligned
+                )
+                self._context_cache.put(key, entry, cost=split_cost + time.perf_counter() - t0)
+                found[key] = entry
+        return [found[key] for key in keys]
+
+    def _compress_batch_with_passages(
+        self,
+        samples: List[Dict],
+        passage_idx: List[int],
+        target_token: int,
+        compression_rate: float,
+        use_threshold_filtering: bool,
+        threshold: float,
+        **batch_kwargs,
+    ) -> List[Dict[str, Union[str, List, Dict]]]:
+        """Passage-list samples one by one (all their passages split in one call first)."""
+        by_type: Dict[str, List[str]] = {}
+        for i in passage_idx:
+            context_type = samples[i].get("context_type", "english")
+            by_type.setdefault(context_type, []).extend(
+                p for p in samples[i]["context"] if p.strip()
+            )
+        for context_type, passages in by_type.items():
+            self._passage_entries(list(dict.fromkeys(passages)), context_type)
+
+        results: List[Optional[Dict]] = [None] * len(samples)
+        for i in passage_idx:
+            s = samples[i]
+            results[i] = self._compress(
+                context=s["context"],
+                question=s.get("question", ""),
+                target_token=target_token,
+                compression_rate=compression_rate,
+                context_type=s.get("context_type", "english"),
+                use_threshold_filtering=use_threshold_filtering,
+                threshold=threshold,
+            )
+        text_idx = [i for i in range(len(samples)) if results[i] is None]
+        if text_idx:
+            text_results = self._compress_batch_uncached(
+                [samples[i] for i in text_idx],
+                target_token=target_token,
+                compression_rate=compression_rate,
+                use_threshold_filtering=use_threshold_filtering,
+                threshold=threshold,
+                **batch_kwargs,
+            )
+            for i, result in zip(text_idx, text_results):
+                results[i] = result
+        return results  # type: ignore[return-value]
+
+    def _prepare_sample_package(self, sample: Dict[str, str]) -> dict:
+        """CPU-only prep for one sample (thread-safe)."""
+        context = sample["context"]
+        question = sample.get("question", "")
+        context_type = sample.get("context_type", "english")
+        view = None
+        if self.dedup_sentences != "off":
+            with self._prep_cache_lock:
+                view = self._context_dedup_view(context, context_type)
+        if self._sample_needs_chunking(
+            context, question, context_type, entry=view["entry"] if view else None
+        ):
+            return {"needs_chunking": True, "sample": sample}
+        with self._prep_cache_lock:
+            if view is None:
+                prompt_context = context
+                doc_sentences, preset_tokens = self._doc_sentences_and_tokens(
+                    context, context_type
+                )
+            else:
+                prompt_context = view["context"]
+                doc_sentences = view["entry"]["sentences"]
+                preset_tokens = view["entry"]["budget_tokens"].tolist()
+            prep = self._prepare_filtering_inputs(
+                prompt_context,
+                question,
+                context_type,
+                preset_sentences=doc_sentences if doc_sentences else None,
+                preset_sentence_tokens=preset_tokens,
+            )
+        return {
+            "needs_chunking": False,
+            "context": context,
+            "question": question,
+            "context_type": context_type,
+            "prep": prep,
+            "dedup": view,
+            "result_key": self._sample_result_key(sample),
+        }
+
+    def _forward_scores_from_prep(
+        self, prep: dict, context_type: str
+    ) -> Tuple[Union[List[float], torch.Tensor], List[str], List[int]]:
+        """GPU forward + detector on ready prep (main thread only)."""
+        return self._probs_to_sentence_scores(
+            self._forward_probs_from_prep(prep),
+            prep["sentences"],
+            prep["sentence_tokens"],
+            context_type,
+        )
+
+    def _forward_probs_from_prep(self, prep: dict) -> torch.Tensor:
+        """GPU forward + detector probs on device, no host sync (main thread only)."""
+        for probs in self._forward_probs_steps(prep):
+            pass
+        return probs
+
+    _MIN_RETRY_CHUNK_TOKENS = 256
+
+    def _forward_probs_steps(
+        self, prep: dict, chunk_tokens: Optional[int] = None
+    ) -> Iterator[Optional[torch.Tensor]]:
+        """Every single-row probe forward goes through here (memory_planning).
+
+        One forward (chunk_tokens=None) or prefill slices (_forward_probs_sliced).
+        A prompt predicted over the memory budget raises MemoryBudgetError before
+        it runs; on an allocation error the forward is retried as prefill slices
+        of half the previous length (the single-row analogue of halving a batch),
+        down to _MIN_RETRY_CHUNK_TOKENS.
+        """
+        seq_len = prep["inputs"]["input_ids"].shape[1]
+        self._plan_memory([(seq_len, len(prep["sent_positions"]))])
+        while True:
+            span = min(chunk_tokens or seq_len, seq_len)
+            try:
+                if span >= seq_len:
+                    yield self._probe_forward_probs(prep)
+                else:
+                    yield from self._forward_probs_sliced(prep, span)
+                return
+            except Exception as exc:
+                if not is_allocation_error(exc) or span <= self._MIN_RETRY_CHUNK_TOKENS:
+                    raise
+            self._release_after_allocation_error()
+            chunk_tokens = (span + 1) // 2
+            print(
+                f"⚠️  Allocation failed for a {span}-token forward, "
+                f"retrying as {chunk_tokens}-token prefill slices"
+            )
+
+    def _release_after_allocation_error(self) -> None:
+        self._probe_state.clear()
+        self.clear_cache()
+        self._memory_stats["oom_retries"] += 1
+
+    def _probe_forward_probs(self, prep: dict) -> torch.Tensor:
+        """One probe forward + detector probs (no memory check)."""
+        if self.torch_detector is None:
+            raise ValueError("Torch detector not loaded. Detector required for clean mode.")
+
+        _tf32_restore = None
+        if self.use_pure_gpu and torch.cuda.is_available():
+            _tf32_restore = torch.backends.cuda.matmul.allow_tf32
+            torch.backends.cuda.matmul.allow_tf32 = True
+        try:
+            with torch.inference_mode():
+                self._probe_state.begin(
+                    prep["sent_positions"], prep["context_start"], prep["context_end"]
+                )
+                _ = self.attention_model(
+                    input_ids=prep["inputs"]["input_ids"],
+                    attention_mask=prep["inputs"]["attention_mask"],
+                    output_attentions=False,
+                    use_cache=False,
+                    return_dict=True,
+                )
+                vectors = self._probe_state.finalize_vectors()
+            if vectors is None:
+                raise ValueError("Attention probe processing failed to produce features.")
+            return self._detector_probs_from_vectors(vectors)
+        finally:
+            if _tf32_restore is not None:
                 torch.backends.cuda.matmul.allow_tf32 = _tf32_restore
 
+    def _forward_probs_sliced(
+        self, prep: dict, chunk_tokens: int
+    ) -> Iterator[Optional[torch.Tensor]]:
+        """_forward_probs_from_prep() as prefill slices of chunk_tokens.
+
+        The KV cache is carried between slices; only the last slice runs with
+        the probe on (it reads the last query row over all cached keys). Yields
+        None after every earlier slice, then the detector probs. Other forwards
+        may run between slices (they do not touch this cache).
+        """
+        input_ids = prep["inputs"]["input_ids"]
+        seq_len = input_ids.shape[1]
+        if seq_len <= chunk_tokens:
+            yield self._probe_forward_probs(prep)
+            return
+        body = getattr(self.attention_model, "model", self.attention_model)
+        cache = DynamicCache()
+        last_start = ((seq_len - 1) // chunk_tokens) * chunk_tokens
+        for start in range(0, last_start, chunk_tokens):
+            with torch.inference_mode():
+                body(
+                    input_ids=input_ids[:, start : start + chunk_tokens],
+                    past_key_values=cache,
+                    use_cache=True,
+                )
+            yield None
+        if self.torch_detector is None:
+            raise ValueError("Torch detector not loaded. Detector required for clean mode.")
+        with torch.inference_mode():
+            self._probe_state.begin(
+                prep["sent_positions"], prep["context_start"], prep["context_end"]
+            )
+            body(input_ids=input_ids[:, last_start:], past_key_values=cache, use_cache=True)
+            vectors = self._probe_state.finalize_vectors()
+        del cache
+        if vectors is None:
+            raise ValueError("Attention probe processing failed to produce features.")
+        yield self._detector_probs_from_vectors(vectors)
+
     def _compress_from_prep_package(
         self,
         package: dict,
@@ -537,23 +1797,52 @@ class AttentionCompressor:
         use_threshold_filtering: bool,
         threshold: float,
     ) -> Dict[str, Union[str, List, Dict]]:
+        budget = dict(
+            target_token=target_token,
+            compression_rate=compression_rate,
+            use_threshold_filtering=use_threshold_filtering,
+            threshold=threshold,
+        )
+        return self._finalize_prep_package(
+            package, self._forward_prep_package(package, budget), budget
+        )
+
+    def _forward_prep_package(
+        self, package: dict, budget: dict
+    ) -> Tuple[float, Union[torch.Tensor, Dict]]:
+        """Forward stage: (start time, detector probs on device), or the whole
+        compress() result for samples that need chunking."""
+        start_time = time.time()
         if package.get("needs_chunking"):
             sample = package["sample"]
-            return self.compress(
+            return start_time, self._compress(
                 context=sample["context"],
                 question=sample.get("question", ""),
-                target_token=target_token,
-                compression_rate=compression_rate,
                 context_type=sample.get("context_type", "english"),
-                use_threshold_filtering=use_threshold_filtering,
-                threshold=threshold,
+                **budget,
             )
+        return start_time, self._forward_probs_from_prep(package["prep"])
 
-        start_time = time.time()
+    def _finalize_prep_package(
+        self, package: dict, forwarded: Tuple[float, Union[torch.Tensor, Dict]], budget: dict
+    ) -> Dict[str, Union[str, List, Dict]]:
+        """Finalize stage: host scores, score rules, dedup expansion, selection (thread-safe)."""
+        start_time, probs = forwarded
+        if isinstance(probs, dict):
+            return probs
         prep = package["prep"]
         context_type = package["context_type"]
-        sentence_scores, sentences, sentence_tokens = self._forward_scores_from_prep(
-            prep, context_type
+        sentence_scores, sentences, sentence_tokens = self._probs_to_sentence_scores(
+            probs, prep["sentences"], prep["sentence_tokens"], context_type
+        )
+        if package.get("dedup") is not None:
+            sentence_scores, sentences, sentence_tokens = self._expand_dedup_scores(
+                package["dedup"], sentence_scores, sentences, sentence_tokens
+            )
+        self._store_scores(
+            package.get("result_key"),
+            (sentence_scores, sentences, sentence_tokens, None),
+            cost=time.time() - start_time,
         )
         return self._finalize_compress_result(
             package["context"],
@@ -561,11 +1850,9 @@ class AttentionCompressor:
             sentence_scores,
             sentence_tokens,
             context_type,
-            target_token,
-            compression_rate,
-            use_threshold_filtering,
-            threshold,
-            time.time() - start_time,
+            processing_time=time.time() - start_time,
+            question=package["question"],
+            **budget,
         )
 
     def _compress_sequential_pipelined(
@@ -575,8 +1862,19 @@ class AttentionCompressor:
         compression_rate: float,
         use_threshold_filtering: bool,
         threshold: float,
+        pipeline_stats: Optional[PipelineStats] = None,
     ) -> List[Dict[str, Union[str, List, Dict]]]:
-        """Overlap CPU prep for next sample with GPU forward on current sample."""
+        """Overlap CPU prep for next sample with GPU forward on current sample.
+
+        Prep runs on pipeline_prep_workers threads; with pipeline_finalize_workers
+        > 0, host transfer, score rules and selection of sample i run on worker
+        threads while sample i + 1 is in the forward. pipeline_stats accumulates
+        stage stats across calls; the latest summary is get_model_info()["pipeline"].
+        """
+        if self.prep_processes > 0 and len(samples) > 1 and self.dedup_sentences == "off":
+            return self._compress_with_prep_pool(
+                samples, target_token, compression_rate, use_threshold_filtering, threshold
+            )
         if len(samples) == 1:
             return [
                 self._compress_from_prep_package(
@@ -588,26 +1886,95 @@ class AttentionCompressor:
                 )
             ]
 
-        queue: Queue = Queue(maxsize=2)
-        errors: List[BaseException] = []
+        budget = dict(
+            target_token=target_token,
+            compression_rate=compression_rate,
+            use_threshold_filtering=use_threshold_filtering,
+            threshold=threshold,
+        )
+        stats = pipeline_stats or PipelineStats(
+            self.pipeline_prep_workers, self.pipeline_finalize_workers
+        )
+        results, _ = run_pipeline(
+            samples,
+            self._prepare_sample_package,
+            lambda package: self._forward_prep_package(package, budget),
+            lambda package, forwarded: self._finalize_prep_package(package, forwarded, budget),
+            prep_workers=self.pipeline_prep_workers,
+            finalize_workers=self.pipeline_finalize_workers,
+            queue_depth=self.pipeline_queue_depth,
+            stats=stats,
+        )
+        self._pipeline_stats = stats.summary()
+        return results
+
+    def _prep_worker_config(self) -> dict:
+        """Constructor kwargs for prep.worker.SamplePrep (mirrors this instance).
 
-        def _prep_worker() -> None:
-            for idx, sample in enumerate(samples):
-                try:
-                    queue.put((idx, self._prepare_sample_package(sample)))
-                except BaseException as exc:
-                    errors.append(exc)
-                    return
+        The loaded tokenizers go over serialized, so workers tokenize exactly as
+        this process does without importing transformers (and torch).
+        """
+        budget_7b = self.sentence_budget_tokenizer != "0.5b"
+        return {
+            "attention_tokenizer_path": self.attention_model_path,
+            "attention_tokenizer_json": tokenizer_json(self.tokenizer),
+            "budget_tokenizer_path": self.eval_tokenizer_path if budget_7b else None,
+            "budget_tokenizer_json": tokenizer_json(self.eval_tokenizer) if budget_7b else None,
+            "max_seq_len": self.max_seq_len,
+            "english_sentence_splitter": self.english_sentence_splitter,
+            "use_fast_chinese_split": self.use_fast_chinese_split,
+            "min_word_length": self.min_word_length,
+            "use_sentence_aligned_prep": self.use_sentence_aligned_prep,
+            "disable_chunking": self.disable_chunking,
+            "context_cache_bytes": self._context_cache.max_bytes // self.prep_processes,
+        }
 
-        worker = threading.Thread(target=_prep_worker, daemon=True)
-        worker.start()
+    def _get_prep_pool(self) -> PrepProcessPool:
+        if self._prep_pool is None:
+            self._prep_pool = PrepProcessPool(self._prep_worker_config(), self.prep_processes)
+        return self._prep_pool
+
+    def _package_from_worker_row(self, sample: Dict[str, str], row: dict) -> dict:
+        """Prep package (same shape as _prepare_sample_package) from a worker row."""
+        if row["needs_chunking"]:
+            return {"needs_chunking": True, "sample": sample}
+        input_ids = torch.from_numpy(row["input_ids"]).unsqueeze(0)
+        non_blocking = self.device.type == "cuda"
+        inputs = {
+            "input_ids": input_ids.to(self.device, non_blocking=non_blocking),
+            "attention_mask": torch.ones_like(input_ids).to(
+                self.device, non_blocking=non_blocking
+            ),
+        }
+        return {
+            "needs_chunking": False,
+            "context": sample["context"],
+            "question": sample.get("question", ""),
+            "context_type": sample.get("context_type", "english"),
+            "prep": {
+                "inputs": inputs,
+                "context_start": row["context_start"],
+                "context_end": row["context_end"],
+                "context_num_tokens": int(row["context_end"] - row["context_start"] + 1),
+                "sent_positions": row["sent_positions"],
+                "sentences": row["sentences"],
+                "sentence_tokens": row["sentence_tokens"],
+            },
+        }
 
+    def _compress_with_prep_pool(
+        self,
+        samples: List[Dict[str, str]],
+        target_token: int,
+        compression_rate: float,
+        use_threshold_filtering: bool,
+        threshold: float,
+    ) -> List[Dict[str, Union[str, List, Dict]]]:
+        """Prep in worker processes (ordered, bounded window); forward on this thread."""
         results: List[Optional[Dict]] = [None] * len(samples)
-        for _ in range(len(samples)):
-            if errors:
-                worker.join(timeout=0.1)
-                raise errors[0]
-            idx, package = queue.get()
+        for idx, row in self._get_prep_pool().imap(samples):
+            package = self._package_from_worker_row(samples[idx], row)
+            package["result_key"] = self._sample_result_key(samples[idx])
             results[idx] = self._compress_from_prep_package(
                 package,
                 target_token,
@@ -615,21 +1982,19 @@ class AttentionCompressor:
                 use_threshold_filtering,
                 threshold,
             )
-        worker.join()
-        if errors:
-            raise errors[0]
         return results  # type: ignore[return-value]
 
     def _sample_needs_chunking(
-        self, context: str, question: str, context_type: str
+        self, context: str, question: str, context_type: str, entry: Optional[dict] = None
     ) -> bool:
         if self.disable_chunking:
             return False
-        doc_sentences = self._split_context_sentences(context, context_type)
-        if not doc_sentences:
+        if entry is None:
+            entry = self._tokenized_context(context, context_type)
+        attn_toks = entry["attn_tokens"]
+        if attn_toks is None or len(attn_toks) == 0:
             return False
-        attn_toks = self._batch_count_tokens(doc_sentences, self.tokenizer)
-        return sum(attn_toks) > self._max_context_tokens_for_forward(question)
+        return int(attn_toks.sum()) > self._max_context_tokens_for_forward(question)
 
     def _compress_batch_chunk(
         self,
@@ -638,11 +2003,104 @@ class AttentionCompressor:
         compression_rate: float,
         use_threshold_filtering: bool,
         threshold: float,
+    ) -> List[Dict]:
+        """Batch of samples within the memory plan; halves and retries on allocation errors."""
+        budget = dict(
+            target_token=target_token,
+            compression_rate=compression_rate,
+            use_threshold_filtering=use_threshold_filtering,
+            threshold=threshold,
+        )
+        groups = self._plan_batch_memory(samples)
+        if len(groups) > 1:
+            self._memory_stats["planned_splits"] += 1
+            results: List[Dict] = []
+            for group in groups:
+                results.extend(self._compress_batch_chunk([samples[i] for i in group], **budget))
+            return results
+        try:
+            return self._run_batch_chunk(samples, **budget)
+        except Exception as exc:
+            if len(samples) <= 1 or not is_allocation_error(exc):
+                raise
+        self._release_after_allocation_error()
+        half = (len(samples) + 1) // 2
+        print(f"⚠️  Allocation failed for a batch of {len(samples)}, retrying in halves")
+        return self._compress_batch_chunk(
+            samples[:half], **budget
+        ) + self._compress_batch_chunk(samples[half:], **budget)
+
+    def _plan_batch_memory(self, samples: List[Dict]) -> List[List[int]]:
+        """Consecutive sample groups whose predicted peak fits the memory budget."""
+        if self._memory_model is None:
+            return [list(range(len(samples)))]
+        return self._plan_memory([self._estimated_prompt_shape(s) for s in samples])
+
+    def _plan_memory(self, shapes: List[Tuple[int, int]]) -> List[List[int]]:
+        """MemoryModel.plan of (tokens, sentences) rows; one group without a model / budget."""
+        if self._memory_model is None:
+            return [list(range(len(shapes)))]
+        budget = self.memory_budget_bytes or available_bytes(self.device)
+        if budget is None:
+            return [list(range(len(shapes)))]
+        try:
+            return self._memory_model.plan(shapes, budget)
+        except MemoryBudgetError:
+            self._memory_stats["rejected"] += 1
+            raise
+
+    def _setup_memory_model(self) -> None:
+        """Fit the forward terms of MemoryModel from a few synthetic probe forwards."""
+        model = MemoryModel(
+            self.num_layers, self.num_heads, self.model_dtype, safety=self._memory_config.safety
+        )
+        vocab = int(self.attention_model.config.vocab_size)
+        generator = torch.Generator().manual_seed(0)
+        points = []
+        for tokens in sorted({min(t, self.max_seq_len) for t in (128, 256, 512)}):
+            for batch in (1, 2):
+                input_ids = torch.randint(0, vocab, (batch, tokens), generator=generator)
+                input_ids = input_ids.to(self.device)
+                sent_positions = [(p, min(p + 15, tokens - 2)) for p in range(1, tokens - 1, 16)]
+                row = {
+                    "sent_positions": sent_positions,
+                    "context_start": 1,
+                    "context_end": tokens - 2,
+                }
+                meta = [row] * batch
+
+                def _probe_forward():
+                    with torch.inference_mode():
+                        self._probe_state.begin_batch(meta)
+                        self.attention_model(
+                            input_ids=input_ids,
+                            attention_mask=torch.ones_like(input_ids),
+                            output_attentions=False,
+                            use_cache=False,
+                            return_dict=True,
+                        )
+                        self._probe_state.finalize_batch_vectors()
+
+                _probe_forward()  # warm allocator / kernels for this shape
+                peak = measure_peak_bytes(_probe_forward, self.device)
+                points.append((batch, tokens, len(sent_positions), peak))
+        self._probe_state.clear()
+        self._memory_model = model.calibrate(points)
+        if not model.samples:
+            print("⚠️  Memory planning: peak memory not measurable here, using probe buffers only")
+
+    def _run_batch_chunk(
+        self,
+        samples: List[Dict[str, str]],
+        target_token: int,
+        compression_rate: float,
+        use_threshold_filtering: bool,
+        threshold: float,
     ) -> List[Dict]:
         if len(samples) == 1:
             s = samples[0]
             return [
-                self.compress(
+                self._compress(
                     context=s["context"],
                     question=s.get("question", ""),
                     target_token=target_token,
@@ -660,7 +2118,7 @@ class AttentionCompressor:
             for s in samples
         ):
             return [
-                self.compress(
+                self._compress(
                     context=s["context"],
                     question=s.get("question", ""),
                     target_token=target_token,
@@ -685,6 +2143,7 @@ class AttentionCompressor:
                 input_ids=inputs["input_ids"],
                 attention_mask=inputs["attention_mask"],
                 output_attentions=False,
+                use_cache=False,
                 return_dict=True,
             )
             vectors = self._probe_state.finalize_batch_vectors()
@@ -695,51 +2154,109 @@ class AttentionCompressor:
         flat_chunks = [vectors[b, : n_valid_list[b]] for b in range(len(samples))]
         flat_vectors = torch.cat(flat_chunks, dim=0)
         flat_probs = self._detector_probs_from_vectors(flat_vectors)
+        if not self.use_pure_gpu:
+            flat_probs = flat_probs.detach().cpu().tolist()
 
         elapsed = time.time() - start_time
         per_time = elapsed / max(len(samples), 1)
         identical_prep = self._batch_samples_share_prep(per_sample)
 
-        chunk_results = []
+        items = []
         offset = 0
         for b, prep in enumerate(per_sample):
             n_valid = n_valid_list[b]
-            sentence_probs = flat_probs[offset : offset + n_valid]
-            offset += n_valid
-            if self.use_pure_gpu:
-                sentence_scores = sentence_probs
-            else:
-                sentence_scores = sentence_probs.detach().cpu().tolist()
             sentence_scores = self._apply_context_type_score_adjustments(
-                sentence_scores,
+                flat_probs[offset : offset + n_valid],
                 prep["sentences"],
                 prep["context_type"],
             )
-            if identical_prep and b > 0:
-                chunk_results.append({**chunk_results[0], "processing_time": per_time})
-                continue
-            chunk_results.append(
-                self._finalize_compress_result(
-                    prep["context"],
-                    prep["sentences"],
-                    sentence_scores,
-                    prep["sentence_tokens"],
-                    prep["context_type"],
-                    target_token,
-                    compression_rate,
-                    use_threshold_filtering,
-                    threshold,
-                    per_time,
-                )
+            offset += n_valid
+            self._store_scores(
+                self._sample_result_key(samples[b]),
+                (sentence_scores, prep["sentences"], prep["sentence_tokens"], None),
+                cost=per_time,
+            )
+            items.append(
+                {
+                    "context": prep["context"],
+                    "sentences": prep["sentences"],
+                    "sentence_scores": sentence_scores,
+                    "sentence_tokens": prep["sentence_tokens"],
+                    "context_type": prep["context_type"],
+                    "question": samples[b].get("question", ""),
+                }
             )
+            if identical_prep:
+                break
+        chunk_results = self._finalize_compress_results_batch(
+            items,
+            target_token,
+            compression_rate,
+            use_threshold_filtering,
+            threshold,
+            per_time,
+        )
+        if identical_prep:
+            chunk_results += [
+                self._attach_token_ids(
+                    {**chunk_results[0], "processing_time": per_time},
+                    per_sample[0]["context_type"],
+                    sample.get("question", ""),
+                )
+                for sample in samples[1:]
+            ]
         return chunk_results
 
+    _PROMPT_HEAD = PROMPT_HEAD
+    _filtering_prompt_tail = staticmethod(filtering_prompt_tail)
+
     def _build_filtering_prompt(self, context: str, question: str) -> str:
-        return (
-            f"Given the following information: {context}\n"
-            f"Answer the following question based on the given information with one or few words: {question}\n"
-            f"Answer:"
+        return build_filtering_prompt(context, question)
+
+    def _prepare_aligned_row(
+        self,
+        context: str,
+        question: str,
+        context_type: str,
+        preset_sentences: Optional[List[str]] = None,
+        preset_sentence_tokens: Optional[List[int]] = None,
+    ) -> Optional[dict]:
+        """Sentence-aligned prep row (input_ids as numpy); None → use offset mapping."""
+        if self._aligned_tokenizer is None:
+            return None
+        entry = self._tokenized_context(
+            context, context_type, preset_sentences, preset_sentence_tokens
+        )
+        doc = entry["aligned"]
+        if doc is None:
+            return None
+        sentences = (
+            preset_sentences
+            if preset_sentences is not None
+            else self._entry_sentences(context, entry)
         )
+        if not sentences:
+            return None
+        row = self._aligned_tokenizer.build_row(
+            doc, self._filtering_prompt_tail(question)
+        )
+        if row is None:
+            return None
+        if preset_sentence_tokens is None:
+            token_counts = entry["budget_tokens"].tolist()
+        else:
+            token_counts = preset_sentence_tokens
+        sent_positions, sentences, sentence_tokens = self._drop_empty_sentences(
+            row["sent_positions"], sentences, token_counts
+        )
+        return {
+            "input_ids": row["input_ids"],
+            "context_start": row["context_start"],
+            "context_end": row["context_end"],
+            "sent_positions": sent_positions,
+            "sentences": sentences,
+            "sentence_tokens": sentence_tokens,
+        }
 
     @staticmethod
     def _filtering_cache_key(
@@ -747,21 +2264,18 @@ class AttentionCompressor:
         question: str,
         context_type: str,
         preset_sentences: Optional[List[str]] = None,
-    ) -> Tuple:
-        return (
-            context,
-            question,
-            context_type,
-            tuple(preset_sentences) if preset_sentences is not None else None,
+    ) -> bytes:
+        if preset_sentences is None:
+            return content_hash(context_type, context, question)
+        return content_hash(
+            context_type, context, question, "\x00", joined_sentences(preset_sentences)
         )
 
-    def _filtering_cache_get(self, key: Tuple) -> Optional[dict]:
+    def _filtering_cache_get(self, key: bytes) -> Optional[dict]:
         return self._filtering_cache.get(key)
 
-    def _filtering_cache_put(self, key: Tuple, value: dict) -> None:
-        self._filtering_cache[key] = value
-        if len(self._filtering_cache) > self._filtering_cache_max:
-            self._filtering_cache.pop(next(iter(self._filtering_cache)))
+    def _filtering_cache_put(self, key: bytes, value: dict) -> None:
+        self._filtering_cache.put(key, value)
 
     @staticmethod
     def _batch_samples_share_prep(per_sample: List[dict]) -> bool:
@@ -809,19 +2323,211 @@ class AttentionCompressor:
             "sentence_tokens": sentence_tokens,
         }
 
+    def _tokenized_context(
+        self,
+        context: str,
+        context_type: str,
+        sentences: Optional[List[str]] = None,
+        sentence_tokens: Optional[List[int]] = None,
+    ) -> dict:
+        """Per-document split, token counts and aligned ids, cached by content hash.
+
+        Entries hold compact arrays: sentence char spans (text is re-sliced from the
+        caller's context), budget / 0.5B token counts and sentence-aligned ids.
+        ``sentences`` pins the split (chunk path, with known ``sentence_tokens``);
+        otherwise the doc is split on miss. Pinned entries skip the 0.5B gate counts.
+        """
+        doc_key = content_hash(context_type, context)
+        if sentences is None:
+            key = doc_key
+        else:
+            entry = self._context_cache.peek(doc_key)
+            if entry is not None and self._entry_sentences(context, entry) == sentences:
+                return entry
+            key = content_hash(context_type, context, *sentences)
+        entry = self._context_cache.get(key)
+        if entry is not None:
+            return entry
+
+        t0 = time.perf_counter()
+        pinned = sentences is not None
+        if not pinned:
+            sentences = self._split_context_sentences(context, context_type)
+        entry = self._build_context_entry(context, sentences, pinned, sentence_tokens)
+        self._context_cache.put(key, entry, cost=time.perf_counter() - t0)
+        return entry
+
+    def _prefetch_tokenized_contexts(self, samples: List[Dict[str, str]]) -> None:
+        """Split every uncached document of a batch in one splitter call, then cache."""
+        pending: Dict[bytes, Tuple[str, str]] = {}
+        for sample in samples:
+            context = sample.get("context", "")
+            context_type = sample.get("context_type", "english")
+            key = content_hash(context_type, context)
+            if context and key not in pending and self._context_cache.peek(key) is None:
+                pending[key] = (context, context_type)
+        if len(pending) < 2:
+            return
+        docs = list(pending.values())
+        t0 = time.perf_counter()
+        split = self._split_contexts(
+            [context for context, _ in docs], [context_type for _, context_type in docs]
+        )
+        split_cost = (time.perf_counter() - t0) / len(docs)
+        for key, (context, _), sentences in zip(pending, docs, split):
+            t0 = time.perf_counter()
+            entry = self._build_context_entry(context, sentences, pinned=False)
+            self._context_cache.put(key, entry, cost=split_cost + time.perf_counter() - t0)
+
+    def _build_context_entry(
+        self,
+        context: str,
+        sentences: List[str],
+        pinned: bool,
+        sentence_tokens: Optional[List[int]] = None,
+        aligned_tokenizer: Optional[SentenceAlignedTokenizer] = None,
+    ) -> dict:
+        """Spans, budget / 0.5B counts and aligned ids for an already split document.
+
+        aligned_tokenizer: overrides the instance's (None = use_sentence_aligned_prep).
+        """
+        return build_context_entry(
+            context,
+            sentences,
+            self._count_sentence_tokens,
+            None
+            if self.disable_chunking or pinned
+            else lambda sents: self._batch_count_tokens(sents, self.tokenizer),
+            self._shared_sentence_tokenizer,
+            aligned_tokenizer=aligned_tokenizer or self._aligned_tokenizer,
+            sentence_tokens=sentence_tokens,
+        )
+
+    @staticmethod
+    def _entry_sentences(context: str, entry: dict) -> List[str]:
+        return entry_sentences(context, entry)
+
+    def _context_dedup_view(self, context: str, context_type: str) -> Optional[dict]:
+        """_dedup_view of one document, cached by content hash (None = no copies)."""
+        key = content_hash(
+            "dedup", self.dedup_sentences, repr(self.dedup_threshold), context_type, context
+        )
+        view = self._dedup_cache.get(key)
+        if view is None:
+            t0 = time.perf_counter()
+            entry = self._tokenized_context(context, context_type)
+            view = self._dedup_view(
+                context,
+                context_type,
+                self._entry_sentences(context, entry),
+                entry["budget_tokens"],
+                entry["attn_tokens"],
+                entry["sent_spans"],
+            ) or {}
+            self._dedup_cache.put(key, view, cost=time.perf_counter() - t0)
+        return view or None
+
+    def _dedup_view(
+        self,
+        context: str,
+        context_type: str,
+        sentences: List[str],
+        budget_tokens: np.ndarray,
+        attn_tokens: Optional[np.ndarray],
+        spans: Optional[np.ndarray] = None,
+    ) -> Optional[dict]:
+        """Prompt context with duplicate sentences cut out, or None (nothing to collapse).
+
+        Only the canonical copy (first occurrence) stays in the prompt and is scored.
+        ``source`` maps every scored sentence of the original split (budget tokens > 0,
+        doc order) to the forward output row of its canonical copy.
+        """
+        if len(sentences) < 2:
+            return None
+        budget_tokens = np.asarray(budget_tokens)
+        canonical = duplicate_groups(
+            sentences, near=self.dedup_sentences == "near", threshold=self.dedup_threshold
+        )
+        # A canonical copy without tokens is never scored: keep its copies in the prompt.
+        orphan = budget_tokens[canonical] <= 0
+        canonical[orphan] = np.flatnonzero(orphan)
+        keep = canonical == np.arange(len(sentences))
+        if keep.all():
+            return None
+        if spans is None:
+            spans = locate_sentence_spans(context, sentences)
+            if spans is None:
+                return None
+        parts = []
+        cursor = 0
+        for start, end in spans[~keep].tolist():
+            parts.append(context[cursor:start])
+            cursor = end
+        parts.append(context[cursor:])
+
+        kept = np.flatnonzero(keep)
+        scored = budget_tokens > 0
+        forward = np.flatnonzero(keep & scored)
+        row = np.full(len(sentences), -1, dtype=np.int64)
+        row[forward] = np.arange(len(forward))
+        out = np.flatnonzero(scored)
+        return {
+            "context": "".join(parts),
+            "entry": {
+                "sent_spans": None,
+                "sentences": [sentences[i] for i in kept.tolist()],
+                "budget_tokens": budget_tokens[kept],
+                "attn_tokens": (
+                    budget_tokens if attn_tokens is None else np.asarray(attn_tokens)
+                )[kept],
+                "aligned": None,
+            },
+            "sentences": [sentences[i] for i in out.tolist()],
+            "sentence_tokens": budget_tokens[out].tolist(),
+            "source": row[canonical[out]],
+            "num_forward": len(forward),
+        }
+
+    def _score_dedup_view(
+        self, view: dict, question: str, context_type: str
+    ) -> Optional[Tuple[Union[List[float], torch.Tensor], List[str], List[int]]]:
+        """Score the deduplicated prompt, then expand to the original sentences."""
+        entry = view["entry"]
+        if self.disable_chunking:
+            scored = self._get_sentence_scores(
+                view["context"],
+                question,
+                context_type,
+                preset_sentences=entry["sentences"],
+                preset_sentence_tokens=entry["budget_tokens"].tolist(),
+            )
+        else:
+            scored = self._compress_with_chunking(
+                view["context"], question, context_type, entry=entry
+            )
+        return self._expand_dedup_scores(view, *scored)
+
+    @staticmethod
+    def _expand_dedup_scores(
+        view: dict, sentence_scores, sentences: List[str], sentence_tokens: List[int]
+    ) -> Optional[Tuple[Union[List[float], torch.Tensor], List[str], List[int]]]:
+        """Copies take their canonical sentence's score; None if the forward re-split sentences."""
+        if len(sentences) != view["num_forward"]:
+            return None
+        source = view["source"]
+        if isinstance(sentence_scores, torch.Tensor):
+            scores = sentence_scores[torch.as_tensor(source, device=sentence_scores.device)]
+        else:
+            scores = [sentence_scores[j] for j in source.tolist()]
+        return scores, list(view["sentences"]), list(view["sentence_tokens"])
+
     def _doc_sentences_and_tokens(
         self, context: str, context_type: str
     ) -> Tuple[List[str], Optional[List[int]]]:
-        """Split + 7B token count once per (context, context_type)."""
-        doc_key = (context, context_type)
-        cached = self._doc_prep_cache.get(doc_key)
-        if cached is not None:
-            return cached
-        doc_sentences = self._split_context_sentences(context, context_type)
-        preset_tokens = (
-            self._count_sentence_tokens(doc_sentences) if doc_sentences else None
-        )
-        self._doc_prep_cache[doc_key] = (doc_sentences, preset_tokens)
+        """Split + 7B token count once per document (content-hash cache)."""
+        entry = self._tokenized_context(context, context_type)
+        doc_sentences = self._entry_sentences(context, entry)
+        preset_tokens = entry["budget_tokens"].tolist() if doc_sentences else None
         return doc_sentences, preset_tokens
 
     def _prepare_filtering_row_meta(
@@ -865,6 +2571,10 @@ class AttentionCompressor:
                     "sentence_tokens": row["sentence_tokens"],
                 },
             )
+        return self._row_meta_pair(context, context_type, row)
+
+    @staticmethod
+    def _row_meta_pair(context: str, context_type: str, row: dict) -> Tuple[dict, dict]:
         per_sample = {
             "context": context,
             "context_type": context_type,
@@ -876,10 +2586,133 @@ class AttentionCompressor:
             "context_start": row["context_start"],
             "context_end": row["context_end"],
         }
-        return per_sample, batch_meta
+        return per_sample, batch_meta
+
+    def _align_filtering_batch(
+        self,
+        samples: List[Dict[str, str]],
+        prompts: List[str],
+        offset_mappings: torch.Tensor,
+    ) -> Optional[List[Tuple[dict, dict]]]:
+        """Align all uncached rows with one batched searchsorted; None → per-row path."""
+        rows: List[Optional[Tuple[dict, dict]]] = [None] * len(samples)
+        pending: List[Tuple[int, Tuple, List[str], Optional[List[int]]]] = []
+        pending_spans: List[np.ndarray] = []
+        for i, sample in enumerate(samples):
+            context = sample["context"]
+            question = sample.get("question", "")
+            context_type = sample.get("context_type", "english")
+            doc_sentences, preset_tokens = self._doc_sentences_and_tokens(
+                context, context_type
+            )
+            cache_key = self._filtering_cache_key(
+                context, question, context_type, doc_sentences if doc_sentences else None
+            )
+            cached = self._filtering_cache_get(cache_key)
+            if cached is not None:
+                rows[i] = self._row_meta_pair(context, context_type, cached)
+                continue
+            context_char = prompts[i].find(context)
+            spans = np.asarray(
+                [[context_char, context_char + len(context)]], dtype=np.int64
+            )
+            if doc_sentences:
+                spans = np.concatenate(
+                    [spans, cumulative_char_spans(prompts[i], doc_sentences)]
+                )
+            pending.append((i, cache_key, doc_sentences, preset_tokens))
+            pending_spans.append(spans)
+
+        if pending:
+            offsets_np = offset_mappings.cpu().numpy()
+            aligned = align_char_spans_batch(
+                offsets_np[[i for i, _, _, _ in pending]], pending_spans
+            )
+            if aligned is None:
+                return None
+            for (i, cache_key, doc_sentences, preset_tokens), positions in zip(
+                pending, aligned
+            ):
+                if preset_tokens is None:
+                    preset_tokens = self._count_sentence_tokens(
+                        [s.strip() for s in doc_sentences]
+                    )
+                sent_positions, sentences, sentence_tokens = self._drop_empty_sentences(
+                    [tuple(pos) for pos in positions[1:].tolist()],
+                    doc_sentences,
+                    preset_tokens,
+                )
+                row = {
+                    "context_start": int(positions[0, 0]),
+                    "context_end": int(positions[0, 1]),
+                    "sent_positions": sent_positions,
+                    "sentences": sentences,
+                    "sentence_tokens": sentence_tokens,
+                }
+                self._filtering_cache_put(cache_key, row)
+                sample = samples[i]
+                rows[i] = self._row_meta_pair(
+                    sample["context"], sample.get("context_type", "english"), row
+                )
+        return rows  # type: ignore[return-value]
+
+    def _prepare_aligned_batch(self, samples: List[Dict[str, str]]) -> Optional[dict]:
+        """Batch prep from sentence-aligned rows; None if any row needs offset mapping."""
+        rows = []
+        for sample in samples:
+            context = sample["context"]
+            context_type = sample.get("context_type", "english")
+            doc_sentences, preset_tokens = self._doc_sentences_and_tokens(
+                context, context_type
+            )
+            row = self._prepare_aligned_row(
+                context,
+                sample.get("question", ""),
+                context_type,
+                preset_sentences=doc_sentences if doc_sentences else None,
+                preset_sentence_tokens=preset_tokens,
+            )
+            if row is None:
+                return None
+            rows.append(row)
+
+        pad_id = self.tokenizer.pad_token_id
+        if pad_id is None:
+            pad_id = self.tokenizer.eos_token_id or 0
+        input_ids, attention_mask, shifts = pad_aligned_rows(
+            [row["input_ids"] for row in rows], pad_id, self.tokenizer.padding_side
+        )
+        per_sample: List[dict] = []
+        batch_meta: List[dict] = []
+        for sample, row, shift in zip(samples, rows, shifts):
+            per_sample.append({
+                "context": sample["context"],
+                "context_type": sample.get("context_type", "english"),
+                "sentences": row["sentences"],
+                "sentence_tokens": row["sentence_tokens"],
+            })
+            batch_meta.append({
+                "sent_positions": [
+                    (start + shift, end + shift) for start, end in row["sent_positions"]
+                ],
+                "context_start": row["context_start"] + shift,
+                "context_end": row["context_end"] + shift,
+            })
+        non_blocking = self.device.type == "cuda"
+        inputs = {
+            "input_ids": torch.from_numpy(input_ids).to(self.device, non_blocking=non_blocking),
+            "attention_mask": torch.from_numpy(attention_mask).to(
+                self.device, non_blocking=non_blocking
+            ),
+        }
+        return {"inputs": inputs, "per_sample": per_sample, "batch_meta": batch_meta}
 
     def _prepare_filtering_batch(self, samples: List[Dict[str, str]]) -> dict:
         """One batched tokenize + parallel CPU align (same semantics as compress())."""
+        if self._aligned_tokenizer is not None:
+            aligned = self._prepare_aligned_batch(samples)
+            if aligned is not None:
+                return aligned
         prompts = [
             self._build_filtering_prompt(s["context"], s.get("question", ""))
             for s in samples
@@ -900,11 +2733,14 @@ class AttentionCompressor:
 
         per_sample: List[dict] = []
         batch_meta: List[dict] = []
-        # Warm doc-level cache once per unique context before parallel align.
-        for sample in samples:
-            self._doc_sentences_and_tokens(
-                sample["context"], sample.get("context_type", "english")
-            )
+        rows = self._align_filtering_batch(samples, prompts, offset_mappings)
+        if rows is not None:
+            for ps, bm in rows:
+                per_sample.append(ps)
+                batch_meta.append(bm)
+            return {"inputs": inputs, "per_sample": per_sample, "batch_meta": batch_meta}
+
+        # Non-monotone offsets: per-row align (doc-level cache already warm).
         unique_samples = len(
             {
                 (s["context"], s.get("question", ""), s.get("context_type", "english"))
@@ -924,8 +2760,7 @@ class AttentionCompressor:
                     om = offset_raw.cpu().numpy()
                 return self._prepare_filtering_row_meta(samples[i], prompts[i], om)
 
-            with ThreadPoolExecutor(max_workers=min(workers, len(samples))) as pool:
-                rows = list(pool.map(_row, range(len(samples))))
+            rows = list(self._get_prep_threads(workers).map(_row, range(len(samples))))
         else:
             rows = []
             for i, sample in enumerate(samples):
@@ -942,6 +2777,17 @@ class AttentionCompressor:
 
         return {"inputs": inputs, "per_sample": per_sample, "batch_meta": batch_meta}
 
+    def _get_prep_threads(self, workers: int) -> ThreadPoolExecutor:
+        """Persistent row-align threads (grown on demand, not recreated per batch)."""
+        if self._prep_threads is None or self._prep_threads_size < workers:
+            if self._prep_threads is not None:
+                self._prep_threads.shutdown(wait=False)
+            self._prep_threads = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="sentinel-prep"
+            )
+            self._prep_threads_size = workers
+        return self._prep_threads
+
     def _detector_probs_from_vectors(self, vectors: torch.Tensor) -> torch.Tensor:
         """Run torch detector on [N, D] vectors; returns [N] probs on device."""
         expected_dim = self.torch_detector.in_features
@@ -969,7 +2815,17 @@ class AttentionCompressor:
         sentence_tokens: List[int],
         context_type: str,
     ) -> Tuple[Union[List[float], torch.Tensor], List[str], List[int]]:
-        sentence_probs = self._detector_probs_from_vectors(vectors)
+        return self._probs_to_sentence_scores(
+            self._detector_probs_from_vectors(vectors), sentences, sentence_tokens, context_type
+        )
+
+    def _probs_to_sentence_scores(
+        self,
+        sentence_probs: torch.Tensor,
+        sentences: List[str],
+        sentence_tokens: List[int],
+        context_type: str,
+    ) -> Tuple[Union[List[float], torch.Tensor], List[str], List[int]]:
         if self.use_pure_gpu:
             sentence_scores = sentence_probs
         else:
@@ -980,16 +2836,19 @@ class AttentionCompressor:
         )
         return sentence_scores, sentences, sentence_tokens
 
-    @staticmethod
-    def _sentences_contain_any(sentences: List[str], markers: Tuple[str, ...]) -> bool:
-        return any(marker in sent for sent in sentences for marker in markers)
+    def _sentence_markers(self, sentences: List[str]) -> Dict[str, np.ndarray]:
+        """Marker masks (prep.markers.MARKER_GROUPS), cached per sentence list."""
+        joined = joined_sentences(sentences)
+        key = content_hash(joined)
+        masks = self._marker_cache.get(key)
+        if masks is None:
+            masks = sentence_marker_masks(sentences, joined)
+            self._marker_cache.put(key, masks)
+        return masks
 
     def _mandatory_chinese_indices(self, sentences: List[str]) -> List[int]:
-        """lsht-style mandatory sentences; skip scan when markers absent."""
-        markers = ('新闻内容：', '类别：')
-        if not self._sentences_contain_any(sentences, markers):
-            return []
-        return [i for i, sent in enumerate(sentences) if any(m in sent for m in markers)]
+        """lsht-style mandatory sentences (新闻内容： / 类别：)."""
+        return np.flatnonzero(self._sentence_markers(sentences)["mandatory"]).tolist()
 
     def _apply_context_type_score_adjustments(
         self,
@@ -997,77 +2856,77 @@ class AttentionCompressor:
         sentences: List[str],
         context_type: str,
     ):
-        if context_type == 'fewshot':
-            fewshot_markers = ('Passage:', 'Question:', 'Answer:')
-            if self._sentences_contain_any(sentences, fewshot_markers):
-                if isinstance(sentence_scores, torch.Tensor):
-                    out = sentence_scores.clone()
-                    for i, sent in enumerate(sentences):
-                        if any(marker in sent for marker in fewshot_markers):
-                            out[i] = 1.0
-                    return out
-                for i, sent in enumerate(sentences):
-                    if any(marker in sent for marker in fewshot_markers):
-                        sentence_scores[i] = 1.0
-
-        if context_type == 'chinese':
-            chinese_markers = ('新闻内容', '类别')
-            if self._sentences_contain_any(sentences, chinese_markers):
-                if isinstance(sentence_scores, torch.Tensor):
-                    mask = torch.tensor(
-                        [any(marker in sent for marker in chinese_markers) for sent in sentences],
-                        device=sentence_scores.device, dtype=torch.bool,
-                    )
-                    return torch.where(
-                        mask, torch.clamp(sentence_scores, min=0.95), sentence_scores
-                    )
-                for i, sent in enumerate(sentences):
-                    if any(marker in sent for marker in chinese_markers):
-                        sentence_scores[i] = max(
-                            sentence_scores[i] if sentence_scores else 0.0, 0.95
-                        )
+        if context_type not in ('fewshot', 'chinese'):
+            return sentence_scores
+        hits = self._sentence_markers(sentences)[context_type]
+        if not hits.any():
+            return sentence_scores
+        if isinstance(sentence_scores, torch.Tensor):
+            mask = torch.from_numpy(hits).to(sentence_scores.device)
+            if context_type == 'fewshot':
+                return sentence_scores.masked_fill(mask, 1.0)
+            return torch.where(mask, torch.clamp(sentence_scores, min=0.95), sentence_scores)
+        for i in np.flatnonzero(hits).tolist():
+            if context_type == 'fewshot':
+                sentence_scores[i] = 1.0
+            else:
+                sentence_scores[i] = max(sentence_scores[i], 0.95)
         return sentence_scores
 
-    @staticmethod
-    def _join_separator(context_type: str, sentences: List[str]) -> str:
+    def _join_separator(self, context_type: str, sentences: List[str]) -> str:
         if context_type == "code" or context_type == "fewshot":
             return "\n\n"
-        if context_type == "chinese" and any("新闻内容：" in s for s in sentences):
+        if context_type == "chinese" and self._sentence_markers(sentences)["section"].any():
             return "\n\n"
         return " "
 
-    @staticmethod
     def _join_compressed_sentences(
+        self,
         sentences: List[str],
         preserved_indices: List[int],
         context_type: str,
     ) -> str:
         compressed_sentences = [sentences[i] for i in preserved_indices]
-        sep = AttentionCompressor._join_separator(context_type, sentences)
-        return sep.join(compressed_sentences)
+        return self._join_separator(context_type, sentences).join(compressed_sentences)
 
     def _join_separator_token_cost(
         self, context_type: str, sentences: List[str]
     ) -> int:
-        sep = self._join_separator(context_type, sentences)
-        cache = getattr(self, "_join_sep_token_cache", None)
-        if cache is None:
-            cache = {}
-            self._join_sep_token_cache = cache
-        if sep not in cache:
-            cache[sep] = self._encode_length(self._budget_tokenizer(), sep)
-        return cache[sep]
-
-    @staticmethod
-    def _estimate_joined_token_count(
-        indices: List[int],
-        sentence_tokens: List[int],
-        sep_cost: int,
-    ) -> int:
-        n = len(indices)
-        if n == 0:
-            return 0
-        return sum(sentence_tokens[i] for i in indices) + max(0, n - 1) * sep_cost
+        return self._join_sep_token_costs[self._join_separator(context_type, sentences)]
+
+    def _attach_token_ids(self, result: Dict, context_type: str, question: str = "") -> Dict:
+        """compressed_token_ids (+ prompt_token_ids) from cached sentence ids (return_token_ids)."""
+        if self._token_ids is None:
+            return result
+        sentences = result["sentences"]
+        kept = [sentences[i] for i in result["preserved_indices"]]
+        separator = self._join_separator(context_type, sentences)
+        result["compressed_token_ids"] = self._checked_token_ids(
+            self._token_ids.assemble(kept, separator), result["compressed_text"]
+        )
+        if self.prompt_template is not None:
+            head, tail = (
+                part.replace("{question}", question)
+                for part in self.prompt_template.split("{context}", 1)
+            )
+            result["prompt_token_ids"] = self._checked_token_ids(
+                self._token_ids.assemble(kept, separator, head, tail),
+                head + result["compressed_text"] + tail,
+            )
+        return result
+
+    def _checked_token_ids(self, ids: List[int], text: str) -> List[int]:
+        """validate_token_ids: compare with a full encode of text; the full encode wins."""
+        if not self.validate_token_ids:
+            return ids
+        fresh = list(self.eval_tokenizer(text, add_special_tokens=False)["input_ids"])
+        if fresh != ids:
+            self._token_id_mismatches += 1
+            print(
+                f"⚠️  Assembled token ids differ from a full encode "
+                f"({len(ids)} vs {len(fresh)} tokens); using the full encode"
+            )
+        return fresh
 
     def _finalize_compress_result(
         self,
@@ -1081,6 +2940,7 @@ class AttentionCompressor:
         use_threshold_filtering: bool,
         threshold: float,
         processing_time: float,
+        question: str = "",
     ) -> Dict:
         total_tokens = sum(sentence_tokens)
 
@@ -1095,13 +2955,9 @@ class AttentionCompressor:
             target_tokens = sum(sentence_tokens[i] for i in preserved_indices)
             actual_compression_rate = 1.0 - (target_tokens / total_tokens) if total_tokens > 0 else 0.0
         else:
-            if target_token > 0:
-                target_tokens = min(target_token, total_tokens)
-                actual_compression_rate = 1.0 - (target_tokens / total_tokens)
-            else:
-                target_tokens = int(total_tokens * (1 - compression_rate))
-                actual_compression_rate = compression_rate
-
+            target_tokens, actual_compression_rate = self._budget_target(
+                total_tokens, target_token, compression_rate
+            )
             compressed_text, preserved_indices, joined_token_len = self._select_sentences(
                 sentences, sentence_scores, sentence_tokens, target_tokens, context_type
             )
@@ -1114,16 +2970,156 @@ class AttentionCompressor:
             else self._compressed_length_from_text(compressed_text)
         )
 
-        return {
-            'compressed_text': compressed_text,
-            'original_length': total_tokens,
-            'compressed_length': compressed_tokens,
-            'compression_ratio': actual_compression_rate,
-            'sentence_scores': sentence_scores,
-            'sentences': sentences,
-            'preserved_indices': preserved_indices,
-            'processing_time': processing_time,
-        }
+        return self._attach_token_ids(
+            {
+                'compressed_text': compressed_text,
+                'original_length': total_tokens,
+                'compressed_length': compressed_tokens,
+                'compression_ratio': actual_compression_rate,
+                'sentence_scores': sentence_scores,
+                'sentence_tokens': sentence_tokens,
+                'sentences': sentences,
+                'preserved_indices': preserved_indices,
+                'processing_time': processing_time,
+            },
+            context_type,
+            question,
+        )
+
+    @staticmethod
+    def _budget_target(
+        total_tokens: int, target_token: int, compression_rate: float
+    ) -> Tuple[int, float]:
+        """(target tokens, reported compression ratio) for a budget request."""
+        if target_token > 0:
+            target_tokens = min(target_token, total_tokens)
+            return target_tokens, 1.0 - (target_tokens / total_tokens)
+        return int(total_tokens * (1 - compression_rate)), compression_rate
+
+    def _finalize_compress_results_batch(
+        self,
+        items: List[dict],
+        target_token: int,
+        compression_rate: float,
+        use_threshold_filtering: bool,
+        threshold: float,
+        processing_time: float,
+    ) -> List[Dict]:
+        """_finalize_compress_result for a batch: one selector pass, one host transfer.
+
+        items: dicts with context, sentences, sentence_scores, sentence_tokens,
+        context_type and question. Only the joined-text budget check runs per sample.
+        """
+        if self.use_threshold_by_default and not use_threshold_filtering:
+            use_threshold_filtering = True
+            threshold = self.default_threshold
+
+        scores, valid = pad_scores([item["sentence_scores"] for item in items])
+        device = scores.device
+        totals = [sum(item["sentence_tokens"]) for item in items]
+        mandatory = pad_index_lists(
+            [
+                self._mandatory_chinese_indices(item["sentences"])
+                if item["context_type"] == "chinese"
+                else []
+                for item in items
+            ],
+            device,
+        )
+        if use_threshold_filtering:
+            preserved, fallback = select_by_threshold_batch(
+                scores, valid, threshold, mandatory
+            )
+        else:
+            budgets = [
+                self._budget_target(total, target_token, compression_rate) for total in totals
+            ]
+            sep_costs = [
+                self._join_separator_token_cost(item["context_type"], item["sentences"])
+                for item in items
+            ]
+            preserved, fallback = select_by_budget_batch(
+                scores,
+                pad_tokens([item["sentence_tokens"] for item in items], device),
+                valid,
+                torch.tensor([target for target, _ in budgets]),
+                torch.tensor(sep_costs),
+                mandatory,
+            )
+        host = torch.cat([preserved, fallback[:, None]], dim=1).cpu().numpy()
+
+        results = []
+        for b, item in enumerate(items):
+            sentences = item["sentences"]
+            sentence_scores = item["sentence_scores"]
+            sentence_tokens = item["sentence_tokens"]
+            context_type = item["context_type"]
+            preserved_indices = np.flatnonzero(host[b, : len(sentences)]).tolist()
+            if use_threshold_filtering:
+                if host[b, -1]:
+                    print(
+                        f"⚠️  No sentences met threshold {threshold:.2f}, selecting best sentence "
+                        f"(score: {float(sentence_scores[preserved_indices[0]]):.3f})"
+                    )
+                if self.print_sentence_scores:
+                    print(f"📊 Threshold filtering: {len(preserved_indices)}/{len(sentences)} sentences selected (threshold: {threshold})")
+                    self._print_selected_sentences(
+                        sentences, sentence_scores, sentence_tokens, preserved_indices, truncate=True
+                    )
+                compressed_text = self._join_compressed_sentences(
+                    sentences, preserved_indices, context_type
+                )
+                target_tokens = sum(sentence_tokens[i] for i in preserved_indices)
+                actual_compression_rate = (
+                    1.0 - (target_tokens / totals[b]) if totals[b] > 0 else 0.0
+                )
+                compressed_tokens = self._compressed_length_from_text(compressed_text)
+            else:
+                target_tokens, actual_compression_rate = budgets[b]
+                if self.print_sentence_scores:
+                    current_tokens = (
+                        0
+                        if host[b, -1]
+                        else sum(sentence_tokens[i] for i in preserved_indices)
+                        + max(0, len(preserved_indices) - 1) * sep_costs[b]
+                    )
+                    print(f"📊 Token budget filtering: {len(preserved_indices)}/{len(sentences)} sentences selected (target: {target_tokens} tokens, actual: {current_tokens} tokens)")
+                    self._print_selected_sentences(
+                        sentences, sentence_scores, sentence_tokens, preserved_indices
+                    )
+                compressed_text, preserved_indices, joined_token_len = (
+                    self._finalize_joined_selection(
+                        sentences,
+                        preserved_indices,
+                        sentence_scores,
+                        target_tokens,
+                        context_type,
+                        sentence_tokens=sentence_tokens,
+                    )
+                )
+                compressed_tokens = (
+                    joined_token_len
+                    if joined_token_len is not None
+                    else self._compressed_length_from_text(compressed_text)
+                )
+            results.append(
+                self._attach_token_ids(
+                    {
+                        'compressed_text': compressed_text,
+                        'original_length': totals[b],
+                        'compressed_length': compressed_tokens,
+                        'compression_ratio': actual_compression_rate,
+                        'sentence_scores': sentence_scores,
+                        'sentence_tokens': sentence_tokens,
+                        'sentences': sentences,
+                        'preserved_indices': preserved_indices,
+                        'processing_time': processing_time,
+                    },
+                    context_type,
+                    item.get("question", ""),
+                )
+            )
+        return results
 
     def _get_sentence_scores(
         self,
@@ -1184,34 +3180,45 @@ class AttentionCompressor:
         )
         cached = self._filtering_cache_get(cache_key)
         if cached is not None and "inputs" in cached:
-            return cached
+            return self._prep_on_device(cached)
 
-        prompt = self._build_filtering_prompt(context, question)
-        inputs = self.tokenizer(
-            prompt,
-            return_tensors="pt",
-            return_offsets_mapping=True,
-            truncation=True,
-            max_length=self.max_seq_len,
-        )
-        offset_raw = inputs.pop("offset_mapping")[0]
-        if self.use_pure_gpu and self.device.type == "cuda":
-            offset_mapping = offset_raw.to(self.device)
-        else:
-            offset_mapping = offset_raw.cpu().numpy()
-        inputs = {
-            k: v.to(self.device, non_blocking=(self.device.type == "cuda"))
-            for k, v in inputs.items()
-        }
-        row = self._align_filtering_row(
+        row = self._prepare_aligned_row(
             context,
             question,
             context_type,
-            prompt,
-            offset_mapping,
             preset_sentences=preset_sentences,
             preset_sentence_tokens=preset_sentence_tokens,
         )
+        if row is not None:
+            input_ids = torch.from_numpy(row["input_ids"]).unsqueeze(0)
+            inputs = {
+                "input_ids": input_ids,
+                "attention_mask": torch.ones_like(input_ids),
+            }
+        else:
+            prompt = self._build_filtering_prompt(context, question)
+            inputs = self.tokenizer(
+                prompt,
+                return_tensors="pt",
+                return_offsets_mapping=True,
+                truncation=True,
+                max_length=self.max_seq_len,
+            )
+            offset_raw = inputs.pop("offset_mapping")[0]
+            if self.use_pure_gpu and self.device.type == "cuda":
+                offset_mapping = offset_raw.to(self.device)
+            else:
+                offset_mapping = offset_raw.cpu().numpy()
+            row = self._align_filtering_row(
+                context,
+                question,
+                context_type,
+                prompt,
+                offset_mapping,
+                preset_sentences=preset_sentences,
+                preset_sentence_tokens=preset_sentence_tokens,
+            )
+        inputs = {k: v.cpu() for k, v in inputs.items()}
         context_num_tokens = int(row["context_end"] - row["context_start"] + 1)
         prep = {
             "inputs": inputs,
@@ -1223,7 +3230,18 @@ class AttentionCompressor:
             "sentence_tokens": row["sentence_tokens"],
         }
         self._filtering_cache_put(cache_key, prep)
-        return prep
+        return self._prep_on_device(prep)
+
+    def _prep_on_device(self, prep: dict) -> dict:
+        """Cached preps keep host tensors; hand out a copy with inputs on device."""
+        non_blocking = self.device.type == "cuda"
+        return dict(
+            prep,
+            inputs={
+                k: v.to(self.device, non_blocking=non_blocking)
+                for k, v in prep["inputs"].items()
+            },
+        )
 
     def _detector_based_filtering_impl(
         self,
@@ -1241,103 +3259,42 @@ class AttentionCompressor:
             preset_sentences=preset_sentences,
             preset_sentence_tokens=preset_sentence_tokens,
         )
-        inputs = prep["inputs"]
-        context_start = prep["context_start"]
-        context_end = prep["context_end"]
-        sent_positions = prep["sent_positions"]
-        sentences = prep["sentences"]
-        sentence_tokens = prep["sentence_tokens"]
-
-        if self.torch_detector is None:
-            raise ValueError("Torch detector not loaded. Detector required for clean mode.")
-
-        with torch.inference_mode():
-            self._probe_state.begin(sent_positions, context_start, context_end)
-            _ = self.attention_model(
-                input_ids=inputs["input_ids"],
-                attention_mask=inputs["attention_mask"],
-                output_attentions=False,
-                return_dict=True,
-            )
-            vectors = self._probe_state.finalize_vectors()
-            if vectors is None:
-                raise ValueError("Attention probe processing failed to produce features.")
-
-        expected_dim = self.torch_detector.in_features
-        if vectors.shape[1] != expected_dim:
-            if vectors.shape[1] == self.num_heads and expected_dim == self.num_layers * self.num_heads:
-                vectors = vectors.repeat(1, self.num_layers)
-            else:
-                raise ValueError(f"Vector dim {vectors.shape[1]} != detector expected {expected_dim}")
-
-        # Detector needs float32; vectors from _stream_feat_sum already on device
-        if vectors.dtype != torch.float32:
-            vectors = vectors.to(dtype=torch.float32)
-
-        if self.detector_scaler:
-            vectors = (vectors - self.detector_scaler["mean"]) / self.detector_scaler["scale"]
-
-        logits = self.torch_detector(vectors)
-        sentence_probs = torch.sigmoid(logits).squeeze(-1)
-        if self.use_pure_gpu:
-            sentence_scores = sentence_probs
-        else:
-            sentence_scores = sentence_probs.detach().cpu().tolist()
-
-        sentence_scores = self._apply_context_type_score_adjustments(
-            sentence_scores, sentences, context_type
-        )
-        return sentence_scores, sentences, sentence_tokens
+        return self._forward_scores_from_prep(prep, context_type)
 
     def _find_context_position(
         self, offset_mapping: Union[np.ndarray, torch.Tensor], prompt: str, context: str
     ) -> Tuple[int, int]:
         """Find context position in token sequence."""
         start_char = prompt.find(context)
-        end_char = start_char + len(context)
-        token_starts = offset_mapping[:, 0]
-        token_ends = offset_mapping[:, 1]
-        valid_tokens = (token_ends > start_char) & (token_starts < end_char)
+        span = np.asarray([[start_char, start_char + len(context)]], dtype=np.int64)
         if isinstance(offset_mapping, torch.Tensor):
-            token_indices = valid_tokens.nonzero(as_tuple=True)[0]
-            vals = token_indices[[0, -1]].cpu().tolist()
-            return int(vals[0]), int(vals[1])
-        token_indices = np.nonzero(valid_tokens)[0]
-        return int(token_indices[0]), int(token_indices[-1])
+            return self._align_spans_torch(offset_mapping, span)[0]
+        aligned = align_char_spans(offset_mapping, span)
+        if aligned is None:
+            return self._align_spans_dense(offset_mapping, span)[0]
+        return int(aligned[0, 0]), int(aligned[0, 1])
 
     def _split_context_sentences(self, context: str, context_type: str) -> List[str]:
         """Split context into sentences (text only; shared by chunking and offset alignment)."""
+        return self._split_contexts([context], [context_type])[0]
+
+    def _sentence_splitter_for(self, context_type: str) -> Optional[SentenceSplitter]:
         if context_type == 'english':
-            raw_sentences = nltk.sent_tokenize(context)
-            raw_sentences = [s.strip() for s in raw_sentences if s.strip()]
-            sentences = self._sync_sentence(raw_sentences, context)
-        elif context_type == 'code':
-            sentences = self._code_sentence_split_fallback(context)
-        elif context_type == 'chinese':
+            return self._english_splitter
+        if context_type == 'chinese':
             if self.use_fast_chinese_split:
-                sentences = self._split_chinese_simple(context)
-            else:
-                self._ensure_spacy_loaded()
-                if self.zh_sent_tokenize:
-                    doc = self.zh_sent_tokenize(context)
-                    raw_sentences = [sent.text.strip() for sent in doc.sents if sent.text.strip()]
-                    sentences = self._sync_sentence(raw_sentences, context)
-                else:
-                    sentences = context.split('。')
-                    sentences = [s.strip() + '。' for s in sentences if s.strip()]
-        else:
-            sentences = context.split('\n\n')
-            sentences = [s.strip() for s in sentences if s.strip()]
-
-        filtered_sentences = []
-        for sent in sentences:
-            cleaned_sent = sent.strip()
-            if not cleaned_sent:
-                continue
-            if self._count_words_multilingual(cleaned_sent) < self.min_word_length:
-                continue
-            filtered_sentences.append(sent)
-        return filtered_sentences
+                return self._chinese_rule_splitter
+            self._ensure_spacy_loaded()
+            return self._spacy_splitter
+        return None
+
+    def _split_contexts(
+        self, contexts: List[str], context_types: List[str]
+    ) -> List[List[str]]:
+        """Batch split: one splitter call per context type, one word-count pass overall."""
+        return split_contexts(
+            contexts, context_types, self._sentence_splitter_for, self.min_word_length
+        )
 
     @staticmethod
     def _context_type_has_chinese(context_type: str, sentences: List[str]) -> bool:
@@ -1369,89 +3326,68 @@ class AttentionCompressor:
         if not sentences:
             return [], [], []
 
-        use_torch = isinstance(offset_mapping, torch.Tensor)
-
-        if use_torch:
-            num_sents = len(sentences)
-            sent_lengths = torch.tensor(
-                [len(sent) for sent in sentences],
-                dtype=torch.long,
-                device=offset_mapping.device
-            )
-            cumulative_lengths = torch.cumsum(sent_lengths, dim=0)
-            start_chars = torch.zeros_like(cumulative_lengths)
-            start_chars[1:] = cumulative_lengths[:-1]
-            offset = prompt.find(sentences[0])
-            start_chars = start_chars + offset
-            end_chars = start_chars + sent_lengths
-            token_starts = offset_mapping[:, 0:1]
-            token_ends = offset_mapping[:, 1:2]
-            start_chars_2d = start_chars.unsqueeze(0)
-            end_chars_2d = end_chars.unsqueeze(0)
-            valid_tokens = (token_ends > start_chars_2d) & (token_starts < end_chars_2d)
-            token_sentence_pairs = valid_tokens.nonzero(as_tuple=False)
-            if token_sentence_pairs.numel() > 0:
-                sent_idx = token_sentence_pairs[:, 1]
-                token_idx = token_sentence_pairs[:, 0]
-                try:
-                    sent_min = torch.full((num_sents,), 999999, device=offset_mapping.device, dtype=torch.long)
-                    sent_max = torch.full((num_sents,), -1, device=offset_mapping.device, dtype=torch.long)
-                    sent_min.scatter_reduce_(0, sent_idx, token_idx, reduce='amin')
-                    sent_max.scatter_reduce_(0, sent_idx, token_idx, reduce='amax')
-                    valid = sent_max >= 0
-                    # Batch sync once (no per-element .item())
-                    sent_min_list = sent_min.cpu().tolist()
-                    sent_max_list = sent_max.cpu().tolist()
-                    valid_list = valid.cpu().tolist()
-                    sent_positions = [
-                        (sent_min_list[i], sent_max_list[i]) if valid_list[i] else (0, 0)
-                        for i in range(num_sents)
-                    ]
-                except (AttributeError, TypeError):
-                    # Fallback: batch gather, one .tolist() sync (no per-element .item())
-                    dev = offset_mapping.device
-                    mins, maxs = [], []
-                    for i in range(num_sents):
-                        mask = token_sentence_pairs[:, 1] == i
-                        st = token_sentence_pairs[mask, 0]
-                        if st.numel() > 0:
-                            mins.append(st.min().unsqueeze(0))
-                            maxs.append(st.max().unsqueeze(0))
-                        else:
-                            mins.append(torch.tensor([0], device=dev, dtype=torch.long))
-                            maxs.append(torch.tensor([0], device=dev, dtype=torch.long))
-                    m = torch.cat(mins).cpu().tolist()
-                    x = torch.cat(maxs).cpu().tolist()
-                    sent_positions = list(zip(m, x))
-            else:
-                sent_positions = [(0, 0)] * num_sents
+        spans = cumulative_char_spans(prompt, sentences)
+        if isinstance(offset_mapping, torch.Tensor):
+            sent_positions = self._align_spans_torch(offset_mapping, spans)
         else:
-            sent_lengths = np.array([len(sent) for sent in sentences])
-            cumulative_lengths = np.cumsum(sent_lengths)
-            start_chars = np.zeros_like(cumulative_lengths)
-            start_chars[1:] = cumulative_lengths[:-1]
-            offset = prompt.find(sentences[0])
-            start_chars = start_chars + offset
-            end_chars = start_chars + sent_lengths
-            token_starts = offset_mapping[:, 0][:, np.newaxis]
-            token_ends = offset_mapping[:, 1][:, np.newaxis]
-            valid_tokens = (token_ends > start_chars) & (token_starts < end_chars)
-            token_sentence_pairs = np.argwhere(valid_tokens)
-            sent_positions = []
-            for sent_idx in range(len(sentences)):
-                sent_tokens = token_sentence_pairs[token_sentence_pairs[:, 1] == sent_idx, 0]
-                if len(sent_tokens) == 0:
-                    sent_positions.append((0, 0))
-                else:
-                    sent_positions.append((
-                        int(sent_tokens[0]),
-                        int(sent_tokens[-1]),
-                    ))
+            aligned = align_char_spans(offset_mapping, spans)
+            sent_positions = (
+                [tuple(pos) for pos in aligned.tolist()]
+                if aligned is not None
+                else self._align_spans_dense(offset_mapping, spans)
+            )
 
         if sentence_tokens is None:
             token_counts = self._count_sentence_tokens([s.strip() for s in sentences])
         else:
             token_counts = sentence_tokens
+        return self._drop_empty_sentences(sent_positions, sentences, token_counts)
+
+    @staticmethod
+    def _align_spans_torch(
+        offset_mapping: torch.Tensor, spans: np.ndarray
+    ) -> List[Tuple[int, int]]:
+        """torch.searchsorted variant of align_char_spans (offsets stay on device)."""
+        starts = offset_mapping[:, 0].long()
+        ends = offset_mapping[:, 1].long()
+        idx = ((starts != 0) | (ends != 0)).nonzero(as_tuple=True)[0]
+        starts = starts[idx].contiguous()
+        ends = ends[idx].contiguous()
+        span_t = torch.as_tensor(spans, dtype=torch.long, device=offset_mapping.device)
+        n = idx.numel()
+        if n == 0:
+            return [(0, 0)] * len(spans)
+        first = torch.searchsorted(ends, span_t[:, 0].contiguous(), right=True)
+        last = torch.searchsorted(starts, span_t[:, 1].contiguous()) - 1
+        ok = (first <= last) & (first < n) & (last >= 0)
+        first_tok = torch.where(ok, idx[first.clamp(0, n - 1)], 0)
+        last_tok = torch.where(ok, idx[last.clamp(0, n - 1)], 0)
+        monotone = (starts[1:] >= starts[:-1]).all() & (ends[1:] >= ends[:-1]).all()
+        # One batch sync: positions + monotone flag
+        packed = torch.cat([
+            torch.stack([first_tok, last_tok], dim=1).flatten(),
+            monotone.long().view(1),
+        ]).cpu().tolist()
+        if not packed[-1]:
+            return AttentionCompressor._align_spans_dense(
+                offset_mapping.cpu().numpy(), spans
+            )
+        return list(zip(packed[0:-1:2], packed[1:-1:2]))
+
+    @staticmethod
+    def _align_spans_dense(
+        offset_mapping: np.ndarray, spans: np.ndarray
+    ) -> List[Tuple[int, int]]:
+        """Reference [T, S] overlap matrix (non-monotone offsets only)."""
+        return align_char_spans_dense(offset_mapping, spans)
+
+    @staticmethod
+    def _drop_empty_sentences(
+        sent_positions: List[Tuple[int, int]],
+        sentences: List[str],
+        token_counts: List[int],
+    ) -> Tuple[List[Tuple[int, int]], List[str], List[int]]:
+        """Keep sentences with a positive budget token count."""
         valid_sentences = []
         valid_positions = []
         valid_tokens = []
@@ -1476,82 +3412,19 @@ class AttentionCompressor:
 
     def _sync_sentence(self, sentences: List[str], text: str) -> List[str]:
         """Ensure split sentences match original text exactly."""
-        if not sentences:
-            return []
-        seen_text = 0
-        sentence_num = len(sentences)
-        new_sentences = []
-        for i, s in enumerate(sentences):
-            if not s.strip():
-                continue
-            if i == sentence_num - 1:
-                remaining_text = text[seen_text:]
-                if remaining_text.strip():
-                    new_sentences.append(remaining_text)
-                break
-            next_sentence = sentences[i + 1] if i + 1 < len(sentences) else ""
-            if next_sentence:
-                search_len = min(10, len(next_sentence))
-                search_text = next_sentence[:search_len]
-                next_sentence_start = text.find(search_text, seen_text + len(s.strip()))
-                if next_sentence_start > seen_text:
-                    sentence_text = text[seen_text:next_sentence_start]
-                    if sentence_text.strip():
-                        new_sentences.append(sentence_text)
-                    seen_text = next_sentence_start
-                else:
-                    remaining_text = text[seen_text:]
-                    if remaining_text.strip():
-                        new_sentences.append(remaining_text)
-                    break
-        return new_sentences
+        return [text[a:b] for a, b in sync_sentence_spans(sentences, text).tolist()]
 
     def _split_chinese_simple(self, context: str) -> List[str]:
         """Fast rule-based Chinese sentence splitting. Splits by 。？！； and newlines."""
-        raw = re.split(r'[。？！；\n]+', context)
-        sentences = [s.strip() for s in raw if s.strip()]
-        return self._sync_sentence(sentences, context)
+        return self._chinese_rule_splitter.split([context])[0]
 
     def _code_sentence_split_fallback(self, code: str) -> List[str]:
         """Simple code splitting: split by newlines."""
-        lines = code.split('\n')
-        sentences = []
-        current_block = []
-        for line in lines:
-            stripped = line.strip()
-            if not stripped:
-                if current_block:
-                    block_text = '\n'.join(current_block)
-                    if self._count_words_multilingual(block_text) >= self.min_word_length:
-                        sentences.append(block_text)
-                    current_block = []
-                continue
-            current_block.append(line)
-            if any(stripped.endswith(p) for p in ['{', '}', ';', ':', '"""', "'''"]):
-                if len(current_block) >= 2:
-                    block_text = '\n'.join(current_block)
-                    if self._count_words_multilingual(block_text) >= self.min_word_length:
-                        sentences.append(block_text)
-                    current_block = []
-        if current_block:
-            block_text = '\n'.join(current_block)
-            if self._count_words_multilingual(block_text) >= self.min_word_length:
-                sentences.append(block_text)
-        return sentences if sentences else [code]
+        return split_code_blocks(code, self.min_word_length)
 
     def _count_words_multilingual(self, text: str) -> int:
         """Count words in text, handling both English and Chinese."""
-        text = text.strip()
-        if not text:
-            return 0
-        has_chinese = any('\u4e00' <= char <= '\u9fff' for char in text)
-        if has_chinese:
-            chinese_chars = sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
-            english_words = len([word for word in text.split() if any(char.isalpha() for char in word)])
-            return chinese_chars + english_words
-        else:
-            words = text.split()
-            return len([word for word in words if any(char.isalpha() for char in word)])
+        return int(count_words([text])[0])
 
     def _select_sentences(
         self,
@@ -1563,7 +3436,7 @@ class AttentionCompressor:
     ) -> Tuple[str, List[int], Optional[int]]:
         """Select sentences based on importance scores and token budget."""
         if isinstance(scores, torch.Tensor):
-            sorted_indices = torch.argsort(scores, descending=True).tolist()
+            sorted_indices = torch.argsort(scores, descending=True, stable=True).tolist()
         else:
             sorted_indices = sorted(
                 range(len(sentences)), key=lambda i: scores[i], reverse=True
@@ -1598,27 +3471,9 @@ class AttentionCompressor:
 
         if self.print_sentence_scores:
             print(f"📊 Token budget filtering: {len(preserved_set)}/{len(sentences)} sentences selected (target: {target_tokens} tokens, actual: {current_tokens} tokens)")
-            print("🔥 Selected sentences ranked by score:")
-            preserved_indices_dbg = sorted(preserved_set)
-            if isinstance(scores, torch.Tensor):
-                preserved_t = torch.tensor(
-                    preserved_indices_dbg, device=scores.device, dtype=torch.long
-                )
-                selected_scores = scores[preserved_t].cpu().tolist()
-                selected_data = list(zip(
-                    preserved_indices_dbg, selected_scores,
-                    [sentences[i] for i in preserved_indices_dbg],
-                    [sentence_tokens[i] for i in preserved_indices_dbg],
-                ))
-            else:
-                selected_data = [
-                    (i, scores[i], sentences[i], sentence_tokens[i])
-                    for i in preserved_indices_dbg
-                ]
-            selected_data.sort(key=lambda x: x[1], reverse=True)
-            for rank, (idx, score, sentence, tokens) in enumerate(selected_data, 1):
-                print(f"  {rank:2d}. [Index: {idx:2d}] [Score: {score:.3f}] [Tokens: {tokens:3d}] {sentence}")
-            print()
+            self._print_selected_sentences(
+                sentences, scores, sentence_tokens, sorted(preserved_set)
+            )
 
         preserved_indices = sorted(preserved_set)
         return self._finalize_joined_selection(
@@ -1630,6 +3485,32 @@ class AttentionCompressor:
             sentence_tokens=sentence_tokens,
         )
 
+    @staticmethod
+    def _print_selected_sentences(
+        sentences: List[str],
+        scores: Union[List[float], torch.Tensor],
+        sentence_tokens: List[int],
+        preserved_indices: List[int],
+        truncate: bool = False,
+    ) -> None:
+        print("🔥 Selected sentences ranked by score:")
+        if isinstance(scores, torch.Tensor):
+            preserved_t = torch.tensor(preserved_indices, device=scores.device, dtype=torch.long)
+            selected_scores = scores[preserved_t].cpu().tolist()
+        else:
+            selected_scores = [scores[i] for i in preserved_indices]
+        selected_data = list(zip(
+            preserved_indices, selected_scores,
+            [sentences[i] for i in preserved_indices],
+            [sentence_tokens[i] for i in preserved_indices],
+        ))
+        selected_data.sort(key=lambda x: x[1], reverse=True)
+        for rank, (idx, score, sentence, tokens) in enumerate(selected_data, 1):
+            if truncate and len(sentence) > 100:
+                sentence = sentence[:100] + "..."
+            print(f"  {rank:2d}. [Index: {idx:2d}] [Score: {score:.3f}] [Tokens: {tokens:3d}] {sentence}")
+        print()
+
     def _finalize_joined_selection(
         self,
         sentences: List[str],
@@ -1637,21 +3518,59 @@ class AttentionCompressor:
         scores: Union[List[float], torch.Tensor],
         target_tokens: int,
         context_type: str,
-        sentence_tokens: Optional[List[int]] = None,
+        sentence_tokens: List[int],
     ) -> Tuple[str, List[int], Optional[int]]:
-        """Join selected sentences and enforce budget on the actual joined 7B encode."""
+        """Join selected sentences and enforce budget on the actual joined 7B encode.
+
+        The joined length is sum(sentence_tokens) plus one junction cost per
+        adjacent pair; missing costs come from one batched pair encode before any
+        full encode, so the arithmetic is exact. Over budget, sentences are dropped
+        (lowest score first, mandatory sentences last) by that arithmetic
+        (_drops_to_budget), then one encode verifies the join. Only a merge that
+        spans more than one junction can leave it over, in which case one more
+        exact pass drops the rest and a final encode reports the length.
+        """
         indices = sorted(preserved_indices)
-        compressed_text = self._join_compressed_sentences(
-            sentences, indices, context_type
-        )
         if target_tokens <= 0 or len(indices) <= 1:
-            return compressed_text, indices, None
+            text = self._join_compressed_sentences(sentences, indices, context_type)
+            return text, indices, None
 
         budget_tok = self._budget_tokenizer()
-        actual = self._encode_length(budget_tok, compressed_text)
-        if actual <= target_tokens:
-            return compressed_text, indices, actual
+        separator = self._join_separator(context_type, sentences)
+        pairs = list(zip(indices, indices[1:]))
+        junctions = self._cached_junctions(sentences, separator, pairs)
+        self._junction_costs(
+            budget_tok, sentences, sentence_tokens, separator, pairs, junctions
+        )
+        length = sum(sentence_tokens[i] for i in indices) + sum(
+            junctions[pair] for pair in pairs
+        )
+
+        order: List[int] = []
+        for _ in range(2):
+            if length > target_tokens:
+                if not order:
+                    order = self._drop_order(sentences, indices, scores, context_type)
+                indices = self._drops_to_budget(
+                    budget_tok, sentences, sentence_tokens, indices, order, separator,
+                    length, target_tokens, junctions,
+                )
+            compressed_text = self._join_compressed_sentences(
+                sentences, indices, context_type
+            )
+            length = self._encode_length(budget_tok, compressed_text)
+            if length <= target_tokens or len(indices) <= 1:
+                break
+        return compressed_text, indices, length
 
+    def _drop_order(
+        self,
+        sentences: List[str],
+        indices: List[int],
+        scores: Union[List[float], torch.Tensor],
+        context_type: str,
+    ) -> List[int]:
+        """Drop order for budget enforcement: lowest score first, mandatory sentences last."""
         if isinstance(scores, torch.Tensor):
             score_list = scores.detach().cpu().tolist()
         else:
@@ -1661,42 +3580,114 @@ class AttentionCompressor:
             if context_type == "chinese"
             else []
         )
-        removable = sorted(
-            (i for i in indices if i not in mandatory),
-            key=lambda i: score_list[i],
-        )
-        sep_cost = (
-            self._join_separator_token_cost(context_type, sentences)
-            if sentence_tokens is not None
-            else 0
+        return sorted(
+            (i for i in indices if i not in mandatory), key=lambda i: score_list[i]
+        ) + sorted((i for i in indices if i in mandatory), key=lambda i: score_list[i])
+
+    def _junction_key(self, separator: str, left: str, right: str) -> bytes:
+        return content_hash("junction", self.sentence_budget_tokenizer, separator, left, right)
+
+    def _cached_junctions(
+        self, sentences: List[str], separator: str, pairs: Iterable[Tuple[int, int]]
+    ) -> Dict[Tuple[int, int], int]:
+        """Junction costs of ``pairs`` already in the sentence_ids cache."""
+        junctions: Dict[Tuple[int, int], int] = {}
+        for a, b in pairs:
+            cost = self._sentence_ids_cache.peek(
+                self._junction_key(separator, sentences[a], sentences[b])
+            )
+            if cost is not None:
+                junctions[(a, b)] = cost
+        return junctions
+
+    def _junction_costs(
+        self,
+        tokenizer,
+        sentences: List[str],
+        sentence_tokens: List[int],
+        separator: str,
+        pairs: Iterable[Tuple[int, int]],
+        junctions: Dict[Tuple[int, int], int],
+    ) -> None:
+        """Fill ``junctions[(a, b)]``: tokens added by joining sentences a and b
+        (separator plus boundary merges), from one batched encode of the missing pairs."""
+        missing = list(dict.fromkeys(pair for pair in pairs if pair not in junctions))
+        if not missing:
+            return
+        counts = self._batch_count_tokens(
+            [sentences[a] + separator + sentences[b] for a, b in missing], tokenizer
         )
+        for (a, b), count in zip(missing, counts):
+            junctions[(a, b)] = count - sentence_tokens[a] - sentence_tokens[b]
+            self._sentence_ids_cache.put(
+                self._junction_key(separator, sentences[a], sentences[b]), junctions[(a, b)]
+            )
 
-        drop_ptr = 0
-        while actual > target_tokens and len(indices) > 1:
-            while drop_ptr < len(removable) and removable[drop_ptr] not in indices:
-                drop_ptr += 1
-            if drop_ptr < len(removable):
-                drop = removable[drop_ptr]
-                drop_ptr += 1
-            else:
-                drop = min(indices, key=lambda i: score_list[i])
-            if drop not in indices:
-                break
-            indices.remove(drop)
-            compressed_text = self._join_compressed_sentences(
-                sentences, indices, context_type
+    def _drops_to_budget(
+        self,
+        tokenizer,
+        sentences: List[str],
+        sentence_tokens: List[int],
+        indices: List[int],
+        order: List[int],
+        separator: str,
+        length: int,
+        target_tokens: int,
+        junctions: Dict[Tuple[int, int], int],
+    ) -> List[int]:
+        """Drop ``order`` from sorted ``indices`` until ``length`` fits the target.
+
+        Dropping x between kept neighbours a and b changes the joined length by
+        J(a, b) - J(a, x) - J(x, b) - tokens(x). ``junctions`` must hold every
+        adjacent pair of ``indices``; the new pairs (a, b) are encoded as drops
+        create them. Drops are taken in batches that sentence_tokens says cover
+        the excess; each batch is one tokenizer call.
+        """
+        n = len(indices)
+        position = {idx: p for p, idx in enumerate(indices)}
+        prev = list(range(-1, n - 1))
+        nxt = list(range(1, n + 1))
+        candidates = [idx for idx in order if idx in position]
+        dropped = set()
+        start = 0
+        while length > target_tokens and n - len(dropped) > 1 and start < len(candidates):
+            excess, count = length - target_tokens, 0
+            while start + count < len(candidates) and excess > 0:
+                excess -= sentence_tokens[candidates[start + count]]
+                count += 1
+            step = candidates[start : start + min(count, n - len(dropped) - 1)]
+
+            sim_prev, sim_nxt, pairs = list(prev), list(nxt), []
+            for idx in step:
+                p = position[idx]
+                a, b = sim_prev[p], sim_nxt[p]
+                if a >= 0 and b < n:
+                    pairs.append((indices[a], indices[b]))
+                if a >= 0:
+                    sim_nxt[a] = b
+                if b < n:
+                    sim_prev[b] = a
+            self._junction_costs(
+                tokenizer, sentences, sentence_tokens, separator, pairs, junctions
             )
-            if (
-                sentence_tokens is not None
-                and self._estimate_joined_token_count(
-                    indices, sentence_tokens, sep_cost
-                )
-                > target_tokens
-            ):
-                continue
-            actual = self._encode_length(budget_tok, compressed_text)
 
-        return compressed_text, sorted(indices), actual
+            for idx in step:
+                p = position[idx]
+                a, b = prev[p], nxt[p]
+                length -= sentence_tokens[idx]
+                if a >= 0:
+                    length -= junctions[(indices[a], idx)]
+                    nxt[a] = b
+                if b < n:
+                    length -= junctions[(idx, indices[b])]
+                    prev[b] = a
+                if a >= 0 and b < n:
+                    length += junctions[(indices[a], indices[b])]
+                dropped.add(idx)
+                start += 1
+                if length <= target_tokens:
+                    break
+        return [idx for idx in indices if idx not in dropped]
 
     def _select_sentences_by_threshold(
         self,
@@ -1735,18 +3726,9 @@ class AttentionCompressor:
 
         if self.print_sentence_scores:
             print(f"📊 Threshold filtering: {len(preserved_indices)}/{len(sentences)} sentences selected (threshold: {threshold})")
-            print("🔥 Selected sentences ranked by score:")
-            if isinstance(scores, torch.Tensor):
-                preserved_t = torch.tensor(preserved_indices, device=scores.device, dtype=torch.long)
-                selected_scores = scores[preserved_t].cpu().tolist()
-                selected_data = list(zip(preserved_indices, selected_scores, [sentences[i] for i in preserved_indices], [sentence_tokens[i] for i in preserved_indices]))
-            else:
-                selected_data = [(i, scores[i], sentences[i], sentence_tokens[i]) for i in preserved_indices]
-            selected_data.sort(key=lambda x: x[1], reverse=True)
-            for rank, (idx, score, sentence, tokens) in enumerate(selected_data, 1):
-                display_sentence = sentence[:100] + "..." if len(sentence) > 100 else sentence
-                print(f"  {rank:2d}. [Index: {idx:2d}] [Score: {score:.3f}] [Tokens: {tokens:3d}] {display_sentence}")
-            print()
+            self._print_selected_sentences(
+                sentences, scores, sentence_tokens, preserved_indices, truncate=True
+            )
 
         preserved_indices = sorted(preserved_indices)
         compressed_text = self._join_compressed_sentences(
@@ -1766,6 +3748,13 @@ class AttentionCompressor:
 
     def _count_sentence_tokens(self, sentences: List[str]) -> List[int]:
         """Count tokens per sentence for selection budget."""
+        if (
+            self._token_ids is not None
+            and self._token_ids.available
+            and self.sentence_tokenize_workers <= 1
+            and self._budget_tokenizer() is self.eval_tokenizer
+        ):
+            return self._token_ids.count(sentences)  # keeps the ids for assembly
         return self._batch_count_tokens(
             sentences, self._budget_tokenizer(), workers=self.sentence_tokenize_workers
         )
@@ -1819,7 +3808,7 @@ class AttentionCompressor:
                 )
             )
 
-    _PROMPT_TOKEN_MARGIN = 10
+    _PROMPT_TOKEN_MARGIN = PROMPT_TOKEN_MARGIN
 
     def _attention_prompt_overhead_tokens(self, question: str) -> int:
         """Template + question tokens (empty context), 0.5B attention tokenizer."""
@@ -1833,13 +3822,13 @@ class AttentionCompressor:
         """Max context tokens per forward so prompt fits in max_seq_len."""
         if ctx_budget is not None:
             return ctx_budget
-        cache_key = (int(self.max_seq_len), question)
+        cache_key = content_hash(str(int(self.max_seq_len)), question)
         cached = self._ctx_budget_cache.get(cache_key)
         if cached is not None:
             return cached
         overhead = self._attention_prompt_overhead_tokens(question)
         budget = max(int(self.max_seq_len) - overhead - self._PROMPT_TOKEN_MARGIN, 1)
-        self._ctx_budget_cache[cache_key] = budget
+        self._ctx_budget_cache.put(cache_key, budget)
         return budget
 
     def _split_text_by_token_budget(
@@ -1868,12 +3857,15 @@ class AttentionCompressor:
         sentence_tokens: List[int],
         chunk_size: int,
         context_type: str,
-    ) -> List[Dict[str, Union[str, List[str], List[int]]]]:
-        """Pack pre-split sentences into forward chunks (reuses sentence lists per chunk)."""
+    ) -> List[Dict[str, Union[str, int, List[str], List[int]]]]:
+        """Pack pre-split sentences into forward chunks (reuses sentence lists per chunk).
+
+        Sentence chunks carry their ``[start, end)`` index range into ``sentences``.
+        """
         if not sentences:
             return []
         has_chinese = self._context_type_has_chinese(context_type, sentences)
-        specs: List[Dict[str, Union[str, List[str], List[int]]]] = []
+        specs: List[Dict[str, Union[str, int, List[str], List[int]]]] = []
         range_start: Optional[int] = None
         current_tokens = 0
 
@@ -1886,6 +3878,8 @@ class AttentionCompressor:
                 "text": self._join_context_sentences(chunk_sents, context_type),
                 "sentences": chunk_sents,
                 "sentence_tokens": chunk_toks,
+                "start": start,
+                "end": end,
             })
 
         for idx, (sentence, tokens) in enumerate(zip(sentences, sentence_tokens)):
@@ -1919,7 +3913,7 @@ class AttentionCompressor:
             _append_range(range_start, len(sentences))
         return specs
 
-    def get_model_info(self) -> Dict[str, Union[str, int, bool]]:
+    def get_model_info(self) -> Dict[str, Union[str, int, bool, Dict]]:
         """Get information about the loaded model and configuration."""
         return {
             'attention_model_path': self.attention_model_path,
@@ -1933,8 +3927,46 @@ class AttentionCompressor:
             'min_word_length': self.min_word_length,
             'print_sentence_scores': self.print_sentence_scores,
             'disable_chunking': self.disable_chunking,
+            'use_sentence_aligned_prep': self.use_sentence_aligned_prep,
+            'english_sentence_splitter': self.english_sentence_splitter,
+            'prep_processes': self.prep_processes,
+            'shared_sentence_tokenizer': self._shared_sentence_tokenizer,
+            'corpus_index': self._corpus_index.path if self._corpus_index is not None else None,
+            'cache_policy': self._caches.policy,
+            'dedup_sentences': self.dedup_sentences,
+            'return_token_ids': self.return_token_ids,
+            'pipeline': self._pipeline_stats,
+            'batch_size': self.batch_size,
+            'autotune': self._autotune_profile,
+            'memory': dict(
+                self._memory_stats,
+                model=self._memory_model.summary() if self._memory_model is not None else None,
+                budget_bytes=self.memory_budget_bytes,
+            ),
+            'token_id_mismatches': (
+                self._token_id_mismatches if self.validate_token_ids else None
+            ),
+            'result_cache': (
+                {
+                    'config': self._result_config,
+                    'store': self._result_store.stats() if self._result_store else None,
+                    'coalesced': self._result_flight.stats(),
+                }
+                if self._result_config is not None
+                else None
+            ),
+            'caches': self._caches.stats(),
         }
 
+    def close(self):
+        """Shut down prep worker processes and threads; both restart lazily on next use."""
+        if self._prep_pool is not None:
+            self._prep_pool.shutdown()
+            self._prep_pool = None
+        if self._prep_threads is not None:
+            self._prep_threads.shutdown(wait=True)
+            self._prep_threads = None
+
     def clear_cache(self):
         """Clear GPU cache and perform garbage collection."""
         if torch.cuda.is_available():
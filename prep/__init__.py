@@ -0,0 +1,85 @@
+"""CPU-side prompt preparation (torch-free).
+
+The process pool lives in ``prep.worker`` (imports transformers for tokenizers).
+"""
+
+from prep.align import (
+    align_char_spans,
+    align_char_spans_batch,
+    align_char_spans_dense,
+    cumulative_char_spans,
+)
+from prep.aligned_prompt import (
+    SentenceAlignedTokenizer,
+    locate_sentence_spans,
+    pad_aligned_rows,
+)
+from prep.cache import (
+    ByteBudgetCache,
+    CacheRegistry,
+    SingleFlight,
+    content_hash,
+    estimate_nbytes,
+)
+from prep.corpus import (
+    PASSAGE_SEPARATOR,
+    CorpusIndex,
+    CorpusShardWriter,
+    build_corpus_index,
+)
+from prep.dedup import duplicate_groups
+from prep.entry import build_context_entry, entry_sentences
+from prep.fingerprint import tokenizer_fingerprint
+from prep.markers import MARKER_GROUPS, marker_mask, sentence_marker_masks
+from prep.pipeline import PipelineStats, run_pipeline
+from prep.prompt import build_filtering_prompt, filtering_prompt_tail
+from prep.result_store import ResultStore
+from prep.splitters import (
+    ChineseRuleSplitter,
+    PunktSplitter,
+    RegexEnglishSplitter,
+    SentenceSplitter,
+    SpacySplitter,
+    count_words,
+    split_contexts,
+)
+from prep.token_ids import SentenceIdAssembler
+
+__all__ = [
+    "MARKER_GROUPS",
+    "PASSAGE_SEPARATOR",
+    "PipelineStats",
+    "ByteBudgetCache",
+    "CacheRegistry",
+    "ChineseRuleSplitter",
+    "CorpusIndex",
+    "CorpusShardWriter",
+    "PunktSplitter",
+    "RegexEnglishSplitter",
+    "ResultStore",
+    "SentenceAlignedTokenizer",
+    "SentenceIdAssembler",
+    "SentenceSplitter",
+    "SingleFlight",
+    "SpacySplitter",
+    "align_char_spans",
+    "align_char_spans_batch",
+    "align_char_spans_dense",
+    "build_context_entry",
+    "build_corpus_index",
+    "build_filtering_prompt",
+    "content_hash",
+    "count_words",
+    "cumulative_char_spans",
+    "duplicate_groups",
+    "entry_sentences",
+    "estimate_nbytes",
+    "filtering_prompt_tail",
+    "locate_sentence_spans",
+    "marker_mask",
+    "pad_aligned_rows",
+    "run_pipeline",
+    "sentence_marker_masks",
+    "split_contexts",
+    "tokenizer_fingerprint",
+]
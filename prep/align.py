@@ -0,0 +1,133 @@
+"""Sentence-to-token alignment by binary search over token offsets.
+
+Token ``(start, end)`` char offsets of a fast tokenizer are non-decreasing, so the
+tokens overlapping a char range ``[s, e)`` (``end > s`` and ``start < e``) form a
+contiguous run ``[searchsorted(ends, s, right), searchsorted(starts, e) - 1]``.
+That gives the same (first, last) token per sentence as the dense ``[T, S]``
+overlap matrix in O((T + S) log T) time and O(T + S) memory.
+
+Zero-width ``(0, 0)`` rows (special / padding tokens) never overlap a range with
+``s >= 0`` and are skipped. Functions return None when the remaining offsets are
+not monotone so the caller can fall back to the dense path.
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _kept_tokens(
+    offset_mapping: np.ndarray,
+) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    starts = np.asarray(offset_mapping[:, 0], dtype=np.int64)
+    ends = np.asarray(offset_mapping[:, 1], dtype=np.int64)
+    idx = np.flatnonzero((starts != 0) | (ends != 0))
+    kept_starts = starts[idx]
+    kept_ends = ends[idx]
+    if len(idx) > 1 and (
+        (np.diff(kept_starts) < 0).any() or (np.diff(kept_ends) < 0).any()
+    ):
+        return None
+    return idx, kept_starts, kept_ends
+
+
+def _search(
+    idx: np.ndarray,
+    starts: np.ndarray,
+    ends: np.ndarray,
+    span_starts: np.ndarray,
+    span_ends: np.ndarray,
+) -> np.ndarray:
+    out = np.zeros((len(span_starts), 2), dtype=np.int64)
+    n = len(idx)
+    if n == 0 or len(span_starts) == 0:
+        return out
+    first = np.searchsorted(ends, span_starts, side="right")
+    last = np.searchsorted(starts, span_ends, side="left") - 1
+    ok = (first <= last) & (first < n) & (last >= 0)
+    out[ok, 0] = idx[first[ok]]
+    out[ok, 1] = idx[last[ok]]
+    return out
+
+
+def cumulative_char_spans(prompt: str, sentences: Sequence[str]) -> np.ndarray:
+    """``[S, 2]`` char spans laid end to end from the first sentence's position."""
+    lengths = np.fromiter(map(len, sentences), dtype=np.int64, count=len(sentences))
+    ends = np.cumsum(lengths) + prompt.find(sentences[0])
+    return np.stack([ends - lengths, ends], axis=1)
+
+
+def align_char_spans(
+    offset_mapping: np.ndarray, spans: np.ndarray
+) -> Optional[np.ndarray]:
+    """(first, last) overlapping token per span, ``(0, 0)`` when none; ``[S, 2]``."""
+    kept = _kept_tokens(offset_mapping)
+    if kept is None:
+        return None
+    idx, starts, ends = kept
+    return _search(idx, starts, ends, spans[:, 0], spans[:, 1])
+
+
+def align_char_spans_dense(
+    offset_mapping: np.ndarray, spans: np.ndarray
+) -> List[Tuple[int, int]]:
+    """Reference [T, S] overlap matrix (non-monotone offsets only)."""
+    token_starts = offset_mapping[:, 0][:, np.newaxis]
+    token_ends = offset_mapping[:, 1][:, np.newaxis]
+    valid_tokens = (token_ends > spans[:, 0]) & (token_starts < spans[:, 1])
+    sent_positions = []
+    for sent_idx in range(len(spans)):
+        sent_tokens = np.flatnonzero(valid_tokens[:, sent_idx])
+        if len(sent_tokens) == 0:
+            sent_positions.append((0, 0))
+        else:
+            sent_positions.append((int(sent_tokens[0]), int(sent_tokens[-1])))
+    return sent_positions
+
+
+def align_char_spans_batch(
+    offset_mappings: np.ndarray, spans: List[np.ndarray]
+) -> Optional[List[np.ndarray]]:
+    """Align every row of a padded ``[B, T, 2]`` batch with one search.
+
+    Rows are laid out on one axis by adding ``row * stride`` to token offsets and
+    spans (stride exceeds every offset), so a single sorted search serves the
+    whole batch. Token indices in the result are per row.
+    """
+    batch, seq_len = offset_mappings.shape[:2]
+    stride = int(offset_mappings[..., 1].max(initial=0))
+    for row_spans in spans:
+        if len(row_spans):
+            stride = max(stride, int(row_spans.max()))
+    stride += 1
+
+    idx_parts, start_parts, end_parts = [], [], []
+    for b in range(batch):
+        kept = _kept_tokens(offset_mappings[b])
+        if kept is None:
+            return None
+        idx, starts, ends = kept
+        idx_parts.append(idx + b * seq_len)
+        start_parts.append(starts + b * stride)
+        end_parts.append(ends + b * stride)
+    row_of_span = np.concatenate(
+        [np.full(len(s), b, dtype=np.int64) for b, s in enumerate(spans)]
+    ) if spans else np.zeros(0, dtype=np.int64)
+    all_spans = (
+        np.concatenate(spans).astype(np.int64, copy=False)
+        if spans
+        else np.zeros((0, 2), dtype=np.int64)
+    )
+    shift = row_of_span * stride
+    flat = _search(
+        np.concatenate(idx_parts),
+        np.concatenate(start_parts),
+        np.concatenate(end_parts),
+        all_spans[:, 0] + shift,
+        all_spans[:, 1] + shift,
+    )
+    flat %= seq_len
+    bounds = np.cumsum([0] + [len(s) for s in spans])
+    return [flat[bounds[b] : bounds[b + 1]] for b in range(len(spans))]
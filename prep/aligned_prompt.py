@@ -0,0 +1,346 @@
+"""Sentence-aligned prompt tokenization (no offset mapping, no overlap matrix).
+
+The filtering prompt is ``head + context + tail``. Instead of tokenizing the full
+prompt with ``return_offsets_mapping=True`` and recovering sentence spans by char
+overlap, the context is cut at the pre-tokenizer boundaries nearest to each
+sentence start / end, all pieces are encoded in one batched call and the ids are
+concatenated. BPE never merges across pre-token boundaries, so the ids match a
+full-prompt encode; every junction is still checked once per document (normalizer
+or unusual pre-tokenizer) and ``None`` is returned so the caller can fall back to
+the offset path.
+
+Per document (question independent, cacheable): pre-tokenize, cut, batch encode,
+validate junctions. Per request: encode only the context remainder + tail.
+Several prepared documents can share one prompt (``build_joined_row``): only the
+glue between them (remainder + separator) is encoded, after the same local
+merge check on the pre-tokens on either side of each glue.
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Sentinel in sentence token indices: position falls in the tail-encoded remainder.
+_TAIL = -1
+
+
+def locate_sentence_spans(context: str, sentences: Sequence[str]) -> Optional[np.ndarray]:
+    """Char spans ``[S, 2]`` (start, end) of ordered sentences in context, or None."""
+    spans = np.empty((len(sentences), 2), dtype=np.int64)
+    cursor = 0
+    for i, sent in enumerate(sentences):
+        pos = context.find(sent, cursor)
+        if pos < 0:
+            stripped = sent.strip()
+            pos = context.find(stripped, cursor) if stripped else -1
+            if pos < 0:
+                return None
+            sent = stripped
+        spans[i, 0] = pos
+        spans[i, 1] = pos + len(sent)
+        cursor = pos + len(sent)
+    return spans
+
+
+class SentenceAlignedTokenizer:
+    """Build ``input_ids`` + sentence token spans from pre-tokenized pieces."""
+
+    def __init__(self, tokenizer, head: str, max_length: int, tail_lead: str = "\n"):
+        self.tokenizer = tokenizer
+        self.head = head
+        self.max_length = max_length
+        self.tail_lead = tail_lead
+        backend = getattr(tokenizer, "backend_tokenizer", None)
+        self._pre_tokenizer = getattr(backend, "pre_tokenizer", None)
+        self.available = self._pre_tokenizer is not None
+        self._prefix_special: List[int] = []
+        self._suffix_special: List[int] = []
+        if self.available:
+            self._prefix_special, self._suffix_special = self._special_token_ids()
+
+    def _special_token_ids(self) -> Tuple[List[int], List[int]]:
+        plain = self.tokenizer("a", add_special_tokens=False)["input_ids"]
+        full = self.tokenizer("a")["input_ids"]
+        n = len(plain)
+        for i in range(len(full) - n + 1):
+            if full[i : i + n] == plain:
+                return list(full[:i]), list(full[i + n :])
+        return [], []
+
+    def _encode_many(self, texts: List[str]) -> List[List[int]]:
+        if not texts:
+            return []
+        return self.tokenizer(
+            texts, add_special_tokens=False, padding=False, truncation=False
+        )["input_ids"]
+
+    def _pre_token_bounds(self, text: str) -> np.ndarray:
+        spans = self._pre_tokenizer.pre_tokenize_str(text)
+        starts = [start for _, (start, _) in spans]
+        starts.append(len(text))
+        return np.unique(np.asarray(starts, dtype=np.int64))
+
+    def _junctions_merge_free(
+        self, text: str, bounds: np.ndarray, cuts: np.ndarray
+    ) -> bool:
+        """encode(left + right) == encode(left) + encode(right) at every cut."""
+        k = np.searchsorted(bounds, cuts)
+        inner = (k > 0) & (k < len(bounds) - 1)
+        if not inner.any():
+            return True
+        k = k[inner]
+        lefts = [text[a:b] for a, b in zip(bounds[k - 1].tolist(), bounds[k].tolist())]
+        rights = [text[a:b] for a, b in zip(bounds[k].tolist(), bounds[k + 1].tolist())]
+        joined = [l + r for l, r in zip(lefts, rights)]
+        n = len(joined)
+        ids = self._encode_many(joined + lefts + rights)
+        return all(ids[i] == ids[n + i] + ids[2 * n + i] for i in range(n))
+
+    def prepare_context(
+        self,
+        context: str,
+        sentences: Sequence[str],
+        spans: Optional[np.ndarray] = None,
+        count_sentences: bool = False,
+    ) -> Optional[dict]:
+        """Question-independent doc prep; None when the aligned path does not apply.
+
+        count_sentences: also return per-sentence token counts (``sentence_lengths``)
+        from the same batched encode; pieces identical to a sentence are encoded once.
+        """
+        if not self.available or not context or not sentences:
+            return None
+        if spans is None:
+            spans = locate_sentence_spans(context, sentences)
+            if spans is None:
+                return None
+        base = len(self.head)
+        text = self.head + context + self.tail_lead
+        bounds = self._pre_token_bounds(text)
+
+        def _snap(pos: np.ndarray) -> np.ndarray:
+            return bounds[np.searchsorted(bounds, pos, side="right") - 1]
+
+        c0 = int(_snap(np.asarray([base]))[0])
+        c_last = int(_snap(np.asarray([base + len(context)]))[0])
+        if c_last <= c0:
+            return None
+
+        abs_spans = spans + base
+        inner = np.clip(_snap(abs_spans.reshape(-1)), c0, c_last)
+        cuts = np.unique(np.concatenate([np.asarray([c0, c_last]), inner]))
+        if not self._junctions_merge_free(text, bounds, cuts):
+            return None
+
+        cut_list = cuts.tolist()
+        pieces = [text[a:b] for a, b in zip(cut_list[:-1], cut_list[1:])]
+        extra: List[str] = []
+        sent_src: List[int] = []
+        if count_sentences:
+            piece_at = {a: j for j, a in enumerate(cut_list[:-1])}
+            for sent, (a, b) in zip(sentences, abs_spans.tolist()):
+                j = piece_at.get(a)
+                if j is not None and cut_list[j + 1] == b and pieces[j] == sent:
+                    sent_src.append(j)
+                else:
+                    sent_src.append(len(pieces) + len(extra))
+                    extra.append(sent)
+        encoded = self._encode_many([text[:c0]] + pieces + extra)
+        head_ids = encoded[0]
+        piece_ids = encoded[1 : 1 + len(pieces)]
+        piece_lens = np.fromiter((len(p) for p in piece_ids), dtype=np.int64, count=len(piece_ids))
+        piece_tok_start = np.zeros(len(piece_ids) + 1, dtype=np.int64)
+        np.cumsum(piece_lens, out=piece_tok_start[1:])
+
+        # First token of each sentence covers char start; last covers char end - 1.
+        first_char = abs_spans[:, 0]
+        last_char = np.maximum(abs_spans[:, 1] - 1, first_char)
+        sent_first = self._token_index_at(
+            text, bounds, cuts, piece_tok_start, first_char, first=True
+        )
+        sent_last = self._token_index_at(
+            text, bounds, cuts, piece_tok_start, last_char, first=False
+        )
+        context_first = self._token_index_at(
+            text, bounds, cuts, piece_tok_start, np.asarray([base], dtype=np.int64), first=True
+        )[0]
+        context_ids = np.fromiter(
+            (t for ids in piece_ids for t in ids), dtype=np.int32, count=int(piece_tok_start[-1])
+        )
+        sentence_lengths = (
+            np.fromiter(
+                (len(encoded[1 + j]) for j in sent_src), dtype=np.int32, count=len(sent_src)
+            )
+            if count_sentences
+            else None
+        )
+        return {
+            "head_ids": np.asarray(head_ids, dtype=np.int32),
+            "context_ids": context_ids,
+            "sent_first": sent_first.astype(np.int32),
+            "sent_last": sent_last.astype(np.int32),
+            "context_first": int(context_first),
+            "remainder": text[c_last : base + len(context)],
+            # Junction anchors for build_joined_row: head chars folded into the
+            # first piece, first pre-token at c0, last full pre-token before c_last.
+            "lead": text[c0:base],
+            "first_pretoken": text[c0 : int(bounds[np.searchsorted(bounds, c0, side="right")])],
+            "last_pretoken": text[
+                int(bounds[np.searchsorted(bounds, c_last, side="left") - 1]) : c_last
+            ],
+            "sentences": list(sentences),
+            "sentence_lengths": sentence_lengths,
+        }
+
+    def _token_index_at(
+        self,
+        text: str,
+        bounds: np.ndarray,
+        cuts: np.ndarray,
+        piece_tok_start: np.ndarray,
+        chars: np.ndarray,
+        first: bool,
+    ) -> np.ndarray:
+        """First (or last) token overlapping each char, within context ids.
+
+        Byte-level tokens may split one char, hence first / last. _TAIL past the
+        last cut (char is encoded together with the tail).
+        """
+        out = np.full(len(chars), _TAIL, dtype=np.int64)
+        in_pieces = chars < cuts[-1]
+        if not in_pieces.any():
+            return out
+        pos = chars[in_pieces]
+        piece = np.searchsorted(cuts, pos, side="right") - 1
+        pre = np.searchsorted(bounds, pos, side="right") - 1
+        pre_start = bounds[pre]
+        # The pre-token holding ``pos`` starts a piece whenever pos is a sentence
+        # start or an end that is not itself a pre-token boundary.
+        starts_piece = pre_start == cuts[piece]
+        tok = np.where(
+            starts_piece,
+            piece_tok_start[piece],
+            piece_tok_start[piece + 1] - 1,
+        )
+        inside = starts_piece & ((pos > pre_start) | (not first))
+        if inside.any():
+            uniq, inverse = np.unique(pre[inside], return_inverse=True)
+            strings = [text[bounds[k] : bounds[k + 1]] for k in uniq.tolist()]
+            offsets = self.tokenizer(
+                strings, add_special_tokens=False, return_offsets_mapping=True
+            )["offset_mapping"]
+            rel = (pos[inside] - pre_start[inside]).tolist()
+            if first:
+                within = [
+                    sum(1 for _, end in offsets[j] if end <= r)
+                    for j, r in zip(inverse.tolist(), rel)
+                ]
+            else:
+                within = [
+                    max(sum(1 for start, _ in offsets[j] if start <= r) - 1, 0)
+                    for j, r in zip(inverse.tolist(), rel)
+                ]
+            tok[inside] += np.asarray(within, dtype=np.int64)
+        out[in_pieces] = tok
+        return out
+
+    def build_row(self, doc: dict, tail: str) -> Optional[dict]:
+        """Assemble one prompt row from doc prep + question tail (no context re-encode)."""
+        return self.build_joined_row([doc], "", tail)
+
+    def build_joined_row(
+        self, docs: Sequence[dict], separator: str, tail: str
+    ) -> Optional[dict]:
+        """Row for ``head + separator.join(contexts) + tail`` from per-context preps.
+
+        Each glue (remainder of one context + separator up to the next context's
+        lead) is encoded on its own; None when a separator does not end with the
+        next lead, a junction merges across the glue, or the row is too long.
+        """
+        glues: List[str] = []
+        for left, right in zip(docs[:-1], docs[1:]):
+            lead = right["lead"]
+            if not separator.endswith(lead):
+                return None
+            glues.append(left["remainder"] + separator[: len(separator) - len(lead)])
+        pieces = glues + [docs[-1]["remainder"] + tail]
+        enc = self.tokenizer(
+            pieces, add_special_tokens=False, return_offsets_mapping=True
+        )
+        glue_ids = enc["input_ids"]
+        if glues and not self._glues_merge_free(docs, glues, glue_ids[:-1]):
+            return None
+
+        ctx_off = len(self._prefix_special) + len(docs[0]["head_ids"])
+        pos = ctx_off
+        firsts: List[np.ndarray] = []
+        lasts: List[np.ndarray] = []
+        context_end = ctx_off
+        for doc, ids, offsets in zip(docs, glue_ids, enc["offset_mapping"]):
+            remainder = doc["remainder"]
+            n_ctx = len(doc["context_ids"])
+            n_rem_tok = (
+                sum(1 for start, _ in offsets if start < len(remainder)) if remainder else 0
+            )
+            end = pos + n_ctx - 1 + n_rem_tok
+            firsts.append(
+                np.where(doc["sent_first"] == _TAIL, n_ctx, doc["sent_first"]).astype(np.int64)
+                + pos
+            )
+            lasts.append(
+                np.where(doc["sent_last"] == _TAIL, end - pos, doc["sent_last"]).astype(np.int64)
+                + pos
+            )
+            context_end = end
+            pos += n_ctx + len(ids)
+        total = pos + len(self._suffix_special)
+        if total > self.max_length:
+            return None
+
+        context_start = ctx_off + docs[0]["context_first"]
+        sent_first = np.clip(np.concatenate(firsts), context_start, context_end)
+        sent_last = np.concatenate(lasts)
+        parts = [np.asarray(self._prefix_special, dtype=np.int64), docs[0]["head_ids"]]
+        for doc, ids in zip(docs, glue_ids):
+            parts.append(doc["context_ids"])
+            parts.append(np.asarray(ids, dtype=np.int64))
+        parts.append(np.asarray(self._suffix_special, dtype=np.int64))
+        input_ids = np.concatenate(parts).astype(np.int64, copy=False)
+        return {
+            "input_ids": input_ids,
+            "context_start": int(context_start),
+            "context_end": int(context_end),
+            "sent_positions": list(zip(sent_first.tolist(), sent_last.tolist())),
+        }
+
+    def _glues_merge_free(
+        self, docs: Sequence[dict], glues: List[str], glue_ids: List[List[int]]
+    ) -> bool:
+        """encode(last + glue + first) == encode(last) + glue ids + encode(first)."""
+        lefts = [doc["last_pretoken"] for doc in docs[:-1]]
+        rights = [doc["first_pretoken"] for doc in docs[1:]]
+        n = len(glues)
+        ids = self._encode_many(
+            [l + g + r for l, g, r in zip(lefts, glues, rights)] + lefts + rights
+        )
+        return all(
+            ids[i] == ids[n + i] + list(glue_ids[i]) + ids[2 * n + i] for i in range(n)
+        )
+
+
+def pad_aligned_rows(
+    rows: List[np.ndarray], pad_id: int, padding_side: str = "right"
+) -> Tuple[np.ndarray, np.ndarray, List[int]]:
+    """Pad id rows to ``[B, T]``; returns (input_ids, attention_mask, left pad per row)."""
+    max_len = max(len(r) for r in rows)
+    input_ids = np.full((len(rows), max_len), pad_id, dtype=np.int64)
+    attention_mask = np.zeros((len(rows), max_len), dtype=np.int64)
+    shifts: List[int] = []
+    for b, row in enumerate(rows):
+        shift = max_len - len(row) if padding_side == "left" else 0
+        input_ids[b, shift : shift + len(row)] = row
+        attention_mask[b, shift : shift + len(row)] = 1
+        shifts.append(shift)
+    return input_ids, attention_mask, shifts
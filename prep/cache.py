@@ -0,0 +1,274 @@
+"""Byte-budgeted caches for per-document prep (token ids, spans, counts).
+
+``ByteBudgetCache`` evicts by LRU or, with ``policy="cost"``, by GreedyDual-Size:
+each entry has priority ``L + cost / bytes`` (refreshed on hit), the lowest
+priority goes first and ``L`` rises to the evicted priority, so cheap-to-rebuild
+large entries leave before expensive small ones while idle entries still age out.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+import itertools
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+def content_hash(*parts: str) -> bytes:
+    """128-bit blake2b over parts (separator-safe); used as cache key."""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        data = part.encode("utf-8", "surrogatepass")
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.digest()
+
+
+def estimate_nbytes(value: Any) -> int:
+    """Approximate retained size: numpy buffers + strings + containers."""
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes) + 112
+    if hasattr(value, "nbytes") and hasattr(value, "shape"):  # torch.Tensor
+        return int(value.nbytes) + 112
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ByteBudgetCache:
+    """Thread-safe cache bounded by estimated bytes, with hit / miss / eviction stats."""
+
+    POLICIES = ("lru", "cost")
+
+    def __init__(self, max_bytes: int, name: str = "cache", policy: str = "lru"):
+        if policy not in self.POLICIES:
+            raise ValueError(f"cache policy must be one of {self.POLICIES}, got {policy!r}")
+        self.name = name
+        self.policy = policy
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._costs: Dict[Hashable, float] = {}
+        self._priority: Dict[Hashable, float] = {}
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._seq = itertools.count()
+        self._inflation = 0.0
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if self.policy == "cost":
+                self._touch(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Lookup without touching LRU order or stats."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        nbytes: Optional[int] = None,
+        cost: Optional[float] = None,
+    ) -> None:
+        """Insert / replace. cost: rebuild cost (any unit, e.g. seconds) for policy="cost"."""
+        size = estimate_nbytes(value) if nbytes is None else int(nbytes)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.bytes += size
+            if self.policy == "cost":
+                self._costs[key] = 1.0 if cost is None else float(cost)
+                self._touch(key)
+            while self.bytes > self.max_bytes and self._entries:
+                self._remove(self._victim())
+                self.evictions += 1
+
+    def _touch(self, key: Hashable) -> None:
+        priority = self._inflation + self._costs[key] / max(self._sizes[key], 1)
+        if self._priority.get(key) == priority:
+            return  # its heap entry is still current
+        self._priority[key] = priority
+        heapq.heappush(self._heap, (priority, next(self._seq), key))
+        if len(self._heap) > 2 * len(self._priority) + 16:
+            self._compact_heap()
+
+    def _compact_heap(self) -> None:
+        """Drop stale heap entries (superseded priorities, removed keys)."""
+        live: Dict[Hashable, Tuple[float, int, Hashable]] = {}
+        for item in self._heap:
+            priority, seq, key = item
+            if self._priority.get(key) == priority and (key not in live or seq < live[key][1]):
+                live[key] = item
+        self._heap = list(live.values())
+        heapq.heapify(self._heap)
+
+    def _victim(self) -> Hashable:
+        if self.policy == "lru":
+            return next(iter(self._entries))
+        while True:
+            priority, _, key = heapq.heappop(self._heap)
+            if self._priority.get(key) == priority:
+                self._inflation = priority
+                return key
+
+    def _remove(self, key: Hashable) -> None:
+        del self._entries[key]
+        self.bytes -= self._sizes.pop(key)
+        self._costs.pop(key, None)
+        self._priority.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._costs.clear()
+            self._priority.clear()
+            self._heap.clear()
+            self._inflation = 0.0
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "policy": self.policy,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CacheRegistry:
+    """Named byte-budgeted caches; one place for budgets, clearing and stats."""
+
+    def __init__(self, policy: str = "lru"):
+        self.policy = policy
+        self._caches: Dict[str, ByteBudgetCache] = {}
+
+    def create(
+        self, name: str, max_bytes: int, policy: Optional[str] = None
+    ) -> ByteBudgetCache:
+        cache = ByteBudgetCache(max_bytes, name=name, policy=policy or self.policy)
+        self._caches[name] = cache
+        return cache
+
+    def __getitem__(self, name: str) -> ByteBudgetCache:
+        return self._caches[name]
+
+    def clear(self) -> None:
+        for cache in self._caches.values():
+            cache.clear()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {name: cache.stats() for name, cache in self._caches.items()}
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error", "owner")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.owner = threading.get_ident()
+
+
+class SingleFlight:
+    """One computation per key at a time; concurrent callers wait and share its result.
+
+    ``do`` runs one key; ``lead`` / ``finish`` / ``wait`` let a batch lead many
+    keys at once. A call from the thread already leading a key computes directly
+    instead of waiting on itself.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        led, waiting = self.lead([key])
+        if key in waiting:
+            return self.wait(waiting[key])
+        if not led:  # nested under this thread's own flight
+            return fn()
+        try:
+            value = fn()
+        except BaseException as exc:
+            self.finish(key, error=exc)
+            raise
+        self.finish(key, value)
+        return value
+
+    def lead(
+        self, keys: Iterable[Hashable]
+    ) -> Tuple[List[Hashable], Dict[Hashable, _Flight]]:
+        """Claim keys not in flight; returns (claimed keys, flights to wait on).
+
+        Keys this thread already leads are in neither. Every claimed key must be
+        released with finish(); wait on the others only after that.
+        """
+        led: List[Hashable] = []
+        waiting: Dict[Hashable, _Flight] = {}
+        me = threading.get_ident()
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                flight = self._flights.get(key)
+                if flight is None:
+                    self._flights[key] = _Flight()
+                    self.leaders += 1
+                    led.append(key)
+                elif flight.owner != me:
+                    self.shared += 1
+                    waiting[key] = flight
+        return led, waiting
+
+    def finish(
+        self, key: Hashable, value: Any = None, error: Optional[BaseException] = None
+    ) -> None:
+        """Publish a claimed key's result (or error) to its waiters."""
+        with self._lock:
+            flight = self._flights.pop(key)
+        flight.value, flight.error = value, error
+        flight.done.set()
+
+    @staticmethod
+    def wait(flight: _Flight) -> Any:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def stats(self) -> Dict[str, int]:
+        return {"leaders": self.leaders, "shared": self.shared}
@@ -0,0 +1,306 @@
+"""Offline passage index: pre-split, pre-tokenized passages in memory-mapped shards.
+
+A RAG corpus is prepared once (sentence split, 0.5B prompt pieces, 7B sentence
+ids and counts) and written as shards of flat ``.npy`` arrays plus ragged
+offsets. At request time ``CorpusIndex.passage`` returns read-only memmap views,
+so prompt rows for ``compress_passages`` are assembled by slicing instead of
+splitting and tokenizing text again.
+
+Layout of ``<index>/``::
+
+    manifest.json            format version, tokenizer fingerprints, split config
+    shard-00000/ids.json     passage ids in shard order
+    shard-00000/*.npy        arrays below (N passages, S sentences in the shard)
+
+Per-passage strings (text, remainder, lead, first / last pre-token) live in one
+UTF-8 blob ``strings.npy`` with ``string_offsets`` [5N + 1].
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from prep.fingerprint import tokenizer_fingerprint
+from prep.prompt import PROMPT_HEAD
+
+CORPUS_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+# Passages of one request are joined with this string (mirrors the head's
+# trailing space, so the next passage's lead usually lines up with it).
+PASSAGE_SEPARATOR = " "
+
+_STRING_FIELDS = ("text", "remainder", "lead", "first_pretoken", "last_pretoken")
+_FLAG_ALIGNED = 1
+
+
+def _ragged(parts: List[np.ndarray], dtype) -> Tuple[np.ndarray, np.ndarray]:
+    lengths = np.fromiter((len(p) for p in parts), dtype=np.int64, count=len(parts))
+    offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    flat = np.concatenate(parts).astype(dtype, copy=False) if parts else np.zeros(0, dtype)
+    return flat, offsets
+
+
+class CorpusShardWriter:
+    """Collect prepared passages and write them as one shard directory."""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self._strings: List[str] = []
+        self._spans: List[np.ndarray] = []
+        self._budget_tokens: List[np.ndarray] = []
+        self._attn_tokens: List[np.ndarray] = []
+        self._budget_ids: List[np.ndarray] = []
+        self._head_ids: List[np.ndarray] = []
+        self._context_ids: List[np.ndarray] = []
+        self._sent_first: List[np.ndarray] = []
+        self._sent_last: List[np.ndarray] = []
+        self._context_first: List[int] = []
+        self._flags: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(
+        self,
+        passage_id: str,
+        text: str,
+        entry: dict,
+        budget_ids: Sequence[Sequence[int]],
+    ) -> None:
+        """entry: ``prep.entry.build_context_entry`` output (verbatim spans required)."""
+        spans = entry["sent_spans"]
+        if spans is None:
+            raise ValueError(f"passage {passage_id!r}: sentences are not verbatim slices")
+        empty = np.zeros(0, dtype=np.int32)
+        aligned = entry["aligned"]
+        self.ids.append(str(passage_id))
+        self._spans.append(np.asarray(spans, dtype=np.int32).reshape(-1, 2))
+        self._budget_tokens.append(np.asarray(entry["budget_tokens"], dtype=np.int32))
+        attn = entry["attn_tokens"]
+        self._attn_tokens.append(
+            np.asarray(attn if attn is not None else entry["budget_tokens"], dtype=np.int32)
+        )
+        self._budget_ids.append(
+            np.fromiter((t for ids in budget_ids for t in ids), dtype=np.int32)
+        )
+        if aligned is None:
+            self._strings.extend([text, "", "", "", ""])
+            self._head_ids.append(empty)
+            self._context_ids.append(empty)
+            self._sent_first.append(np.zeros(len(spans), dtype=np.int32))
+            self._sent_last.append(np.zeros(len(spans), dtype=np.int32))
+            self._context_first.append(0)
+            self._flags.append(0)
+            return
+        self._strings.append(text)
+        self._strings.extend(aligned[name] for name in _STRING_FIELDS[1:])
+        self._head_ids.append(np.asarray(aligned["head_ids"], dtype=np.int32))
+        self._context_ids.append(np.asarray(aligned["context_ids"], dtype=np.int32))
+        self._sent_first.append(np.asarray(aligned["sent_first"], dtype=np.int32))
+        self._sent_last.append(np.asarray(aligned["sent_last"], dtype=np.int32))
+        self._context_first.append(int(aligned["context_first"]))
+        self._flags.append(_FLAG_ALIGNED)
+
+    def write(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        encoded = [s.encode("utf-8", "surrogatepass") for s in self._strings]
+        blob, string_offsets = _ragged(
+            [np.frombuffer(b, dtype=np.uint8) for b in encoded], np.uint8
+        )
+        spans, sent_offsets = _ragged(self._spans, np.int32)
+        budget_ids, budget_id_offsets = _ragged(self._budget_ids, np.int32)
+        head_ids, head_offsets = _ragged(self._head_ids, np.int32)
+        context_ids, context_offsets = _ragged(self._context_ids, np.int32)
+        arrays = {
+            "strings": blob,
+            "string_offsets": string_offsets,
+            "sent_spans": spans.reshape(-1, 2),
+            "sent_offsets": sent_offsets,
+            "budget_tokens": np.concatenate(self._budget_tokens or [np.zeros(0, np.int32)]),
+            "attn_tokens": np.concatenate(self._attn_tokens or [np.zeros(0, np.int32)]),
+            "sent_first": np.concatenate(self._sent_first or [np.zeros(0, np.int32)]),
+            "sent_last": np.concatenate(self._sent_last or [np.zeros(0, np.int32)]),
+            "budget_ids": budget_ids,
+            "budget_id_offsets": budget_id_offsets,
+            "head_ids": head_ids,
+            "head_offsets": head_offsets,
+            "context_ids": context_ids,
+            "context_offsets": context_offsets,
+            "context_first": np.asarray(self._context_first, dtype=np.int32),
+            "flags": np.asarray(self._flags, dtype=np.uint8),
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), array)
+        with open(os.path.join(path, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump(self.ids, f, ensure_ascii=False)
+
+
+class _Shard:
+    def __init__(self, path: str):
+        self.path = path
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        array = self._arrays.get(name)
+        if array is None:
+            array = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+            self._arrays[name] = array
+        return array
+
+    def string(self, local: int, field: int) -> str:
+        offsets = self["string_offsets"]
+        k = local * len(_STRING_FIELDS) + field
+        return bytes(self["strings"][offsets[k] : offsets[k + 1]]).decode(
+            "utf-8", "surrogatepass"
+        )
+
+
+class CorpusIndex:
+    """Read side of a passage index; arrays are memory-mapped lazily per shard."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_NAME), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        version = self.manifest.get("version")
+        if version != CORPUS_FORMAT_VERSION:
+            raise ValueError(
+                f"corpus index version {version!r} != supported {CORPUS_FORMAT_VERSION}"
+            )
+        self.context_type: str = self.manifest["context_type"]
+        self._shards = [_Shard(os.path.join(path, name)) for name in self.manifest["shards"]]
+        self._locations: Dict[str, Tuple[int, int]] = {}
+        for shard_idx, shard in enumerate(self._shards):
+            with open(os.path.join(shard.path, "ids.json"), encoding="utf-8") as f:
+                for local, passage_id in enumerate(json.load(f)):
+                    self._locations[passage_id] = (shard_idx, local)
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def __contains__(self, passage_id: str) -> bool:
+        return str(passage_id) in self._locations
+
+    def passage(self, passage_id: str) -> dict:
+        """Text, sentence spans / counts / 7B ids and aligned prompt pieces (views)."""
+        location = self._locations.get(str(passage_id))
+        if location is None:
+            raise KeyError(f"passage {passage_id!r} not in corpus index {self.path}")
+        shard = self._shards[location[0]]
+        i = location[1]
+        s0, s1 = shard["sent_offsets"][i : i + 2]
+        b0, b1 = shard["budget_id_offsets"][i : i + 2]
+        out = {
+            "id": str(passage_id),
+            "text": shard.string(i, 0),
+            "sent_spans": shard["sent_spans"][s0:s1],
+            "budget_tokens": shard["budget_tokens"][s0:s1],
+            "attn_tokens": shard["attn_tokens"][s0:s1],
+            "budget_ids": shard["budget_ids"][b0:b1],
+            "aligned": None,
+        }
+        if shard["flags"][i] & _FLAG_ALIGNED:
+            h0, h1 = shard["head_offsets"][i : i + 2]
+            c0, c1 = shard["context_offsets"][i : i + 2]
+            aligned = {
+                "head_ids": shard["head_ids"][h0:h1],
+                "context_ids": shard["context_ids"][c0:c1],
+                "sent_first": shard["sent_first"][s0:s1],
+                "sent_last": shard["sent_last"][s0:s1],
+                "context_first": int(shard["context_first"][i]),
+            }
+            for field, name in enumerate(_STRING_FIELDS[1:], start=1):
+                aligned[name] = shard.string(i, field)
+            out["aligned"] = aligned
+        return out
+
+
+def _batched(records: Iterable[Tuple[str, str]], size: int) -> Iterator[List[Tuple[str, str]]]:
+    batch: List[Tuple[str, str]] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def build_corpus_index(
+    records: Iterable[Tuple[str, str]],
+    path: str,
+    prep,
+    context_type: str = "english",
+    shard_size: int = 50000,
+    batch_size: int = 256,
+    manifest_extra: Optional[dict] = None,
+    progress: Optional[Callable[[int], None]] = None,
+) -> dict:
+    """Prepare ``(passage_id, text)`` records into an index directory; returns the manifest.
+
+    prep: a ``prep.worker.SamplePrep`` built with ``use_sentence_aligned_prep=True``
+    (splitter, 0.5B / 7B tokenizers and aligned tokenizer of the target compressor).
+    """
+    os.makedirs(path, exist_ok=True)
+    shards: List[str] = []
+    seen = set()
+    writer = CorpusShardWriter()
+    total = skipped = 0
+
+    def _flush() -> None:
+        nonlocal writer
+        if len(writer):
+            name = f"shard-{len(shards):05d}"
+            writer.write(os.path.join(path, name))
+            shards.append(name)
+            writer = CorpusShardWriter()
+
+    for batch in _batched(records, batch_size):
+        batch = [(str(pid), text) for pid, text in batch if str(pid) not in seen and text]
+        seen.update(pid for pid, _ in batch)
+        texts = [text for _, text in batch]
+        split = prep.split_batch(texts, context_type)
+        flat = [sent for sentences in split for sent in sentences]
+        flat_ids = (
+            prep.budget_tokenizer(flat, add_special_tokens=False)["input_ids"] if flat else []
+        )
+        pos = 0
+        for (passage_id, text), sentences in zip(batch, split):
+            budget_ids = flat_ids[pos : pos + len(sentences)]
+            pos += len(sentences)
+            entry = prep.build_entry(
+                text, sentences, sentence_tokens=[len(ids) for ids in budget_ids]
+            )
+            if entry["sent_spans"] is None:
+                skipped += 1
+                continue
+            writer.add(passage_id, text, entry, budget_ids)
+            total += 1
+            if len(writer) >= shard_size:
+                _flush()
+        if progress is not None:
+            progress(total)
+    _flush()
+
+    manifest = {
+        "version": CORPUS_FORMAT_VERSION,
+        "context_type": context_type,
+        "num_passages": total,
+        "skipped_passages": skipped,
+        "shards": shards,
+        "prompt_head": PROMPT_HEAD,
+        "passage_separator": PASSAGE_SEPARATOR,
+        "attention_tokenizer": tokenizer_fingerprint(prep.tokenizer),
+        "budget_tokenizer": tokenizer_fingerprint(prep.budget_tokenizer),
+        "min_word_length": prep.min_word_length,
+    }
+    manifest.update(manifest_extra or {})
+    with open(os.path.join(path, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
@@ -0,0 +1,151 @@
+"""Exact and near-duplicate sentence detection (MinHash + LSH), vectorized.
+
+``duplicate_groups`` maps every sentence to the index of its canonical copy
+(the first occurrence). Exact duplicates compare normalized text (case-folded,
+whitespace collapsed). Near duplicates hash character k-shingles with a rolling
+polynomial over code points, take ``num_perm`` multiply-shift MinHash values per
+sentence (``np.minimum.reduceat`` over the shingles of each sentence), bucket
+signatures by LSH bands and confirm candidates on the MinHash Jaccard estimate.
+"""
+
+from __future__ import annotations
+
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+_BASE = np.uint64(1000003)
+_PERM_BLOCK = 16
+_EMPTY = np.zeros(0, dtype=np.uint64)
+
+
+def normalize_sentence(sentence: str) -> str:
+    return " ".join(sentence.casefold().split())
+
+
+def exact_duplicates(normalized: Sequence[str]) -> np.ndarray:
+    """canonical[i]: first index with the same normalized text (empty text stays unique)."""
+    canonical = np.arange(len(normalized))
+    first = {}
+    for i, key in enumerate(normalized):
+        if key:
+            canonical[i] = first.setdefault(key, i)
+    return canonical
+
+
+def shingle_hashes(texts: Sequence[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(hash uint64 [M], owner int64 [M]) of char k-shingles inside each text."""
+    n = len(texts)
+    if n == 0:
+        return _EMPTY, np.zeros(0, dtype=np.int64)
+    joined = "\x00".join(texts)
+    cp = np.frombuffer(joined.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    if len(cp) < k:
+        return _EMPTY, np.zeros(0, dtype=np.int64)
+    powers = _BASE ** np.arange(k - 1, -1, -1, dtype=np.uint64)
+    hashes = (sliding_window_view(cp.astype(np.uint64), k) * powers).sum(
+        axis=1, dtype=np.uint64
+    )
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=n)
+    starts = np.zeros(n, dtype=np.int64)
+    np.cumsum(lengths[:-1] + 1, out=starts[1:])
+    pos = np.arange(len(hashes))
+    owner = np.searchsorted(starts, pos, side="right") - 1
+    inside = pos + k <= starts[owner] + lengths[owner]
+    return hashes[inside], owner[inside]
+
+
+def minhash_signatures(
+    hashes: np.ndarray, owner: np.ndarray, num_perm: int, seed: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(signatures uint32 [num_perm, N'], sentence index [N']) for owners with shingles."""
+    if len(hashes) == 0:
+        return np.zeros((num_perm, 0), dtype=np.uint32), np.zeros(0, dtype=np.int64)
+    seg = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+    sig = np.empty((num_perm, len(seg)), dtype=np.uint32)
+    for p0 in range(0, num_perm, _PERM_BLOCK):
+        p1 = min(p0 + _PERM_BLOCK, num_perm)
+        values = (a[p0:p1, None] * hashes[None, :] + b[p0:p1, None]) >> np.uint64(32)
+        sig[p0:p1] = np.minimum.reduceat(values, seg, axis=1)
+    return sig, owner[seg]
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def near_duplicates(
+    normalized: Sequence[str],
+    threshold: float = 0.8,
+    num_perm: int = 64,
+    bands: int = 16,
+    shingle: int = 5,
+    seed: int = 1,
+) -> np.ndarray:
+    """canonical[i] for near-duplicate groups (estimated Jaccard >= threshold)."""
+    n = len(normalized)
+    canonical = np.arange(n)
+    sig, members = minhash_signatures(
+        *shingle_hashes(normalized, shingle), num_perm=num_perm, seed=seed
+    )
+    if len(members) < 2:
+        return canonical
+    rows = num_perm // bands
+    mix = np.random.default_rng(seed + 1).integers(
+        1, 2**63, size=rows, dtype=np.uint64
+    ) | np.uint64(1)
+    cand_a: List[np.ndarray] = []
+    cand_b: List[np.ndarray] = []
+    for band in range(bands):
+        block = sig[band * rows : (band + 1) * rows].astype(np.uint64)
+        keys = (block * mix[:, None]).sum(axis=0, dtype=np.uint64)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]
+        head = order[np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))]
+        dup = ~starts
+        cand_a.append(head[dup])
+        cand_b.append(order[dup])
+    a = np.concatenate(cand_a)
+    b = np.concatenate(cand_b)
+    if len(a) == 0:
+        return canonical
+    pairs = np.unique(np.stack([np.minimum(a, b), np.maximum(a, b)], axis=1), axis=0)
+    similarity = (sig[:, pairs[:, 0]] == sig[:, pairs[:, 1]]).mean(axis=0)
+    pairs = members[pairs[similarity >= threshold]]
+    parent = list(range(n))
+    for i, j in pairs.tolist():
+        ri, rj = _find(parent, i), _find(parent, j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    return np.asarray([_find(parent, i) for i in range(n)], dtype=np.int64)
+
+
+def duplicate_groups(
+    sentences: Sequence[str],
+    near: bool = True,
+    threshold: float = 0.8,
+    num_perm: int = 64,
+    bands: int = 16,
+    shingle: int = 5,
+) -> np.ndarray:
+    """canonical[i] == i for sentences kept in the prompt, else the copy that is kept."""
+    normalized = [normalize_sentence(s) for s in sentences]
+    canonical = exact_duplicates(normalized)
+    if not near:
+        return canonical
+    unique = np.flatnonzero(canonical == np.arange(len(canonical)))
+    near_canonical = near_duplicates(
+        [normalized[i] for i in unique.tolist()], threshold, num_perm, bands, shingle
+    )
+    # Re-root every exact group on its near-duplicate representative.
+    root = np.arange(len(canonical))
+    root[unique] = unique[near_canonical]
+    return root[canonical]
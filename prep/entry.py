@@ -0,0 +1,70 @@
+"""Per-document prep entry (split spans, token counts, aligned ids)."""
+
+from __future__ import annotations
+
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from prep.aligned_prompt import SentenceAlignedTokenizer, locate_sentence_spans
+
+CountFn = Callable[[List[str]], List[int]]
+
+
+def build_context_entry(
+    context: str,
+    sentences: List[str],
+    count_budget: CountFn,
+    count_attention: Optional[CountFn],
+    shared_tokenizer: bool,
+    aligned_tokenizer: Optional[SentenceAlignedTokenizer] = None,
+    sentence_tokens: Optional[List[int]] = None,
+) -> dict:
+    """Spans, budget / 0.5B counts and aligned ids for an already split document.
+
+    count_attention: 0.5B counter for the chunk gate; None skips gate counts.
+    shared_tokenizer: budget and 0.5B tokenizers are identical, so one encode
+    (taken from the aligned pieces when available) serves both counts.
+    """
+    spans = locate_sentence_spans(context, sentences) if sentences else None
+    verbatim = spans is not None and np.array_equal(
+        spans[:, 1] - spans[:, 0],
+        np.fromiter(map(len, sentences), dtype=np.int64, count=len(sentences)),
+    )
+    aligned = (
+        aligned_tokenizer.prepare_context(
+            context,
+            sentences,
+            spans,
+            count_sentences=shared_tokenizer and sentence_tokens is None,
+        )
+        if aligned_tokenizer is not None and spans is not None
+        else None
+    )
+    lengths = aligned.pop("sentence_lengths") if aligned is not None else None
+    if sentence_tokens is not None:
+        budget_tokens = np.asarray(sentence_tokens, dtype=np.int32)
+    elif lengths is not None:
+        # Same tokenizer: sentence lengths came with the aligned pieces encode.
+        budget_tokens = lengths
+    else:
+        budget_tokens = np.asarray(count_budget(sentences), dtype=np.int32)
+    if count_attention is None:
+        attn_tokens = None
+    elif shared_tokenizer:
+        attn_tokens = budget_tokens
+    else:
+        attn_tokens = np.asarray(count_attention(sentences), dtype=np.int32)
+    return {
+        "sent_spans": spans.astype(np.int32) if verbatim else None,
+        "sentences": None if verbatim else list(sentences),
+        "budget_tokens": budget_tokens,
+        "attn_tokens": attn_tokens,
+        "aligned": aligned,
+    }
+
+
+def entry_sentences(context: str, entry: dict) -> List[str]:
+    if entry["sentences"] is not None:
+        return list(entry["sentences"])
+    return [context[start:end] for start, end in entry["sent_spans"].tolist()]
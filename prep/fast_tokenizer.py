@@ -0,0 +1,95 @@
+"""Torch-free tokenizer for prep workers: ``tokenizers.Tokenizer`` behind the HF call API.
+
+``transformers`` imports torch, which every spawned prep worker would then pay
+for in import time and RSS. ``FastTokenizer`` loads the same ``tokenizer.json``
+with ``tokenizers`` alone and answers the subset of the
+``PreTrainedTokenizerFast`` interface the prep code uses: ``__call__`` (ids,
+offsets, lengths, truncation), ``encode`` and ``backend_tokenizer``.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Optional, Union
+
+from tokenizers import Tokenizer
+
+
+class FastTokenizer:
+    """Minimal PreTrainedTokenizerFast stand-in over a ``tokenizers.Tokenizer``."""
+
+    def __init__(self, tokenizer: Tokenizer):
+        self.backend_tokenizer = tokenizer
+        self._truncating: Dict[int, Tokenizer] = {}
+
+    def _backend(self, truncation: bool, max_length: Optional[int]) -> Tokenizer:
+        if not truncation or max_length is None:
+            return self.backend_tokenizer
+        backend = self._truncating.get(max_length)
+        if backend is None:
+            backend = Tokenizer.from_str(self.backend_tokenizer.to_str())
+            backend.enable_truncation(max_length)
+            self._truncating[max_length] = backend
+        return backend
+
+    def __call__(
+        self,
+        text: Union[str, List[str]],
+        add_special_tokens: bool = True,
+        padding: bool = False,
+        truncation: bool = False,
+        max_length: Optional[int] = None,
+        return_offsets_mapping: bool = False,
+        return_length: bool = False,
+    ) -> Dict[str, list]:
+        if padding:
+            raise ValueError("FastTokenizer does not pad")
+        backend = self._backend(truncation, max_length)
+        batched = not isinstance(text, str)
+        encodings = backend.encode_batch(
+            list(text) if batched else [text], add_special_tokens=add_special_tokens
+        )
+        out: Dict[str, list] = {"input_ids": [e.ids for e in encodings]}
+        if return_offsets_mapping:
+            out["offset_mapping"] = [e.offsets for e in encodings]
+        if return_length:
+            out["length"] = [len(e.ids) for e in encodings]
+        if not batched:
+            out = {key: value[0] for key, value in out.items()}
+        return out
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        return self.backend_tokenizer.encode(text, add_special_tokens=add_special_tokens).ids
+
+
+def tokenizer_json(tokenizer) -> Optional[str]:
+    """Serialized pipeline of a loaded fast tokenizer (what the parent actually uses)."""
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    return backend.to_str() if backend is not None else None
+
+
+def load_prep_tokenizer(path: str, serialized: Optional[str] = None):
+    """FastTokenizer from ``serialized`` (see tokenizer_json), else ``path``/tokenizer.json
+    (local dir or hub id).
+
+    transformers may rebuild a tokenizer's pipeline from its class rather than
+    tokenizer.json, so callers holding the loaded tokenizer should pass its
+    serialized form. Falls back to AutoTokenizer (and so torch) only when
+    neither is available, e.g. slow-only tokenizers.
+    """
+    if serialized is not None:
+        return FastTokenizer(Tokenizer.from_str(serialized))
+    if os.path.isdir(path):
+        file = os.path.join(path, "tokenizer.json")
+        if os.path.isfile(file):
+            return FastTokenizer(Tokenizer.from_file(file))
+    else:
+        try:
+            from huggingface_hub import hf_hub_download
+
+            return FastTokenizer(Tokenizer.from_file(hf_hub_download(path, "tokenizer.json")))
+        except Exception:
+            pass
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(path, use_fast=True)
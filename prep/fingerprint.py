@@ -0,0 +1,25 @@
+"""Tokenizer equivalence by content hash (normalizer, pre-tokenizer, vocab, merges)."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Optional
+
+
+def tokenizer_fingerprint(tokenizer) -> Optional[str]:
+    """Hash of the fast tokenizer pipeline + added tokens; None for slow tokenizers.
+
+    Two tokenizers with equal fingerprints produce identical ids for any text
+    (e.g. Qwen2.5 0.5B and 7B share one vocabulary).
+    """
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is None:
+        return None
+    spec = json.loads(backend.to_str())
+    payload = {key: spec.get(key) for key in ("normalizer", "pre_tokenizer", "model")}
+    payload["added_tokens"] = sorted(
+        (tok["id"], tok["content"]) for tok in spec.get("added_tokens") or []
+    )
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
@@ -0,0 +1,66 @@
+"""Per-sentence marker masks for context-type score rules and join separators.
+
+One ``str.find`` sweep per marker over the NUL-joined sentences replaces the
+per-sentence ``any(marker in sent ...)`` scans; hits map back to sentences with
+``searchsorted`` over the join offsets. Markers never contain NUL, so a hit
+cannot straddle two sentences.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+FEWSHOT_MARKERS: Tuple[str, ...] = ('Passage:', 'Question:', 'Answer:')
+CHINESE_MARKERS: Tuple[str, ...] = ('新闻内容', '类别')
+MANDATORY_CHINESE_MARKERS: Tuple[str, ...] = ('新闻内容：', '类别：')
+SECTION_MARKERS: Tuple[str, ...] = ('新闻内容：',)
+
+MARKER_GROUPS: Dict[str, Tuple[str, ...]] = {
+    "fewshot": FEWSHOT_MARKERS,
+    "chinese": CHINESE_MARKERS,
+    "mandatory": MANDATORY_CHINESE_MARKERS,
+    "section": SECTION_MARKERS,
+}
+
+_JOIN = "\x00"
+
+
+def joined_sentences(sentences: Sequence[str]) -> str:
+    return _JOIN.join(sentences)
+
+
+def marker_mask(
+    sentences: Sequence[str], markers: Sequence[str], joined: Optional[str] = None
+) -> np.ndarray:
+    """Bool [S]: sentence contains any of ``markers``."""
+    n = len(sentences)
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+    if joined is None:
+        joined = joined_sentences(sentences)
+    hits = []
+    for marker in markers:
+        pos = joined.find(marker)
+        while pos >= 0:
+            hits.append(pos)
+            pos = joined.find(marker, pos + len(marker))
+    if hits:
+        lengths = np.fromiter(map(len, sentences), dtype=np.int64, count=n)
+        starts = np.concatenate([[0], np.cumsum(lengths[:-1] + 1)])
+        mask[np.searchsorted(starts, hits, side="right") - 1] = True
+    return mask
+
+
+def sentence_marker_masks(
+    sentences: Sequence[str], joined: Optional[str] = None
+) -> Dict[str, np.ndarray]:
+    """All ``MARKER_GROUPS`` masks for one sentence list."""
+    if joined is None:
+        joined = joined_sentences(sentences)
+    return {
+        name: marker_mask(sentences, markers, joined)
+        for name, markers in MARKER_GROUPS.items()
+    }
@@ -0,0 +1,201 @@
+"""Bounded prep -> forward -> finalize pipeline with per-stage utilization stats.
+
+``run_pipeline`` runs ``prep`` on worker threads, ``forward`` on the calling
+thread (the device stays single-threaded) and ``finalize`` on worker threads, or
+inline after each forward when ``finalize_workers`` is 0. Queues between stages
+hold at most ``queue_depth`` items, so prep cannot run far ahead of the device.
+The first exception from any stage stops the pipeline and is re-raised.
+
+Stats per stage: items, busy / wait seconds, utilization (busy over wall time x
+workers) and the depth of the stage's input queue each time it takes an item.
+Forward ``wait_s`` is device idle time spent waiting for prep; prep ``wait_s``
+is time blocked on a full queue.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from queue import Empty, Full, Queue
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+_POLL_S = 0.05
+_DONE = object()
+
+
+class StageStats:
+    """Counters of one stage (thread-safe)."""
+
+    def __init__(self, name: str, workers: int, has_queue: bool = True):
+        self.name = name
+        self.workers = workers
+        self.has_queue = has_queue
+        self.items = 0
+        self.busy = 0.0
+        self.wait = 0.0
+        self._depth_sum = 0
+        self._depth_max = 0
+        self._lock = threading.Lock()
+
+    def record(self, busy: float, wait: float = 0.0, depth: Optional[int] = None) -> None:
+        with self._lock:
+            self.items += 1
+            self.busy += busy
+            self.wait += wait
+            if depth is not None:
+                self._depth_sum += depth
+                self._depth_max = max(self._depth_max, depth)
+
+    def summary(self, wall: float) -> Dict[str, Any]:
+        capacity = wall * max(self.workers, 1)
+        return {
+            "workers": self.workers,
+            "items": self.items,
+            "busy_s": self.busy,
+            "wait_s": self.wait,
+            "utilization": self.busy / capacity if capacity > 0 else 0.0,
+            "queue_depth_mean": (
+                self._depth_sum / self.items if self.has_queue and self.items else None
+            ),
+            "queue_depth_max": self._depth_max if self.has_queue else None,
+        }
+
+
+class PipelineStats:
+    """Stage counters accumulated over one or more ``run_pipeline`` calls."""
+
+    def __init__(self, prep_workers: int, finalize_workers: int):
+        self.stages = {
+            "prep": StageStats("prep", prep_workers, has_queue=False),
+            "forward": StageStats("forward", 1),
+            "finalize": StageStats(
+                "finalize", finalize_workers, has_queue=finalize_workers > 0
+            ),
+        }
+        self.items = 0
+        self.wall = 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "items": self.items,
+            "wall_s": self.wall,
+            "stages": {name: stage.summary(self.wall) for name, stage in self.stages.items()},
+        }
+
+
+def run_pipeline(
+    items: Sequence[Any],
+    prep: Callable[[Any], Any],
+    forward: Callable[[Any], Any],
+    finalize: Callable[[Any, Any], Any],
+    prep_workers: int = 1,
+    finalize_workers: int = 0,
+    queue_depth: int = 2,
+    stats: Optional[PipelineStats] = None,
+) -> Tuple[List[Any], PipelineStats]:
+    """results[i] = finalize(prepped, forward(prepped)) with prepped = prep(items[i]).
+
+    stats: counters to add this run to (new ones when None).
+    """
+    n = len(items)
+    if stats is None:
+        stats = PipelineStats(prep_workers, finalize_workers)
+    stages = stats.stages
+    prep_workers = max(1, min(prep_workers, n))
+    results: List[Any] = [None] * n
+    prep_q: Queue = Queue(maxsize=max(1, queue_depth))
+    final_q: Queue = Queue(maxsize=max(1, queue_depth))
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    feed = iter(enumerate(items))
+    feed_lock = threading.Lock()
+
+    def _fail(exc: BaseException) -> None:
+        errors.append(exc)
+        stop.set()
+
+    def _put(q: Queue, value: Any) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(value, timeout=_POLL_S)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _get(q: Queue) -> Tuple[Any, int]:
+        while not stop.is_set():
+            depth = q.qsize()
+            try:
+                return q.get(timeout=_POLL_S), depth
+            except Empty:
+                continue
+        return _DONE, 0
+
+    def _prep_loop() -> None:
+        while not stop.is_set():
+            with feed_lock:
+                nxt = next(feed, None)
+            if nxt is None:
+                return
+            idx, item = nxt
+            t0 = time.perf_counter()
+            try:
+                value = prep(item)
+            except BaseException as exc:
+                _fail(exc)
+                return
+            t1 = time.perf_counter()
+            if not _put(prep_q, (idx, value)):
+                return
+            stages["prep"].record(t1 - t0, wait=time.perf_counter() - t1)
+
+    def _finalize_one(idx: int, value: Any, forwarded: Any, wait: float, depth) -> None:
+        t0 = time.perf_counter()
+        results[idx] = finalize(value, forwarded)
+        stages["finalize"].record(time.perf_counter() - t0, wait=wait, depth=depth)
+
+    def _finalize_loop() -> None:
+        while True:
+            t0 = time.perf_counter()
+            got, depth = _get(final_q)
+            if got is _DONE:
+                return
+            try:
+                _finalize_one(*got, wait=time.perf_counter() - t0, depth=depth)
+            except BaseException as exc:
+                _fail(exc)
+                return
+
+    threads = [
+        threading.Thread(target=_prep_loop, daemon=True) for _ in range(prep_workers)
+    ] + [threading.Thread(target=_finalize_loop, daemon=True) for _ in range(finalize_workers)]
+    wall0 = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        for _ in range(n):
+            t0 = time.perf_counter()
+            got, depth = _get(prep_q)
+            if got is _DONE:
+                break
+            idx, value = got
+            t1 = time.perf_counter()
+            forwarded = forward(value)
+            stages["forward"].record(time.perf_counter() - t1, wait=t1 - t0, depth=depth)
+            if finalize_workers:
+                if not _put(final_q, (idx, value, forwarded)):
+                    break
+            else:
+                _finalize_one(idx, value, forwarded, wait=0.0, depth=None)
+        for _ in range(finalize_workers):
+            _put(final_q, _DONE)
+    except BaseException as exc:
+        _fail(exc)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    stats.items += n
+    stats.wall += time.perf_counter() - wall0
+    return results, stats
@@ -0,0 +1,17 @@
+"""Filtering prompt template shared by the compressor and prep workers."""
+
+PROMPT_HEAD = "Given the following information: "
+
+# Headroom (tokens) kept free when sizing the context for one forward.
+PROMPT_TOKEN_MARGIN = 10
+
+
+def filtering_prompt_tail(question: str) -> str:
+    return (
+        f"\nAnswer the following question based on the given information with one or few words: {question}\n"
+        f"Answer:"
+    )
+
+
+def build_filtering_prompt(context: str, question: str) -> str:
+    return PROMPT_HEAD + context + filtering_prompt_tail(question)
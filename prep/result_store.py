@@ -0,0 +1,83 @@
+"""On-disk store for per-request sentence scores, addressed by content hash.
+
+Each entry is one JSON file ``<root>/<hh>/<hex key>.json`` (``hh`` = first two
+hex digits), written to a temp file and renamed into place, so concurrent
+writers and crashes never leave a torn entry. Floats round-trip exactly through
+``json``. Unreadable or foreign-version files count as misses.
+
+Layout of an entry::
+
+    {"version": 1, "scores": [...], "tensor": false, "sentences": [...],
+     "sentence_tokens": [...], "sentence_passages": null | [...]}
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Optional
+
+RESULT_FORMAT_VERSION = 1
+
+
+class ResultStore:
+    """Directory of JSON score entries keyed by ``content_hash`` digests."""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _path(self, key: bytes) -> str:
+        name = key.hex()
+        return os.path.join(self.root, name[:2], name + ".json")
+
+    def get(self, key: bytes) -> Optional[dict]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            value = None
+        if value is not None and value.get("version") != RESULT_FORMAT_VERSION:
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key: bytes, value: dict) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(
+                    dict(value, version=RESULT_FORMAT_VERSION),
+                    f,
+                    ensure_ascii=False,
+                    separators=(",", ":"),
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        with self._lock:
+            self.writes += 1
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "root": self.root,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,322 @@
+"""Batch sentence splitters that return char spans, plus vectorized word counts.
+
+Every splitter maps ``texts`` to one ``[S, 2]`` int64 span array per text. Spans
+tile the text the way ``_sync_sentence`` did: the first sentence starts at 0,
+each sentence runs up to the first non-space char of the next one and the last
+one runs to the end. Whitespace-only segments are dropped.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Callable, Dict, List, Optional, Sequence
+
+import nltk
+import numpy as np
+
+_EMPTY_SPANS = np.zeros((0, 2), dtype=np.int64)
+
+_CJK_FIRST, _CJK_LAST = 0x4E00, 0x9FFF
+_BMP = 0x10000
+_bmp_tables: Optional[tuple] = None
+
+
+def _char_tables() -> tuple:
+    """(isspace, isalpha) lookup over the BMP; astral chars are checked directly."""
+    global _bmp_tables
+    if _bmp_tables is None:
+        chars = [chr(i) for i in range(_BMP)]
+        space = np.fromiter((c.isspace() for c in chars), dtype=bool, count=_BMP)
+        alpha = np.fromiter((c.isalpha() for c in chars), dtype=bool, count=_BMP)
+        _bmp_tables = (space, alpha)
+    return _bmp_tables
+
+
+def _lookup(cp: np.ndarray, table: np.ndarray, predicate) -> np.ndarray:
+    out = table[np.minimum(cp, _BMP - 1)]
+    astral = cp >= _BMP
+    if astral.any():
+        uniq, inverse = np.unique(cp[astral], return_inverse=True)
+        flags = np.fromiter((predicate(chr(c)) for c in uniq.tolist()), dtype=bool)
+        out[astral] = flags[inverse]
+    return out
+
+
+def count_words(texts: Sequence[str]) -> np.ndarray:
+    """Per-text word count: CJK chars + whitespace tokens containing a letter.
+
+    Same result as ``_count_words_multilingual`` applied to each text, computed
+    for the whole batch with codepoint lookups instead of per-char Python loops.
+    """
+    n = len(texts)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    joined = "\n".join(texts)
+    if not joined:
+        return np.zeros(n, dtype=np.int64)
+    cp = np.frombuffer(joined.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=n)
+    owner = np.repeat(np.arange(n), lengths + 1)[: len(cp)]
+
+    space_table, alpha_table = _char_tables()
+    space = _lookup(cp, space_table, str.isspace)
+    alpha = _lookup(cp, alpha_table, str.isalpha)
+    cjk = (cp >= _CJK_FIRST) & (cp <= _CJK_LAST)
+
+    word_start = ~space
+    word_start[1:] &= space[:-1]
+    word_id = np.cumsum(word_start) - 1
+    has_alpha = np.zeros(int(word_start.sum()), dtype=bool)
+    has_alpha[word_id[alpha]] = True
+    word_owner = owner[word_start]
+    return np.bincount(owner[cjk], minlength=n) + np.bincount(
+        word_owner[has_alpha], minlength=n
+    )
+
+
+def tile_spans(text: str, starts: Sequence[int]) -> np.ndarray:
+    """Spans from sentence start offsets: first from 0, last to ``len(text)``."""
+    if not starts:
+        return _EMPTY_SPANS
+    bounds = np.asarray(starts, dtype=np.int64)
+    bounds[0] = 0
+    ends = np.append(bounds[1:], len(text))
+    spans = np.stack([bounds, ends], axis=1)
+    keep = [bool(text[a:b].strip()) for a, b in spans.tolist()]
+    return spans if all(keep) else spans[np.asarray(keep, dtype=bool)]
+
+
+def sync_sentence_spans(sentences: Sequence[str], text: str) -> np.ndarray:
+    """Spans of stripped splitter output re-anchored in text (``_sync_sentence``)."""
+    if not sentences:
+        return _EMPTY_SPANS
+    out: List[tuple] = []
+    seen_text = 0
+    last = len(sentences) - 1
+    for i, s in enumerate(sentences):
+        if not s.strip():
+            continue
+        if i == last:
+            if text[seen_text:].strip():
+                out.append((seen_text, len(text)))
+            break
+        next_sentence = sentences[i + 1]
+        if next_sentence:
+            search_text = next_sentence[: min(10, len(next_sentence))]
+            next_start = text.find(search_text, seen_text + len(s.strip()))
+            if next_start > seen_text:
+                if text[seen_text:next_start].strip():
+                    out.append((seen_text, next_start))
+                seen_text = next_start
+            else:
+                if text[seen_text:].strip():
+                    out.append((seen_text, len(text)))
+                break
+    return np.asarray(out, dtype=np.int64).reshape(-1, 2)
+
+
+class SentenceSplitter:
+    """Batch splitter interface: texts → per-text ``[S, 2]`` char spans."""
+
+    name = "base"
+
+    def split_spans(self, texts: Sequence[str]) -> List[np.ndarray]:
+        raise NotImplementedError
+
+    def split(self, texts: Sequence[str]) -> List[List[str]]:
+        return [
+            [text[a:b] for a, b in spans.tolist()]
+            for text, spans in zip(texts, self.split_spans(texts))
+        ]
+
+
+class PunktSplitter(SentenceSplitter):
+    """``nltk.sent_tokenize`` + re-anchoring (reference English behaviour)."""
+
+    name = "nltk"
+
+    def split_spans(self, texts: Sequence[str]) -> List[np.ndarray]:
+        out = []
+        for text in texts:
+            raw = [s.strip() for s in nltk.sent_tokenize(text) if s.strip()]
+            out.append(sync_sentence_spans(raw, text))
+        return out
+
+
+# Lowercased tokens (without the final period) that do not end a sentence.
+_ENGLISH_ABBREVIATIONS = frozenset(
+    """
+    mr mrs ms dr prof sr jr st mt ft vs etc al cf ca approx dept fig figs eq eqs
+    vol vols pp eds rev gen gov sen rep lt sgt capt cmdr adm inc ltd corp bros
+    jan feb apr jul aug sept oct nov dec tues thurs e.g i.e a.m p.m u.s u.k ph.d
+    """.split()
+)
+
+
+class RegexEnglishSplitter(SentenceSplitter):
+    """Compiled-regex English splitter that emits spans directly (no sync pass).
+
+    Breaks after ``.``, ``!`` or ``?`` (plus closing quotes / brackets) followed
+    by whitespace, except after known abbreviations, single-letter initials,
+    dotted acronyms and an ellipsis followed by lowercase, roughly matching
+    punkt's decisions on prose.
+    """
+
+    name = "regex"
+    _candidate = re.compile(r"([.!?]+)[\"'”’)\]]*\s+(?=\S)")
+    _acronym = re.compile(r"(?:[A-Za-z]\.)+[A-Za-z]")
+
+    def __init__(self, abbreviations: Optional[Sequence[str]] = None):
+        self.abbreviations = (
+            frozenset(a.lower().rstrip(".") for a in abbreviations)
+            if abbreviations is not None
+            else _ENGLISH_ABBREVIATIONS
+        )
+
+    def _is_break(self, text: str, match: "re.Match") -> bool:
+        punct = match.group(1)
+        nxt = text[match.end()]
+        if punct.startswith(".."):
+            return not nxt.islower()
+        if punct != ".":
+            return True
+        word_start = match.start()
+        while word_start > 0 and not text[word_start - 1].isspace():
+            word_start -= 1
+        word = text[word_start : match.start()].lstrip("\"'“‘([{")
+        if not word:
+            return True
+        if len(word) == 1 and word.isalpha():
+            return False
+        lowered = word.lower()
+        if lowered in self.abbreviations:
+            return False
+        return not self._acronym.fullmatch(word)
+
+    def split_spans(self, texts: Sequence[str]) -> List[np.ndarray]:
+        out = []
+        for text in texts:
+            starts = [0]
+            starts.extend(
+                m.end() for m in self._candidate.finditer(text) if self._is_break(text, m)
+            )
+            out.append(tile_spans(text, starts) if text.strip() else _EMPTY_SPANS)
+        return out
+
+
+class ChineseRuleSplitter(SentenceSplitter):
+    """Rule-based Chinese split on 。？！； and newlines."""
+
+    name = "zh_rule"
+    _piece = re.compile(r"[^。？！；\n]+")
+
+    def split_spans(self, texts: Sequence[str]) -> List[np.ndarray]:
+        out = []
+        for text in texts:
+            starts = []
+            for m in self._piece.finditer(text):
+                piece = m.group()
+                stripped = piece.lstrip()
+                if stripped.strip():
+                    starts.append(m.start() + len(piece) - len(stripped))
+            out.append(tile_spans(text, starts))
+        return out
+
+
+class SpacySplitter(SentenceSplitter):
+    """spaCy sentencizer over the whole batch with ``nlp.pipe``."""
+
+    name = "spacy"
+
+    def __init__(self, nlp, batch_size: int = 64):
+        self.nlp = nlp
+        self.batch_size = batch_size
+
+    def split_spans(self, texts: Sequence[str]) -> List[np.ndarray]:
+        out = []
+        for text, doc in zip(texts, self.nlp.pipe(texts, batch_size=self.batch_size)):
+            starts = []
+            for sent in doc.sents:
+                sent_text = sent.text
+                stripped = sent_text.lstrip()
+                if stripped.strip():
+                    starts.append(sent.start_char + len(sent_text) - len(stripped))
+            out.append(tile_spans(text, starts))
+        return out
+
+
+ENGLISH_SPLITTERS = {
+    PunktSplitter.name: PunktSplitter,
+    RegexEnglishSplitter.name: RegexEnglishSplitter,
+}
+
+
+def split_code_blocks(code: str, min_word_length: int) -> List[str]:
+    """Code split: blank lines and block-closing line endings delimit blocks."""
+    sentences = []
+    current_block: List[str] = []
+
+    def _flush() -> None:
+        block_text = '\n'.join(current_block)
+        if int(count_words([block_text])[0]) >= min_word_length:
+            sentences.append(block_text)
+
+    for line in code.split('\n'):
+        stripped = line.strip()
+        if not stripped:
+            if current_block:
+                _flush()
+                current_block = []
+            continue
+        current_block.append(line)
+        if any(stripped.endswith(p) for p in ['{', '}', ';', ':', '"""', "'''"]):
+            if len(current_block) >= 2:
+                _flush()
+                current_block = []
+    if current_block:
+        _flush()
+    return sentences if sentences else [code]
+
+
+def split_contexts(
+    contexts: Sequence[str],
+    context_types: Sequence[str],
+    splitter_for: Callable[[str], Optional[SentenceSplitter]],
+    min_word_length: int,
+) -> List[List[str]]:
+    """Batch split: one splitter call per context type, one word-count pass overall.
+
+    ``splitter_for(context_type)`` returns the batch splitter or None for the
+    plain fallbacks (code blocks, 。 split, blank-line paragraphs).
+    """
+    split: List[List[str]] = [[] for _ in contexts]
+    by_type: Dict[str, List[int]] = {}
+    for i, context_type in enumerate(context_types):
+        by_type.setdefault(context_type, []).append(i)
+    for context_type, indices in by_type.items():
+        texts = [contexts[i] for i in indices]
+        splitter = splitter_for(context_type)
+        if splitter is not None:
+            for i, sentences in zip(indices, splitter.split(texts)):
+                split[i] = sentences
+        elif context_type == 'code':
+            for i, text in zip(indices, texts):
+                split[i] = split_code_blocks(text, min_word_length)
+        elif context_type == 'chinese':
+            for i, text in zip(indices, texts):
+                split[i] = [s.strip() + '。' for s in text.split('。') if s.strip()]
+        else:
+            for i, text in zip(indices, texts):
+                split[i] = [s.strip() for s in text.split('\n\n') if s.strip()]
+
+    flat = [sent for sentences in split for sent in sentences]
+    keep = count_words(flat) >= min_word_length
+    if min_word_length <= 0:
+        keep &= np.fromiter((bool(sent.strip()) for sent in flat), dtype=bool, count=len(flat))
+    out: List[List[str]] = []
+    pos = 0
+    for sentences in split:
+        mask = keep[pos : pos + len(sentences)]
+        out.append([sent for sent, k in zip(sentences, mask.tolist()) if k])
+        pos += len(sentences)
+    return out
@@ -0,0 +1,113 @@
+"""Token ids of a compressed context assembled from cached per-sentence ids.
+
+BPE never merges across pre-tokens, so ``encode(a + sep + b)`` differs from the
+per-sentence ids only around the junction: the last pre-token of ``a``, the
+separator and the first pre-token of ``b``. Each sentence is cached as (first
+pre-token text, ids strictly between its first and last pre-tokens, last
+pre-token text, token count); a selection is assembled from the cached middles
+plus one encode per junction glue (``last + sep + first``, itself cached).
+Sentences of a single pre-token are folded into the surrounding glue.
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Tuple
+
+from prep.cache import ByteBudgetCache, content_hash
+
+# (first pre-token, middle ids or None when folded into the glue, last pre-token, count)
+_Record = Tuple[str, Optional[List[int]], str, int]
+
+
+class SentenceIdAssembler:
+    """``separator.join(sentences)`` ids (optionally inside a prompt) without a full encode."""
+
+    def __init__(self, tokenizer, cache: ByteBudgetCache):
+        self.tokenizer = tokenizer
+        self._cache = cache
+        backend = getattr(tokenizer, "backend_tokenizer", None)
+        self._pre_tokenizer = getattr(backend, "pre_tokenizer", None)
+        self.available = self._pre_tokenizer is not None
+
+    def _encode_many(self, texts: List[str], offsets: bool = False):
+        return self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            padding=False,
+            truncation=False,
+            return_offsets_mapping=offsets,
+        )
+
+    def _record(self, sentence: str, ids: List[int], offsets) -> _Record:
+        spans = self._pre_tokenizer.pre_tokenize_str(sentence)
+        if len(spans) < 2:
+            return (sentence, None, "", len(ids))
+        first_end = spans[0][1][1]
+        last_start = spans[-1][1][0]
+        middle = [t for t, (start, _) in zip(ids, offsets) if first_end <= start < last_start]
+        return (sentence[:first_end], middle, sentence[last_start:], len(ids))
+
+    def records(self, sentences: Sequence[str]) -> List[_Record]:
+        """Cached per-sentence records; misses share one batched encode."""
+        keys = [content_hash("sentence", s) for s in sentences]
+        out: List[Optional[_Record]] = [self._cache.get(k) for k in keys]
+        missing = sorted({s for s, r in zip(sentences, out) if r is None})
+        if missing:
+            enc = self._encode_many(missing, offsets=True)
+            fresh = {
+                s: self._record(s, ids, offs)
+                for s, ids, offs in zip(missing, enc["input_ids"], enc["offset_mapping"])
+            }
+            for i, s in enumerate(sentences):
+                if out[i] is None:
+                    out[i] = fresh[s]
+                    self._cache.put(keys[i], fresh[s])
+        return out  # type: ignore[return-value]
+
+    def count(self, sentences: Sequence[str]) -> List[int]:
+        """Per-sentence token counts; the ids are kept for ``assemble``."""
+        return [r[3] for r in self.records(sentences)]
+
+    def _glue_ids(self, glues: List[str]) -> List[List[int]]:
+        keys = [content_hash("glue", g) for g in glues]
+        out: List[Optional[List[int]]] = [
+            [] if not g else self._cache.get(k) for g, k in zip(glues, keys)
+        ]
+        missing = sorted({g for g, ids in zip(glues, out) if ids is None})
+        if missing:
+            fresh = dict(zip(missing, self._encode_many(missing)["input_ids"]))
+            for i, g in enumerate(glues):
+                if out[i] is None:
+                    out[i] = fresh[g]
+                    self._cache.put(keys[i], fresh[g])
+        return out  # type: ignore[return-value]
+
+    def assemble(
+        self, sentences: Sequence[str], separator: str, head: str = "", tail: str = ""
+    ) -> List[int]:
+        """ids of ``head + separator.join(sentences) + tail``."""
+        if not self.available:
+            text = head + separator.join(sentences) + tail
+            return list(self._encode_many([text])["input_ids"][0]) if text else []
+        glues: List[str] = []
+        middles: List[List[int]] = []
+        glue = head
+        for k, (sentence, (first, middle, last, _)) in enumerate(
+            zip(sentences, self.records(sentences))
+        ):
+            if k:
+                glue += separator
+            if middle is None:
+                glue += sentence
+                continue
+            glues.append(glue + first)
+            middles.append(middle)
+            glue = last
+        glues.append(glue + tail)
+        glue_ids = self._glue_ids(glues)
+        ids: List[int] = []
+        for glue_part, middle in zip(glue_ids, middles):
+            ids.extend(glue_part)
+            ids.extend(middle)
+        ids.extend(glue_ids[-1])
+        return ids
@@ -0,0 +1,373 @@
+"""Torch-free sample prep and a persistent process pool with shared-memory handoff.
+
+``SamplePrep`` runs the CPU side of one compress() call: prompt build, sentence
+split, budget / gate token counts and prompt tokenization with sentence token
+spans (sentence-aligned ids or offset mapping). Nothing here imports torch:
+tokenizers are loaded with ``tokenizers`` alone (``prep.fast_tokenizer``), not
+through transformers.
+
+``PrepProcessPool`` keeps one single-process executor per worker and routes a
+sample by document hash, so repeats of a document hit that worker's context
+cache. A prepared row comes back as one shared-memory int64 block
+``[input_ids | sent_positions | sent_spans | sentence_tokens]``; only a small
+metadata dict goes through the result pipe. Workers are started with ``spawn``
+(safe after CUDA init), so the calling script needs a ``__main__`` guard.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from prep.align import (
+    align_char_spans,
+    align_char_spans_dense,
+    cumulative_char_spans,
+)
+from prep.aligned_prompt import SentenceAlignedTokenizer
+from prep.cache import ByteBudgetCache, content_hash
+from prep.entry import build_context_entry, entry_sentences
+from prep.fast_tokenizer import load_prep_tokenizer
+from prep.fingerprint import tokenizer_fingerprint
+from prep.prompt import (
+    PROMPT_HEAD,
+    PROMPT_TOKEN_MARGIN,
+    build_filtering_prompt,
+    filtering_prompt_tail,
+)
+from prep.splitters import (
+    ENGLISH_SPLITTERS,
+    ChineseRuleSplitter,
+    SentenceSplitter,
+    SpacySplitter,
+    split_contexts,
+)
+
+
+class SamplePrep:
+    """CPU prep for one sample, same results as the compressor's in-process path."""
+
+    def __init__(
+        self,
+        attention_tokenizer_path: str,
+        budget_tokenizer_path: Optional[str] = None,
+        max_seq_len: int = 32768,
+        english_sentence_splitter: str = "nltk",
+        use_fast_chinese_split: bool = False,
+        min_word_length: int = 1,
+        use_sentence_aligned_prep: bool = False,
+        disable_chunking: bool = False,
+        context_cache_bytes: int = 64 * 1024 * 1024,
+        attention_tokenizer_json: Optional[str] = None,
+        budget_tokenizer_json: Optional[str] = None,
+    ):
+        self.tokenizer = load_prep_tokenizer(attention_tokenizer_path, attention_tokenizer_json)
+        if budget_tokenizer_path is None or budget_tokenizer_path == attention_tokenizer_path:
+            self.budget_tokenizer = self.tokenizer
+            self.shared_tokenizer = True
+        else:
+            self.budget_tokenizer = load_prep_tokenizer(
+                budget_tokenizer_path, budget_tokenizer_json
+            )
+            attn_fp = tokenizer_fingerprint(self.tokenizer)
+            self.shared_tokenizer = attn_fp is not None and (
+                attn_fp == tokenizer_fingerprint(self.budget_tokenizer)
+            )
+        self.max_seq_len = int(max_seq_len)
+        self.min_word_length = min_word_length
+        self.disable_chunking = disable_chunking
+        self.use_fast_chinese_split = use_fast_chinese_split
+        self.english_splitter: SentenceSplitter = ENGLISH_SPLITTERS[english_sentence_splitter]()
+        self.chinese_splitter: Optional[SentenceSplitter] = (
+            ChineseRuleSplitter() if use_fast_chinese_split else None
+        )
+        self._spacy_tried = False
+        self.aligned_tokenizer: Optional[SentenceAlignedTokenizer] = None
+        if use_sentence_aligned_prep:
+            aligned = SentenceAlignedTokenizer(self.tokenizer, PROMPT_HEAD, self.max_seq_len)
+            if aligned.available:
+                self.aligned_tokenizer = aligned
+        self.cache = ByteBudgetCache(context_cache_bytes, name="worker_context")
+        self._ctx_budget = ByteBudgetCache(1024 * 1024, name="worker_ctx_budget")
+
+    def _splitter_for(self, context_type: str) -> Optional[SentenceSplitter]:
+        if context_type == "english":
+            return self.english_splitter
+        if context_type == "chinese":
+            if self.chinese_splitter is None and not self._spacy_tried:
+                self._spacy_tried = True
+                try:
+                    import spacy
+                    nlp = spacy.load(
+                        "zh_core_web_sm",
+                        disable=['tok2vec', 'tagger', 'parser', 'attribute_ruler', 'lemmatizer', 'ner'],
+                    )
+                    nlp.add_pipe('sentencizer')
+                    self.chinese_splitter = SpacySplitter(nlp)
+                except (ImportError, OSError):
+                    pass
+            return self.chinese_splitter
+        return None
+
+    def _count(self, tokenizer, sentences: List[str]) -> List[int]:
+        if not sentences:
+            return []
+        return tokenizer(
+            sentences, add_special_tokens=False, padding=False, truncation=False,
+            return_length=True,
+        )["length"]
+
+    def split_batch(self, texts: List[str], context_type: str) -> List[List[str]]:
+        return split_contexts(
+            texts, [context_type] * len(texts), self._splitter_for, self.min_word_length
+        )
+
+    def build_entry(
+        self,
+        context: str,
+        sentences: List[str],
+        sentence_tokens: Optional[List[int]] = None,
+        count_attention: bool = True,
+    ) -> dict:
+        return build_context_entry(
+            context,
+            sentences,
+            lambda sents: self._count(self.budget_tokenizer, sents),
+            (lambda sents: self._count(self.tokenizer, sents)) if count_attention else None,
+            self.shared_tokenizer,
+            aligned_tokenizer=self.aligned_tokenizer,
+            sentence_tokens=sentence_tokens,
+        )
+
+    def context_entry(self, context: str, context_type: str) -> dict:
+        key = content_hash(context_type, context)
+        entry = self.cache.get(key)
+        if entry is None:
+            sentences = self.split_batch([context], context_type)[0]
+            entry = self.build_entry(
+                context, sentences, count_attention=not self.disable_chunking
+            )
+            self.cache.put(key, entry)
+        return entry
+
+    def max_context_tokens(self, question: str) -> int:
+        key = content_hash(question)
+        budget = self._ctx_budget.get(key)
+        if budget is None:
+            overhead = len(
+                self.tokenizer.encode(
+                    build_filtering_prompt("", question), add_special_tokens=False
+                )
+            )
+            budget = max(self.max_seq_len - overhead - PROMPT_TOKEN_MARGIN, 1)
+            self._ctx_budget.put(key, budget, nbytes=64)
+        return budget
+
+    def prepare(self, context: str, question: str, context_type: str) -> dict:
+        """Prompt ids + sentence spans for one sample, or ``{"needs_chunking": True}``."""
+        entry = self.context_entry(context, context_type)
+        attn_tokens = entry["attn_tokens"]
+        if (
+            attn_tokens is not None
+            and len(attn_tokens)
+            and int(attn_tokens.sum()) > self.max_context_tokens(question)
+        ):
+            return {"needs_chunking": True}
+        sentences = entry_sentences(context, entry)
+        budget_tokens = entry["budget_tokens"]
+
+        row = None
+        doc = entry["aligned"]
+        if doc is not None and sentences:
+            row = self.aligned_tokenizer.build_row(doc, filtering_prompt_tail(question))
+        if row is not None:
+            input_ids = row["input_ids"]
+            context_start, context_end = row["context_start"], row["context_end"]
+            positions = np.asarray(row["sent_positions"], dtype=np.int64).reshape(-1, 2)
+        else:
+            prompt = build_filtering_prompt(context, question)
+            enc = self.tokenizer(
+                prompt,
+                return_offsets_mapping=True,
+                truncation=True,
+                max_length=self.max_seq_len,
+            )
+            input_ids = np.asarray(enc["input_ids"], dtype=np.int64)
+            offsets = np.asarray(enc["offset_mapping"], dtype=np.int64).reshape(-1, 2)
+            context_char = prompt.find(context)
+            spans = np.asarray(
+                [[context_char, context_char + len(context)]], dtype=np.int64
+            )
+            if sentences:
+                spans = np.concatenate([spans, cumulative_char_spans(prompt, sentences)])
+            aligned = align_char_spans(offsets, spans)
+            if aligned is None:
+                aligned = np.asarray(align_char_spans_dense(offsets, spans), dtype=np.int64)
+            context_start, context_end = int(aligned[0, 0]), int(aligned[0, 1])
+            positions = aligned[1:]
+
+        keep = np.flatnonzero(np.asarray(budget_tokens) > 0) if sentences else np.zeros(0, dtype=np.int64)
+        sent_spans = entry["sent_spans"]
+        return {
+            "needs_chunking": False,
+            "input_ids": input_ids,
+            "context_start": int(context_start),
+            "context_end": int(context_end),
+            "sent_positions": positions[keep],
+            "sent_spans": sent_spans[keep].astype(np.int64) if sent_spans is not None else None,
+            "sentences": None if sent_spans is not None else [sentences[i] for i in keep.tolist()],
+            "sentence_tokens": np.asarray(budget_tokens, dtype=np.int64)[keep],
+        }
+
+
+def export_row(row: dict) -> dict:
+    """Move a prepared row's arrays into one shared-memory block (worker side)."""
+    if row["needs_chunking"]:
+        return row
+    num_sentences = len(row["sentence_tokens"])
+    spans = row["sent_spans"]
+    parts = [
+        row["input_ids"],
+        row["sent_positions"].reshape(-1),
+        spans.reshape(-1) if spans is not None else np.zeros(2 * num_sentences, dtype=np.int64),
+        row["sentence_tokens"],
+    ]
+    total = sum(len(p) for p in parts)
+    shm = shared_memory.SharedMemory(create=True, size=max(total, 1) * 8)
+    try:
+        view = np.ndarray((total,), dtype=np.int64, buffer=shm.buf)
+        np.concatenate(parts, out=view, casting="unsafe")
+        del view
+    finally:
+        shm.close()
+    return {
+        "needs_chunking": False,
+        "shm": shm.name,
+        "length": len(row["input_ids"]),
+        "num_sentences": num_sentences,
+        "context_start": row["context_start"],
+        "context_end": row["context_end"],
+        "sentences": row["sentences"],
+    }
+
+
+def import_row(meta: dict, context: str) -> dict:
+    """Read and release a shared-memory row (caller side); sentences sliced from context."""
+    if meta["needs_chunking"]:
+        return meta
+    length, num_sentences = meta["length"], meta["num_sentences"]
+    shm = shared_memory.SharedMemory(name=meta["shm"])
+    try:
+        flat = np.ndarray(
+            (length + 5 * num_sentences,), dtype=np.int64, buffer=shm.buf
+        ).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    bounds = np.cumsum([length, 2 * num_sentences, 2 * num_sentences])
+    positions = flat[bounds[0] : bounds[1]].reshape(-1, 2)
+    sentences = meta["sentences"]
+    if sentences is None:
+        sentences = [
+            context[a:b] for a, b in flat[bounds[1] : bounds[2]].reshape(-1, 2).tolist()
+        ]
+    return {
+        "needs_chunking": False,
+        "input_ids": flat[: bounds[0]],
+        "context_start": meta["context_start"],
+        "context_end": meta["context_end"],
+        "sent_positions": [tuple(p) for p in positions.tolist()],
+        "sentences": sentences,
+        "sentence_tokens": flat[bounds[2] :].tolist(),
+    }
+
+
+_WORKER: Optional[SamplePrep] = None
+
+
+def _init_worker(config: dict) -> None:
+    global _WORKER
+    _WORKER = SamplePrep(**config)
+
+
+def _prepare_in_worker(context: str, question: str, context_type: str) -> dict:
+    return export_row(_WORKER.prepare(context, question, context_type))
+
+
+def _release(meta: dict) -> None:
+    if not meta.get("needs_chunking") and "shm" in meta:
+        try:
+            shm = shared_memory.SharedMemory(name=meta["shm"])
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+
+
+class PrepProcessPool:
+    """Persistent worker processes running ``SamplePrep`` (sticky by document)."""
+
+    def __init__(self, config: dict, processes: int):
+        self.config = dict(config)
+        self.processes = max(1, int(processes))
+        ctx = multiprocessing.get_context("spawn")
+        self._executors = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(self.config,),
+            )
+            for _ in range(self.processes)
+        ]
+
+    def submit(self, context: str, question: str, context_type: str) -> Future:
+        """Future of the exported row metadata; pass it to ``import_row``."""
+        digest = content_hash(context_type, context)
+        worker = int.from_bytes(digest[:4], "little") % self.processes
+        return self._executors[worker].submit(
+            _prepare_in_worker, context, question, context_type
+        )
+
+    def imap(
+        self, samples: Iterable[Dict[str, str]], window: Optional[int] = None
+    ) -> Iterator[Tuple[int, dict]]:
+        """Prepared rows in input order, at most ``window`` samples in flight."""
+        window = window or 2 * self.processes
+        pending: List[Tuple[int, str, Future]] = []
+        it = iter(enumerate(samples))
+        try:
+            for idx, sample in it:
+                context = sample["context"]
+                pending.append((
+                    idx,
+                    context,
+                    self.submit(
+                        context,
+                        sample.get("question", ""),
+                        sample.get("context_type", "english"),
+                    ),
+                ))
+                if len(pending) >= window:
+                    head_idx, head_ctx, fut = pending.pop(0)
+                    yield head_idx, import_row(fut.result(), head_ctx)
+            while pending:
+                head_idx, head_ctx, fut = pending.pop(0)
+                yield head_idx, import_row(fut.result(), head_ctx)
+        finally:
+            for _, _, fut in pending:
+                if fut.cancel():
+                    continue
+                try:
+                    _release(fut.result())
+                except Exception:
+                    pass
+
+    def shutdown(self, wait: bool = True) -> None:
+        for executor in self._executors:
+            executor.shutdown(wait=wait, cancel_futures=True)
+        self._executors = []
@@ -1,6 +1,15 @@
 """Last-row attention probe for Qwen2 (SDPA + side-channel)."""
 
+from probe.memory import MemoryBudgetError, MemoryModel, MemoryPlanConfig, is_allocation_error
 from probe.state import ProbeState
 from probe.qwen2_probe import patch_qwen2_attention_for_probe, unpatch_qwen2_attention_probe
 
-__all__ = ["ProbeState", "patch_qwen2_attention_for_probe", "unpatch_qwen2_attention_probe"]
+__all__ = [
+    "MemoryBudgetError",
+    "MemoryModel",
+    "MemoryPlanConfig",
+    "ProbeState",
+    "is_allocation_error",
+    "patch_qwen2_attention_for_probe",
+    "unpatch_qwen2_attention_probe",
+]
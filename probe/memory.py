@@ -0,0 +1,187 @@
+"""Peak-memory model for batched probe forwards.
+
+Peak bytes of one batched forward of B rows padded to T tokens, with at most S
+sentences per row, are predicted as
+
+    safety * (c0 + c1 * B*T + c2 * B*T^2  +  probe_bytes(B, T, S))
+
+The forward terms (weights already resident, so c0 is per-call overhead; c1
+covers hidden states, MLP activations and the full-vocab logits; c2 covers any
+materialized attention scores) are fitted at startup from a few probe forwards.
+The ProbeState terms are computed exactly: the [B, S, T] sentence masks, the
+[B, S, L*H] feature accumulator and the per-row temporaries built in
+``begin_batch``.
+
+Peaks are read from the CUDA caching allocator, or on CPU replayed from the
+torch profiler's allocation / free events (RSS is useless there: the C
+allocator reuses freed pages).
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+
+class MemoryBudgetError(ValueError):
+    """Raised when a single sample is predicted to exceed the memory budget."""
+
+
+class MemoryPlanConfig:
+    """Options for AttentionCompressor(memory_planning=...).
+
+    budget_bytes: peak bytes a forward may use (None = free device memory at
+        call time). safety: multiplier on predicted peaks.
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None, safety: float = 1.2):
+        if budget_bytes is not None and budget_bytes <= 0:
+            raise ValueError(f"budget_bytes must be > 0 or None, got {budget_bytes}")
+        if safety < 1.0:
+            raise ValueError(f"safety must be >= 1.0, got {safety}")
+        self.budget_bytes = budget_bytes
+        self.safety = float(safety)
+
+
+def is_allocation_error(exc: BaseException) -> bool:
+    """CUDA OOM, or a CPU allocator failure surfaced as MemoryError / RuntimeError."""
+    if isinstance(exc, (torch.OutOfMemoryError, MemoryError)):
+        return True
+    msg = str(exc)
+    return isinstance(exc, RuntimeError) and (
+        "out of memory" in msg or "can't allocate memory" in msg
+    )
+
+
+def measure_peak_bytes(fn: Callable[[], object], device: torch.device) -> Optional[int]:
+    """Peak bytes allocated by ``fn()`` above the level before it; None if unmeasurable."""
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+        base = torch.cuda.memory_allocated(device)
+        fn()
+        torch.cuda.synchronize(device)
+        return torch.cuda.max_memory_allocated(device) - base
+    from torch.profiler import ProfilerActivity, profile
+
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        fn()
+    current = peak = 0
+    for event in sorted(prof.events(), key=lambda e: e.time_range.start):
+        # ops carry their own allocations; frees arrive as "[memory]" events
+        if event.name == "[memory]":
+            current += event.cpu_memory_usage
+        else:
+            current += event.self_cpu_memory_usage
+        peak = max(peak, current)
+    return peak
+
+
+def available_bytes(device: torch.device) -> Optional[int]:
+    """Free device memory (CUDA) or MemAvailable (CPU); None if unknown."""
+    if device.type == "cuda":
+        return int(torch.cuda.mem_get_info(device)[0])
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            match = re.search(r"^MemAvailable:\s+(\d+) kB", f.read(), re.MULTILINE)
+    except OSError:
+        return None
+    return int(match.group(1)) * 1024 if match else None
+
+
+def _fit_nonnegative(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Least squares with coefficients clamped to >= 0 (drop negatives, refit)."""
+    active = list(range(x.shape[1]))
+    coeffs = np.zeros(x.shape[1])
+    while active:
+        sol, *_ = np.linalg.lstsq(x[:, active], y, rcond=None)
+        if (sol >= 0).all():
+            coeffs[active] = sol
+            break
+        active = [a for a, c in zip(active, sol) if c >= 0]
+    return coeffs
+
+
+class MemoryModel:
+    """Predicts peak bytes of a batched probe forward from (B, T_max, S_max)."""
+
+    def __init__(
+        self,
+        num_layers: int,
+        num_heads: int,
+        dtype: torch.dtype,
+        coeffs: Sequence[float] = (0.0, 0.0, 0.0),
+        safety: float = 1.2,
+    ):
+        self.num_layers = num_layers
+        self.num_heads = num_heads
+        self.dtype = dtype
+        self.coeffs = tuple(float(c) for c in coeffs)
+        self.safety = float(safety)
+        self.samples: List[Tuple[int, int, int, int]] = []
+
+    def probe_bytes(self, batch: int, tokens: int, sentences: int) -> int:
+        """ProbeState buffers: masks, feature accumulator and one row's mask temporaries."""
+        elt = torch.empty((), dtype=self.dtype).element_size()
+        masks = batch * sentences * tokens * elt
+        features = batch * sentences * self.num_layers * self.num_heads * elt
+        row_build = sentences * tokens * (3 + 2 * elt)  # bool compares + cast + divide
+        return masks + features + row_build
+
+    def forward_bytes(self, batch: int, tokens: int) -> float:
+        c0, c1, c2 = self.coeffs
+        bt = batch * tokens
+        return c0 + c1 * bt + c2 * bt * tokens
+
+    def predict(self, batch: int, tokens: int, sentences: int) -> int:
+        probe = self.probe_bytes(batch, tokens, sentences)
+        return int(self.safety * (self.forward_bytes(batch, tokens) + probe))
+
+    def calibrate(self, samples: Iterable[Tuple[int, int, int, int]]) -> "MemoryModel":
+        """Fit the forward terms from (B, T, S, measured peak bytes) tuples."""
+        self.samples = [s for s in samples if s[3] is not None]
+        if not self.samples:
+            return self
+        rows, target = [], []
+        for batch, tokens, sentences, peak in self.samples:
+            bt = batch * tokens
+            rows.append((1.0, bt, bt * tokens))
+            target.append(max(0, peak - self.probe_bytes(batch, tokens, sentences)))
+        fitted = _fit_nonnegative(np.array(rows), np.array(target, dtype=float))
+        self.coeffs = tuple(float(c) for c in fitted)
+        return self
+
+    def plan(self, shapes: Sequence[Tuple[int, int]], budget: int) -> List[List[int]]:
+        """Split rows (T_i, S_i) into consecutive groups whose padded batch fits ``budget``."""
+        groups: List[List[int]] = []
+        group: List[int] = []
+        t_max = s_max = 0
+        for i, (tokens, sentences) in enumerate(shapes):
+            alone = self.predict(1, tokens, sentences)
+            if alone > budget:
+                raise MemoryBudgetError(
+                    f"sample {i} ({tokens} tokens, {sentences} sentences) needs an estimated "
+                    f"{alone / 2**20:.0f} MiB, over the {budget / 2**20:.0f} MiB memory budget"
+                )
+            t, s = max(t_max, tokens), max(s_max, sentences)
+            if group and self.predict(len(group) + 1, t, s) > budget:
+                groups.append(group)
+                group, t, s = [], tokens, sentences
+            group.append(i)
+            t_max, s_max = t, s
+        if group:
+            groups.append(group)
+        return groups
+
+    def summary(self) -> Dict[str, object]:
+        c0, c1, c2 = self.coeffs
+        return {
+            "fixed_bytes": c0,
+            "bytes_per_token": c1,
+            "bytes_per_token_sq": c2,
+            "safety": self.safety,
+            "calibration_points": len(self.samples),
+        }
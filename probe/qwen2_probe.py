@@ -94,6 +94,8 @@ def _make_probed_forward(probe_state: ProbeState) -> Callable:
         cos, sin = position_embeddings
         query_states, key_states = apply_rotary_pos_emb(query_states, key_states, cos, sin)
 
+        if past_key_value is None:  # transformers >= 4.56 passes ``past_key_values``
+            past_key_value = kwargs.pop("past_key_values", None)
         if past_key_value is not None:
             cache_kwargs = {"sin": sin, "cos": cos, "cache_position": cache_position}
             key_states, value_states = past_key_value.update(
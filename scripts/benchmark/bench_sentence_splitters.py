@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Agreement / throughput of English sentence splitters against nltk punkt.
+
+Agreement is measured on sentence boundaries (start offsets after re-anchoring):
+precision / recall / F1 of the candidate against punkt, plus the share of
+documents split identically. Word counting is checked against the per-sentence
+Python loop and timed the same way.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmark/bench_sentence_splitters.py \\
+        --input data.jsonl --field context --max_docs 500 --repeat 3
+
+Inputs: .jsonl (one document per line, text under --field) or plain text files
+(one document per file). Defaults to README.md + PROBE_OPTIMIZATION.md.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+from prep.splitters import ENGLISH_SPLITTERS, PunktSplitter, count_words
+
+
+def load_documents(paths: List[str], field: str, max_docs: int) -> List[str]:
+    docs: List[str] = []
+    for path in paths:
+        if path.endswith(".jsonl"):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        text = json.loads(line).get(field, "")
+                        if text:
+                            docs.append(text)
+        else:
+            with open(path, encoding="utf-8") as f:
+                docs.append(f.read())
+        if len(docs) >= max_docs:
+            break
+    return docs[:max_docs]
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+
+def boundary_agreement(reference, candidate):
+    tp = fp = fn = identical = 0
+    for ref_spans, cand_spans in zip(reference, candidate):
+        ref = set(ref_spans[1:, 0].tolist())
+        cand = set(cand_spans[1:, 0].tolist())
+        tp += len(ref & cand)
+        fp += len(cand - ref)
+        fn += len(ref - cand)
+        identical += int(ref_spans.shape == cand_spans.shape and (ref_spans == cand_spans).all())
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1, identical / max(len(reference), 1)
+
+
+def count_words_loop(texts: List[str]) -> List[int]:
+    out = []
+    for text in texts:
+        text = text.strip()
+        chinese = sum(1 for char in text if '一' <= char <= '鿿')
+        words = len([w for w in text.split() if any(char.isalpha() for char in w)])
+        out.append(chinese + words)
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--input", nargs="*", default=None)
+    parser.add_argument("--field", default="context")
+    parser.add_argument("--max_docs", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = args.input or [
+        os.path.join(_ROOT, "README.md"),
+        os.path.join(_ROOT, "PROBE_OPTIMIZATION.md"),
+    ]
+    docs = load_documents(paths, args.field, args.max_docs)
+    if not docs:
+        print("No documents loaded.")
+        sys.exit(1)
+    n_chars = sum(len(d) for d in docs)
+    print(f"Documents: {len(docs)}  chars: {n_chars:,}")
+
+    reference, ref_time = timed(lambda: PunktSplitter().split_spans(docs), args.repeat)
+    print(f"\n{'splitter':<10} {'docs/s':>10} {'MB/s':>8} {'speedup':>8} "
+          f"{'P':>6} {'R':>6} {'F1':>6} {'same':>6}")
+    for name, cls in ENGLISH_SPLITTERS.items():
+        splitter = cls()
+        spans, elapsed = timed(lambda: splitter.split_spans(docs), args.repeat)
+        p, r, f1, same = boundary_agreement(reference, spans)
+        print(f"{name:<10} {len(docs) / elapsed:>10.1f} {n_chars / elapsed / 1e6:>8.2f} "
+              f"{ref_time / elapsed:>7.1f}x {p:>6.3f} {r:>6.3f} {f1:>6.3f} {same:>6.1%}")
+
+    sentences = [d[a:b] for d, s in zip(docs, reference) for a, b in s.tolist()]
+    count_words([""])  # build lookup tables outside the timing
+    loop_counts, loop_time = timed(lambda: count_words_loop(sentences), args.repeat)
+    vec_counts, vec_time = timed(lambda: count_words(sentences), args.repeat)
+    print(f"\nWord count over {len(sentences)} sentences: loop {loop_time * 1e3:.1f} ms, "
+          f"vectorized {vec_time * 1e3:.1f} ms ({loop_time / vec_time:.1f}x), "
+          f"match={list(vec_counts) == loop_counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Build an offline passage index for AttentionCompressor.compress_passages().
+
+Every passage is split, its 0.5B prompt pieces and 7B sentence ids / counts are
+computed once and written to memory-mapped shards (see prep/corpus.py). Use the
+same tokenizers and split settings as the compressor that will load the index.
+
+Usage:
+    PYTHONPATH=. python scripts/build_corpus_index.py \\
+        --input passages.jsonl --id_field id --text_field text \\
+        --output corpus_index/ \\
+        --attention_model_path models/Qwen2.5-0.5B-Instruct \\
+        --eval_tokenizer_path Qwen/Qwen2.5-7B-Instruct \\
+        --context_type english --english_sentence_splitter nltk
+
+Then:
+    compressor.load_corpus_index("corpus_index/")
+    compressor.compress_passages(["doc-17", "doc-3"], question="...")
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Iterator, Tuple
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+from prep.corpus import build_corpus_index
+from prep.worker import SamplePrep
+
+
+def read_passages(path: str, id_field: str, text_field: str) -> Iterator[Tuple[str, str]]:
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            yield str(record.get(id_field, line_no)), record.get(text_field, "")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--input", required=True, help=".jsonl, one passage per line")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--id_field", default="id")
+    parser.add_argument("--text_field", default="text")
+    parser.add_argument("--attention_model_path", default="models/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--eval_tokenizer_path", default="Qwen/Qwen2.5-7B-Instruct")
+    parser.add_argument("--sentence_budget_tokenizer", choices=["7b", "0.5b"], default="7b")
+    parser.add_argument("--context_type", default="english")
+    parser.add_argument("--english_sentence_splitter", choices=["nltk", "regex"], default="nltk")
+    parser.add_argument("--use_fast_chinese_split", action="store_true")
+    parser.add_argument("--min_word_length", type=int, default=1)
+    parser.add_argument("--shard_size", type=int, default=50000)
+    parser.add_argument("--batch_size", type=int, default=256)
+    args = parser.parse_args()
+
+    prep = SamplePrep(
+        attention_tokenizer_path=args.attention_model_path,
+        budget_tokenizer_path=(
+            None if args.sentence_budget_tokenizer == "0.5b" else args.eval_tokenizer_path
+        ),
+        english_sentence_splitter=args.english_sentence_splitter,
+        use_fast_chinese_split=args.use_fast_chinese_split,
+        min_word_length=args.min_word_length,
+        use_sentence_aligned_prep=True,
+    )
+    if prep.aligned_tokenizer is None:
+        print("⚠️  Tokenizer has no pre-tokenizer: passages are indexed without prompt pieces")
+
+    t0 = time.perf_counter()
+
+    def _progress(done: int) -> None:
+        elapsed = time.perf_counter() - t0
+        print(f"\r  indexed {done:,} passages ({done / max(elapsed, 1e-9):.0f}/s)", end="", flush=True)
+
+    manifest = build_corpus_index(
+        read_passages(args.input, args.id_field, args.text_field),
+        args.output,
+        prep,
+        context_type=args.context_type,
+        shard_size=args.shard_size,
+        batch_size=args.batch_size,
+        manifest_extra={
+            "english_sentence_splitter": args.english_sentence_splitter,
+            "use_fast_chinese_split": args.use_fast_chinese_split,
+        },
+        progress=_progress,
+    )
+    print()
+    print(
+        f"✅ {manifest['num_passages']:,} passages in {len(manifest['shards'])} shard(s) "
+        f"→ {args.output} ({time.perf_counter() - t0:.1f} s)"
+    )
+    if manifest["skipped_passages"]:
+        print(
+            f"⚠️  Skipped {manifest['skipped_passages']} passages whose split is not a "
+            f"verbatim slice of the text (use a span splitter for this context type)"
+        )
+
+
+if __name__ == "__main__":
+    main()
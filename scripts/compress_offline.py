@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline batch compression of JSONL / Parquet prompts with AttentionCompressor.
+
+The input is cut into shards of --shard_size records. --workers processes, each
+owning an AttentionCompressor (devices round-robin from --devices), take shards
+from a queue and stream them through compress_stream(). A shard is written to
+<output>/shard-NNNNN.jsonl.tmp and renamed when complete, so rerunning a killed
+job with the same arguments skips finished shards. manifest.json records the
+input fingerprint, shard table and settings; a mismatch refuses to resume.
+
+Usage:
+    PYTHONPATH=. python scripts/compress_offline.py \\
+        --input prompts.jsonl --output compressed/ \\
+        --id_field id --context_field context --question_field question \\
+        --detector_path models/detectors/<detector>.pkl \\
+        --workers 2 --devices cuda:0,cuda:1 --compression_rate 0.5
+
+Each output line: id, compressed_text, original_length, compressed_length,
+compression_ratio (+ --keep_fields copied from the input record).
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+import traceback
+from collections import deque
+from queue import Empty
+from typing import Dict, Iterator, List
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def _input_format(path: str) -> str:
+    return "parquet" if path.endswith((".parquet", ".pq")) else "jsonl"
+
+
+def _import_parquet():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as exc:
+        raise ImportError("Parquet input requires pyarrow: pip install pyarrow") from exc
+    return pq
+
+
+def plan_jsonl_shards(path: str, shard_size: int) -> List[Dict]:
+    """Byte ranges of shard_size non-blank lines each (one scan, stored in the manifest)."""
+    shards: List[Dict] = []
+    offset = start = count = first = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if count == 0:
+                start = offset
+            offset += len(line)
+            if line.strip():
+                count += 1
+            if count == shard_size:
+                shards.append({"offset": start, "length": offset - start, "first": first, "records": count})
+                first += count
+                count = 0
+    if count:
+        shards.append({"offset": start, "length": offset - start, "first": first, "records": count})
+    return shards
+
+
+def plan_parquet_shards(path: str, shard_size: int) -> List[Dict]:
+    """Consecutive row groups per shard, at least shard_size rows (except the last)."""
+    meta = _import_parquet().ParquetFile(path).metadata
+    shards: List[Dict] = []
+    groups: List[int] = []
+    rows = first = 0
+    for g in range(meta.num_row_groups):
+        groups.append(g)
+        rows += meta.row_group(g).num_rows
+        if rows >= shard_size:
+            shards.append({"row_groups": groups, "first": first, "records": rows})
+            first += rows
+            groups, rows = [], 0
+    if groups:
+        shards.append({"row_groups": groups, "first": first, "records": rows})
+    return shards
+
+
+def read_shard(path: str, shard: Dict) -> Iterator[Dict]:
+    if _input_format(path) == "parquet":
+        table = _import_parquet().ParquetFile(path).read_row_groups(shard["row_groups"])
+        yield from table.to_pylist()
+        return
+    with open(path, "rb") as f:
+        f.seek(shard["offset"])
+        data = f.read(shard["length"])
+    for line in data.splitlines():
+        if line.strip():
+            yield json.loads(line)
+
+
+def input_fingerprint(path: str) -> Dict:
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def shard_path(output: str, shard_id: int) -> str:
+    return os.path.join(output, f"shard-{shard_id:05d}.jsonl")
+
+
+def load_or_create_manifest(args, settings: Dict) -> Dict:
+    path = os.path.join(args.output, MANIFEST_NAME)
+    fingerprint = input_fingerprint(args.input)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION or manifest["input"] != fingerprint:
+            raise SystemExit(f"⚠️  {args.output} belongs to a different input; use a new --output")
+        if manifest["settings"] != settings:
+            changed = sorted(k for k in settings if manifest["settings"].get(k) != settings[k])
+            raise SystemExit(
+                f"⚠️  {args.output} was written with different settings ({', '.join(changed)}); "
+                f"use a new --output"
+            )
+        return manifest
+    os.makedirs(args.output, exist_ok=True)
+    plan = plan_parquet_shards if _input_format(args.input) == "parquet" else plan_jsonl_shards
+    shards = plan(args.input, settings["shard_size"])
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "input": fingerprint,
+        "format": _input_format(args.input),
+        "settings": settings,
+        "shards": shards,
+        "num_records": sum(s["records"] for s in shards),
+    }
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return manifest
+
+
+def _samples(records: Iterator[Dict], settings: Dict) -> Iterator[Dict]:
+    for record in records:
+        context = record.get(settings["context_field"], "")
+        yield {
+            "context": context if isinstance(context, str) else list(context),
+            "question": record.get(settings["question_field"]) or "",
+            "context_type": record.get(settings["context_type_field"]) or settings["context_type"],
+            "record": record,
+        }
+
+
+def _output_line(sample: Dict, result: Dict, index: int, settings: Dict) -> str:
+    record = sample["record"]
+    out = {"id": record.get(settings["id_field"], index)}
+    for field in settings["keep_fields"]:
+        if field in record:
+            out[field] = record[field]
+    out.update(
+        compressed_text=result["compressed_text"],
+        original_length=result["original_length"],
+        compressed_length=result["compressed_length"],
+        compression_ratio=result["compression_ratio"],
+    )
+    return json.dumps(out, ensure_ascii=False) + "\n"
+
+
+def compress_shard(compressor, manifest: Dict, shard_id: int, output: str, events, rank: int) -> None:
+    settings = manifest["settings"]
+    shard = manifest["shards"][shard_id]
+    final = shard_path(output, shard_id)
+    tmp = final + ".tmp"
+    in_flight: deque = deque()  # samples read by compress_stream, not yet written
+
+    def _read() -> Iterator[Dict]:
+        for sample in _samples(read_shard(manifest["input"]["path"], shard), settings):
+            in_flight.append(sample)
+            yield sample
+
+    stream = compressor.compress_stream(
+        _read(),
+        window=settings["window"],
+        batch_size=settings["batch_size"],
+        **settings["budget"],
+    )
+    pending = tokens = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        for i, result in enumerate(stream):
+            f.write(_output_line(in_flight.popleft(), result, shard["first"] + i, settings))
+            pending += 1
+            tokens += result["original_length"]
+            if pending >= settings["batch_size"]:
+                f.flush()
+                events.put(("progress", rank, pending, tokens))
+                pending = tokens = 0
+    os.replace(tmp, final)
+    events.put(("done", rank, shard_id, pending, tokens))
+
+
+def worker_main(rank: int, compressor_kwargs: Dict, manifest: Dict, output: str, tasks, events) -> None:
+    try:
+        from attention_compressor import AttentionCompressor
+
+        compressor = AttentionCompressor(**compressor_kwargs)
+        events.put(("ready", rank))
+        while True:
+            shard_id = tasks.get()
+            if shard_id is None:
+                break
+            compress_shard(compressor, manifest, shard_id, output, events, rank)
+        compressor.close()
+    except BaseException:
+        events.put(("error", rank, traceback.format_exc()))
+
+
+def _format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--input", required=True, help=".jsonl or .parquet, one prompt per record")
+    parser.add_argument("--output", required=True, help="directory for shards + manifest.json")
+    parser.add_argument("--id_field", default="id")
+    parser.add_argument("--context_field", default="context")
+    parser.add_argument("--question_field", default="question")
+    parser.add_argument("--context_type_field", default="context_type")
+    parser.add_argument("--context_type", default="english", help="when the record has none")
+    parser.add_argument("--keep_fields", default="", help="comma-separated input fields to copy")
+    parser.add_argument("--compression_rate", type=float, default=0.5)
+    parser.add_argument("--target_token", type=int, default=-1)
+    parser.add_argument("--threshold", type=float, default=None, help="threshold filtering")
+    parser.add_argument("--attention_model_path", default="Qwen/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--detector_path", required=True)
+    parser.add_argument("--eval_tokenizer_path", default="Qwen/Qwen2.5-7B-Instruct")
+    parser.add_argument("--max_seq_len", type=int, default=None)
+    parser.add_argument("--english_sentence_splitter", choices=["nltk", "regex"], default="nltk")
+    parser.add_argument("--use_fast_chinese_split", action="store_true")
+    parser.add_argument("--use_pure_gpu", action="store_true")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--devices", default="cuda", help="comma-separated, round-robin over workers")
+    parser.add_argument("--shard_size", type=int, default=10000)
+    parser.add_argument("--batch_size", type=int, default=4)
+    parser.add_argument("--window", type=int, default=256, help="compress_stream window")
+    args = parser.parse_args()
+
+    settings = {
+        "shard_size": args.shard_size,
+        "id_field": args.id_field,
+        "context_field": args.context_field,
+        "question_field": args.question_field,
+        "context_type_field": args.context_type_field,
+        "context_type": args.context_type,
+        "keep_fields": [f for f in args.keep_fields.split(",") if f],
+        "budget": {
+            "compression_rate": args.compression_rate,
+            "target_token": args.target_token,
+            "use_threshold_filtering": args.threshold is not None,
+            "threshold": 0.5 if args.threshold is None else args.threshold,
+        },
+        "batch_size": args.batch_size,
+        "window": args.window,
+        "attention_model_path": args.attention_model_path,
+        "detector_path": args.detector_path,
+        "eval_tokenizer_path": args.eval_tokenizer_path,
+        "max_seq_len": args.max_seq_len,
+        "english_sentence_splitter": args.english_sentence_splitter,
+        "use_fast_chinese_split": args.use_fast_chinese_split,
+    }
+    manifest = load_or_create_manifest(args, settings)
+    shards = manifest["shards"]
+    todo = [i for i in range(len(shards)) if not os.path.exists(shard_path(args.output, i))]
+    done_before = manifest["num_records"] - sum(shards[i]["records"] for i in todo)
+    total = manifest["num_records"]
+    print(
+        f"{total:,} records in {len(shards)} shard(s); {len(shards) - len(todo)} already done "
+        f"({done_before:,} records), {len(todo)} to run"
+    )
+    if not todo:
+        print(f"✅ Nothing to do: {args.output} is complete")
+        return
+
+    devices = [d for d in args.devices.split(",") if d]
+    num_workers = max(1, min(args.workers, len(todo)))
+    ctx = mp.get_context("spawn")
+    tasks = ctx.Queue()
+    events = ctx.Queue()
+    for shard_id in todo:
+        tasks.put(shard_id)
+    for _ in range(num_workers):
+        tasks.put(None)
+    procs = []
+    for rank in range(num_workers):
+        kwargs = {
+            "attention_model_path": args.attention_model_path,
+            "detector_path": args.detector_path,
+            "eval_tokenizer_path": args.eval_tokenizer_path,
+            "max_seq_len": args.max_seq_len,
+            "device": devices[rank % len(devices)],
+            "english_sentence_splitter": args.english_sentence_splitter,
+            "use_fast_chinese_split": args.use_fast_chinese_split,
+            "use_pure_gpu": args.use_pure_gpu,
+            "print_sentence_scores": False,
+        }
+        proc = ctx.Process(
+            target=worker_main,
+            args=(rank, kwargs, manifest, args.output, tasks, events),
+            daemon=True,
+        )
+        proc.start()
+        procs.append(proc)
+
+    t0 = None
+    records = tokens = shards_done = 0
+    remaining = total - done_before
+    last_print = 0.0
+    try:
+        while shards_done < len(todo):
+            try:
+                event = events.get(timeout=1.0)
+            except Empty:
+                dead = [p for p in procs if p.exitcode not in (None, 0)]
+                if dead:
+                    raise SystemExit(f"⚠️  Worker exited with code {dead[0].exitcode}")
+                continue
+            kind = event[0]
+            if kind == "error":
+                raise SystemExit(f"⚠️  Worker {event[1]} failed:\n{event[2]}")
+            if kind == "ready":
+                t0 = t0 or time.perf_counter()
+                continue
+            if kind == "progress":
+                records += event[2]
+                tokens += event[3]
+            elif kind == "done":
+                records += event[3]
+                tokens += event[4]
+                shards_done += 1
+            now = time.perf_counter()
+            if now - last_print >= 1.0 or shards_done == len(todo):
+                last_print = now
+                elapsed = max(now - (t0 or now), 1e-9)
+                rate = records / elapsed
+                eta = (remaining - records) / rate if rate > 0 else 0.0
+                print(
+                    f"\r  {done_before + records:,}/{total:,} records | {rate:.1f} rec/s | "
+                    f"{tokens / elapsed:,.0f} tok/s | shards {shards_done}/{len(todo)} | "
+                    f"ETA {_format_eta(eta)}",
+                    end="",
+                    flush=True,
+                )
+    except BaseException:
+        for proc in procs:
+            proc.terminate()
+        print()
+        raise
+    for proc in procs:
+        proc.join()
+    print()
+    elapsed = time.perf_counter() - (t0 or time.perf_counter())
+    print(
+        f"✅ {records:,} records ({tokens:,} tokens) in {elapsed:.1f} s → {args.output} "
+        f"({num_workers} worker(s))"
+    )
+
+
+if __name__ == "__main__":
+    main()
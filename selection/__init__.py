@@ -0,0 +1,22 @@
+"""Sentence selection: batched [B, S] selectors, reusable rankings, columnar results."""
+
+from selection.batched import (
+    pad_index_lists,
+    pad_scores,
+    pad_tokens,
+    select_by_budget_batch,
+    select_by_threshold_batch,
+)
+from selection.columnar import ColumnarResults, ColumnarResultsBuilder
+from selection.ranking import SentenceRanking
+
+__all__ = [
+    "ColumnarResults",
+    "ColumnarResultsBuilder",
+    "SentenceRanking",
+    "pad_index_lists",
+    "pad_scores",
+    "pad_tokens",
+    "select_by_budget_batch",
+    "select_by_threshold_batch",
+]
@@ -0,0 +1,128 @@
+"""Tensor-native sentence selection for a whole batch.
+
+Same rules as ``AttentionCompressor._select_sentences`` and
+``_select_sentences_by_threshold``, per row of a padded ``[B, S]`` batch:
+
+* budget: mandatory sentences first (index order, each kept if it still fits),
+  then by score descending (stable) up to the first sentence that does not fit;
+  every kept sentence after the first pays the separator cost; the best
+  sentence is kept if nothing fits.
+* threshold: ``score >= threshold`` or mandatory; the best sentence if none.
+
+Both return ``(preserved [B, S] bool, fallback [B] bool)`` on the scores' device,
+so callers move the whole selection to the host in one transfer.
+"""
+
+from __future__ import annotations
+
+from typing import Sequence, Tuple, Union
+
+import torch
+
+Scores = Union[Sequence[float], torch.Tensor]
+
+# Padded sentences cost more than any budget, so the prefix scan stops at them.
+_PAD_TOKENS = 1 << 40
+
+
+def pad_scores(scores: Sequence[Scores]) -> Tuple[torch.Tensor, torch.Tensor]:
+    """([B, S] scores padded with -inf, [B, S] valid mask); device of tensor rows."""
+    lengths = [len(s) for s in scores]
+    tensors = [s for s in scores if isinstance(s, torch.Tensor)]
+    if tensors:
+        ref = tensors[0]
+        rows = [torch.as_tensor(s, dtype=ref.dtype, device=ref.device) for s in scores]
+        padded = torch.nn.utils.rnn.pad_sequence(
+            rows, batch_first=True, padding_value=float("-inf")
+        )
+    else:
+        width = max(lengths, default=0)
+        padded = torch.tensor(
+            [list(s) + [float("-inf")] * (width - len(s)) for s in scores],
+            dtype=torch.float64,
+        ).reshape(len(scores), width)
+    valid = torch.arange(padded.shape[1], device=padded.device)[None, :] < torch.tensor(
+        lengths, device=padded.device
+    )[:, None]
+    return padded, valid
+
+
+def pad_tokens(tokens: Sequence[Sequence[int]], device: torch.device) -> torch.Tensor:
+    """[B, S] int64 token counts padded with a cost no budget admits."""
+    width = max((len(t) for t in tokens), default=0)
+    return torch.tensor(
+        [list(t) + [_PAD_TOKENS] * (width - len(t)) for t in tokens], dtype=torch.int64
+    ).reshape(len(tokens), width).to(device)
+
+
+def pad_index_lists(indices: Sequence[Sequence[int]], device: torch.device) -> torch.Tensor:
+    """[B, M] int64 index lists padded with -1 (M = longest list, may be 0)."""
+    width = max((len(i) for i in indices), default=0)
+    return torch.tensor(
+        [list(i) + [-1] * (width - len(i)) for i in indices], dtype=torch.int64
+    ).reshape(len(indices), width).to(device)
+
+
+def _best_when_empty(
+    preserved: torch.Tensor, order: torch.Tensor, valid: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    fallback = ~preserved.any(dim=1) & valid.any(dim=1)
+    first = order[:, :1]
+    preserved.scatter_(1, first, preserved.gather(1, first) | fallback[:, None])
+    return preserved, fallback
+
+
+def select_by_budget_batch(
+    scores: torch.Tensor,
+    tokens: torch.Tensor,
+    valid: torch.Tensor,
+    targets: torch.Tensor,
+    sep_costs: torch.Tensor,
+    mandatory: torch.Tensor,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Greedy budget selection; mandatory is [B, M] index lists (pad_index_lists)."""
+    batch, width = scores.shape
+    device = scores.device
+    preserved = torch.zeros(batch, width, dtype=torch.bool, device=device)
+    if width == 0:
+        return preserved, torch.zeros(batch, dtype=torch.bool, device=device)
+    targets = targets.view(batch, 1).to(device=device, dtype=torch.int64)
+    sep = sep_costs.view(batch, 1).to(device=device, dtype=torch.int64)
+    current = torch.zeros(batch, 1, dtype=torch.int64, device=device)
+    kept = torch.zeros(batch, 1, dtype=torch.bool, device=device)
+
+    for m in range(mandatory.shape[1]):
+        slot = mandatory[:, m : m + 1]
+        idx = slot.clamp(min=0)
+        cost = tokens.gather(1, idx) + sep * kept
+        fits = (slot >= 0) & (current + cost <= targets)
+        current += torch.where(fits, cost, 0)
+        kept |= fits
+        preserved.scatter_(1, idx, preserved.gather(1, idx) | fits)
+
+    order = torch.sort(scores, dim=1, descending=True, stable=True).indices
+    skip = preserved.gather(1, order)
+    cost = torch.where(skip, 0, tokens.gather(1, order) + sep)
+    total = current + cost.cumsum(dim=1) - sep * ~kept
+    fits = skip | (total <= targets)
+    alive = fits.to(torch.int8).cummin(dim=1).values.bool()
+    preserved.scatter_(1, order, skip | (alive & valid.gather(1, order)))
+    return _best_when_empty(preserved, order, valid)
+
+
+def select_by_threshold_batch(
+    scores: torch.Tensor,
+    valid: torch.Tensor,
+    threshold: float,
+    mandatory: torch.Tensor,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Sentences scoring >= threshold, plus mandatory; the best one if none."""
+    batch, width = scores.shape
+    preserved = (scores >= threshold) & valid
+    if width == 0:
+        return preserved, torch.zeros(batch, dtype=torch.bool, device=scores.device)
+    if mandatory.shape[1]:
+        hits = torch.zeros(batch, width + 1, dtype=torch.bool, device=scores.device)
+        hits.scatter_(1, torch.where(mandatory >= 0, mandatory, width), True)
+        preserved |= hits[:, :width] & valid
+    return _best_when_empty(preserved, scores.argmax(dim=1, keepdim=True), valid)
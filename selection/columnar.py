@@ -0,0 +1,252 @@
+"""Columnar compress_batch() results: flat numpy columns, per-sample dicts on demand.
+
+Sentences are ``(start, end)`` char spans into the sample's context (the caller's
+string, referenced, not copied); ``compressed_text`` is joined from the spans
+of the preserved sentences only when read. Per-sentence columns are flat over
+the batch and sliced with ``sentence_offsets``; preserved indices likewise with
+``preserved_offsets``. Samples whose split is not a verbatim slice of the
+context keep their sentence list instead of spans.
+"""
+
+from __future__ import annotations
+
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from prep.aligned_prompt import locate_sentence_spans
+
+
+class ColumnarResults:
+    """Batch results as columns; ``results[i]`` materializes one compress() dict."""
+
+    def __init__(
+        self,
+        contexts: List[str],
+        separators: List[str],
+        sentence_offsets: np.ndarray,
+        sentence_spans: np.ndarray,
+        sentence_scores: np.ndarray,
+        sentence_tokens: np.ndarray,
+        preserved_offsets: np.ndarray,
+        preserved_indices: np.ndarray,
+        columns: Dict[str, np.ndarray],
+        sentence_passages: Optional[np.ndarray] = None,
+        has_passages: Optional[np.ndarray] = None,
+        token_ids: Optional[Dict[str, tuple]] = None,
+        fallback_sentences: Optional[Dict[int, List[str]]] = None,
+        score_tensor: Optional[Tuple[torch.dtype, torch.device]] = None,
+    ):
+        self.contexts = contexts
+        self.separators = separators
+        self.sentence_offsets = sentence_offsets
+        self.sentence_spans = sentence_spans
+        self.sentence_scores = sentence_scores
+        self.sentence_tokens = sentence_tokens
+        self.preserved_offsets = preserved_offsets
+        self.preserved_indices = preserved_indices
+        # original_length, compressed_length, compression_ratio, processing_time: [B]
+        self.columns = columns
+        self.sentence_passages = sentence_passages  # [N], -1 for non-passage samples
+        self.has_passages = has_passages  # [B]: sample came as a passage list
+        self.token_ids = token_ids or {}  # name -> (flat ids, offsets [B + 1])
+        self.fallback_sentences = fallback_sentences or {}
+        # (dtype, device) when compress() returned score tensors (use_pure_gpu)
+        self.score_tensor = score_tensor
+
+    def __len__(self) -> int:
+        return len(self.contexts)
+
+    def __repr__(self) -> str:
+        return (
+            f"ColumnarResults({len(self)} samples, {len(self.sentence_scores)} sentences, "
+            f"{self.nbytes / 1024:.1f} KiB)"
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the columns (contexts are the caller's strings)."""
+        arrays = [
+            self.sentence_offsets,
+            self.sentence_spans,
+            self.sentence_scores,
+            self.sentence_tokens,
+            self.preserved_offsets,
+            self.preserved_indices,
+            *self.columns.values(),
+            *(a for pair in self.token_ids.values() for a in pair),
+        ]
+        if self.sentence_passages is not None:
+            arrays += [self.sentence_passages, self.has_passages]
+        fallback = sum(
+            sys.getsizeof(s) for sents in self.fallback_sentences.values() for s in sents
+        )
+        return int(sum(a.nbytes for a in arrays)) + fallback
+
+    def _rows(self, i: int) -> slice:
+        return slice(int(self.sentence_offsets[i]), int(self.sentence_offsets[i + 1]))
+
+    def _index(self, i: int) -> int:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"result index {i} out of range for {len(self)} samples")
+        return i
+
+    def preserved(self, i: int) -> np.ndarray:
+        i = self._index(i)
+        return self.preserved_indices[self.preserved_offsets[i] : self.preserved_offsets[i + 1]]
+
+    def sentences(self, i: int) -> List[str]:
+        i = self._index(i)
+        if i in self.fallback_sentences:
+            return list(self.fallback_sentences[i])
+        context = self.contexts[i]
+        return [context[a:b] for a, b in self.sentence_spans[self._rows(i)].tolist()]
+
+    def compressed_text(self, i: int) -> str:
+        i = self._index(i)
+        kept = self.preserved(i).tolist()
+        if i in self.fallback_sentences:
+            sentences = self.fallback_sentences[i]
+            return self.separators[i].join(sentences[k] for k in kept)
+        context = self.contexts[i]
+        spans = self.sentence_spans[self._rows(i)][kept].tolist()
+        return self.separators[i].join(context[a:b] for a, b in spans)
+
+    def _scores(self, rows: slice):
+        """Sentence scores as the list path returns them: floats, or a tensor (use_pure_gpu)."""
+        scores = self.sentence_scores[rows]
+        if self.score_tensor is None:
+            return scores.tolist()
+        dtype, device = self.score_tensor
+        return torch.from_numpy(scores).to(device=device, dtype=dtype)
+
+    def __getitem__(self, i: int) -> Dict:
+        """The compress_batch() dict of sample i (same keys and value types)."""
+        i = self._index(i)
+        rows = self._rows(i)
+        preserved = self.preserved(i)
+        result = {
+            'compressed_text': self.compressed_text(i),
+            'original_length': int(self.columns["original_length"][i]),
+            'compressed_length': int(self.columns["compressed_length"][i]),
+            'compression_ratio': float(self.columns["compression_ratio"][i]),
+            'sentence_scores': self._scores(rows),
+            'sentences': self.sentences(i),
+            'preserved_indices': preserved.tolist(),
+            'processing_time': float(self.columns["processing_time"][i]),
+        }
+        for name, (flat, offsets) in self.token_ids.items():
+            result[name] = flat[offsets[i] : offsets[i + 1]].tolist()
+        if self.sentence_passages is not None and self.has_passages[i]:
+            passages = self.sentence_passages[rows]
+            result['sentence_passages'] = passages.tolist()
+            result['preserved_passages'] = np.unique(passages[preserved]).tolist()
+        return result
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_dicts(self) -> List[Dict]:
+        return list(self)
+
+
+class ColumnarResultsBuilder:
+    """Accumulates compress() dicts into typed buffers; each dict can be dropped after append."""
+
+    _TOKEN_ID_KEYS = ("compressed_token_ids", "prompt_token_ids")
+    _COLUMN_TYPES = {
+        "original_length": "q",
+        "compressed_length": "q",
+        "compression_ratio": "d",
+        "processing_time": "d",
+    }
+
+    def __init__(self):
+        self._contexts: List[str] = []
+        self._separators: List[str] = []
+        self._sentence_offsets = array("q", [0])
+        self._preserved_offsets = array("q", [0])
+        self._spans = array("i")
+        self._scores = array("d")
+        self._tokens = array("i")
+        self._preserved = array("i")
+        self._passages = array("i")
+        self._has_passages = array("b")
+        self._columns = {name: array(code) for name, code in self._COLUMN_TYPES.items()}
+        self._ids: Dict[str, Tuple[array, array]] = {}
+        self._fallback: Dict[int, List[str]] = {}
+        self._score_tensor: Optional[Tuple[torch.dtype, torch.device]] = None
+
+    def __len__(self) -> int:
+        return len(self._contexts)
+
+    def append(self, result: Dict, context: str, separator: str) -> None:
+        i = len(self._contexts)
+        sentences = result["sentences"]
+        n = len(sentences)
+        spans = locate_sentence_spans(context, sentences) if n else None
+        if n and (
+            spans is None
+            or not np.array_equal(
+                spans[:, 1] - spans[:, 0], np.fromiter(map(len, sentences), np.int64, n)
+            )
+        ):
+            self._fallback[i] = list(sentences)
+            spans = np.full((n, 2), -1, dtype=np.int64)
+        self._contexts.append(context)
+        self._separators.append(sys.intern(separator))
+        if n:
+            self._spans.frombytes(spans.astype(np.int32).tobytes())
+        scores = result["sentence_scores"]
+        if isinstance(scores, torch.Tensor):
+            self._score_tensor = (scores.dtype, scores.device)
+            scores = scores.detach().double().cpu().numpy()
+        self._scores.frombytes(np.asarray(scores, dtype=np.float64).tobytes())
+        self._tokens.extend(result["sentence_tokens"])
+        self._sentence_offsets.append(self._sentence_offsets[-1] + n)
+        self._preserved.extend(result["preserved_indices"])
+        self._preserved_offsets.append(len(self._preserved))
+        passages = result.get("sentence_passages")
+        self._has_passages.append(passages is not None)
+        self._passages.extend(passages if passages is not None else [-1] * n)
+        for name, column in self._columns.items():
+            column.append(result[name])
+        for name in self._TOKEN_ID_KEYS:
+            if name in result:
+                flat, offsets = self._ids.setdefault(name, (array("i"), array("q", [0])))
+                flat.extend(result[name])
+                offsets.append(len(flat))
+
+    def build(self) -> ColumnarResults:
+        def _np(buffer: array, dtype) -> np.ndarray:
+            return np.frombuffer(buffer, dtype=dtype).copy() if len(buffer) else np.zeros(0, dtype)
+
+        has_passages = _np(self._has_passages, np.int8).astype(bool)
+        return ColumnarResults(
+            contexts=self._contexts,
+            separators=self._separators,
+            sentence_offsets=_np(self._sentence_offsets, np.int64),
+            sentence_spans=_np(self._spans, np.int32).reshape(-1, 2),
+            sentence_scores=_np(self._scores, np.float64),
+            sentence_tokens=_np(self._tokens, np.int32),
+            preserved_offsets=_np(self._preserved_offsets, np.int64),
+            preserved_indices=_np(self._preserved, np.int32),
+            columns={
+                name: _np(column, np.dtype(column.typecode)) for name, column in self._columns.items()
+            },
+            sentence_passages=_np(self._passages, np.int32) if has_passages.any() else None,
+            has_passages=has_passages,
+            token_ids={
+                name: (_np(flat, np.int32), _np(offsets, np.int64))
+                for name, (flat, offsets) in self._ids.items()
+                if len(offsets) == len(self._contexts) + 1
+            },
+            fallback_sentences=self._fallback,
+            score_tensor=self._score_tensor,
+        )
@@ -0,0 +1,90 @@
+"""Reusable per-request ranking: score once, select any number of budgets."""
+
+from __future__ import annotations
+
+import time
+from typing import Dict, List, Optional, Union
+
+import torch
+
+from prep.corpus import PASSAGE_SEPARATOR
+
+
+class SentenceRanking:
+    """Sentences, scores and 7B counts of one request (AttentionCompressor.rank()).
+
+    ``select`` runs selection only (no prep, no forward) and returns the same
+    dict as ``compress()``, so a ladder of budgets costs one forward in total.
+    """
+
+    def __init__(
+        self,
+        compressor,
+        context: Union[str, List[str]],
+        question: str,
+        context_type: str,
+        sentence_scores: Union[List[float], torch.Tensor],
+        sentences: List[str],
+        sentence_tokens: List[int],
+        sentence_passages: Optional[List[int]] = None,
+    ):
+        self._compressor = compressor
+        self.context = context
+        self.question = question
+        self.context_type = context_type
+        self.sentence_scores = sentence_scores
+        self.sentences = sentences
+        self.sentence_tokens = sentence_tokens
+        self.sentence_passages = sentence_passages
+        self.total_tokens = sum(sentence_tokens)
+        self.separator_cost = compressor._join_separator_token_cost(context_type, sentences)
+
+    def __len__(self) -> int:
+        return len(self.sentences)
+
+    def __repr__(self) -> str:
+        return (
+            f"SentenceRanking({len(self)} sentences, {self.total_tokens} tokens, "
+            f"context_type={self.context_type!r})"
+        )
+
+    @property
+    def order(self) -> List[int]:
+        """Sentence indices by score, best first (ties keep document order)."""
+        scores = self.sentence_scores
+        if isinstance(scores, torch.Tensor):
+            return torch.sort(scores, descending=True, stable=True).indices.tolist()
+        return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+
+    def select(
+        self,
+        target_tokens: int = -1,
+        rate: Optional[float] = None,
+        threshold: Optional[float] = None,
+    ) -> Dict[str, Union[str, List, Dict]]:
+        """One compression: target_tokens > 0, else compression ``rate`` (default 0.5),
+        or threshold filtering when ``threshold`` is given."""
+        start_time = time.time()
+        context = (
+            self.context if isinstance(self.context, str) else PASSAGE_SEPARATOR.join(self.context)
+        )
+        result = self._compressor._finalize_compress_result(
+            context,
+            self.sentences,
+            self.sentence_scores,
+            self.sentence_tokens,
+            self.context_type,
+            target_token=target_tokens,
+            compression_rate=0.5 if rate is None else rate,
+            use_threshold_filtering=threshold is not None,
+            threshold=0.5 if threshold is None else threshold,
+            processing_time=0.0,
+            question=self.question,
+        )
+        result["processing_time"] = time.time() - start_time
+        if self.sentence_passages is not None:
+            result["sentence_passages"] = list(self.sentence_passages)
+            result["preserved_passages"] = sorted(
+                {self.sentence_passages[i] for i in result["preserved_indices"]}
+            )
+        return self._compressor._public_result(result)
@@ -0,0 +1,42 @@
+"""Online serving helpers around AttentionCompressor (torch-free at import).
+
+``MicroBatcher`` turns concurrent single requests into batched calls (FIFO);
+``SloScheduler`` does the same by deadline and runs long requests as prefill
+slices between short batches. ``AsyncCompressor`` puts either in front of a
+compressor (``compress_async`` / ``submit_compress``), configured by an
+``AsyncConfig``. ``WorkerPool`` forks CPU workers that share one loaded model;
+``serving.server`` is the HTTP front end. ``load_or_autotune`` applies the
+stored throughput settings for this hardware and model at startup, or
+benchmarks them (``autotune_compressor``) and persists the winners in a
+``ProfileStore``; ``AutotuneConfig`` holds its options.
+"""
+
+from serving.async_compressor import AsyncCompressor
+from serving.autotune import (
+    ProfileStore,
+    autotune_compressor,
+    hardware_fingerprint,
+    load_or_autotune,
+    run_autotune,
+)
+from serving.batcher import MicroBatcher, QueueFullError
+from serving.config import AsyncConfig, AutotuneConfig
+from serving.scheduler import LatencyHistogram, SloScheduler
+from serving.worker_pool import WorkerPool, split_cores
+
+__all__ = [
+    "AsyncCompressor",
+    "AsyncConfig",
+    "AutotuneConfig",
+    "LatencyHistogram",
+    "MicroBatcher",
+    "ProfileStore",
+    "QueueFullError",
+    "SloScheduler",
+    "WorkerPool",
+    "autotune_compressor",
+    "hardware_fingerprint",
+    "load_or_autotune",
+    "run_autotune",
+    "split_cores",
+]
@@ -0,0 +1,190 @@
+"""compress_async / submit_compress on top of one AttentionCompressor.
+
+``AsyncCompressor`` owns the request queue: a ``MicroBatcher`` (FIFO) or an
+``SloScheduler`` (priority + deadline, long prompts as prefill slices), built
+lazily from an ``AsyncConfig``. The compressor itself stays synchronous; the
+batcher thread calls its ``compress_batch`` / ``compress_steps``.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from serving.batcher import MicroBatcher
+from serving.config import AsyncConfig
+from serving.scheduler import SloScheduler
+
+
+class AsyncCompressor:
+    """Micro-batched async front end for an AttentionCompressor."""
+
+    def __init__(self, compressor, config: Optional[AsyncConfig] = None):
+        self.compressor = compressor
+        self.config = config or AsyncConfig()
+        self._batcher: Optional[Union[MicroBatcher, SloScheduler]] = None
+        self._lock = threading.Lock()
+        cfg = self.config
+        if cfg.max_batch_tokens is not None:
+            print(f"  - compress_async batch token budget: {cfg.max_batch_tokens}")
+        if cfg.max_pending is not None:
+            print(f"  - compress_async queue bound: {cfg.max_pending} waiting requests")
+        if cfg.scheduling == "slo":
+            print(
+                f"  - compress_async scheduling: SLO (short {cfg.slo_ms['short']:.0f} ms / "
+                f"long {cfg.slo_ms['long']:.0f} ms, long >= {cfg.long_request_tokens} tokens "
+                f"in {cfg.prefill_chunk_tokens}-token prefill slices)"
+            )
+
+    async def compress_async(
+        self,
+        context: Union[str, List[str]],
+        question: str = "",
+        target_token: int = -1,
+        compression_rate: float = 0.5,
+        context_type: str = "english",
+        use_threshold_filtering: bool = False,
+        threshold: float = 0.5,
+        priority: int = 0,
+        deadline_ms: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        compress() for asyncio callers, micro-batched with concurrent calls.
+
+        Requests are queued to a background batcher (the event loop never runs
+        the model). It waits up to max_wait_ms after the oldest pending request
+        for others with the same budget, up to max_batch_size requests (and
+        max_batch_tokens prompt tokens when set), then runs them through
+        compress_batch() and resolves each call with its own result.
+
+        With scheduling="slo", requests are ordered by (priority, deadline);
+        deadline_ms defaults to slo_ms of the request's class. Requests of at least
+        long_request_tokens context tokens run as prefill_chunk_tokens slices with
+        the KV cache carried over, so short requests are batched in between.
+        """
+        return await asyncio.wrap_future(
+            self.submit_compress(
+                context,
+                question,
+                target_token=target_token,
+                compression_rate=compression_rate,
+                context_type=context_type,
+                use_threshold_filtering=use_threshold_filtering,
+                threshold=threshold,
+                priority=priority,
+                deadline_ms=deadline_ms,
+            )
+        )
+
+    def submit_compress(
+        self,
+        context: Union[str, List[str]],
+        question: str = "",
+        target_token: int = -1,
+        compression_rate: float = 0.5,
+        context_type: str = "english",
+        use_threshold_filtering: bool = False,
+        threshold: float = 0.5,
+        priority: int = 0,
+        deadline_ms: Optional[float] = None,
+    ) -> Future:
+        """
+        Queue one compress() on the batcher; returns a concurrent Future.
+
+        For thread-based callers (e.g. serving.server). Raises QueueFullError
+        when max_pending requests are already waiting; cancelling the future
+        before its batch starts drops the request. priority / deadline_ms apply
+        with scheduling="slo" only.
+        """
+        sample = {"context": context, "question": question, "context_type": context_type}
+        budget = (target_token, compression_rate, use_threshold_filtering, threshold)
+        batcher = self._get_batcher()
+        if isinstance(batcher, SloScheduler):
+            return batcher.submit(
+                (sample, budget),
+                priority=priority,
+                deadline_s=None if deadline_ms is None else deadline_ms / 1000.0,
+            )
+        return batcher.submit((sample, budget))
+
+    def compress_batch(self, samples: List[Dict], **budget) -> List[Dict]:
+        """The wrapped compressor's compress_batch() (bypasses the batcher)."""
+        return self.compressor.compress_batch(samples, **budget)
+
+    def _get_batcher(self) -> Union[MicroBatcher, SloScheduler]:
+        cfg = self.config
+        with self._lock:
+            if self._batcher is not None and not self._batcher.closed:
+                return self._batcher
+            if cfg.scheduling == "slo":
+                self._batcher = SloScheduler(
+                    self._run_batch,
+                    start_job=self._start_job,
+                    classify=self._request_class,
+                    slo_s={name: ms / 1000.0 for name, ms in cfg.slo_ms.items()},
+                    max_batch_size=cfg.max_batch_size,
+                    max_wait_s=cfg.max_wait_ms / 1000.0,
+                    group_key=lambda item: item[1],
+                    max_pending=cfg.max_pending,
+                    name="compress-async",
+                )
+            else:
+                self._batcher = MicroBatcher(
+                    self._run_batch,
+                    max_batch_size=cfg.max_batch_size,
+                    max_wait_s=cfg.max_wait_ms / 1000.0,
+                    max_batch_tokens=cfg.max_batch_tokens,
+                    cost=lambda item: self.compressor.estimate_prompt_tokens(item[0]),
+                    group_key=lambda item: item[1],
+                    max_pending=cfg.max_pending,
+                    name="compress-async",
+                )
+            return self._batcher
+
+    @staticmethod
+    def _budget_kwargs(budget: tuple) -> Dict[str, Any]:
+        target_token, compression_rate, use_threshold_filtering, threshold = budget
+        return dict(
+            target_token=target_token,
+            compression_rate=compression_rate,
+            use_threshold_filtering=use_threshold_filtering,
+            threshold=threshold,
+        )
+
+    def _request_class(self, item: Tuple[Dict, tuple]) -> str:
+        tokens = self.compressor.estimate_prompt_tokens(item[0])
+        return "long" if tokens >= self.config.long_request_tokens else "short"
+
+    def _run_batch(self, items: List[Tuple[Dict, tuple]]) -> List[Dict]:
+        return self.compressor.compress_batch(
+            [sample for sample, _ in items],
+            batch_size=len(items),
+            **self._budget_kwargs(items[0][1]),
+        )
+
+    def _start_job(self, item: Tuple[Dict, tuple]):
+        sample, budget = item
+        return self.compressor.compress_steps(
+            sample, self.config.prefill_chunk_tokens, **self._budget_kwargs(budget)
+        )
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        return self._batcher.stats() if self._batcher is not None else None
+
+    def get_model_info(self) -> Dict[str, Any]:
+        info = self.compressor.get_model_info()
+        info["micro_batcher"] = self.stats()
+        return info
+
+    def close(self) -> None:
+        """Drain the batcher (queued requests still run), then close the compressor;
+        both restart lazily on next use."""
+        if self._batcher is not None:
+            self._batcher.close()
+        self.compressor.close()
+
+    def __enter__(self) -> "AsyncCompressor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,301 @@
+"""Startup autotuning of throughput knobs, persisted per (hardware, model).
+
+``autotune_compressor`` measures ``compress_batch`` throughput (samples/s, prep caches
+cleared before every run so prep knobs count) on the caller's samples or a
+synthetic mix, one knob at a time in ``KNOB_ORDER``, keeping the best value of
+each before moving on. Knobs that cannot vary here (Triton without CUDA,
+torch.compile unless asked for) are left alone.
+
+``ProfileStore`` keeps the chosen settings in one JSON file, keyed by
+``profile_key(hardware_fingerprint(), model)``, written to a temp file and
+renamed into place. ``load_or_autotune`` is the startup entry point: it loads
+the entry for this machine and model, or runs ``run_autotune`` (benchmark and
+save) when there is none.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from serving.config import AutotuneConfig
+
+PROFILE_FORMAT_VERSION = 1
+DEFAULT_PROFILE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "sentinel", "autotune.json")
+KNOB_ORDER = (
+    "use_triton_probe",
+    "use_prep_pipeline",
+    "batch_size",
+    "sentence_tokenize_workers",
+    "use_torch_compile",
+)
+
+_WORDS = (
+    "model context sentence attention probe budget token layer query answer retrieval passage "
+    "score detector compression latency throughput cache batch forward memory signal evidence"
+).split()
+_ZH_SENTENCES = (
+    "模型在推理时会读取检索到的上下文。",
+    "注意力分布反映了模型对句子的使用情况。",
+    "压缩只保留最可能被使用的句子。",
+    "这种方法只需要一次前向计算。",
+)
+
+
+def _cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def _usable_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def hardware_fingerprint() -> Dict[str, Any]:
+    """CPU model / usable cores, GPUs and the torch build."""
+    import torch
+
+    cpus = _usable_cpus()
+    gpus = (
+        [torch.cuda.get_device_name(i) for i in range(torch.cuda.device_count())]
+        if torch.cuda.is_available()
+        else []
+    )
+    return {
+        "machine": platform.machine(),
+        "cpu": _cpu_model(),
+        "cpus": cpus,
+        "gpus": gpus,
+        "torch": torch.__version__,
+    }
+
+
+def profile_key(hardware: Dict[str, Any], model: Dict[str, Any]) -> str:
+    data = json.dumps({"hardware": hardware, "model": model}, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ProfileStore:
+    """JSON file of tuned profiles: ``{"version": 1, "profiles": {key: profile}}``."""
+
+    def __init__(self, path: str = DEFAULT_PROFILE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != PROFILE_FORMAT_VERSION:
+            return {}
+        return data.get("profiles") or {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._read().get(key)
+
+    def put(self, key: str, profile: Dict[str, Any]) -> None:
+        with self._lock:
+            profiles = self._read()
+            profiles[key] = profile
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(
+                        {"version": PROFILE_FORMAT_VERSION, "profiles": profiles},
+                        f,
+                        indent=1,
+                        ensure_ascii=False,
+                    )
+                os.replace(tmp, self.path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+
+
+def synthetic_samples(n: int = 8, seed: int = 0) -> List[Dict[str, str]]:
+    """Mixed-length English (and one Chinese in four) samples, deterministic per seed."""
+    rng = random.Random(seed)
+    samples = []
+    for i in range(n):
+        num_sentences = rng.choice((12, 40, 80, 160))
+        if i % 4 == 3:
+            context = "".join(rng.choice(_ZH_SENTENCES) for _ in range(num_sentences))
+            question = "这种方法需要几次前向计算？"
+            samples.append({"context": context, "question": question, "context_type": "chinese"})
+            continue
+        sentences = [
+            " ".join(rng.choice(_WORDS) for _ in range(rng.randint(6, 24))).capitalize() + "."
+            for _ in range(num_sentences)
+        ]
+        samples.append(
+            {
+                "context": " ".join(sentences),
+                "question": "Which passage explains the latency?",
+                "context_type": "english",
+            }
+        )
+    return samples
+
+
+def knob_candidates(compressor, include_compile: bool = False) -> Dict[str, List[Any]]:
+    """Values to try per knob on this machine (knobs with one value are skipped)."""
+    from probe.kernels.fused_probe import _TRITON_OK
+
+    workers = [0] + [w for w in (2, 4, 8) if w <= _usable_cpus()]
+    return {
+        "use_triton_probe": (
+            [False, True] if _TRITON_OK and compressor.device.type == "cuda" else []
+        ),
+        "use_prep_pipeline": [True, False],
+        "batch_size": [1, 2, 4, 8],
+        "sentence_tokenize_workers": workers if len(workers) > 1 else [],
+        "use_torch_compile": [False, True] if include_compile else [],
+    }
+
+
+def autotune_compressor(
+    compressor,
+    samples: Optional[Sequence[Dict]] = None,
+    repeats: int = 2,
+    include_compile: bool = False,
+    log: Callable[[str], None] = print,
+) -> Dict[str, Any]:
+    """Coordinate search over ``KNOB_ORDER``; leaves the best settings applied.
+
+    Returns {"settings", "samples_per_s", "baseline_samples_per_s", "measurements"}.
+    """
+    samples = list(samples) if samples else synthetic_samples()
+    candidates = knob_candidates(compressor, include_compile)
+    best = compressor._tuned_settings()
+    measurements: List[Dict[str, Any]] = []
+
+    def _measure(settings: Dict[str, Any]) -> float:
+        compressor._apply_tuned_settings(settings)
+        compressor.compress_batch(samples[:2], compression_rate=0.5)  # warm kernels / pools
+        runs = []
+        for _ in range(max(1, repeats)):
+            compressor._caches.clear()
+            t0 = time.perf_counter()
+            compressor.compress_batch(samples, compression_rate=0.5)
+            runs.append(time.perf_counter() - t0)
+        rate = len(samples) / min(runs)
+        measurements.append({"settings": dict(settings), "samples_per_s": rate})
+        return rate
+
+    baseline = best_rate = _measure(best)
+    log(f"  - autotune baseline: {baseline:.2f} samples/s")
+    for knob in KNOB_ORDER:
+        values = candidates.get(knob) or []
+        if len(values) < 2:
+            continue
+        for value in values:
+            if value == best[knob]:
+                continue
+            trial = dict(best, **{knob: value})
+            try:
+                rate = _measure(trial)
+            except Exception as exc:  # e.g. torch.compile unsupported here
+                log(f"⚠️  autotune: {knob}={value!r} failed ({type(exc).__name__}: {exc})")
+                continue
+            if rate > best_rate:
+                best, best_rate = trial, rate
+        log(f"  - autotune {knob}: {best[knob]!r} ({best_rate:.2f} samples/s)")
+    compressor._apply_tuned_settings(best)
+    compressor._caches.clear()
+    return {
+        "settings": best,
+        "samples_per_s": best_rate,
+        "baseline_samples_per_s": baseline,
+        "measurements": measurements,
+    }
+
+
+def model_key(compressor) -> Dict[str, Any]:
+    """The model half of a profile key: weights, detector, dtype, device type, max_seq_len."""
+    return {
+        "attention_model": compressor.attention_model_path,
+        "detector": compressor.detector_path,
+        "dtype": str(compressor.model_dtype),
+        "device": compressor.device.type,
+        "max_seq_len": compressor.max_seq_len,
+    }
+
+
+def run_autotune(compressor, config: Optional[AutotuneConfig] = None) -> Dict[str, Any]:
+    """
+    Benchmark throughput knobs (Triton probe, prep pipeline vs batched forward,
+    batch size, sentence tokenize workers, optionally torch.compile) on
+    ``config.samples`` and apply the fastest settings to ``compressor``.
+
+    The profile is saved to ``config.profile_path`` under a key of this
+    machine's hardware and this model, where ``load_or_autotune`` finds it on
+    the next startup. Returns the applied profile.
+    """
+    config = config or AutotuneConfig()
+    hardware = hardware_fingerprint()
+    model = model_key(compressor)
+    key = profile_key(hardware, model)
+    print("Autotuning throughput knobs...")
+    # Score printing and the result cache would skew (or short-circuit) the timings.
+    print_scores, result_config = compressor.print_sentence_scores, compressor._result_config
+    compressor.print_sentence_scores, compressor._result_config = False, None
+    try:
+        tuned = autotune_compressor(
+            compressor,
+            config.samples,
+            repeats=config.repeats,
+            include_compile=config.include_compile,
+        )
+    finally:
+        compressor.print_sentence_scores, compressor._result_config = print_scores, result_config
+    profile = {
+        "settings": tuned["settings"],
+        "samples_per_s": tuned["samples_per_s"],
+        "baseline_samples_per_s": tuned["baseline_samples_per_s"],
+        "hardware": hardware,
+        "model": model,
+        "tuned_at": time.time(),
+    }
+    if config.save:
+        ProfileStore(config.profile_path or DEFAULT_PROFILE_PATH).put(key, profile)
+    profile = dict(profile, key=key, source="benchmark")
+    compressor.apply_tuned_profile(profile)
+    print(
+        f"✅ Autotune: {tuned['settings']} "
+        f"({tuned['baseline_samples_per_s']:.2f} -> {tuned['samples_per_s']:.2f} samples/s)"
+    )
+    return profile
+
+
+def load_or_autotune(compressor, config: Optional[AutotuneConfig] = None) -> Dict[str, Any]:
+    """Apply the stored profile for this hardware and model, or run_autotune() if none."""
+    config = config or AutotuneConfig()
+    path = config.profile_path or DEFAULT_PROFILE_PATH
+    key = profile_key(hardware_fingerprint(), model_key(compressor))
+    profile = ProfileStore(path).get(key)
+    if profile is None:
+        return run_autotune(compressor, config)
+    profile = dict(profile, key=key, source=path)
+    compressor.apply_tuned_profile(profile)
+    print(f"  - Autotune profile: {profile['settings']} (from {path})")
+    return profile
@@ -0,0 +1,230 @@
+"""Micro-batcher: concurrent single requests -> batched calls on one runner thread.
+
+Callers ``submit`` an item and get a ``concurrent.futures.Future`` (wrap it with
+``asyncio.wrap_future`` on an event loop). The runner thread takes the oldest
+pending item and collects more items with the same group key until the batch
+holds ``max_batch_size`` items or ``max_batch_tokens`` of cost, or until the
+oldest item has waited ``max_wait_s``; then ``run_batch(items)`` runs and each
+future is resolved with its own result. Items of other groups (e.g. another
+budget) stay pending in arrival order. Cancelled futures are dropped before
+the batch runs. When a batch raises, its items are retried one by one so a
+single bad request fails alone. With ``max_pending`` set, ``submit`` raises
+``QueueFullError`` instead of queueing more than that many items (backpressure).
+
+``cost`` runs on the runner thread, so expensive estimates (tokenization) never
+block the submitting thread or event loop.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+_CLOSE = object()
+
+
+class QueueFullError(RuntimeError):
+    """Raised by ``MicroBatcher.submit`` when ``max_pending`` items are waiting."""
+
+
+class _Pending:
+    __slots__ = ("item", "future", "key", "cost", "arrival")
+
+    def __init__(self, item: Any, future: Future, key: Hashable, arrival: float):
+        self.item = item
+        self.future = future
+        self.key = key
+        self.cost = 0
+        self.arrival = arrival
+
+
+class MicroBatcher:
+    """Collects submitted items into batches for ``run_batch`` on a background thread."""
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 4,
+        max_wait_s: float = 0.005,
+        max_batch_tokens: Optional[int] = None,
+        cost: Optional[Callable[[Any], int]] = None,
+        group_key: Optional[Callable[[Any], Hashable]] = None,
+        max_pending: Optional[int] = None,
+        name: str = "micro-batcher",
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be >= 1, got {max_batch_size}")
+        if max_wait_s < 0:
+            raise ValueError(f"max_wait_s must be >= 0, got {max_wait_s}")
+        self.run_batch = run_batch
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_s = float(max_wait_s)
+        self.max_batch_tokens = max_batch_tokens
+        self._cost = cost
+        self._group_key = group_key
+        self.max_pending = max_pending
+        self._waiting = 0
+        self._inbox: Queue = Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._wait_s = 0.0
+        self._split_retries = 0
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue one item; the future resolves to its ``run_batch`` result."""
+        future: Future = Future()
+        key = self._group_key(item) if self._group_key is not None else None
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            if self.max_pending is not None and self._waiting >= self.max_pending:
+                raise QueueFullError(f"{self._waiting} requests already waiting")
+            self._waiting += 1
+            self._inbox.put(_Pending(item, future, key, time.perf_counter()))
+        return future
+
+    def close(self, wait: bool = True) -> None:
+        """Stop accepting items; items already submitted are still run."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._inbox.put(_CLOSE)
+        if wait:
+            self._thread.join()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "policy": "fifo",
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_size": self._items / self._batches if self._batches else 0.0,
+                "mean_wait_s": self._wait_s / self._items if self._items else 0.0,
+                "split_retries": self._split_retries,
+                "pending": self._waiting,
+            }
+
+    def _admit(self, entry: _Pending, pending: List[_Pending]) -> None:
+        if self._cost is not None and self.max_batch_tokens is not None:
+            try:
+                entry.cost = int(self._cost(entry.item))
+            except BaseException as exc:
+                self._release(1)
+                if entry.future.set_running_or_notify_cancel():
+                    entry.future.set_exception(exc)
+                return
+        pending.append(entry)
+
+    def _take(self, pending: List[_Pending]) -> List[_Pending]:
+        """Batch of the oldest pending item's group, removed from ``pending``."""
+        key = pending[0].key
+        batch: List[_Pending] = []
+        total = 0
+        for entry in pending:
+            if entry.key != key:
+                continue
+            over = self.max_batch_tokens is not None and total + entry.cost > self.max_batch_tokens
+            if batch and over:
+                break
+            batch.append(entry)
+            total += entry.cost
+            if len(batch) == self.max_batch_size:
+                break
+        taken = {id(entry) for entry in batch}
+        pending[:] = [entry for entry in pending if id(entry) not in taken]
+        return batch
+
+    def _full(self, pending: List[_Pending]) -> bool:
+        key = pending[0].key
+        group = [entry for entry in pending if entry.key == key]
+        if len(group) >= self.max_batch_size:
+            return True
+        if self.max_batch_tokens is None:
+            return False
+        return sum(entry.cost for entry in group) >= self.max_batch_tokens
+
+    def _admit_queued(self, pending: List[_Pending]) -> bool:
+        """Admit everything already in the inbox; True when close was requested."""
+        closing = False
+        while True:
+            try:
+                got = self._inbox.get_nowait()
+            except Empty:
+                return closing
+            if got is _CLOSE:
+                closing = True
+            else:
+                self._admit(got, pending)
+
+    def _loop(self) -> None:
+        pending: List[_Pending] = []
+        closing = False
+        while True:
+            if not pending:
+                if closing:
+                    return
+                got = self._inbox.get()
+                if got is _CLOSE:
+                    closing = True
+                    continue
+                self._admit(got, pending)
+            closing = self._admit_queued(pending) or closing
+            if not pending:
+                continue
+            deadline = pending[0].arrival + self.max_wait_s
+            while not closing and not self._full(pending):
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    got = self._inbox.get(timeout=timeout)
+                except Empty:
+                    break
+                if got is _CLOSE:
+                    closing = True
+                else:
+                    self._admit(got, pending)
+            self._run(self._take(pending))
+
+    def _release(self, n: int) -> None:
+        with self._lock:
+            self._waiting -= n
+
+    def _run(self, batch: List[_Pending]) -> None:
+        self._release(len(batch))
+        batch = [entry for entry in batch if entry.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._wait_s += sum(now - entry.arrival for entry in batch)
+        try:
+            results = self.run_batch([entry.item for entry in batch])
+        except BaseException as exc:
+            if len(batch) == 1:
+                batch[0].future.set_exception(exc)
+                return
+            with self._lock:
+                self._split_retries += 1
+            for entry in batch:
+                try:
+                    entry.future.set_result(self.run_batch([entry.item])[0])
+                except BaseException as one_exc:
+                    entry.future.set_exception(one_exc)
+            return
+        for entry, result in zip(batch, results):
+            entry.future.set_result(result)
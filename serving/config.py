@@ -0,0 +1,74 @@
+"""Serving-layer settings, kept off the AttentionCompressor constructor.
+
+``AsyncConfig`` configures ``AsyncCompressor`` (the compress_async /
+submit_compress batcher or SLO scheduler); ``AutotuneConfig`` configures
+``serving.autotune.load_or_autotune`` / ``run_autotune``.
+"""
+
+from typing import Dict, List, Optional
+
+
+class AsyncConfig:
+    """Micro-batching and scheduling knobs for ``serving.AsyncCompressor``.
+
+    max_batch_size / max_wait_ms: a batch closes at this many requests or this
+        long after its oldest request, whichever comes first.
+    max_batch_tokens: also close a batch at this many estimated prompt tokens
+        (fifo only; None = no token cap).
+    max_pending: waiting requests before submit raises QueueFullError (None =
+        unbounded).
+    scheduling: "fifo" (MicroBatcher) or "slo" (SloScheduler: priority and
+        deadline order; requests of at least long_request_tokens context
+        tokens run as prefill_chunk_tokens slices between short batches).
+    slo_ms: per-class default deadlines, merged over {"short": 250, "long": 5000}.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = 4,
+        max_wait_ms: float = 5.0,
+        max_batch_tokens: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        scheduling: str = "fifo",
+        slo_ms: Optional[Dict[str, float]] = None,
+        long_request_tokens: int = 8192,
+        prefill_chunk_tokens: int = 2048,
+    ):
+        if scheduling not in ("fifo", "slo"):
+            raise ValueError(f"scheduling must be 'fifo' or 'slo', got {scheduling!r}")
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.max_batch_tokens = max_batch_tokens
+        self.max_pending = max_pending
+        self.scheduling = scheduling
+        self.slo_ms = {"short": 250.0, "long": 5000.0, **(slo_ms or {})}
+        self.long_request_tokens = max(1, int(long_request_tokens))
+        self.prefill_chunk_tokens = max(1, int(prefill_chunk_tokens))
+
+    def to_dict(self) -> Dict:
+        return dict(vars(self), slo_ms=dict(self.slo_ms))
+
+
+class AutotuneConfig:
+    """Startup autotune settings for ``serving.autotune.load_or_autotune``.
+
+    samples: benchmark inputs (None = a synthetic mix).
+    profile_path: JSON profile store (None = ~/.cache/sentinel/autotune.json).
+    include_compile: also try torch.compile (slow to benchmark).
+    repeats: timed runs per setting (the fastest counts).
+    save: write a benchmarked profile back to profile_path.
+    """
+
+    def __init__(
+        self,
+        samples: Optional[List[Dict]] = None,
+        profile_path: Optional[str] = None,
+        include_compile: bool = False,
+        repeats: int = 2,
+        save: bool = True,
+    ):
+        self.samples = samples
+        self.profile_path = profile_path
+        self.include_compile = bool(include_compile)
+        self.repeats = max(1, int(repeats))
+        self.save = bool(save)
@@ -0,0 +1,311 @@
+"""SLO-aware scheduler: batched short requests interleaved with sliced long ones.
+
+Each submitted item is classified on the runner thread (``classify`` may be
+expensive, e.g. tokenization) as "short" or "long" and gets a deadline
+(arrival + the class SLO, or the caller's own). Urgency is (-priority, deadline):
+earliest deadline first within a priority.
+
+Short items run in batches through ``run_batch`` like ``MicroBatcher`` (same
+group key, up to ``max_batch_size``, ``max_wait_s`` after the oldest). Long items
+run as jobs: ``start_job(item)`` returns an iterator that does one unit of work
+(a prefill slice) per ``next()`` and yields ``None`` until it yields the result.
+Between units the scheduler picks the most urgent work again, so a short
+request waits for at most one slice instead of a whole long prefill. While a
+short batch is still filling, idle time goes to the active long job.
+
+Per-class latency (submit to result) goes into ``LatencyHistogram``s, with
+deadline misses counted; ``stats()`` reports both.
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from serving.batcher import QueueFullError
+
+_CLOSE = object()
+CLASSES = ("short", "long")
+
+
+class LatencyHistogram:
+    """Log-spaced latency buckets (ms) with bucket-bound percentile estimates."""
+
+    BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000.0
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound (ms) of the bucket holding the q-quantile, capped at the max seen."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                if i == len(self.BOUNDS_MS):
+                    return self.max_ms
+                return min(float(self.BOUNDS_MS[i]), self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> Dict[str, Any]:
+        labels = [f"<={b}ms" for b in self.BOUNDS_MS] + [f">{self.BOUNDS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else None,
+            "max_ms": self.max_ms if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p90_ms": self.percentile(0.9),
+            "p99_ms": self.percentile(0.99),
+            "buckets": {label: n for label, n in zip(labels, self.counts) if n},
+        }
+
+
+class _Request:
+    __slots__ = ("item", "future", "key", "priority", "deadline", "arrival", "cls", "job")
+
+    def __init__(
+        self, item: Any, future: Future, key: Hashable, priority: int, deadline: Optional[float]
+    ):
+        self.item = item
+        self.future = future
+        self.key = key
+        self.priority = priority
+        self.deadline = deadline  # absolute (perf_counter), None until classified
+        self.arrival = time.perf_counter()
+        self.cls = "short"
+        self.job: Optional[Iterator[Any]] = None
+
+    def urgency(self) -> Tuple[int, float]:
+        return (-self.priority, self.deadline)
+
+
+class SloScheduler:
+    """Earliest-deadline-first runner with the ``MicroBatcher`` submit / close / stats API."""
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Any]], List[Any]],
+        start_job: Callable[[Any], Iterator[Any]],
+        classify: Callable[[Any], str],
+        slo_s: Dict[str, float],
+        max_batch_size: int = 4,
+        max_wait_s: float = 0.005,
+        group_key: Optional[Callable[[Any], Hashable]] = None,
+        max_pending: Optional[int] = None,
+        max_active_jobs: int = 1,
+        name: str = "slo-scheduler",
+    ):
+        missing = [c for c in CLASSES if c not in slo_s]
+        if missing:
+            raise ValueError(f"slo_s needs a target for every class, missing {missing}")
+        if max_batch_size < 1 or max_active_jobs < 1:
+            raise ValueError("max_batch_size and max_active_jobs must be >= 1")
+        self.run_batch = run_batch
+        self.start_job = start_job
+        self._classify = classify
+        self.slo_s = dict(slo_s)
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_s = float(max_wait_s)
+        self._group_key = group_key
+        self.max_pending = max_pending
+        self.max_active_jobs = int(max_active_jobs)
+        self._inbox: Queue = Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._latency = {c: LatencyHistogram() for c in CLASSES}
+        self._missed = {c: 0 for c in CLASSES}
+        self._batches = 0
+        self._slices = 0
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any, priority: int = 0, deadline_s: Optional[float] = None) -> Future:
+        """Queue one item; ``deadline_s`` (relative) overrides the class SLO."""
+        future: Future = Future()
+        key = self._group_key(item) if self._group_key is not None else None
+        request = _Request(item, future, key, int(priority), None)
+        if deadline_s is not None:
+            request.deadline = request.arrival + float(deadline_s)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("SloScheduler is closed")
+            if self.max_pending is not None and self._waiting >= self.max_pending:
+                raise QueueFullError(f"{self._waiting} requests already waiting")
+            self._waiting += 1
+            self._inbox.put(request)
+        return future
+
+    def close(self, wait: bool = True) -> None:
+        """Stop accepting items; items already submitted are still run."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._inbox.put(_CLOSE)
+        if wait:
+            self._thread.join()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "policy": "slo",
+                "slo_ms": {c: s * 1000.0 for c, s in self.slo_s.items()},
+                "batches": self._batches,
+                "prefill_slices": self._slices,
+                "pending": self._waiting,
+                "latency": {c: h.summary() for c, h in self._latency.items()},
+                "deadline_misses": dict(self._missed),
+            }
+
+    def _release(self, n: int) -> None:
+        with self._lock:
+            self._waiting -= n
+
+    def _finish(
+        self, request: _Request, result: Any = None, exc: Optional[BaseException] = None
+    ) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            self._latency[request.cls].observe(now - request.arrival)
+            if now > request.deadline:
+                self._missed[request.cls] += 1
+        if exc is not None:
+            request.future.set_exception(exc)
+        else:
+            request.future.set_result(result)
+
+    def _admit(self, request: _Request, shorts: List[_Request], longs: List[_Request]) -> None:
+        try:
+            request.cls = self._classify(request.item)
+            if request.cls not in CLASSES:
+                raise ValueError(f"classify returned {request.cls!r}, expected one of {CLASSES}")
+        except BaseException as exc:
+            self._release(1)
+            if request.future.set_running_or_notify_cancel():
+                request.future.set_exception(exc)
+            return
+        if request.deadline is None:
+            request.deadline = request.arrival + self.slo_s[request.cls]
+        (shorts if request.cls == "short" else longs).append(request)
+
+    def _admit_queued(
+        self, shorts: List[_Request], longs: List[_Request], timeout: Optional[float] = 0.0
+    ) -> bool:
+        """Admit queued requests (blocking up to ``timeout`` for the first); True on close."""
+        closing = False
+        block = timeout is None or timeout > 0
+        while True:
+            try:
+                got = self._inbox.get(timeout=timeout) if block else self._inbox.get_nowait()
+            except Empty:
+                return closing
+            block = False
+            if got is _CLOSE:
+                closing = True
+            else:
+                self._admit(got, shorts, longs)
+
+    def _run_shorts(self, batch: List[_Request]) -> None:
+        self._release(len(batch))
+        batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        with self._lock:
+            self._batches += 1
+        try:
+            results = self.run_batch([r.item for r in batch])
+        except BaseException as exc:
+            if len(batch) == 1:
+                self._finish(batch[0], exc=exc)
+                return
+            for r in batch:
+                try:
+                    self._finish(r, result=self.run_batch([r.item])[0])
+                except BaseException as one_exc:
+                    self._finish(r, exc=one_exc)
+            return
+        for r, result in zip(batch, results):
+            self._finish(r, result=result)
+
+    def _step_job(self, request: _Request, active: List[_Request]) -> None:
+        with self._lock:
+            self._slices += 1
+        try:
+            result = next(request.job)
+        except StopIteration:
+            active.remove(request)
+            self._finish(request, exc=RuntimeError("job finished without a result"))
+            return
+        except BaseException as exc:
+            active.remove(request)
+            self._finish(request, exc=exc)
+            return
+        if result is not None:
+            active.remove(request)
+            self._finish(request, result=result)
+
+    def _loop(self) -> None:
+        shorts: List[_Request] = []
+        longs: List[_Request] = []
+        active: List[_Request] = []
+        closing = False
+        while True:
+            if not (shorts or longs or active):
+                if closing:
+                    return
+            idle = not (shorts or longs or active)
+            closing = self._admit_queued(shorts, longs, timeout=None if idle else 0.0) or closing
+            longs.sort(key=_Request.urgency)
+            while longs and len(active) < self.max_active_jobs:
+                request = longs.pop(0)
+                self._release(1)
+                if not request.future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    request.job = iter(self.start_job(request.item))
+                except BaseException as exc:
+                    self._finish(request, exc=exc)
+                    continue
+                active.append(request)
+            job = min(active, key=_Request.urgency) if active else None
+            if shorts:
+                head = min(shorts, key=_Request.urgency)
+                if job is None or head.urgency() <= job.urgency():
+                    group = sorted((r for r in shorts if r.key == head.key), key=_Request.urgency)
+                    oldest = min(r.arrival for r in group)
+                    wait = oldest + self.max_wait_s - time.perf_counter()
+                    if len(group) < self.max_batch_size and wait > 0 and not closing:
+                        if job is not None:
+                            self._step_job(job, active)
+                        else:
+                            closing = self._admit_queued(shorts, longs, timeout=wait) or closing
+                        continue
+                    batch = group[: self.max_batch_size]
+                    taken = {id(r) for r in batch}
+                    shorts[:] = [r for r in shorts if id(r) not in taken]
+                    self._run_shorts(batch)
+                    continue
+            if job is not None:
+                self._step_job(job, active)
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local HTTP compression service (stdlib only) with dynamic batching.
+
+Endpoints:
+    POST /compress  JSON: context (string or list of passages), question,
+                    context_type, compression_rate | target_token | threshold,
+                    timeout_ms, return_sentences, priority / deadline_ms
+                    (--scheduling slo)
+    GET  /healthz   200 while the process answers HTTP
+    GET  /readyz    200 once the model is loaded and warmed up; 503 while
+                    loading, after a failed load and while draining
+    GET  /stats     server counters + compressor batcher stats (per-class
+                    latency histograms with --scheduling slo)
+
+Requests go through serving.AsyncCompressor.submit_compress(), so concurrent
+requests share batched forwards (--max_batch_size / --max_wait_ms). At most
+--max_queue requests wait for a batch; beyond that the server answers 429 with
+Retry-After. A request not finished within its timeout gets 504 (dropped if its
+batch has not started). --scheduling slo orders requests by priority and
+deadline and runs long prompts as chunked-prefill slices between short batches.
+On CPU, --workers N serves from a serving.WorkerPool (one model load, N forked
+workers pinned to their own cores). SIGTERM / SIGINT drain: readiness turns
+503, new requests get 503, in-flight requests finish (up to --drain_timeout_s),
+then the process exits.
+
+Usage:
+    PYTHONPATH=. python -m serving.server --detector_path models/detectors/<detector>.pkl \\
+        --port 8000 --max_batch_size 8 --max_wait_ms 5 --max_queue 64
+"""
+
+import argparse
+import json
+import signal
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from serving.batcher import QueueFullError
+
+_WARMUP_CONTEXT = " ".join(
+    f"Sentence {i} of the warmup context describes step {i} of the process." for i in range(24)
+)
+_RESULT_FIELDS = (
+    "compressed_text",
+    "original_length",
+    "compressed_length",
+    "compression_ratio",
+    "preserved_indices",
+    "processing_time",
+    "preserved_passages",
+    "compressed_token_ids",
+    "prompt_token_ids",
+)
+
+Response = Tuple[int, Dict[str, Any], Dict[str, str]]
+
+
+def _json_value(value: Any) -> Any:
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return value
+
+
+def parse_compress_request(payload: Any) -> Dict[str, Any]:
+    """Validated submit_compress() kwargs + server options from a /compress body."""
+    if not isinstance(payload, dict):
+        raise ValueError("request body must be a JSON object")
+    context = payload.get("context")
+    if not isinstance(context, str) and not (
+        isinstance(context, list) and context and all(isinstance(p, str) for p in context)
+    ):
+        raise ValueError("context must be a string or a non-empty list of strings")
+    question = payload.get("question", "")
+    if not isinstance(question, str):
+        raise ValueError("question must be a string")
+    threshold = payload.get("threshold")
+    kwargs = {
+        "context": context,
+        "question": question,
+        "context_type": str(payload.get("context_type", "english")),
+        "compression_rate": float(payload.get("compression_rate", 0.5)),
+        "target_token": int(payload.get("target_token", -1)),
+        "use_threshold_filtering": threshold is not None,
+        "threshold": 0.5 if threshold is None else float(threshold),
+        "priority": int(payload.get("priority", 0)),
+        "deadline_ms": (
+            None if payload.get("deadline_ms") is None else float(payload["deadline_ms"])
+        ),
+    }
+    if not 0.0 <= kwargs["compression_rate"] < 1.0:
+        raise ValueError(f"compression_rate must be in [0, 1), got {kwargs['compression_rate']}")
+    timeout_ms = payload.get("timeout_ms")
+    options = {
+        "timeout_s": None if timeout_ms is None else float(timeout_ms) / 1000.0,
+        "return_sentences": bool(payload.get("return_sentences", False)),
+    }
+    return {"kwargs": kwargs, "options": options}
+
+
+class CompressionServer:
+    """ThreadingHTTPServer in front of one AsyncCompressor (or WorkerPool)."""
+
+    def __init__(
+        self,
+        compressor_factory: Callable[[], Any],
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        request_timeout_s: float = 30.0,
+        drain_timeout_s: float = 30.0,
+        max_body_bytes: int = 64 * 1024 * 1024,
+        warmup: bool = True,
+        access_log: bool = False,
+    ):
+        self.compressor_factory = compressor_factory
+        self.request_timeout_s = request_timeout_s
+        self.drain_timeout_s = drain_timeout_s
+        self.max_body_bytes = max_body_bytes
+        self.warmup = warmup
+        self.access_log = access_log
+        self.compressor = None
+        self.state = "loading"  # loading -> ready -> draining -> stopped (or failed)
+        self.load_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._inflight = 0
+        self._responses: Dict[int, int] = {}
+        self._started = time.time()
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._serve_thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Answer HTTP right away; load + warm the model on a background thread."""
+        self._serve_thread = threading.Thread(
+            target=self.httpd.serve_forever, name="http", daemon=True
+        )
+        self._serve_thread.start()
+        threading.Thread(target=self._load, name="model-load", daemon=True).start()
+
+    def _load(self) -> None:
+        try:
+            compressor = self.compressor_factory()
+            if self.warmup:
+                t0 = time.perf_counter()
+                compressor.submit_compress(
+                    _WARMUP_CONTEXT, "What is step 3?", compression_rate=0.5
+                ).result()
+                print(f"✅ Warmup done in {time.perf_counter() - t0:.2f} s")
+            self.compressor = compressor
+            with self._lock:
+                if self.state == "loading":
+                    self.state = "ready"
+        except Exception as exc:
+            self.load_error = f"{type(exc).__name__}: {exc}"
+            with self._lock:
+                self.state = "failed"
+            print(f"⚠️  Model load failed: {self.load_error}")
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.time() + timeout
+        while self.state == "loading":
+            if deadline is not None and time.time() >= deadline:
+                break
+            time.sleep(0.05)
+        return self.state == "ready"
+
+    def drain(self) -> None:
+        """Stop taking requests, finish in-flight ones, then stop the HTTP server."""
+        with self._lock:
+            if self.state in ("draining", "stopped"):
+                return
+            self.state = "draining"
+            deadline = time.time() + self.drain_timeout_s
+            while self._inflight and time.time() < deadline:
+                self._idle.wait(timeout=max(0.0, deadline - time.time()))
+            left = self._inflight
+        if left:
+            print(f"⚠️  Drain timeout: {left} request(s) still in flight")
+        if self.compressor is not None:
+            self.compressor.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        with self._lock:
+            self.state = "stopped"
+
+    def serve_until_signal(self) -> None:
+        stop = threading.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: stop.set())
+        self.start()
+        print(f"Serving on http://{self.httpd.server_address[0]}:{self.port} (loading model)")
+        stop.wait()
+        print("Draining ...")
+        self.drain()
+        print("✅ Stopped")
+
+    def _count(self, status: int) -> None:
+        with self._lock:
+            self._responses[status] = self._responses.get(status, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {
+                "state": self.state,
+                "uptime_s": time.time() - self._started,
+                "inflight": self._inflight,
+                "responses": {str(k): v for k, v in sorted(self._responses.items())},
+            }
+        if self.compressor is not None:
+            out["batcher"] = self.compressor.get_model_info()["micro_batcher"]
+        return out
+
+    def handle_get(self, path: str) -> Response:
+        if path == "/healthz":
+            return 200, {"status": "ok", "state": self.state}, {}
+        if path == "/readyz":
+            body = {"ready": self.state == "ready", "state": self.state}
+            if self.load_error:
+                body["error"] = self.load_error
+            return (200 if self.state == "ready" else 503), body, {}
+        if path == "/stats":
+            return 200, self.stats(), {}
+        return 404, {"error": f"no route {path}"}, {}
+
+    def handle_compress(self, body: bytes) -> Response:
+        with self._lock:
+            if self.state != "ready":
+                return 503, {"error": f"server is {self.state}"}, {"Retry-After": "1"}
+            self._inflight += 1
+        try:
+            return self._compress(body)
+        finally:
+            with self._lock:
+                self._inflight -= 1
+                if not self._inflight:
+                    self._idle.notify_all()
+
+    def _compress(self, body: bytes) -> Response:
+        t0 = time.perf_counter()
+        try:
+            request = parse_compress_request(json.loads(body or b"null"))
+        except (ValueError, TypeError) as exc:
+            return 400, {"error": str(exc)}, {}
+        try:
+            future = self.compressor.submit_compress(**request["kwargs"])
+        except QueueFullError as exc:
+            return 429, {"error": f"queue full: {exc}"}, {"Retry-After": "1"}
+        timeout = request["options"]["timeout_s"]
+        try:
+            result = future.result(timeout=self.request_timeout_s if timeout is None else timeout)
+        except FutureTimeout:
+            future.cancel()
+            return 504, {"error": "request timed out"}, {}
+        except ValueError as exc:
+            return 400, {"error": str(exc)}, {}
+        except Exception as exc:
+            return 500, {"error": f"{type(exc).__name__}: {exc}"}, {}
+        out = {k: _json_value(result[k]) for k in _RESULT_FIELDS if k in result}
+        if request["options"]["return_sentences"]:
+            out["sentences"] = result["sentences"]
+            out["sentence_scores"] = _json_value(result["sentence_scores"])
+        out["latency_s"] = time.perf_counter() - t0
+        return 200, out, {}
+
+
+def _make_handler(server: CompressionServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, response: Response) -> None:
+            status, body, headers = response
+            server._count(status)
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._send(server.handle_get(self.path.split("?", 1)[0]))
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > server.max_body_bytes:
+                self.close_connection = True
+                self._send((413, {"error": f"body over {server.max_body_bytes} bytes"}, {}))
+                return
+            body = self.rfile.read(length)
+            if self.path.split("?", 1)[0] != "/compress":
+                self._send((404, {"error": f"no route {self.path}"}, {}))
+                return
+            self._send(server.handle_compress(body))
+
+        def log_message(self, format, *args):
+            if server.access_log:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local HTTP compression service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--attention_model_path", default="Qwen/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--detector_path", required=True)
+    parser.add_argument("--eval_tokenizer_path", default="Qwen/Qwen2.5-7B-Instruct")
+    parser.add_argument("--max_seq_len", type=int, default=None)
+    parser.add_argument("--device", default="cuda")
+    parser.add_argument("--english_sentence_splitter", choices=["nltk", "regex"], default="nltk")
+    parser.add_argument("--use_fast_chinese_split", action="store_true")
+    parser.add_argument("--use_pure_gpu", action="store_true")
+    parser.add_argument("--max_batch_size", type=int, default=8)
+    parser.add_argument("--max_wait_ms", type=float, default=5.0)
+    parser.add_argument("--max_batch_tokens", type=int, default=None)
+    parser.add_argument("--scheduling", choices=["fifo", "slo"], default="fifo")
+    parser.add_argument("--slo_short_ms", type=float, default=250.0)
+    parser.add_argument("--slo_long_ms", type=float, default=5000.0)
+    parser.add_argument("--long_request_tokens", type=int, default=8192)
+    parser.add_argument("--prefill_chunk_tokens", type=int, default=2048)
+    parser.add_argument(
+        "--workers", type=int, default=0, help="CPU: forked worker processes sharing the weights"
+    )
+    parser.add_argument("--cores_per_worker", type=int, default=None)
+    parser.add_argument("--no_pin_cores", action="store_true")
+    parser.add_argument("--max_queue", type=int, default=64, help="waiting requests before 429")
+    parser.add_argument("--request_timeout_s", type=float, default=30.0)
+    parser.add_argument("--drain_timeout_s", type=float, default=30.0)
+    parser.add_argument("--no_warmup", action="store_true")
+    parser.add_argument("--access_log", action="store_true")
+    args = parser.parse_args()
+
+    def _compressor():
+        from attention_compressor import AttentionCompressor
+
+        return AttentionCompressor(
+            attention_model_path=args.attention_model_path,
+            detector_path=args.detector_path,
+            eval_tokenizer_path=args.eval_tokenizer_path,
+            max_seq_len=args.max_seq_len,
+            device=args.device,
+            english_sentence_splitter=args.english_sentence_splitter,
+            use_fast_chinese_split=args.use_fast_chinese_split,
+            use_pure_gpu=args.use_pure_gpu,
+            print_sentence_scores=False,
+        )
+
+    def _factory():
+        from serving.async_compressor import AsyncCompressor
+        from serving.config import AsyncConfig
+
+        return AsyncCompressor(
+            _compressor(),
+            AsyncConfig(
+                max_batch_size=args.max_batch_size,
+                max_wait_ms=args.max_wait_ms,
+                max_batch_tokens=args.max_batch_tokens,
+                max_pending=args.max_queue,
+                scheduling=args.scheduling,
+                slo_ms={"short": args.slo_short_ms, "long": args.slo_long_ms},
+                long_request_tokens=args.long_request_tokens,
+                prefill_chunk_tokens=args.prefill_chunk_tokens,
+            ),
+        )
+
+    def _pooled_factory():
+        from serving.worker_pool import WorkerPool
+
+        return WorkerPool(
+            _compressor,
+            num_workers=args.workers,
+            cores_per_worker=args.cores_per_worker,
+            max_batch_size=args.max_batch_size,
+            max_pending=args.max_queue,
+            pin_cores=not args.no_pin_cores,
+        )
+
+    CompressionServer(
+        _factory if args.workers <= 0 else _pooled_factory,
+        host=args.host,
+        port=args.port,
+        request_timeout_s=args.request_timeout_s,
+        drain_timeout_s=args.drain_timeout_s,
+        warmup=not args.no_warmup,
+        access_log=args.access_log,
+    ).serve_until_signal()
+
+
+if __name__ == "__main__":
+    main()
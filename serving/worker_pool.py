@@ -0,0 +1,373 @@
+"""Forked CPU worker pool: one loaded compressor, N pinned workers, a local dispatch queue.
+
+The calling process is the loader: it builds the compressor once with torch
+limited to one thread (so no OpenMP pool exists to break across fork), freezes
+the GC heap, and forks ``num_workers`` processes. Workers share the model and
+detector weights copy-on-write (inference never writes them). Each worker pins
+itself to its own core set with ``os.sched_setaffinity`` and sets
+``torch.set_num_threads`` to the size of that set (``pin_cores=False`` only
+splits the thread budget, e.g. for more workers than cores).
+
+Requests go to one shared task queue. An idle worker takes a task plus up to
+``max_batch_size - 1`` more already queued, and runs those with the same budget
+through ``compress_batch``. A batch that fails on a bad request or an
+allocation error is bisected until the failing request is alone; other errors
+fail the whole batch at once. Results come back on a result queue and resolve
+``concurrent.futures.Future``s. Linux (fork + sched_setaffinity), CPU devices
+only; CUDA cannot be used across fork.
+"""
+
+from __future__ import annotations
+
+import gc
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from serving.batcher import QueueFullError
+
+
+def split_cores(
+    cores: Sequence[int], num_workers: int, cores_per_worker: Optional[int] = None
+) -> List[List[int]]:
+    """Contiguous, disjoint core sets of equal size; leftover cores stay unused."""
+    cores = sorted(cores)
+    if num_workers < 1:
+        raise ValueError(f"num_workers must be >= 1, got {num_workers}")
+    if cores_per_worker is None:
+        cores_per_worker = max(1, len(cores) // num_workers)
+    if cores_per_worker * num_workers > len(cores):
+        raise ValueError(
+            f"{num_workers} workers x {cores_per_worker} cores needs more than the "
+            f"{len(cores)} available cores"
+        )
+    return [cores[i * cores_per_worker : (i + 1) * cores_per_worker] for i in range(num_workers)]
+
+
+def _pin(cores: List[int], threads: int) -> None:
+    import torch
+
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(max(1, threads))
+
+
+def _worker_main(
+    rank: int,
+    compressor,
+    cores: Optional[List[int]],
+    threads: int,
+    tasks,
+    results,
+    max_batch_size: int,
+) -> None:
+    _pin(cores, threads)
+    results.put(("ready", rank, os.getpid()))
+    stop = False
+    while not stop:
+        first = tasks.get()
+        if first is None:
+            break
+        batch = [first]
+        while len(batch) < max_batch_size:
+            try:
+                task = tasks.get_nowait()
+            except Empty:
+                break
+            if task is None:
+                stop = True
+                break
+            batch.append(task)
+        results.put(("start", rank, [task_id for task_id, _, _ in batch]))
+        groups: Dict[tuple, List] = {}
+        for task in batch:
+            groups.setdefault(task[2], []).append(task)
+        for budget, group in groups.items():
+            _run_group(rank, compressor, group, dict(budget), results)
+    results.put(("exit", rank, None))
+
+
+# Errors a single bad request (or a batch too large for memory) can cause; any
+# other error is treated as systemic and fails the whole group without retries.
+_SAMPLE_ERRORS = (ValueError, TypeError, KeyError, IndexError)
+
+
+def _run_group(rank: int, compressor, group: List, budget: Dict, results) -> None:
+    """compress_batch one same-budget group; bisect on per-sample or allocation errors."""
+    from probe.memory import is_allocation_error
+
+    try:
+        out = compressor.compress_batch(
+            [sample for _, sample, _ in group], batch_size=len(group), **budget
+        )
+    except Exception as exc:
+        splittable = isinstance(exc, _SAMPLE_ERRORS) or is_allocation_error(exc)
+        if len(group) > 1 and splittable:
+            half = (len(group) + 1) // 2
+            _run_group(rank, compressor, group[:half], budget, results)
+            _run_group(rank, compressor, group[half:], budget, results)
+            return
+        error = _picklable(exc)
+        for task_id, _, _ in group:
+            results.put(("done", rank, task_id, None, error))
+        return
+    for (task_id, _, _), result in zip(group, out):
+        results.put(("done", rank, task_id, result, None))
+
+
+def _picklable(exc: BaseException) -> BaseException:
+    if isinstance(exc, (ValueError, RuntimeError, TypeError, KeyError, IndexError)):
+        return exc
+    return RuntimeError(f"{type(exc).__name__}: {exc}")
+
+
+class WorkerPool:
+    """N forked compressor workers behind ``submit_compress`` / ``compress_batch``."""
+
+    # Seconds to wait for every worker to report ready before giving up.
+    READY_TIMEOUT_S = 60.0
+
+    def __init__(
+        self,
+        compressor_factory: Callable[[], Any],
+        num_workers: int = 0,
+        cores_per_worker: Optional[int] = None,
+        max_batch_size: int = 4,
+        max_pending: Optional[int] = None,
+        pin_cores: bool = True,
+    ):
+        try:
+            ctx = mp.get_context("fork")
+        except ValueError:
+            raise ValueError("WorkerPool needs the 'fork' start method (Linux)") from None
+        import torch
+
+        if hasattr(os, "sched_getaffinity"):
+            available = sorted(os.sched_getaffinity(0))
+        else:
+            available, pin_cores = list(range(os.cpu_count() or 1)), False
+        if num_workers <= 0:
+            num_workers = max(1, len(available) // (cores_per_worker or 1))
+        if pin_cores:
+            self.core_sets: List[Optional[List[int]]] = split_cores(
+                available, num_workers, cores_per_worker
+            )
+            self.threads = [len(cores) for cores in self.core_sets]
+        else:  # shared cores (e.g. more workers than cores): split the thread budget only
+            self.core_sets = [None] * num_workers
+            self.threads = [cores_per_worker or max(1, len(available) // num_workers)] * num_workers
+        self.num_workers = num_workers
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_pending = max_pending
+
+        threads_before = torch.get_num_threads()
+        torch.set_num_threads(1)
+        t0 = time.perf_counter()
+        self.compressor = compressor_factory()
+        if self.compressor.device.type != "cpu":
+            raise ValueError(
+                "WorkerPool shares weights across fork and needs device='cpu', "
+                f"got {self.compressor.device}"
+            )
+        load_s = time.perf_counter() - t0
+        gc.collect()
+        gc.freeze()  # keep GC passes from touching (and copying) the loader's heap pages
+
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._procs = []
+        for rank, cores in enumerate(self.core_sets):
+            proc = ctx.Process(
+                target=_worker_main,
+                args=(
+                    rank,
+                    self.compressor,
+                    cores,
+                    self.threads[rank],
+                    self._tasks,
+                    self._results,
+                    self.max_batch_size,
+                ),
+                daemon=True,
+            )
+            proc.start()
+            self._procs.append(proc)
+        gc.unfreeze()
+        torch.set_num_threads(threads_before)
+
+        self._lock = threading.Lock()
+        self._futures: Dict[int, Future] = {}
+        self._running: Dict[int, List[int]] = {rank: [] for rank in range(num_workers)}
+        self._done_by_worker = [0] * num_workers
+        self._next_id = 0
+        self._closed = False
+        self._ready = threading.Event()
+        self._ready_count = 0
+        self._collector = threading.Thread(target=self._collect, name="worker-pool", daemon=True)
+        self._collector.start()
+        if not self._ready.wait(timeout=self.READY_TIMEOUT_S) or self._ready_count < num_workers:
+            started = self._ready_count
+            self._terminate()
+            raise RuntimeError(
+                f"WorkerPool: only {started}/{num_workers} workers became ready "
+                f"within {self.READY_TIMEOUT_S:.0f} s"
+            )
+        print(
+            f"✅ WorkerPool: {num_workers} workers x {self.threads[0]} threads "
+            + ("(pinned) " if pin_cores else "")
+            + f"(model loaded once in {load_s:.1f} s, shared copy-on-write)"
+        )
+
+    def submit_compress(
+        self,
+        context,
+        question: str = "",
+        target_token: int = -1,
+        compression_rate: float = 0.5,
+        context_type: str = "english",
+        use_threshold_filtering: bool = False,
+        threshold: float = 0.5,
+        **_scheduling,
+    ) -> Future:
+        """AsyncCompressor.submit_compress() on the pool (priority / deadline ignored)."""
+        sample = {"context": context, "question": question, "context_type": context_type}
+        budget = (
+            ("target_token", target_token),
+            ("compression_rate", compression_rate),
+            ("use_threshold_filtering", use_threshold_filtering),
+            ("threshold", threshold),
+        )
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("WorkerPool is closed")
+            if self.max_pending is not None and len(self._futures) >= self.max_pending:
+                raise QueueFullError(f"{len(self._futures)} requests already waiting")
+            task_id = self._next_id
+            self._next_id += 1
+            self._futures[task_id] = future
+        self._tasks.put((task_id, sample, budget))
+        return future
+
+    def compress_batch(self, samples: List[Dict], **budget) -> List[Dict]:
+        """Spread samples over the workers; results in input order."""
+        futures = [
+            self.submit_compress(
+                s["context"],
+                s.get("question", ""),
+                context_type=s.get("context_type", "english"),
+                **budget,
+            )
+            for s in samples
+        ]
+        return [f.result() for f in futures]
+
+    def _collect(self) -> None:
+        exited = 0
+        while exited < self.num_workers:
+            try:
+                msg = self._results.get(timeout=1.0)
+            except Empty:
+                self._fail_dead_workers()
+                if not any(p.is_alive() for p in self._procs):
+                    self._fail_pending("all workers exited")
+                    self._ready.set()  # wake a constructor still waiting for workers
+                    return
+                continue
+            kind, rank = msg[0], msg[1]
+            if kind == "ready":
+                self._ready_count += 1
+                if self._ready_count == self.num_workers:
+                    self._ready.set()
+            elif kind == "start":
+                with self._lock:
+                    self._running[rank] = list(msg[2])
+            elif kind == "done":
+                _, _, task_id, result, exc = msg
+                with self._lock:
+                    future = self._futures.pop(task_id, None)
+                    if task_id in self._running[rank]:
+                        self._running[rank].remove(task_id)
+                    self._done_by_worker[rank] += 1
+                if future is not None and future.set_running_or_notify_cancel():
+                    if exc is not None:
+                        future.set_exception(exc)
+                    else:
+                        future.set_result(result)
+            elif kind == "exit":
+                exited += 1
+
+    def _fail_dead_workers(self) -> None:
+        for rank, proc in enumerate(self._procs):
+            if proc.exitcode not in (None, 0):
+                with self._lock:
+                    lost = [self._futures.pop(t, None) for t in self._running[rank]]
+                    self._running[rank] = []
+                for future in lost:
+                    if future is not None and future.set_running_or_notify_cancel():
+                        future.set_exception(
+                            RuntimeError(f"worker {rank} died (exit code {proc.exitcode})")
+                        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "policy": "worker_pool",
+                "workers": self.num_workers,
+                "core_sets": self.core_sets,
+                "alive": sum(p.is_alive() for p in self._procs),
+                "pending": len(self._futures),
+                "done_by_worker": list(self._done_by_worker),
+            }
+
+    def get_model_info(self) -> Dict[str, Any]:
+        info = self.compressor.get_model_info()
+        info["micro_batcher"] = self.stats()
+        return info
+
+    def close(self) -> None:
+        """Let workers finish queued tasks, then stop them."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for _ in self._procs:
+            self._tasks.put(None)
+        for proc in self._procs:
+            proc.join()
+        self._tasks.cancel_join_thread()  # tasks left behind by dead workers are dropped
+        self._collector.join(timeout=5.0)
+        self._fail_pending("WorkerPool closed before the request ran")
+
+    def _terminate(self) -> None:
+        """Kill the workers without draining the queues (failed startup)."""
+        with self._lock:
+            self._closed = True
+        for proc in self._procs:
+            if proc.is_alive():
+                proc.terminate()
+        for proc in self._procs:
+            proc.join(timeout=5.0)
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+        self._tasks.cancel_join_thread()
+        self._results.cancel_join_thread()
+        self._collector.join(timeout=5.0)
+
+    def _fail_pending(self, reason: str) -> None:
+        with self._lock:
+            lost, self._futures = list(self._futures.values()), {}
+        for future in lost:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError(reason))
+
+    def __enter__(self) -> "WorkerPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,37 @@
+"""Shared fixtures: repo root on sys.path and a small byte-level BPE tokenizer."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SENTENCES = [
+    "The probe reads the last query row over every context token.",
+    "Sentences with low attention mass are dropped first under a token budget.",
+    "A detector maps per-head attention features to a keep probability.",
+    "Batches are padded to the longest prompt; padding never carries attention.",
+    "Cached scores let any later budget be selected without another forward.",
+    "Mr. Smith asked: which passage explains the latency spike at 10:45?",
+    "Numbers like 3.14, 2048 and 1e-5 tokenize differently from words.",
+]
+CORPUS = SENTENCES * 4
+
+
+@pytest.fixture(scope="session")
+def bpe_tokenizer():
+    """Fast tokenizer with a ByteLevel pre-tokenizer (as Qwen), trained in memory."""
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast
+
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=600,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+        show_progress=False,
+    )
+    tokenizer.train_from_iterator(CORPUS, trainer)
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer)
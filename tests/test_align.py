@@ -0,0 +1,76 @@
+"""searchsorted alignment vs the cumulative-span [T, S] overlap loop it replaced."""
+
+import numpy as np
+import pytest
+
+from prep.align import (
+    align_char_spans,
+    align_char_spans_batch,
+    align_char_spans_dense,
+    cumulative_char_spans,
+)
+
+
+def _cumulative_loop(prompt, sentences, offset_mapping):
+    """Pre-searchsorted _map_sentences_to_offsets (numpy branch)."""
+    sent_lengths = np.array([len(sent) for sent in sentences])
+    cumulative_lengths = np.cumsum(sent_lengths)
+    start_chars = np.zeros_like(cumulative_lengths)
+    start_chars[1:] = cumulative_lengths[:-1]
+    start_chars = start_chars + prompt.find(sentences[0])
+    end_chars = start_chars + sent_lengths
+    token_starts = offset_mapping[:, 0][:, np.newaxis]
+    token_ends = offset_mapping[:, 1][:, np.newaxis]
+    valid_tokens = (token_ends > start_chars) & (token_starts < end_chars)
+    token_sentence_pairs = np.argwhere(valid_tokens)
+    sent_positions = []
+    for sent_idx in range(len(sentences)):
+        sent_tokens = token_sentence_pairs[token_sentence_pairs[:, 1] == sent_idx, 0]
+        if len(sent_tokens) == 0:
+            sent_positions.append((0, 0))
+        else:
+            sent_positions.append((int(sent_tokens[0]), int(sent_tokens[-1])))
+    return sent_positions
+
+
+def _random_case(rng, pad=0):
+    """Prompt of random sentences, random token cuts, special tokens at both ends."""
+    sentences = [
+        "".join(rng.choice(list("abc de.")) for _ in range(rng.integers(1, 30)))
+        for _ in range(rng.integers(1, 12))
+    ]
+    head, tail = "Q: ", " A:"
+    prompt = head + "".join(sentences) + tail
+    cuts = np.unique(np.concatenate([[0, len(prompt)], rng.integers(0, len(prompt), 40)]))
+    offsets = [(0, 0)] + list(zip(cuts[:-1].tolist(), cuts[1:].tolist())) + [(0, 0)] * (1 + pad)
+    return prompt, sentences, np.asarray(offsets, dtype=np.int64)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_align_char_spans_matches_cumulative_loop(seed):
+    prompt, sentences, offsets = _random_case(np.random.default_rng(seed))
+    spans = cumulative_char_spans(prompt, sentences)
+    got = align_char_spans(offsets, spans)
+    assert [tuple(p) for p in got.tolist()] == _cumulative_loop(prompt, sentences, offsets)
+    assert [tuple(p) for p in got.tolist()] == align_char_spans_dense(offsets, spans)
+
+
+def test_align_char_spans_batch_matches_rows():
+    rng = np.random.default_rng(0)
+    cases = [_random_case(rng) for _ in range(5)]
+    width = max(len(o) for _, _, o in cases)
+    batch = np.zeros((len(cases), width, 2), dtype=np.int64)
+    for b, (_, _, offsets) in enumerate(cases):
+        batch[b, : len(offsets)] = offsets
+    spans = [cumulative_char_spans(p, s) for p, s, _ in cases]
+    got = align_char_spans_batch(batch, spans)
+    for b, (_, _, offsets) in enumerate(cases):
+        np.testing.assert_array_equal(got[b], align_char_spans(offsets, spans[b]))
+
+
+def test_non_monotone_offsets_fall_back():
+    offsets = np.asarray([(0, 0), (0, 3), (5, 8), (3, 5)], dtype=np.int64)
+    spans = np.asarray([(0, 4), (4, 8)], dtype=np.int64)
+    assert align_char_spans(offsets, spans) is None
+    assert align_char_spans_batch(offsets[None], [spans]) is None
+    assert align_char_spans_dense(offsets, spans) == [(1, 3), (2, 3)]
@@ -0,0 +1,80 @@
+"""SentenceAlignedTokenizer rows vs a full-prompt encode with offset mapping."""
+
+import numpy as np
+import pytest
+
+from prep.align import align_char_spans_dense
+from prep.aligned_prompt import SentenceAlignedTokenizer, locate_sentence_spans
+from prep.corpus import PASSAGE_SEPARATOR
+from prep.prompt import PROMPT_HEAD, build_filtering_prompt, filtering_prompt_tail
+
+from conftest import SENTENCES
+
+CONTEXTS = [
+    " ".join(SENTENCES[:5]),
+    "  ".join(SENTENCES[2:7]) + "  ",
+    "\n".join(SENTENCES[4:6]),
+]
+
+
+def _reference(tokenizer, prompt, sentences, base):
+    enc = tokenizer(prompt, add_special_tokens=False, return_offsets_mapping=True)
+    spans = locate_sentence_spans(prompt[base:], sentences) + base
+    positions = align_char_spans_dense(np.asarray(enc["offset_mapping"]), spans)
+    return enc["input_ids"], positions
+
+
+@pytest.mark.parametrize("context", CONTEXTS)
+def test_build_row_matches_full_encode(bpe_tokenizer, context):
+    sentences = [s for s in SENTENCES if s in context]
+    sentences.sort(key=context.find)
+    aligned = SentenceAlignedTokenizer(bpe_tokenizer, PROMPT_HEAD, max_length=4096)
+    doc = aligned.prepare_context(context, sentences, count_sentences=True)
+    assert doc is not None
+    question = "Which passage explains the latency?"
+    row = aligned.build_row(doc, filtering_prompt_tail(question))
+
+    ids, positions = _reference(
+        bpe_tokenizer, build_filtering_prompt(context, question), sentences, len(PROMPT_HEAD)
+    )
+    assert row["input_ids"].tolist() == ids
+    assert row["sent_positions"] == positions
+    assert doc["sentence_lengths"].tolist() == [
+        len(bpe_tokenizer(s, add_special_tokens=False)["input_ids"]) for s in sentences
+    ]
+
+
+def test_build_joined_row_matches_full_encode(bpe_tokenizer):
+    passages = [" ".join(SENTENCES[0:2]), " ".join(SENTENCES[2:4]), SENTENCES[4]]
+    separator = PASSAGE_SEPARATOR
+    aligned = SentenceAlignedTokenizer(bpe_tokenizer, PROMPT_HEAD, max_length=4096)
+    docs = [
+        aligned.prepare_context(p, [s for s in SENTENCES[:5] if s in p]) for p in passages
+    ]
+    tail = filtering_prompt_tail("What does the detector map?")
+    row = aligned.build_joined_row(docs, separator, tail)
+    assert row is not None
+
+    context = separator.join(passages)
+    ids, positions = _reference(
+        bpe_tokenizer, PROMPT_HEAD + context + tail, SENTENCES[:5], len(PROMPT_HEAD)
+    )
+    assert row["input_ids"].tolist() == ids
+    assert row["sent_positions"] == positions
+
+
+def test_build_joined_row_rejects_separator_without_lead(bpe_tokenizer):
+    aligned = SentenceAlignedTokenizer(bpe_tokenizer, PROMPT_HEAD, max_length=4096)
+    docs = [aligned.prepare_context(s, [s]) for s in SENTENCES[:2]]
+    assert aligned.build_joined_row(docs, "\n\n", filtering_prompt_tail("q")) is None
+
+
+def test_prepare_context_rejects_missing_sentence(bpe_tokenizer):
+    aligned = SentenceAlignedTokenizer(bpe_tokenizer, PROMPT_HEAD, max_length=4096)
+    assert aligned.prepare_context(SENTENCES[0], ["not in the context"]) is None
+
+
+def test_build_row_over_max_length(bpe_tokenizer):
+    aligned = SentenceAlignedTokenizer(bpe_tokenizer, PROMPT_HEAD, max_length=8)
+    doc = aligned.prepare_context(SENTENCES[0], [SENTENCES[0]])
+    assert aligned.build_row(doc, filtering_prompt_tail("q")) is None
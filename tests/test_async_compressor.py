@@ -0,0 +1,84 @@
+"""AsyncCompressor / AsyncConfig against a stub compressor (no model)."""
+
+import asyncio
+import threading
+
+import pytest
+
+from serving import AsyncCompressor, AsyncConfig
+
+
+class StubCompressor:
+    """Records compress_batch / compress_steps calls; "prompt tokens" = len(context)."""
+
+    def __init__(self):
+        self.batches = []
+        self.steps = []
+        self.closed = 0
+        self._lock = threading.Lock()
+
+    def compress_batch(self, samples, batch_size=4, **budget):
+        with self._lock:
+            self.batches.append(([s["context"] for s in samples], budget))
+        return [{"compressed_text": s["context"], "budget": budget} for s in samples]
+
+    def compress_steps(self, sample, prefill_chunk_tokens=2048, **budget):
+        with self._lock:
+            self.steps.append((sample["context"], prefill_chunk_tokens))
+        for _ in range(0, len(sample["context"]), prefill_chunk_tokens):
+            yield None
+        yield {"compressed_text": sample["context"], "budget": budget}
+
+    def estimate_prompt_tokens(self, sample):
+        return len(sample["context"])
+
+    def get_model_info(self):
+        return {"model": "stub"}
+
+    def close(self):
+        self.closed += 1
+
+
+def test_config_defaults_and_validation():
+    config = AsyncConfig(slo_ms={"short": 100})
+    assert config.slo_ms == {"short": 100, "long": 5000.0}
+    assert config.to_dict()["scheduling"] == "fifo"
+    assert AsyncConfig(max_batch_size=0).max_batch_size == 1
+    with pytest.raises(ValueError):
+        AsyncConfig(scheduling="lifo")
+
+
+def test_fifo_batches_by_budget_and_resolves_each_call():
+    stub = StubCompressor()
+    service = AsyncCompressor(stub, AsyncConfig(max_batch_size=8, max_wait_ms=50))
+
+    async def main():
+        calls = [service.compress_async(f"c{i}", compression_rate=0.5) for i in range(4)]
+        calls.append(service.compress_async("t", target_token=10))
+        return await asyncio.gather(*calls)
+
+    results = asyncio.run(main())
+    assert [r["compressed_text"] for r in results] == ["c0", "c1", "c2", "c3", "t"]
+    assert results[-1]["budget"]["target_token"] == 10
+    assert sorted(len(contexts) for contexts, _ in stub.batches) == [1, 4]
+    info = service.get_model_info()
+    assert info["model"] == "stub" and info["micro_batcher"]["items"] == 5
+    service.close()
+    assert stub.closed == 1
+    # the batcher restarts lazily after close
+    assert service.submit_compress("again").result(timeout=5)["compressed_text"] == "again"
+    service.close()
+
+
+def test_slo_runs_long_requests_as_steps():
+    stub = StubCompressor()
+    config = AsyncConfig(
+        scheduling="slo", max_wait_ms=1, long_request_tokens=100, prefill_chunk_tokens=40
+    )
+    with AsyncCompressor(stub, config) as service:
+        long_future = service.submit_compress("x" * 120, priority=1)
+        short_future = service.submit_compress("short", deadline_ms=1000)
+        assert long_future.result(timeout=5)["compressed_text"] == "x" * 120
+        assert short_future.result(timeout=5)["compressed_text"] == "short"
+    assert stub.steps == [("x" * 120, 40)]
+    assert [contexts for contexts, _ in stub.batches] == [["short"]]
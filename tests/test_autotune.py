@@ -0,0 +1,44 @@
+"""ProfileStore persistence and load_or_autotune's stored-profile path (no benchmark)."""
+
+import json
+from types import SimpleNamespace
+
+from serving import AutotuneConfig, ProfileStore, hardware_fingerprint, load_or_autotune
+from serving.autotune import PROFILE_FORMAT_VERSION, model_key, profile_key
+
+
+class StubCompressor:
+    attention_model_path = "stub/attention"
+    detector_path = "stub/detector.pkl"
+    model_dtype = "torch.float32"
+    device = SimpleNamespace(type="cpu")
+    max_seq_len = 4096
+
+    def __init__(self):
+        self.applied = []
+
+    def apply_tuned_profile(self, profile):
+        self.applied.append(profile)
+
+
+def test_profile_store_round_trip_and_version_check(tmp_path):
+    path = tmp_path / "nested" / "autotune.json"
+    store = ProfileStore(str(path))
+    assert store.get("k") is None  # missing file
+    store.put("k", {"settings": {"batch_size": 8}})
+    store.put("k2", {"settings": {"batch_size": 2}})
+    assert ProfileStore(str(path)).get("k") == {"settings": {"batch_size": 8}}
+    assert not list(path.parent.glob("*.tmp"))
+    path.write_text(json.dumps({"version": PROFILE_FORMAT_VERSION + 1, "profiles": {"k": {}}}))
+    assert store.get("k") is None  # other format versions are ignored
+
+
+def test_load_or_autotune_applies_the_stored_profile(tmp_path):
+    compressor = StubCompressor()
+    path = str(tmp_path / "autotune.json")
+    key = profile_key(hardware_fingerprint(), model_key(compressor))
+    ProfileStore(path).put(key, {"settings": {"batch_size": 8}, "samples_per_s": 3.0})
+    profile = load_or_autotune(compressor, AutotuneConfig(profile_path=path))
+    assert compressor.applied == [profile]
+    assert profile["settings"] == {"batch_size": 8}
+    assert (profile["key"], profile["source"]) == (key, path)
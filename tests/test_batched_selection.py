@@ -0,0 +1,125 @@
+"""select_by_*_batch vs the scalar AttentionCompressor selectors, ties included.
+
+Tie-breaking is pinned: among equal scores the lower sentence index is taken
+first (budget) and is the fallback "best" sentence (threshold), on every path.
+"""
+
+import numpy as np
+import pytest
+import torch
+
+from attention_compressor import AttentionCompressor
+from selection.batched import (
+    pad_index_lists,
+    pad_scores,
+    pad_tokens,
+    select_by_budget_batch,
+    select_by_threshold_batch,
+)
+
+
+def _scalar_selector(mandatory, sep_cost):
+    """Compressor with only the selection rules (no model, no joined-text check)."""
+    compressor = AttentionCompressor.__new__(AttentionCompressor)
+    compressor.print_sentence_scores = False
+    compressor._mandatory_chinese_indices = lambda sentences: list(mandatory)
+    compressor._join_separator_token_cost = lambda context_type, sentences: sep_cost
+    compressor._join_compressed_sentences = lambda sentences, indices, context_type: ""
+    compressor._finalize_joined_selection = (
+        lambda sentences, indices, *args, **kwargs: ("", indices, None)
+    )
+    return compressor
+
+
+def _random_rows(seed, batch=6):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(batch):
+        n = int(rng.integers(1, 15))
+        scores = (rng.integers(0, 4, n) / 4.0).tolist()  # coarse: many ties
+        tokens = rng.integers(1, 20, n).tolist()
+        mandatory = sorted(rng.choice(n, int(rng.integers(0, min(n, 3) + 1)), replace=False).tolist())
+        target = int(rng.integers(0, sum(tokens) + 5))
+        sep_cost = int(rng.integers(0, 3))
+        rows.append((scores, tokens, mandatory, target, sep_cost))
+    return rows
+
+
+def _preserved_lists(preserved):
+    return [np.flatnonzero(row).tolist() for row in preserved.cpu().numpy()]
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_budget_batch_matches_scalar(seed):
+    rows = _random_rows(seed)
+    scores, valid = pad_scores([r[0] for r in rows])
+    preserved, fallback = select_by_budget_batch(
+        scores,
+        pad_tokens([r[1] for r in rows], scores.device),
+        valid,
+        torch.tensor([r[3] for r in rows]),
+        torch.tensor([r[4] for r in rows]),
+        pad_index_lists([r[2] for r in rows], scores.device),
+    )
+    for got, fell_back, (row_scores, tokens, mandatory, target, sep_cost) in zip(
+        _preserved_lists(preserved), fallback.tolist(), rows
+    ):
+        sentences = [""] * len(row_scores)
+        selector = _scalar_selector(mandatory, sep_cost)
+        for scalar_scores in (row_scores, torch.tensor(row_scores)):
+            _, expected, _ = selector._select_sentences(
+                sentences, scalar_scores, tokens, target, "chinese"
+            )
+            assert got == expected
+        cost = sum(tokens[i] for i in got) + sep_cost * (len(got) - 1)
+        assert fell_back == (cost > target)
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_threshold_batch_matches_scalar(seed):
+    rows = _random_rows(seed)
+    scores, valid = pad_scores([r[0] for r in rows])
+    threshold = 0.75
+    preserved, fallback = select_by_threshold_batch(
+        scores, valid, threshold, pad_index_lists([r[2] for r in rows], scores.device)
+    )
+    for got, fell_back, (row_scores, tokens, mandatory, _, _) in zip(
+        _preserved_lists(preserved), fallback.tolist(), rows
+    ):
+        sentences = [""] * len(row_scores)
+        selector = _scalar_selector(mandatory, 0)
+        for scalar_scores in (row_scores, torch.tensor(row_scores)):
+            _, expected = selector._select_sentences_by_threshold(
+                sentences, scalar_scores, tokens, threshold, "chinese"
+            )
+            assert got == expected
+        assert fell_back == (not mandatory and max(row_scores) < threshold)
+
+
+def test_ties_keep_lower_index_first():
+    scores, valid = pad_scores([[0.5, 0.9, 0.5, 0.9, 0.5]])
+    tokens = pad_tokens([[10] * 5], scores.device)
+    no_mandatory = pad_index_lists([[]], scores.device)
+    preserved, _ = select_by_budget_batch(
+        scores, tokens, valid, torch.tensor([30]), torch.tensor([0]), no_mandatory
+    )
+    assert _preserved_lists(preserved) == [[0, 1, 3]]  # 0.9s, then the first 0.5
+
+    scores, valid = pad_scores([[0.2, 0.4, 0.4]])
+    preserved, fallback = select_by_threshold_batch(scores, valid, 0.5, no_mandatory)
+    assert _preserved_lists(preserved) == [[1]] and fallback.tolist() == [True]
+
+
+def test_padding_never_selected():
+    scores, valid = pad_scores([[0.1], [0.3, 0.2, 0.9]])
+    tokens = pad_tokens([[1], [1, 1, 1]], scores.device)
+    preserved, fallback = select_by_budget_batch(
+        scores,
+        tokens,
+        valid,
+        torch.tensor([100, 100]),
+        torch.tensor([0, 0]),
+        pad_index_lists([[], []], scores.device),
+    )
+    assert _preserved_lists(preserved) == [[0], [0, 1, 2]]
+    assert fallback.tolist() == [False, False]
@@ -0,0 +1,126 @@
+"""Joined-length budget enforcement: counts + junction costs, one verification encode."""
+
+import numpy as np
+import pytest
+
+from attention_compressor import AttentionCompressor
+from prep.cache import ByteBudgetCache
+
+from conftest import SENTENCES
+
+FRAGMENTS = SENTENCES + ["3.14", ".", " leading space", "trailing space ", "1e-5", "??", "ok"]
+
+
+class CountingTokenizer:
+    """Forwards to a HF tokenizer; counts full-text encodes and batched pair calls."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.encodes = 0
+        self.batches = 0
+
+    def encode(self, text, **kwargs):
+        self.encodes += 1
+        return self.tokenizer.encode(text, **kwargs)
+
+    def __call__(self, texts, **kwargs):
+        self.batches += 1
+        return self.tokenizer(texts, **kwargs)
+
+
+def _joiner(tokenizer):
+    """Compressor with only the join / budget machinery (no model)."""
+    compressor = AttentionCompressor.__new__(AttentionCompressor)
+    compressor.sentence_budget_tokenizer = "7b"
+    compressor.eval_tokenizer = CountingTokenizer(tokenizer)
+    compressor._sentence_ids_cache = ByteBudgetCache(1 << 20)
+    compressor._join_sep_token_costs = {" ": len(tokenizer.encode(" ", add_special_tokens=False))}
+    return compressor
+
+
+def _length(tokenizer, text):
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def _case(tokenizer, seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(4, 25))
+    sentences = [FRAGMENTS[i] for i in rng.integers(0, len(FRAGMENTS), n)]
+    tokens = [_length(tokenizer, s) for s in sentences]
+    scores = rng.random(n).tolist()
+    joined = _length(tokenizer, " ".join(sentences))
+    target = int(joined * rng.uniform(0.3, 1.0))
+    return sentences, tokens, scores, target
+
+
+def _drop_order(scores, indices):
+    return sorted(indices, key=lambda i: scores[i])
+
+
+def test_junction_cost_is_pair_encode_minus_sentence_counts(bpe_tokenizer):
+    compressor = _joiner(bpe_tokenizer)
+    sentences = ["3.14", " leading space", "trailing space ", "ok"]
+    tokens = [_length(bpe_tokenizer, s) for s in sentences]
+    junctions = {}
+    pairs = [(0, 1), (1, 2), (2, 3), (0, 3)]
+    compressor._junction_costs(compressor.eval_tokenizer, sentences, tokens, " ", pairs, junctions)
+    for a, b in pairs:
+        expected = (
+            _length(bpe_tokenizer, sentences[a] + " " + sentences[b]) - tokens[a] - tokens[b]
+        )
+        assert junctions[(a, b)] == expected
+    assert compressor.eval_tokenizer.batches == 1  # one batched encode for all pairs
+    assert compressor._cached_junctions(sentences, " ", pairs) == junctions
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_fits_budget_with_one_full_encode(bpe_tokenizer, seed):
+    sentences, tokens, scores, target = _case(bpe_tokenizer, seed)
+    compressor = _joiner(bpe_tokenizer)
+    indices = list(range(len(sentences)))
+    text, kept, length = compressor._finalize_joined_selection(
+        sentences, indices, scores, target, "english", sentence_tokens=tokens
+    )
+    assert text == " ".join(sentences[i] for i in kept)
+    assert length == _length(bpe_tokenizer, text)
+    assert length <= target or len(kept) == 1
+    dropped = [i for i in indices if i not in kept]
+    assert dropped == sorted(_drop_order(scores, indices)[: len(dropped)])
+    assert compressor.eval_tokenizer.encodes == 1
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_cached_junctions_give_the_exact_fill(bpe_tokenizer, seed):
+    sentences, tokens, scores, target = _case(bpe_tokenizer, seed)
+    compressor = _joiner(bpe_tokenizer)
+    n = len(sentences)
+    compressor._junction_costs(
+        bpe_tokenizer, sentences, tokens, " ",
+        [(a, b) for a in range(n) for b in range(a + 1, n)], {},
+    )
+    indices = list(range(n))
+    _, kept, length = compressor._finalize_joined_selection(
+        sentences, indices, scores, target, "english", sentence_tokens=tokens
+    )
+    # Reference: drop the shortest prefix of the drop order whose join fits.
+    order = _drop_order(scores, indices)
+    for k in range(n):
+        rest = sorted(set(indices) - set(order[:k]))
+        if _length(bpe_tokenizer, " ".join(sentences[i] for i in rest)) <= target:
+            break
+    assert kept == rest
+    assert compressor.eval_tokenizer.encodes == 1  # the verification encode only
+
+
+def test_within_budget_encodes_once_and_keeps_everything(bpe_tokenizer):
+    sentences = SENTENCES[:4]
+    tokens = [_length(bpe_tokenizer, s) for s in sentences]
+    compressor = _joiner(bpe_tokenizer)
+    target = _length(bpe_tokenizer, " ".join(sentences))
+    for calls in (1, 2):
+        _, kept, length = compressor._finalize_joined_selection(
+            sentences, [0, 1, 2, 3], [0.1, 0.2, 0.3, 0.4], target, "english", sentence_tokens=tokens
+        )
+        assert kept == [0, 1, 2, 3] and length == target
+        # one pair batch for the junctions on the cold call, none once they are cached
+        assert (compressor.eval_tokenizer.encodes, compressor.eval_tokenizer.batches) == (calls, 1)
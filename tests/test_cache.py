@@ -0,0 +1,139 @@
+"""ByteBudgetCache eviction (LRU / GreedyDual-Size) and SingleFlight coalescing."""
+
+import threading
+
+import pytest
+
+from prep.cache import ByteBudgetCache, CacheRegistry, SingleFlight, content_hash
+
+
+def test_lru_evicts_least_recently_used_within_budget():
+    cache = ByteBudgetCache(300)
+    for key in "abc":
+        cache.put(key, key, nbytes=100)
+    assert cache.get("a") == "a"  # refresh: b is now the oldest
+    cache.put("d", "d", nbytes=100)
+    assert cache.peek("b") is None
+    assert [cache.peek(k) for k in "acd"] == ["a", "c", "d"]
+    assert cache.bytes == 300
+    assert cache.evictions == 1
+
+
+def test_one_put_can_evict_several_entries():
+    cache = ByteBudgetCache(300)
+    for key in "abc":
+        cache.put(key, key, nbytes=100)
+    cache.put("big", "big", nbytes=250)
+    assert len(cache) == 1 and cache.bytes == 250
+    assert cache.evictions == 3
+
+
+def test_replace_and_oversize_values():
+    cache = ByteBudgetCache(100)
+    cache.put("a", 1, nbytes=60)
+    cache.put("a", 2, nbytes=30)
+    assert cache.get("a") == 2 and cache.bytes == 30
+    cache.put("huge", 3, nbytes=101)  # never stored, nothing evicted
+    assert cache.peek("huge") is None
+    assert cache.peek("a") == 2
+    cache.put("a", 4, nbytes=101)  # replacing with an oversize value drops the key
+    assert cache.peek("a") is None and cache.bytes == 0
+
+
+def test_cost_policy_evicts_cheapest_per_byte_first():
+    cache = ByteBudgetCache(300, policy="cost")
+    cache.put("cheap_large", 1, nbytes=200, cost=1.0)
+    cache.put("dear_small", 2, nbytes=50, cost=1.0)
+    cache.put("new", 3, nbytes=100, cost=1.0)
+    assert cache.peek("cheap_large") is None
+    assert cache.peek("dear_small") == 2 and cache.peek("new") == 3
+
+
+def test_cost_policy_ages_idle_entries():
+    cache = ByteBudgetCache(200, policy="cost")
+    cache.put("old", 1, nbytes=100, cost=10.0)
+    for i in range(30):  # inflation from each eviction eventually passes "old"
+        cache.put(i, i, nbytes=100, cost=1.0)
+    assert cache.peek("old") is None
+
+
+def test_cost_policy_heap_stays_bounded():
+    cache = ByteBudgetCache(10_000, policy="cost")
+    cache.put("only", 1, nbytes=100, cost=1.0)
+    for _ in range(100_000):
+        assert cache.get("only") == 1
+    assert len(cache._heap) <= 2 * len(cache) + 16
+    for i in range(5_000):  # churn: replaced and evicted keys
+        cache.put(i % 50, i, nbytes=100 + i % 7, cost=float(i % 3 + 1))
+        cache.get((i * 7) % 50)
+    assert len(cache._heap) <= 2 * len(cache) + 16
+    live = {key for _, _, key in cache._heap if cache._priority.get(key) is not None}
+    assert live == set(cache._entries)
+
+
+def test_stats_and_registry_clear():
+    registry = CacheRegistry(policy="lru")
+    cache = registry.create("docs", 1000)
+    cache.put(content_hash("a", "b"), [1, 2, 3])
+    assert cache.get(content_hash("a", "b")) == [1, 2, 3]
+    assert cache.get(content_hash("ab")) is None  # parts are length-prefixed
+    stats = registry.stats()["docs"]
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+    registry.clear()
+    assert len(registry["docs"]) == 0 and registry["docs"].bytes == 0
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        ByteBudgetCache(10, policy="fifo")
+
+
+def test_single_flight_shares_one_computation():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "scores"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", compute)))
+    leader.start()
+    started.wait()
+    followers = [
+        threading.Thread(target=lambda: results.append(flight.do("k", compute)))
+        for _ in range(3)
+    ]
+    for t in followers:
+        t.start()
+    while flight.shared < 3:
+        threading.Event().wait(0.001)
+    release.set()
+    for t in [leader] + followers:
+        t.join()
+    assert results == ["scores"] * 4
+    assert len(calls) == 1
+    assert (flight.leaders, flight.shared) == (1, 3)
+
+
+def test_single_flight_batch_lead_and_nested_calls():
+    flight = SingleFlight()
+    led, waiting = flight.lead(["a", "b", "a"])
+    assert led == ["a", "b"] and waiting == {}
+    # the leading thread computes nested keys itself instead of waiting on itself
+    assert flight.do("a", lambda: "nested") == "nested"
+    assert flight.lead(["a"]) == ([], {})
+
+    got = {}
+    other = threading.Thread(target=lambda: got.update(flight.lead(["b", "c"])[1]))
+    other.start()
+    other.join()
+    assert list(got) == ["b"]  # "c" was claimed by the other thread
+    flight.finish("a", "A")
+    flight.finish("b", error=KeyError("b"))
+    with pytest.raises(KeyError):
+        SingleFlight.wait(got["b"])
+    assert (flight.leaders, flight.shared) == (3, 1)
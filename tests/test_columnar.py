@@ -0,0 +1,138 @@
+"""ColumnarResults round trip vs the compress() dicts they were built from."""
+
+import copy
+
+import numpy as np
+import pytest
+import torch
+
+from attention_compressor import AttentionCompressor
+from selection.columnar import ColumnarResultsBuilder
+
+
+def _result(context, sentences, preserved, separator=" ", **extra):
+    scores = np.linspace(0.1, 0.9, len(sentences))
+    result = {
+        'compressed_text': separator.join(sentences[i] for i in preserved),
+        'original_length': 3 * len(sentences),
+        'compressed_length': 3 * len(preserved),
+        'compression_ratio': 1.0 - len(preserved) / max(len(sentences), 1),
+        'sentence_scores': scores.tolist(),
+        'sentence_tokens': [3] * len(sentences),
+        'sentences': sentences,
+        'preserved_indices': preserved,
+        'processing_time': 0.25,
+    }
+    result.update(extra)
+    return result
+
+
+def _samples():
+    plain = "First sentence here. Second one follows. Third closes it."
+    plain_sents = ["First sentence here.", "Second one follows.", "Third closes it."]
+    # split that is not a verbatim slice of the context (normalized whitespace)
+    odd = "Line  one.\nLine two."
+    odd_sents = ["Line one.", "Line two."]
+    passages = "Passage A text. Passage B text."
+    return [
+        (plain, " ", _result(plain, plain_sents, [0, 2])),
+        (odd, "\n\n", _result(odd, odd_sents, [1], separator="\n\n")),
+        (
+            passages,
+            " ",
+            _result(
+                passages,
+                ["Passage A text.", "Passage B text."],
+                [1],
+                sentence_passages=[0, 1],
+                preserved_passages=[1],
+            ),
+        ),
+        ("", " ", _result("", [], [])),
+    ]
+
+
+def test_round_trip_matches_input_dicts():
+    builder = ColumnarResultsBuilder()
+    samples = _samples()
+    for context, separator, result in samples:
+        builder.append(result, context, separator)
+    columnar = builder.build()
+    assert len(columnar) == len(samples)
+    for got, (_, _, expected) in zip(columnar, samples):
+        assert set(got) == set(expected) - {"sentence_tokens"}
+        for key, value in got.items():
+            assert value == expected[key], key
+            assert type(value) is type(expected[key]), key
+    assert 1 in columnar.fallback_sentences
+    assert columnar[-2]["sentences"] == columnar[len(samples) - 2]["sentences"]
+    with pytest.raises(IndexError):
+        columnar[len(samples)]
+
+
+def test_tensor_scores_and_token_ids():
+    context = "Alpha. Beta."
+    result = _result(context, ["Alpha.", "Beta."], [1], compressed_token_ids=[7, 8])
+    result["sentence_scores"] = torch.tensor([0.25, 0.75])
+    builder = ColumnarResultsBuilder()
+    builder.append(result, context, " ")
+    row = builder.build()[0]
+    assert row["compressed_token_ids"] == [7, 8]
+    assert isinstance(row["sentence_scores"], torch.Tensor)  # as compress() with use_pure_gpu
+    assert row["sentence_scores"].dtype == torch.float32
+    assert torch.equal(row["sentence_scores"], result["sentence_scores"])
+
+
+def test_token_ids_dropped_unless_every_sample_has_them():
+    builder = ColumnarResultsBuilder()
+    builder.append(_result("A. B.", ["A.", "B."], [0], compressed_token_ids=[1]), "A. B.", " ")
+    builder.append(_result("C. D.", ["C.", "D."], [1]), "C. D.", " ")
+    assert "compressed_token_ids" not in builder.build()[0]
+
+
+def test_public_result_drops_sentence_tokens():
+    result = _result("A. B.", ["A.", "B."], [0])
+    public = AttentionCompressor._public_result(dict(result))
+    assert "sentence_tokens" not in public
+    assert {k: v for k, v in result.items() if k != "sentence_tokens"} == public
+
+
+def _batch_compressor(results):
+    """compress_batch() over canned _compress_batch_dicts output (no model)."""
+    compressor = AttentionCompressor.__new__(AttentionCompressor)
+    compressor.batch_size = 4
+    compressor._sentence_markers = lambda sentences: {"section": np.zeros(len(sentences), bool)}
+    compressor._compress_batch_dicts = lambda samples, **kwargs: [
+        {k: (v.clone() if isinstance(v, torch.Tensor) else copy.deepcopy(v)) for k, v in r.items()}
+        for r in results
+    ]
+    return compressor
+
+
+@pytest.mark.parametrize("tensor_scores", [False, True])
+def test_columnar_dicts_match_list_path(tensor_scores):
+    samples, results = [], []
+    for context, separator, result in _samples():
+        if separator != " ":
+            continue  # english samples: " " is the compressor's join separator
+        if tensor_scores:
+            result["sentence_scores"] = torch.tensor(result["sentence_scores"], dtype=torch.float32)
+        samples.append({"context": context, "context_type": "english"})
+        results.append(result)
+    for result, ids in zip(results, ([3, 1, 4], [1, 5], [])):
+        # compress() adds token ids before the passage keys
+        passage_keys = {k: result.pop(k) for k in ("sentence_passages", "preserved_passages") if k in result}
+        result["compressed_token_ids"] = ids
+        result.update(passage_keys)
+    compressor = _batch_compressor(results)
+    listed = compressor.compress_batch(samples)
+    columnar = compressor.compress_batch(samples, columnar=True).to_dicts()
+    assert len(listed) == len(columnar)
+    for expected, got in zip(listed, columnar):
+        assert list(got) == list(expected)
+        for key, value in expected.items():
+            assert type(got[key]) is type(value), key
+            if isinstance(value, torch.Tensor):
+                assert torch.equal(got[key], value), key
+            else:
+                assert got[key] == value, key
@@ -0,0 +1,128 @@
+"""Corpus index round trip: build_corpus_index shards reopened by CorpusIndex."""
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from prep.corpus import CORPUS_FORMAT_VERSION, MANIFEST_NAME, CorpusIndex, build_corpus_index
+from prep.entry import entry_sentences
+from prep.fast_tokenizer import tokenizer_json
+from prep.fingerprint import tokenizer_fingerprint
+
+from conftest import SENTENCES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSAGES = [
+    ("doc-0", " ".join(SENTENCES[:3])),
+    ("doc-1", " ".join(SENTENCES[3:])),
+    ("doc-2", "Café prices rose 3.14% — latency fell. Ünïcode survives the blob!"),
+    ("doc-3", SENTENCES[5]),
+    ("doc-4", "  Leading spaces, then two sentences.  And a trailing gap. "),
+]
+
+
+@pytest.fixture(scope="module")
+def prep(bpe_tokenizer):
+    from prep.worker import SamplePrep
+
+    prep = SamplePrep(
+        "unused",
+        english_sentence_splitter="regex",
+        use_sentence_aligned_prep=True,
+        attention_tokenizer_json=tokenizer_json(bpe_tokenizer),
+    )
+    assert prep.aligned_tokenizer is not None
+    return prep
+
+
+def _assert_same(value, expected, what):
+    if isinstance(expected, np.ndarray):
+        np.testing.assert_array_equal(np.asarray(value), expected, err_msg=what)
+    else:
+        assert value == expected, what
+
+
+def test_index_round_trip_matches_fresh_prep(tmp_path, prep):
+    path = str(tmp_path / "index")
+    records = PASSAGES + [("doc-0", "duplicate id is ignored"), ("empty", "")]
+    manifest = build_corpus_index(records, path, prep, shard_size=2, batch_size=3)
+    assert manifest["num_passages"] == len(PASSAGES)
+    assert len(manifest["shards"]) == 3
+    assert manifest["attention_tokenizer"] == tokenizer_fingerprint(prep.tokenizer)
+
+    index = CorpusIndex(path)
+    assert len(index) == len(PASSAGES) and "empty" not in index
+    for passage_id, text in PASSAGES:
+        stored = index.passage(passage_id)
+        assert stored["text"] == text
+        sentences = prep.split_batch([text], "english")[0]
+        fresh = prep.build_entry(text, sentences)
+        # the row compress_passages hands to _compress_joined_entries
+        row = {
+            "sent_spans": stored["sent_spans"],
+            "sentences": None,
+            "budget_tokens": stored["budget_tokens"],
+            "attn_tokens": stored["attn_tokens"],
+            "aligned": stored["aligned"],
+        }
+        assert row.keys() == fresh.keys()
+        for key in ("sent_spans", "sentences", "budget_tokens", "attn_tokens"):
+            _assert_same(row[key], fresh[key], f"{passage_id}.{key}")
+        # the index keeps spans rather than sentence strings
+        assert entry_sentences(text, row) == fresh["aligned"].pop("sentences") == sentences
+        assert row["aligned"].keys() == fresh["aligned"].keys()
+        for key, expected in fresh["aligned"].items():
+            _assert_same(row["aligned"][key], expected, f"{passage_id}.aligned.{key}")
+        budget_ids = prep.budget_tokenizer(sentences, add_special_tokens=False)["input_ids"]
+        assert stored["budget_ids"].tolist() == [t for ids in budget_ids for t in ids]
+        assert not stored["sent_spans"].flags.writeable  # memmap views, not copies
+
+    with pytest.raises(KeyError):
+        index.passage("missing")
+
+
+def test_index_rejects_other_format_versions(tmp_path, prep):
+    path = tmp_path / "index"
+    build_corpus_index(PASSAGES[:1], str(path), prep)
+    manifest = json.loads((path / MANIFEST_NAME).read_text())
+    manifest["version"] = CORPUS_FORMAT_VERSION + 1
+    (path / MANIFEST_NAME).write_text(json.dumps(manifest))
+    with pytest.raises(ValueError, match="version"):
+        CorpusIndex(str(path))
+
+
+def test_build_script_writes_a_readable_index(tmp_path, bpe_tokenizer):
+    tokenizer_dir = tmp_path / "tokenizer"
+    bpe_tokenizer.save_pretrained(str(tokenizer_dir))
+    source = tmp_path / "passages.jsonl"
+    source.write_text(
+        "".join(json.dumps({"pid": pid, "body": text}) + "\n" for pid, text in PASSAGES),
+        encoding="utf-8",
+    )
+    out = tmp_path / "index"
+    subprocess.run(
+        [
+            sys.executable,
+            os.path.join(ROOT, "scripts", "build_corpus_index.py"),
+            "--input", str(source),
+            "--id_field", "pid",
+            "--text_field", "body",
+            "--output", str(out),
+            "--attention_model_path", str(tokenizer_dir),
+            "--sentence_budget_tokenizer", "0.5b",
+            "--english_sentence_splitter", "regex",
+            "--shard_size", "2",
+        ],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+    )
+    index = CorpusIndex(str(out))
+    assert index.manifest["english_sentence_splitter"] == "regex"
+    assert [index.passage(pid)["text"] for pid, _ in PASSAGES] == [t for _, t in PASSAGES]
+    assert all(index.passage(pid)["aligned"] is not None for pid, _ in PASSAGES)
@@ -0,0 +1,142 @@
+"""MemoryModel prediction, calibration, plan splitting and rejection."""
+
+import pytest
+import torch
+
+from probe.memory import MemoryBudgetError, MemoryModel, MemoryPlanConfig, is_allocation_error
+
+
+def _model(per_token=4096.0):
+    return MemoryModel(num_layers=4, num_heads=2, dtype=torch.float16, coeffs=(0.0, per_token, 0.0))
+
+
+def test_predict_is_monotone_and_includes_probe_buffers():
+    model = _model()
+    assert model.predict(2, 512, 10) > model.predict(1, 512, 10)
+    assert model.predict(1, 1024, 10) > model.predict(1, 512, 10)
+    assert model.predict(1, 512, 40) > model.predict(1, 512, 10)
+    # masks [B, S, T] and features [B, S, L*H] in fp16, plus one row's temporaries
+    assert model.probe_bytes(2, 100, 5) == 2 * 5 * 100 * 2 + 2 * 5 * 8 * 2 + 5 * 100 * 7
+
+
+def test_calibrate_recovers_forward_terms():
+    truth = MemoryModel(4, 2, torch.float16, coeffs=(1e6, 3000.0, 0.5), safety=1.0)
+    points = [
+        (b, t, 8, int(truth.forward_bytes(b, t) + truth.probe_bytes(b, t, 8)))
+        for b in (1, 2)
+        for t in (128, 256, 512)
+    ]
+    model = MemoryModel(4, 2, torch.float16).calibrate(points + [(1, 64, 4, None)])
+    assert len(model.samples) == len(points)  # unmeasurable points are skipped
+    for got, want in zip(model.coeffs, truth.coeffs):
+        assert got == pytest.approx(want, rel=1e-3, abs=1.0)
+    summary = model.summary()
+    assert summary["calibration_points"] == len(points)
+    assert all(
+        type(summary[k]) is float for k in ("fixed_bytes", "bytes_per_token", "bytes_per_token_sq")
+    )
+
+
+def test_calibrate_clamps_negative_coefficients():
+    points = [(1, t, 1, 1000 - t) for t in (100, 200, 300)]  # peak falling with T
+    model = MemoryModel(1, 1, torch.float32).calibrate(points)
+    assert min(model.coeffs) >= 0.0
+
+
+def test_plan_keeps_everything_together_when_it_fits():
+    model = _model()
+    shapes = [(256, 8)] * 6
+    assert model.plan(shapes, budget=model.predict(6, 256, 8)) == [[0, 1, 2, 3, 4, 5]]
+
+
+def test_plan_splits_into_consecutive_fitting_groups():
+    model = _model()
+    shapes = [(128, 4), (512, 16), (128, 4), (128, 4), (512, 16), (256, 8)]
+    budget = model.predict(2, 512, 16)
+    groups = model.plan(shapes, budget)
+    assert len(groups) > 1
+    assert [i for g in groups for i in g] == list(range(len(shapes)))
+    for group in groups:
+        tokens = max(shapes[i][0] for i in group)
+        sentences = max(shapes[i][1] for i in group)
+        assert model.predict(len(group), tokens, sentences) <= budget
+    # greedy: each group could not have taken the next sample
+    for group, nxt in zip(groups, groups[1:]):
+        members = group + nxt[:1]
+        tokens = max(shapes[i][0] for i in members)
+        sentences = max(shapes[i][1] for i in members)
+        assert model.predict(len(members), tokens, sentences) > budget
+
+
+def test_plan_rejects_a_sample_over_budget_alone():
+    model = _model()
+    shapes = [(128, 4), (4096, 64)]
+    with pytest.raises(MemoryBudgetError, match="sample 1"):
+        model.plan(shapes, budget=model.predict(1, 1024, 64))
+    assert issubclass(MemoryBudgetError, ValueError)
+
+
+def test_is_allocation_error():
+    assert is_allocation_error(MemoryError())
+    assert is_allocation_error(RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB"))
+    assert is_allocation_error(RuntimeError("[enforce fail] DefaultCPUAllocator: can't allocate memory"))
+    assert not is_allocation_error(RuntimeError("shape mismatch"))
+    assert not is_allocation_error(ValueError("out of memory"))
+
+
+def test_plan_config_validation():
+    assert (MemoryPlanConfig().budget_bytes, MemoryPlanConfig().safety) == (None, 1.2)
+    with pytest.raises(ValueError):
+        MemoryPlanConfig(budget_bytes=0)
+    with pytest.raises(ValueError):
+        MemoryPlanConfig(safety=0.5)
+
+
+def _guarded_compressor(budget):
+    """Compressor with only the memory guard; forwards are recorded, not run."""
+    from attention_compressor import AttentionCompressor
+
+    compressor = AttentionCompressor.__new__(AttentionCompressor)
+    compressor._memory_model = _model()
+    compressor.memory_budget_bytes = budget
+    compressor._memory_stats = {"planned_splits": 0, "rejected": 0, "oom_retries": 0}
+    compressor._probe_state = type("State", (), {"clear": lambda self: None})()
+    compressor.clear_cache = lambda: None
+    compressor.forwards = []
+    return compressor
+
+
+def _prep(tokens, sentences):
+    return {
+        "inputs": {"input_ids": torch.zeros(1, tokens, dtype=torch.long)},
+        "sent_positions": [(1, 2)] * sentences,
+    }
+
+
+def test_single_forward_rejected_over_budget():
+    compressor = _guarded_compressor(budget=_model().predict(1, 256, 4))
+    with pytest.raises(MemoryBudgetError):
+        compressor._forward_probs_from_prep(_prep(1024, 4))
+    assert compressor._memory_stats["rejected"] == 1
+
+
+def test_single_forward_retried_as_halved_prefill_slices():
+    compressor = _guarded_compressor(budget=None)
+    compressor._memory_model = None  # no plan: exercise the allocation-error path only
+
+    def full(prep):
+        compressor.forwards.append(None)
+        raise RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB")
+
+    def sliced(prep, chunk_tokens):
+        compressor.forwards.append(chunk_tokens)
+        if chunk_tokens > 600:
+            raise RuntimeError("CUDA out of memory. Tried to allocate 1.00 GiB")
+        yield None
+        yield "probs"
+
+    compressor._probe_forward_probs = full
+    compressor._forward_probs_sliced = sliced
+    assert compressor._forward_probs_from_prep(_prep(2048, 4)) == "probs"
+    assert compressor.forwards == [None, 1024, 512]
+    assert compressor._memory_stats["oom_retries"] == 2
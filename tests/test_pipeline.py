@@ -0,0 +1,129 @@
+"""run_pipeline ordering, error propagation and stage stats (stub stages, no model)."""
+
+import random
+import threading
+import time
+
+import pytest
+
+from prep.pipeline import PipelineStats, run_pipeline
+
+
+def _run(items, timeout=10.0, **kwargs):
+    """run_pipeline on a helper thread; a deadlock fails the test instead of hanging it."""
+    out = {}
+
+    def target():
+        try:
+            out["value"] = run_pipeline(items, **kwargs)
+        except BaseException as exc:
+            out["error"] = exc
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "run_pipeline deadlocked"
+    if "error" in out:
+        raise out["error"]
+    return out["value"]
+
+
+def _jittered(fn):
+    rng = random.Random(0)
+    lock = threading.Lock()
+
+    def wrapped(*args):
+        with lock:
+            delay = rng.random() * 0.004
+        time.sleep(delay)
+        return fn(*args)
+
+    return wrapped
+
+
+@pytest.mark.parametrize("finalize_workers", [0, 3])
+def test_results_stay_in_input_order(finalize_workers):
+    items = list(range(40))
+    results, stats = _run(
+        items,
+        prep=_jittered(lambda x: x * 10),
+        forward=lambda v: v + 1,
+        finalize=_jittered(lambda v, f: (v, f)),
+        prep_workers=4,
+        finalize_workers=finalize_workers,
+        queue_depth=2,
+    )
+    assert results == [(x * 10, x * 10 + 1) for x in items]
+    summary = stats.summary()
+    assert summary["items"] == len(items)
+    for name in ("prep", "forward", "finalize"):
+        assert summary["stages"][name]["items"] == len(items), name
+    assert summary["stages"]["prep"]["queue_depth_max"] is None
+    assert (summary["stages"]["finalize"]["queue_depth_max"] is None) == (finalize_workers == 0)
+
+
+def test_stats_accumulate_across_runs():
+    stats = PipelineStats(prep_workers=2, finalize_workers=1)
+    for items in ([1, 2, 3], [4, 5]):
+        results, same = _run(
+            items,
+            prep=lambda x: x,
+            forward=lambda v: v,
+            finalize=lambda v, f: f,
+            prep_workers=2,
+            finalize_workers=1,
+            stats=stats,
+        )
+        assert same is stats and results == items
+    summary = stats.summary()
+    assert summary["items"] == 5
+    assert {name: s["items"] for name, s in summary["stages"].items()} == {
+        "prep": 5,
+        "forward": 5,
+        "finalize": 5,
+    }
+
+
+def test_empty_input():
+    results, stats = _run(
+        [],
+        prep=lambda x: x,
+        forward=lambda v: v,
+        finalize=lambda v, f: f,
+        prep_workers=4,
+        finalize_workers=2,
+    )
+    assert results == []
+    assert stats.summary()["items"] == 0
+    assert all(s["items"] == 0 for s in stats.summary()["stages"].values())
+
+
+def _fail_at(stage, fail_index=5):
+    def raise_on(x):
+        if x == fail_index:
+            raise RuntimeError(f"{stage} failed")
+        return x
+
+    stages = {
+        "prep": lambda x: x,
+        "forward": lambda v: v,
+        "finalize": lambda v, f: f,
+    }
+    if stage == "finalize":
+        stages[stage] = lambda v, f: raise_on(f)
+    else:
+        stages[stage] = raise_on
+    return stages
+
+
+@pytest.mark.parametrize("finalize_workers", [0, 2])
+@pytest.mark.parametrize("stage", ["prep", "forward", "finalize"])
+def test_stage_exception_propagates(stage, finalize_workers):
+    with pytest.raises(RuntimeError, match=f"{stage} failed"):
+        _run(
+            list(range(50)),
+            prep_workers=3,
+            finalize_workers=finalize_workers,
+            queue_depth=1,
+            **_fail_at(stage),
+        )
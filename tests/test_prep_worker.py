@@ -0,0 +1,72 @@
+"""Torch-free prep worker: import check and FastTokenizer vs the HF tokenizer it replaces."""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from prep.fast_tokenizer import load_prep_tokenizer, tokenizer_json
+from prep.fingerprint import tokenizer_fingerprint
+
+from conftest import SENTENCES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_prep_worker_imports_without_torch():
+    code = (
+        "import sys\n"
+        "import prep.worker\n"
+        "assert 'torch' not in sys.modules, 'torch'\n"
+        "assert 'transformers' not in sys.modules, 'transformers'\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+
+
+def test_fast_tokenizer_matches_hf_call_api(bpe_tokenizer):
+    fast = load_prep_tokenizer("unused", tokenizer_json(bpe_tokenizer))
+    assert tokenizer_fingerprint(fast) == tokenizer_fingerprint(bpe_tokenizer)
+    text = " ".join(SENTENCES)
+    for kwargs in (
+        {},
+        {"add_special_tokens": False},
+        {"return_offsets_mapping": True},
+        {"truncation": True, "max_length": 17, "return_offsets_mapping": True},
+    ):
+        got, expected = fast(text, **kwargs), bpe_tokenizer(text, **kwargs)
+        assert got["input_ids"] == expected["input_ids"], kwargs
+        if "offset_mapping" in expected:
+            assert [tuple(o) for o in got["offset_mapping"]] == [
+                tuple(o) for o in expected["offset_mapping"]
+            ]
+    batch = fast(SENTENCES, add_special_tokens=False, padding=False, return_length=True)
+    expected = bpe_tokenizer(SENTENCES, add_special_tokens=False, padding=False, return_length=True)
+    assert batch["input_ids"] == expected["input_ids"]
+    assert list(batch["length"]) == list(expected["length"])
+    assert fast.encode(text, add_special_tokens=False) == bpe_tokenizer.encode(
+        text, add_special_tokens=False
+    )
+
+
+def test_sample_prep_rows_match_hf_tokenizer(bpe_tokenizer):
+    from prep.worker import SamplePrep
+
+    context = " ".join(SENTENCES)
+    rows = []
+    for use_hf in (False, True):
+        prep = SamplePrep(
+            "unused",
+            english_sentence_splitter="regex",
+            attention_tokenizer_json=tokenizer_json(bpe_tokenizer),
+        )
+        if use_hf:
+            prep.tokenizer = prep.budget_tokenizer = bpe_tokenizer
+        rows.append(prep.prepare(context, "Which passage explains the latency?", "english"))
+    fast_row, hf_row = rows
+    assert fast_row.keys() == hf_row.keys()
+    for key, value in fast_row.items():
+        if isinstance(value, np.ndarray):
+            np.testing.assert_array_equal(value, hf_row[key])
+        else:
+            assert value == hf_row[key], key
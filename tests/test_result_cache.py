@@ -0,0 +1,109 @@
+"""Result-cache coalescing between compress() scoring and compress_batch() misses."""
+
+import threading
+
+from attention_compressor import AttentionCompressor
+from prep.cache import ByteBudgetCache, SingleFlight
+
+
+def _sample(context):
+    return {"context": context, "question": "q", "context_type": "english"}
+
+
+def _scored(context):
+    sentences = context.split(". ")
+    return [0.5] * len(sentences), sentences, [3] * len(sentences), None
+
+
+class ResultCacheCompressor(AttentionCompressor):
+    """Only the result-cache plumbing; scoring and selection are stubs."""
+
+    def __init__(self):
+        self._result_config = "stub"
+        self._results_cache = ByteBudgetCache(1 << 20)
+        self._result_store = None
+        self._result_flight = SingleFlight()
+        self.batch_calls = []
+        self.batch_started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def _compress_batch_uncached(self, samples, **kwargs):
+        self.batch_calls.append([s["context"] for s in samples])
+        self.batch_started.set()
+        self.release.wait()
+        results = []
+        for s in samples:
+            key = self._sample_result_key(s)
+            scored = self._cached_scores(key, lambda: _scored(s["context"]))  # nested: no wait
+            results.append(
+                self._finalize_compress_result(s["context"], scored[1], scored[0], scored[2], "english")
+            )
+        return results
+
+    def _finalize_compress_result(self, context, sentences, scores, tokens, context_type, **kwargs):
+        return {"sentence_scores": scores, "sentences": sentences, "sentence_tokens": tokens}
+
+    def score(self, context):
+        """compress()'s scoring step for a text sample."""
+        return self._cached_scores(self._sample_result_key(_sample(context)), lambda: _scored(context))
+
+
+def _batch(compressor, contexts):
+    return compressor._compress_batch_with_result_cache(
+        [_sample(c) for c in contexts],
+        target_token=-1,
+        compression_rate=0.5,
+        use_threshold_filtering=False,
+        threshold=0.5,
+    )
+
+
+def _in_thread(fn):
+    out = []
+    thread = threading.Thread(target=lambda: out.append(fn()), daemon=True)
+    thread.start()
+    return thread, out
+
+
+def test_batch_waits_on_a_compress_already_scoring_the_key():
+    compressor = ResultCacheCompressor()
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def slow_score():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return _scored("A one. A two")
+
+    key = compressor._sample_result_key(_sample("A one. A two"))
+    single, single_out = _in_thread(lambda: compressor._cached_scores(key, slow_score))
+    started.wait(5)
+    batch, batch_out = _in_thread(lambda: _batch(compressor, ["A one. A two", "B one"]))
+    while compressor._result_flight.shared < 1:
+        threading.Event().wait(0.001)
+    assert compressor.batch_calls == [["B one"]]  # the in-flight key is not rescored
+    release.set()
+    single.join(5)
+    batch.join(5)
+    assert len(calls) == 1
+    assert single_out[0][1] == ["A one", "A two"]
+    assert batch_out[0][0]["sentences"] == ["A one", "A two"]
+    assert batch_out[0][1]["sentences"] == ["B one"]
+
+
+def test_compress_waits_on_a_batch_already_scoring_the_key():
+    compressor = ResultCacheCompressor()
+    compressor.release.clear()
+    batch, batch_out = _in_thread(lambda: _batch(compressor, ["A one. A two", "A one. A two"]))
+    compressor.batch_started.wait(5)
+    single, single_out = _in_thread(lambda: compressor.score("A one. A two"))
+    while compressor._result_flight.shared < 1:
+        threading.Event().wait(0.001)
+    compressor.release.set()
+    batch.join(5)
+    single.join(5)
+    assert compressor.batch_calls == [["A one. A two"]]  # duplicates scored once
+    assert single_out[0][1] == ["A one", "A two"]
+    assert [r["sentences"] for r in batch_out[0]] == [["A one", "A two"]] * 2
+    assert compressor._result_flight.stats() == {"leaders": 1, "shared": 1}
@@ -0,0 +1,99 @@
+"""WorkerPool group bisection (_run_group with a stub compressor) and failed startup."""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import serving.worker_pool as worker_pool
+from serving import WorkerPool
+
+
+class StubCompressor:
+    """compress_batch echoes contexts; ``fail`` decides which calls raise."""
+
+    device = SimpleNamespace(type="cpu")
+
+    def __init__(self, fail):
+        self.fail = fail
+        self.calls = []
+
+    def compress_batch(self, samples, batch_size, **budget):
+        contexts = [s["context"] for s in samples]
+        self.calls.append(contexts)
+        exc = self.fail(contexts)
+        if exc is not None:
+            raise exc
+        return [{"compressed_text": c, "budget": budget} for c in contexts]
+
+
+class ListQueue(list):
+    put = list.append
+
+
+def _group(contexts):
+    budget = (("target_token", 10),)
+    return [(i, {"context": c}, budget) for i, c in enumerate(contexts)]
+
+
+def _outcomes(results):
+    assert all(kind == "done" and rank == 0 for kind, rank, *_ in results)
+    return {task_id: (result, exc) for _, _, task_id, result, exc in results}
+
+
+def test_bad_sample_is_isolated_and_siblings_succeed():
+    compressor = StubCompressor(
+        lambda contexts: ValueError("bad sample") if "bad" in contexts else None
+    )
+    contexts = ["a", "b", "bad", "c", "d"]
+    results = ListQueue()
+    worker_pool._run_group(0, compressor, _group(contexts), {"target_token": 10}, results)
+    outcomes = _outcomes(results)
+    assert sorted(outcomes) == list(range(len(contexts)))
+    for task_id, context in enumerate(contexts):
+        result, exc = outcomes[task_id]
+        if context == "bad":
+            assert result is None and isinstance(exc, ValueError)
+        else:
+            assert exc is None
+            assert result == {"compressed_text": context, "budget": {"target_token": 10}}
+    assert ["bad"] in compressor.calls  # bisected down to the failing request
+
+
+def test_allocation_error_bisects():
+    compressor = StubCompressor(
+        lambda contexts: RuntimeError("CPU out of memory") if len(contexts) > 1 else None
+    )
+    results = ListQueue()
+    worker_pool._run_group(0, compressor, _group(["a", "b", "c"]), {}, results)
+    assert all(exc is None for _, exc in _outcomes(results).values())
+
+
+def test_systemic_error_fails_the_group_at_once():
+    compressor = StubCompressor(lambda contexts: RuntimeError("model is broken"))
+    results = ListQueue()
+    worker_pool._run_group(0, compressor, _group(["a", "b", "c", "d"]), {}, results)
+    assert len(compressor.calls) == 1  # no bisection retries
+    outcomes = _outcomes(results)
+    assert sorted(outcomes) == [0, 1, 2, 3]
+    for result, exc in outcomes.values():
+        assert result is None
+        assert isinstance(exc, RuntimeError) and "model is broken" in str(exc)
+
+
+def test_workers_that_never_become_ready_fail_startup(monkeypatch):
+    # _pin runs in the forked worker before it reports ready
+    monkeypatch.setattr(worker_pool, "_pin", lambda cores, threads: time.sleep(60))
+    monkeypatch.setattr(WorkerPool, "READY_TIMEOUT_S", 0.5)
+    procs = []
+    real_terminate = WorkerPool._terminate
+
+    def record(self):
+        procs.extend(self._procs)
+        real_terminate(self)
+
+    monkeypatch.setattr(WorkerPool, "_terminate", record)
+    with pytest.raises(RuntimeError, match="0/2 workers became ready"):
+        WorkerPool(lambda: StubCompressor(lambda c: None), num_workers=2, pin_cores=False)
+    assert len(procs) == 2
+    assert not any(proc.is_alive() for proc in procs)